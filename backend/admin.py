@@ -3,7 +3,8 @@ from typing import List, Optional
 from datetime import datetime, timedelta
 from pydantic import BaseModel, Field, EmailStr
 import uuid
-from motor.motor_asyncio import AsyncIOMotorClient
+from async_database import get_async_db
+from business_context import adrop as drop_business_context
 import os
 from dotenv import load_dotenv
 from pathlib import Path
@@ -16,9 +17,7 @@ ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
 # MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+db = get_async_db()  # Shared Motor pool (async_database.py)
 
 # Stripe configuration
 stripe.api_key = os.environ.get('STRIPE_SECRET_KEY', '')
@@ -501,6 +500,7 @@ async def delete_user(
         await db.content_uploads.delete_many({"user_id": user_id})
         await db.content_notes.delete_many({"owner_id": user_id})
         await db.business_profiles.delete_many({"user_id": user_id})
+        await drop_business_context(db, user_id)
         await db.subscriptions.delete_many({"user_id": user_id})
         await db.payments.delete_many({"user_id": user_id})
         
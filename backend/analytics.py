@@ -8,16 +8,14 @@ import json
 import os
 from collections import Counter
 import re
-from motor.motor_asyncio import AsyncIOMotorClient
+from async_database import get_async_db
 from emergentintegrations.llm.chat import LlmChat, UserMessage
 
 # Import authentication
 from auth import get_current_active_user, User
 
 # MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+db = get_async_db()  # Shared Motor pool (async_database.py)
 
 # Analytics Router
 analytics_router = APIRouter(prefix="/analytics", tags=["analytics"])
@@ -0,0 +1,362 @@
+"""
+Async database module for Claire et Marcus
+Shared Motor (AsyncIOMotorClient) connection pool and async repositories
+used by request handlers, so MongoDB round-trips never block the event loop.
+
+The sync DatabaseManager (database.py) stays for scripts and background jobs
+running in worker threads; both clients use the same URL and pool settings.
+"""
+
+import os
+from datetime import datetime
+from typing import Optional, List, Dict, Any
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorGridFSBucket
+
+from database import get_mongo_url, mongo_client_options, DatabaseManager
+from memory_cache import invalidate_thumbnail
+from business_context import amark_stale as mark_context_stale
+
+RELATIVE_THUMB_ENDPOINT = "/api/content/{file_id}/thumb"
+
+
+def canonical_media_id(media_doc: Dict[str, Any]) -> str:
+    """Canonical string id of a media document (`id`; str(_id) before migrate_media_ids.py)"""
+    return media_doc.get("id") or str(media_doc.get("_id"))
+
+
+def to_object_id(value) -> Optional[ObjectId]:
+    """Convert a str/ObjectId to ObjectId (None if not a valid ObjectId)"""
+    if isinstance(value, ObjectId):
+        return value
+    if isinstance(value, str) and ObjectId.is_valid(value):
+        return ObjectId(value)
+    return None
+
+
+class UsersRepository:
+    """users collection"""
+
+    def __init__(self, db):
+        self.collection = db.users
+
+    async def find_by_id(self, user_id: str, projection: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        return await self.collection.find_one({"user_id": user_id}, projection)
+
+    async def find_by_email(self, email: str) -> Optional[Dict[str, Any]]:
+        return await self.collection.find_one({"email": email})
+
+    async def list_ids(self) -> List[str]:
+        users = await self.collection.find({}, {"user_id": 1}).to_list(length=None)
+        return [u["user_id"] for u in users if u.get("user_id")]
+
+
+class MediaRepository:
+    """media collection (content library)"""
+
+    def __init__(self, db):
+        self.collection = db.media
+        self.aliases = db.media_aliases
+
+    async def find_for_owner(self, file_id: str, owner_id: str, include_deleted: bool = False) -> Optional[Dict[str, Any]]:
+        """Find a media document by its canonical `id` (one indexed equality).
+
+        Legacy identifiers (ObjectId string, external_id, file_id) are resolved
+        through the media_aliases table only when the canonical lookup misses.
+        """
+        base = {"owner_id": owner_id}
+        if not include_deleted:
+            base["deleted"] = {"$ne": True}
+
+        media_doc = await self.collection.find_one({**base, "id": file_id})
+        if media_doc:
+            return media_doc
+
+        canonical = await self.resolve_alias(file_id, owner_id)
+        if canonical and canonical != file_id:
+            return await self.collection.find_one({**base, "id": canonical})
+        return None
+
+    async def resolve_alias(self, alias: str, owner_id: str) -> Optional[str]:
+        """Canonical media id for a legacy identifier (None if unknown)"""
+        entry = await self.aliases.find_one({"alias": alias, "owner_id": owner_id}, {"media_id": 1})
+        return entry["media_id"] if entry else None
+
+    async def canonical_id(self, file_id: str, owner_id: str) -> str:
+        """Canonical `id` of a client-supplied identifier (unchanged when unknown, so callers 404)"""
+        if await self.collection.find_one({"id": file_id, "owner_id": owner_id}, {"_id": 1}):
+            return file_id
+        return await self.resolve_alias(file_id, owner_id) or file_id
+
+    async def find_public(self, file_id: str) -> Optional[Dict[str, Any]]:
+        """Media served without authentication (public image URLs carry no owner).
+
+        Aliases are only unique per owner (external_id / file_id may repeat across
+        tenants), so a legacy id that maps to more than one media is refused (None → 404)
+        rather than serving whichever tenant's document comes first.
+        """
+        media_doc = await self.collection.find_one({"id": file_id})
+        if media_doc:
+            return media_doc
+        entries = await self.aliases.find({"alias": file_id}, {"media_id": 1}).limit(2).to_list(length=2)
+        media_ids = {entry["media_id"] for entry in entries}
+        if len(media_ids) != 1:
+            return None
+        media_id = media_ids.pop()
+        if media_id == file_id:
+            return None
+        return await self.collection.find_one({"id": media_id})
+
+    async def list_accessible(self, owner_id: str, limit: int = 24, cursor: Optional[str] = None,
+                              offset: int = 0) -> Dict[str, Any]:
+        """Async counterpart of DatabaseManager.list_accessible_media (same index, same cursors)"""
+        base_query = {"owner_id": owner_id, "deleted": False, "accessible": True}
+        query = dict(base_query)
+
+        position = DatabaseManager.decode_media_cursor(cursor) if cursor else None
+        start = position["offset"] if position else max(0, int(offset))
+        if position and "created_at" in position:
+            query["$or"] = [
+                {"created_at": {"$lt": position["created_at"]}},
+                {"created_at": position["created_at"], "_id": {"$lt": position["_id"]}},
+                # Documents hérités sans date (triés après les dates en ordre décroissant)
+                {"created_at": {"$not": {"$type": "date"}}}
+            ]
+
+        limit = max(1, int(limit))
+        find = self.collection.find(query).sort([("created_at", -1), ("_id", -1)])
+        if "$or" not in query and start:
+            find = find.skip(start)
+        # Fetch one extra document to know whether another page exists
+        items = await find.limit(limit + 1).to_list(length=limit + 1)
+
+        has_more = len(items) > limit
+        items = items[:limit]
+        next_cursor = DatabaseManager.encode_media_cursor(items[-1], start + len(items)) if has_more and items else None
+
+        return {
+            "items": items,
+            "total": await self.collection.count_documents(base_query),
+            "has_more": has_more,
+            "next_cursor": next_cursor
+        }
+
+    async def list_for_owner(self, owner_id: str, offset: int = 0, limit: int = 24) -> List[Dict[str, Any]]:
+        q = {"owner_id": owner_id, "$or": [{"deleted": {"$ne": True}}, {"deleted": {"$exists": False}}]}
+        cursor = (
+            self.collection.find(q)
+            .sort([("created_at", -1), ("_id", -1)])
+            .skip(max(0, int(offset)))
+            .limit(max(1, int(limit)))
+        )
+        return await cursor.to_list(length=max(1, int(limit)))
+
+    async def count_for_owner(self, owner_id: str) -> int:
+        q = {"owner_id": owner_id, "$or": [{"deleted": {"$ne": True}}, {"deleted": {"$exists": False}}]}
+        return await self.collection.count_documents(q)
+
+    async def insert(self, media_doc: Dict[str, Any]):
+        result = await self.collection.insert_one(media_doc)
+        return result.inserted_id
+
+    async def update_for_owner(self, query: Dict[str, Any], owner_id: str, fields: Dict[str, Any]):
+        return await self.collection.update_one({**query, "owner_id": owner_id}, {"$set": fields})
+
+    async def delete_for_owner(self, query: Dict[str, Any], owner_id: str) -> int:
+        result = await self.collection.delete_one({**query, "owner_id": owner_id})
+        return result.deleted_count
+
+    async def delete_many_for_owner(self, query: Dict[str, Any], owner_id: str) -> int:
+        result = await self.collection.delete_many({**query, "owner_id": owner_id})
+        return result.deleted_count
+
+
+class GeneratedPostsRepository:
+    """generated_posts collection"""
+
+    def __init__(self, db):
+        self.collection = db.generated_posts
+
+    async def list_for_owner(self, owner_id: str, limit: int = 100) -> List[Dict[str, Any]]:
+        cursor = self.collection.find({"owner_id": owner_id}).sort([("scheduled_date", 1)]).limit(limit)
+        return await cursor.to_list(length=limit)
+
+    async def list_calendar_for_owner(self, owner_id: str) -> List[Dict[str, Any]]:
+        cursor = self.collection.find({
+            "owner_id": owner_id,
+            "$or": [
+                {"validated": True},
+                {"status": "scheduled"}
+            ]
+        })
+        return await cursor.to_list(length=None)
+
+    async def find_for_owner(self, post_id: str, owner_id: str) -> Optional[Dict[str, Any]]:
+        return await self.collection.find_one({"id": post_id, "owner_id": owner_id})
+
+
+class ContentNotesRepository:
+    """content_notes collection"""
+
+    def __init__(self, db):
+        self.db = db
+        self.collection = db.content_notes
+
+    async def list_for_owner(self, owner_id: str) -> List[Dict[str, Any]]:
+        cursor = self.collection.find({"owner_id": owner_id}, {"_id": 0}).sort("created_at", -1)
+        return await cursor.to_list(length=None)
+
+    async def create(self, owner_id: str, content: str, description: str = None, priority: str = "normal",
+                     is_monthly_note: bool = False, note_month: Optional[int] = None,
+                     note_year: Optional[int] = None) -> Dict[str, Any]:
+        import uuid
+        note_data = {
+            "note_id": str(uuid.uuid4()),
+            "owner_id": owner_id,
+            "description": description,
+            "content": content,
+            "priority": priority,
+            "is_monthly_note": is_monthly_note,
+            "note_month": note_month,
+            "note_year": note_year,
+            "created_at": datetime.now().isoformat(),
+            "updated_at": datetime.now().isoformat()
+        }
+        await self.collection.insert_one(note_data)
+        note_data.pop('_id', None)
+        await mark_context_stale(self.db, owner_id, "notes")
+        return note_data
+
+    async def update(self, note_id: str, owner_id: str, fields: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Update a note and return the new version (None if not found)"""
+        from pymongo import ReturnDocument
+        note = await self.collection.find_one_and_update(
+            {"note_id": note_id, "owner_id": owner_id},
+            {"$set": fields},
+            projection={"_id": 0},
+            return_document=ReturnDocument.AFTER
+        )
+        if note:
+            await mark_context_stale(self.db, owner_id, "notes")
+        return note
+
+    async def delete(self, note_id: str, owner_id: str) -> bool:
+        result = await self.collection.delete_one({"note_id": note_id, "owner_id": owner_id})
+        if result.deleted_count:
+            await mark_context_stale(self.db, owner_id, "notes")
+        return result.deleted_count > 0
+
+
+class SocialConnectionsRepository:
+    """social_media_connections collection"""
+
+    def __init__(self, db):
+        self.collection = db.social_media_connections
+
+    async def list_active(self, user_id: str, platform: Optional[str] = None) -> List[Dict[str, Any]]:
+        q = {"user_id": user_id, "active": True}
+        if platform:
+            q["platform"] = platform
+        return await self.collection.find(q).to_list(length=None)
+
+
+class ThumbnailsRepository:
+    """thumbnails collection (WebP thumbnails stored as BSON binary)"""
+
+    def __init__(self, db):
+        self.collection = db.thumbnails
+        self.media = db.media
+
+    async def get(self, media_id, variant_keys: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
+        """Thumbnail doc; with `variant_keys`, only the base blob and those variants are fetched"""
+        projection = None
+        if variant_keys is not None:
+            projection = {"media_id": 1, "content_type": 1, "data": 1, "variant_keys": 1, "updated_at": 1}
+            projection.update({f"variants.{key}": 1 for key in variant_keys})
+        return await self.collection.find_one({"media_id": media_id}, projection)
+
+    async def save(self, owner_id: str, media_id, content: bytes, content_type: str = "image/webp",
+                   variants: Optional[Dict[str, bytes]] = None):
+        now = datetime.utcnow()
+        fields = {
+            "media_id": media_id,
+            "owner_id": owner_id,
+            "content_type": content_type,
+            "size": len(content),
+            "data": content,
+            "updated_at": now
+        }
+        if variants is not None:
+            # Responsive variants keyed "<width>_<format>" (see image_pipeline.variant_key)
+            fields["variants"] = variants
+            fields["variant_keys"] = sorted(variants)
+        await self.collection.update_one(
+            {"media_id": media_id},
+            {"$set": fields, "$setOnInsert": {"created_at": now}},
+            upsert=True
+        )
+        invalidate_thumbnail(media_id)
+        # Point the media doc to the API relative endpoint (UUID `id` or legacy ObjectId `_id`)
+        media_filter = {"id": media_id} if isinstance(media_id, str) else {"_id": media_id}
+        await self.media.update_one(
+            media_filter,
+            {"$set": {"thumb_url": RELATIVE_THUMB_ENDPOINT.format(file_id=str(media_id))}}
+        )
+
+    async def existing_media_ids(self, media_ids: List[Any]) -> set:
+        """media_ids that already have a thumbnail (one $in query, no data blobs)"""
+        if not media_ids:
+            return set()
+        cursor = self.collection.find({"media_id": {"$in": list(media_ids)}}, {"media_id": 1, "_id": 0})
+        return {doc["media_id"] async for doc in cursor}
+
+    async def delete(self, media_id) -> int:
+        result = await self.collection.delete_one({"media_id": media_id})
+        invalidate_thumbnail(media_id)
+        return result.deleted_count
+
+    async def count_for_owner(self, owner_id: str) -> int:
+        return await self.collection.count_documents({"owner_id": owner_id})
+
+
+class AsyncDatabase:
+    """Shared Motor client + repositories (one connection pool per process)"""
+
+    def __init__(self):
+        self.db_name = os.getenv("DB_NAME", "claire_marcus")
+        self.client = AsyncIOMotorClient(get_mongo_url(), **mongo_client_options())
+        self.db = self.client[self.db_name]
+        self.fs = AsyncIOMotorGridFSBucket(self.db)
+
+        self.users = UsersRepository(self.db)
+        self.media = MediaRepository(self.db)
+        self.generated_posts = GeneratedPostsRepository(self.db)
+        self.content_notes = ContentNotesRepository(self.db)
+        self.social_connections = SocialConnectionsRepository(self.db)
+        self.thumbnails = ThumbnailsRepository(self.db)
+
+    def close(self):
+        self.client.close()
+        print("🔒 Async database connection closed")
+
+
+# Global async database instance
+async_db_manager = None
+
+def get_async_database() -> AsyncDatabase:
+    """Get the shared async database (repositories + Motor db)"""
+    global async_db_manager
+    if not async_db_manager:
+        async_db_manager = AsyncDatabase()
+    return async_db_manager
+
+def get_async_db():
+    """Raw Motor database for modules that query collections directly"""
+    return get_async_database().db
+
+def close_async_database():
+    """Close the shared Motor client"""
+    global async_db_manager
+    if async_db_manager:
+        async_db_manager.close()
+        async_db_manager = None
@@ -8,7 +8,7 @@ import os
 import logging
 from pydantic import BaseModel, EmailStr, Field
 import uuid
-from motor.motor_asyncio import AsyncIOMotorClient
+from async_database import get_async_db
 from dotenv import load_dotenv
 from pathlib import Path
 
@@ -27,9 +27,7 @@ pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 security = HTTPBearer()
 
 # MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+db = get_async_db()  # Shared Motor pool (async_database.py)
 
 # Pydantic Models
 class User(BaseModel):
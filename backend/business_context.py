@@ -0,0 +1,247 @@
+# business_context.py
+"""Compiled per-user business context (`business_contexts` collection).
+
+Post generation starts every prompt with the same user context: business
+profile, latest website analysis and content notes. Instead of re-reading the
+three collections and re-rendering the text on each generation, the rendered
+sections are materialised once in a compiled document:
+
+    {user_id, version, stale, compiled_version, business_context, website_context,
+     always_valid_notes: [lines], month_notes: {"YYYY-M": [lines]}, profile: {...},
+     versions: {profile, website, notes}, tokens, compiled_at}
+
+Writers of business_profiles / website_analyses / content_notes call
+mark_stale() (or amark_stale() from async code): `version` and the section
+counter are incremented and the document flagged stale. The next reader
+recompiles it, guarded on the version it read, so a write racing with a
+compilation leaves the document stale instead of storing an outdated context.
+
+get_compiled() reads through a sync pymongo database, aget_compiled() through
+Motor (request handlers, generation workers). Fresh documents are served from
+an in-process LRU after a single version-only lookup. Sections are bounded to BUSINESS_CONTEXT_TOKEN_BUDGET
+(≈4 characters per token), the website analysis being truncated first.
+"""
+import os
+from datetime import datetime
+from typing import Dict, Any, Callable, Awaitable, List
+
+from pymongo.errors import DuplicateKeyError
+
+from memory_cache import LRUCache
+
+BUSINESS_CONTEXT_ENABLED = os.environ.get("BUSINESS_CONTEXT_ENABLED", "true").lower() == "true"
+BUSINESS_CONTEXT_TOKEN_BUDGET = int(os.environ.get("BUSINESS_CONTEXT_TOKEN_BUDGET", "3000"))
+BUSINESS_CONTEXT_CACHE_ENTRIES = int(os.environ.get("BUSINESS_CONTEXT_CACHE_ENTRIES", "500"))
+
+CONTEXT_COLLECTION = "business_contexts"
+SECTIONS = ("profile", "website", "notes")
+CHARS_PER_TOKEN = 4
+
+_memory = LRUCache(max_entries=BUSINESS_CONTEXT_CACHE_ENTRIES)
+_counters = {"memory_hits": 0, "mongo_hits": 0, "compilations": 0, "invalidations": 0}
+_indexes_ready = False
+
+
+def approx_tokens(text: str) -> int:
+    return (len(text or "") + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut a section on a line boundary so it fits in max_tokens"""
+    max_chars = max(0, max_tokens) * CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text
+    cut = text.rfind("\n", 0, max_chars)
+    if cut <= 0:
+        cut = max_chars
+    return text[:cut].rstrip() + "\n[...]"
+
+
+def month_key(month: int, year: int) -> str:
+    return f"{year}-{month}"
+
+
+def _update_for(sections) -> Dict[str, Any]:
+    inc = {"version": 1}
+    for section in sections or SECTIONS:
+        inc[f"versions.{section}"] = 1
+    return {"$inc": inc, "$set": {"stale": True, "updated_at": datetime.utcnow()}}
+
+
+def mark_stale(db, user_id: str, *sections: str):
+    """Invalidate the compiled context of a user (sync pymongo database)"""
+    if not user_id:
+        return
+    _memory.pop(user_id)
+    _counters["invalidations"] += 1
+    try:
+        db[CONTEXT_COLLECTION].update_one({"user_id": user_id}, _update_for(sections), upsert=True)
+    except Exception as e:
+        print(f"⚠️ Business context invalidation failed for {user_id}: {e}")
+
+
+async def amark_stale(db, user_id: str, *sections: str):
+    """Invalidate the compiled context of a user (Motor database)"""
+    if not user_id:
+        return
+    _memory.pop(user_id)
+    _counters["invalidations"] += 1
+    try:
+        await db[CONTEXT_COLLECTION].update_one({"user_id": user_id}, _update_for(sections), upsert=True)
+    except Exception as e:
+        print(f"⚠️ Business context invalidation failed for {user_id}: {e}")
+
+
+async def amark_stale_many(db, user_ids: List[str], *sections: str):
+    for user_id in dict.fromkeys(u for u in user_ids if u):
+        await amark_stale(db, user_id, *sections)
+
+
+async def adrop(db, user_id: str):
+    """Remove the compiled context of a deleted account"""
+    _memory.pop(user_id)
+    await db[CONTEXT_COLLECTION].delete_many({"user_id": user_id})
+
+
+def _ensure_indexes(db):
+    global _indexes_ready
+    if _indexes_ready:
+        return
+    try:
+        db[CONTEXT_COLLECTION].create_index("user_id", unique=True)
+    except Exception as e:
+        print(f"⚠️ Business context index creation warning: {e}")
+    _indexes_ready = True
+
+
+_STATE_FIELDS = {"version": 1, "stale": 1, "compiled_version": 1}
+
+
+def _new_state(user_id: str) -> Dict[str, Any]:
+    return {"user_id": user_id, "version": 0, "stale": True, "versions": {s: 0 for s in SECTIONS}}
+
+
+def _is_fresh(doc: Dict[str, Any], version: int) -> bool:
+    return bool(doc) and not doc.get("stale") and doc.get("compiled_version") == version
+
+
+def _stamp(compiled: Dict[str, Any], version: int) -> Dict[str, Any]:
+    compiled.update({"compiled_version": version, "compiled_at": datetime.utcnow()})
+    _counters["compilations"] += 1
+    return compiled
+
+
+def _store_result(user_id: str, version: int, compiled: Dict[str, Any], matched: bool):
+    if matched:
+        _memory.set(user_id, {**compiled, "user_id": user_id, "version": version, "stale": False})
+    else:
+        # Un écrivain a invalidé pendant la compilation : on sert ce contexte sans le garder
+        print(f"⚠️ Business context of {user_id} changed during compilation, not cached")
+
+
+def get_compiled(db, user_id: str, compile_fn: Callable[[str], Dict[str, Any]]) -> Dict[str, Any]:
+    """Compiled context of a user, recompiled with compile_fn(user_id) when stale.
+
+    compile_fn returns the sections (business_context, website_context,
+    always_valid_notes, month_notes, profile, ...); the token budget is applied here.
+    """
+    if not BUSINESS_CONTEXT_ENABLED:
+        return fit_to_budget(compile_fn(user_id))
+
+    _ensure_indexes(db)
+    collection = db[CONTEXT_COLLECTION]
+    state = collection.find_one({"user_id": user_id}, _STATE_FIELDS)
+    if state is None:
+        try:
+            collection.insert_one(_new_state(user_id))
+        except DuplicateKeyError:
+            pass
+        state = collection.find_one({"user_id": user_id}, _STATE_FIELDS)
+
+    version = state.get("version", 0)
+    if _is_fresh(state, version):
+        entry = _memory.get(user_id)
+        if entry and entry.get("compiled_version") == version:
+            _counters["memory_hits"] += 1
+            return entry
+        doc = collection.find_one({"user_id": user_id}, {"_id": 0})
+        if _is_fresh(doc, version):
+            _counters["mongo_hits"] += 1
+            _memory.set(user_id, doc)
+            return doc
+
+    compiled = _stamp(fit_to_budget(compile_fn(user_id)), version)
+    result = collection.update_one(
+        {"user_id": user_id, "version": version},
+        {"$set": {**compiled, "stale": False}}
+    )
+    _store_result(user_id, version, compiled, result.matched_count > 0)
+    return compiled
+
+
+async def _aensure_indexes(db):
+    global _indexes_ready
+    if _indexes_ready:
+        return
+    try:
+        await db[CONTEXT_COLLECTION].create_index("user_id", unique=True)
+    except Exception as e:
+        print(f"⚠️ Business context index creation warning: {e}")
+    _indexes_ready = True
+
+
+async def aget_compiled(db, user_id: str,
+                        compile_fn: Callable[[str], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+    """get_compiled() on a Motor database; compile_fn is a coroutine function"""
+    if not BUSINESS_CONTEXT_ENABLED:
+        return fit_to_budget(await compile_fn(user_id))
+
+    await _aensure_indexes(db)
+    collection = db[CONTEXT_COLLECTION]
+    state = await collection.find_one({"user_id": user_id}, _STATE_FIELDS)
+    if state is None:
+        try:
+            await collection.insert_one(_new_state(user_id))
+        except DuplicateKeyError:
+            pass
+        state = await collection.find_one({"user_id": user_id}, _STATE_FIELDS)
+
+    version = state.get("version", 0)
+    if _is_fresh(state, version):
+        entry = _memory.get(user_id)
+        if entry and entry.get("compiled_version") == version:
+            _counters["memory_hits"] += 1
+            return entry
+        doc = await collection.find_one({"user_id": user_id}, {"_id": 0})
+        if _is_fresh(doc, version):
+            _counters["mongo_hits"] += 1
+            _memory.set(user_id, doc)
+            return doc
+
+    compiled = _stamp(fit_to_budget(await compile_fn(user_id)), version)
+    result = await collection.update_one(
+        {"user_id": user_id, "version": version},
+        {"$set": {**compiled, "stale": False}}
+    )
+    _store_result(user_id, version, compiled, result.matched_count > 0)
+    return compiled
+
+
+def fit_to_budget(compiled: Dict[str, Any], budget: int = BUSINESS_CONTEXT_TOKEN_BUDGET) -> Dict[str, Any]:
+    """Bound the rendered sections to `budget` tokens: notes and profile first, website last"""
+    notes_tokens = sum(approx_tokens(line) for line in compiled.get("always_valid_notes", []))
+    notes_tokens += max(
+        [sum(approx_tokens(line) for line in lines) for lines in compiled.get("month_notes", {}).values()] or [0]
+    )
+    business = truncate_to_tokens(compiled.get("business_context", ""), max(budget - notes_tokens, budget // 4))
+    remaining = budget - notes_tokens - approx_tokens(business)
+    website = truncate_to_tokens(compiled.get("website_context", ""), max(remaining, 0))
+    compiled["business_context"] = business
+    compiled["website_context"] = website
+    compiled["tokens"] = approx_tokens(business) + approx_tokens(website) + notes_tokens
+    return compiled
+
+
+def stats() -> Dict[str, Any]:
+    return {"enabled": BUSINESS_CONTEXT_ENABLED, "token_budget": BUSINESS_CONTEXT_TOKEN_BUDGET,
+            **_counters, "memory": _memory.stats()}
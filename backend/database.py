@@ -13,41 +13,62 @@ import bcrypt
 import jwt
 from bson import ObjectId
 import urllib.parse
+import base64
+import json
+
+from business_context import mark_stale as mark_context_stale
+
+def get_mongo_url() -> str:
+    """Return MONGO_URL with credentials re-encoded (Render compatibility)"""
+    mongo_url = os.getenv("MONGO_URL", "mongodb://localhost:27017")
+    
+    # Fix MongoDB URL encoding for special characters (Render compatibility)
+    if "mongodb+srv://" in mongo_url or "@" in mongo_url:
+        # Parse and re-encode URL components to handle special characters
+        try:
+            from urllib.parse import urlparse, urlunparse, quote_plus
+            parsed = urlparse(mongo_url)
+            if parsed.username and parsed.password:
+                # Re-encode username and password
+                encoded_username = quote_plus(parsed.username)
+                encoded_password = quote_plus(parsed.password)
+                # Reconstruct URL with encoded credentials
+                netloc = f"{encoded_username}:{encoded_password}@{parsed.hostname}"
+                if parsed.port:
+                    netloc += f":{parsed.port}"
+                mongo_url = urlunparse((
+                    parsed.scheme, netloc, parsed.path, 
+                    parsed.params, parsed.query, parsed.fragment
+                ))
+                print(f"✅ MongoDB URL credentials encoded for RFC 3986 compliance")
+        except Exception as e:
+            print(f"⚠️ MongoDB URL encoding warning: {e}")
+    
+    return mongo_url
+
+def mongo_client_options() -> Dict[str, Any]:
+    """Connection pool settings shared by the sync (pymongo) and async (Motor) clients"""
+    return {
+        "maxPoolSize": int(os.getenv("MONGO_MAX_POOL_SIZE", "50")),
+        "minPoolSize": int(os.getenv("MONGO_MIN_POOL_SIZE", "0")),
+        "maxIdleTimeMS": int(os.getenv("MONGO_MAX_IDLE_TIME_MS", "300000")),
+        "serverSelectionTimeoutMS": int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "10000")),
+        "connectTimeoutMS": int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "10000")),
+        "retryWrites": True
+    }
 
 class DatabaseManager:
     """MongoDB database manager for Claire et Marcus"""
     
     def __init__(self):
         """Initialize database connection"""
-        self.mongo_url = os.getenv("MONGO_URL", "mongodb://localhost:27017")
-        
-        # Fix MongoDB URL encoding for special characters (Render compatibility)
-        if "mongodb+srv://" in self.mongo_url or "@" in self.mongo_url:
-            # Parse and re-encode URL components to handle special characters
-            try:
-                from urllib.parse import urlparse, urlunparse, quote_plus
-                parsed = urlparse(self.mongo_url)
-                if parsed.username and parsed.password:
-                    # Re-encode username and password
-                    encoded_username = quote_plus(parsed.username)
-                    encoded_password = quote_plus(parsed.password)
-                    # Reconstruct URL with encoded credentials
-                    netloc = f"{encoded_username}:{encoded_password}@{parsed.hostname}"
-                    if parsed.port:
-                        netloc += f":{parsed.port}"
-                    self.mongo_url = urlunparse((
-                        parsed.scheme, netloc, parsed.path, 
-                        parsed.params, parsed.query, parsed.fragment
-                    ))
-                    print(f"✅ MongoDB URL credentials encoded for RFC 3986 compliance")
-            except Exception as e:
-                print(f"⚠️ MongoDB URL encoding warning: {e}")
+        self.mongo_url = get_mongo_url()
         
         self.db_name = os.getenv("DB_NAME", "claire_marcus")
         self.jwt_secret = os.getenv("JWT_SECRET_KEY", "your-secret-key-change-this-in-production")
         
         try:
-            self.client = MongoClient(self.mongo_url)
+            self.client = MongoClient(self.mongo_url, **mongo_client_options())
             self.db = self.client[self.db_name]
             
             # Test connection
@@ -92,17 +113,33 @@ class DatabaseManager:
             'subscriptions': [
                 ('user_id', 1),
                 ('status', 1)
+            ],
+            'media': [
+                # Keyset pagination for the content library (/api/content/pending)
+                [('owner_id', 1), ('deleted', 1), ('created_at', -1), ('_id', -1)],
+                ('id', 1)  # Unique canonical media id (migrate_media_ids.py)
+            ],
+            'media_aliases': [
+                # Legacy ObjectId / external_id / file_id → canonical media id
+                [('alias', 1), ('owner_id', 1)]  # Unique per owner: the same legacy id may exist in two tenants
+            ],
+            'thumbnails': [
+                ('media_id', 1),  # Unique: one thumbnail per media (batched $in existence checks)
+                ('owner_id', 1)
             ]
         }
+        unique_fields = {('users', 'email'), ('thumbnails', 'media_id'), ('media', 'id'), ('media_aliases', 'alias')}
         
         for collection_name, indexes in collections.items():
             collection = self.db[collection_name]
             for index_fields in indexes:
+                # Single-field entries are (field, direction) tuples; compound ones are lists of them
+                keys = [index_fields] if isinstance(index_fields, tuple) else index_fields
                 try:
-                    if index_fields[0] == 'email':
-                        collection.create_index(index_fields, unique=True)
+                    if (collection_name, keys[0][0]) in unique_fields:
+                        collection.create_index(keys, unique=True)
                     else:
-                        collection.create_index(index_fields)
+                        collection.create_index(keys)
                 except Exception as e:
                     print(f"Index creation warning for {collection_name}: {e}")
     
@@ -279,6 +316,7 @@ class DatabaseManager:
         }
         
         self.db.business_profiles.insert_one(profile_doc)
+        mark_context_stale(self.db, user_id, "profile")
     
     # Business Profile Management
     def get_business_profile(self, user_id: str) -> Optional[Dict[str, Any]]:
@@ -305,6 +343,7 @@ class DatabaseManager:
             {"$set": profile_data},
             upsert=True
         )
+        mark_context_stale(self.db, user_id, "profile")
         
         # Return True if document was modified OR upserted
         return result.modified_count > 0 or result.upserted_id is not None
@@ -331,6 +370,7 @@ class DatabaseManager:
         
         self.db.content_notes.insert_one(note_data)
         note_data.pop('_id', None)
+        mark_context_stale(self.db, user_id, "notes")
         
         return note_data
     
@@ -355,6 +395,8 @@ class DatabaseManager:
             "owner_id": user_id,
             "note_id": note_id
         })
+        if result.deleted_count:
+            mark_context_stale(self.db, user_id, "notes")
         
         return result.deleted_count > 0
 
@@ -406,6 +448,8 @@ class DatabaseManager:
             
             # Perform the deletion
             result = self.db.content_notes.delete_many(delete_filter)
+            for owner_id in {note.get("owner_id") for note in notes_to_delete}:
+                mark_context_stale(self.db, owner_id, "notes")
             
             month_names = [
                 "Janvier", "Février", "Mars", "Avril", "Mai", "Juin",
@@ -447,6 +491,113 @@ class DatabaseManager:
             print(f"❌ Error during notes cleanup: {e}")
             return error_log
     
+    # Media Library Management
+    def compute_media_accessibility(self, media_doc: Dict[str, Any]) -> bool:
+        """Check whether the original file behind a media document can be served.
+
+        Used when a file is uploaded, deleted or repaired (and by the backfill
+        migration) so that listing endpoints only read the stored `accessible` flag.
+        """
+        if media_doc.get("deleted"):
+            return False
+
+        # Méthode 1: Images avec file_path (uploads/)
+        file_path = media_doc.get("file_path", "")
+        if file_path and not file_path.startswith("http") and os.path.exists(file_path):
+            return True
+
+        # Méthode 2: Images avec GridFS
+        grid_id = media_doc.get("gridfs_id") or media_doc.get("grid_file_id")
+        if grid_id and self.is_connected():
+            try:
+                import gridfs
+                if isinstance(grid_id, str):
+                    grid_id = ObjectId(grid_id)
+                if gridfs.GridFS(self.db).exists(grid_id):
+                    return True
+            except Exception:
+                pass
+
+        # Méthode 3: URLs externes valides (Pixabay, médias réparés)
+        url = media_doc.get("url", "") or ""
+        if url.startswith("http") and "claire-marcus-api.onrender.com" not in url:
+            return True
+
+        return False
+
+    @staticmethod
+    def encode_media_cursor(media_doc: Dict[str, Any], consumed: int) -> str:
+        """Build an opaque cursor from the last document of a page.
+
+        `consumed` is the number of documents returned so far: when the last
+        document has no datetime `created_at` (legacy document not migrated by
+        migrate_media_accessibility.py) the cursor falls back to that offset.
+        """
+        created_at = media_doc.get("created_at")
+        if isinstance(created_at, datetime):
+            raw = {"c": created_at.isoformat(), "i": str(media_doc["_id"]), "n": consumed}
+        else:
+            raw = {"n": consumed}
+        return base64.urlsafe_b64encode(json.dumps(raw).encode("utf-8")).decode("ascii")
+
+    @staticmethod
+    def decode_media_cursor(cursor: str) -> Optional[Dict[str, Any]]:
+        """Decode a cursor produced by encode_media_cursor (None if invalid)
+
+        Keyset cursors carry `created_at` and `_id`; offset cursors only `offset`.
+        """
+        try:
+            raw = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8"))
+            position = {"offset": max(0, int(raw.get("n", 0)))}
+            if "c" in raw:
+                position.update({"created_at": datetime.fromisoformat(raw["c"]), "_id": ObjectId(raw["i"])})
+            return position
+        except Exception:
+            return None
+
+    def list_accessible_media(self, owner_id: str, limit: int = 24, cursor: Optional[str] = None,
+                              offset: int = 0) -> Dict[str, Any]:
+        """Page through a user's accessible media, newest first.
+
+        Backed by the (owner_id, deleted, created_at, _id) index: with a cursor the
+        page starts strictly after the last (created_at, _id) pair of the previous
+        page; `offset` (and cursors ending on a legacy document without a datetime
+        created_at) falls back to skip().
+        """
+        if not self.is_connected():
+            return {"items": [], "total": 0, "next_cursor": None}
+
+        base_query = {"owner_id": owner_id, "deleted": False, "accessible": True}
+        query = dict(base_query)
+
+        position = self.decode_media_cursor(cursor) if cursor else None
+        start = position["offset"] if position else max(0, int(offset))
+        if position and "created_at" in position:
+            query["$or"] = [
+                {"created_at": {"$lt": position["created_at"]}},
+                {"created_at": position["created_at"], "_id": {"$lt": position["_id"]}},
+                # Documents hérités sans date (triés après les dates en ordre décroissant)
+                {"created_at": {"$not": {"$type": "date"}}}
+            ]
+
+        limit = max(1, int(limit))
+        find = self.db.media.find(query).sort([("created_at", -1), ("_id", -1)])
+        if "$or" not in query and start:
+            find = find.skip(start)
+        # Fetch one extra document to know whether another page exists
+        items = list(find.limit(limit + 1))
+
+        has_more = len(items) > limit
+        items = items[:limit]
+        next_cursor = self.encode_media_cursor(items[-1], start + len(items)) if has_more and items else None
+
+        return {
+            "items": items,
+            "total": self.db.media.count_documents(base_query),
+            "has_more": has_more,
+            "next_cursor": next_cursor
+        }
+
     # Generated Posts Management
     def create_generated_post(self, user_id: str, content: str, platform: str, 
                             hashtags: List[str] = None) -> Dict[str, Any]:
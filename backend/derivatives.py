@@ -0,0 +1,169 @@
+# derivatives.py
+"""Publish-ready image derivatives cached in GridFS.
+
+Facebook's crawler and Instagram's media fetcher hit /api/public/image/{id}
+repeatedly; the JPEG they receive is rendered once per media item and stored in
+a sibling GridFS bucket ("derivatives"), keyed by the media id and a signature of
+the source file. A changed source (new GridFS file, new upload date/length, new
+file on disk) produces a new signature and the stale derivative is replaced.
+"""
+import asyncio
+import hashlib
+import os
+from datetime import datetime
+from typing import Optional, Dict, Any
+
+from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+
+from async_database import get_async_database, to_object_id, canonical_media_id
+from image_pipeline import run_image_job, render_publish_jpeg
+
+DERIVATIVES_BUCKET = "derivatives"
+PUBLISH_JPEG = "publish_jpeg"
+
+_bucket = None
+_indexes_ready = False
+_render_locks: Dict[str, asyncio.Lock] = {}
+
+
+def media_key(media_doc: Dict[str, Any]) -> str:
+    """Stable key for a media document (canonical media id)"""
+    return canonical_media_id(media_doc)
+
+
+def source_grid_id(media_doc: Dict[str, Any]):
+    """GridFS id of the original (uploads use gridfs_id, older docs grid_file_id)"""
+    return to_object_id(media_doc.get("gridfs_id") or media_doc.get("grid_file_id"))
+
+
+async def _get_bucket() -> AsyncIOMotorGridFSBucket:
+    global _bucket, _indexes_ready
+    adb = get_async_database()
+    if _bucket is None:
+        _bucket = AsyncIOMotorGridFSBucket(adb.db, bucket_name=DERIVATIVES_BUCKET)
+    if not _indexes_ready:
+        try:
+            await adb.db[f"{DERIVATIVES_BUCKET}.files"].create_index(
+                [("metadata.media_key", 1), ("metadata.kind", 1)]
+            )
+        except Exception as e:
+            print(f"⚠️ Derivatives index creation warning: {e}")
+        _indexes_ready = True
+    return _bucket
+
+
+async def source_signature(media_doc: Dict[str, Any]) -> Optional[str]:
+    """Signature of the current original; None when no local original exists"""
+    gid = source_grid_id(media_doc)
+    if gid is not None:
+        adb = get_async_database()
+        info = await adb.db["fs.files"].find_one({"_id": gid}, {"length": 1, "md5": 1, "uploadDate": 1})
+        if not info:
+            return None
+        upload_date = info.get("uploadDate")
+        return f"gridfs:{gid}:{info.get('length')}:{info.get('md5') or ''}:{upload_date.isoformat() if upload_date else ''}"
+
+    file_path = media_doc.get("file_path", "")
+    if file_path and not file_path.startswith("http") and os.path.exists(file_path):
+        stat = os.stat(file_path)
+        return f"file:{file_path}:{stat.st_size}:{int(stat.st_mtime)}"
+    return None
+
+
+async def read_source_bytes(media_doc: Dict[str, Any]) -> Optional[bytes]:
+    """Read the original from GridFS or disk"""
+    gid = source_grid_id(media_doc)
+    if gid is not None:
+        grid_out = await get_async_database().fs.open_download_stream(gid)
+        return await grid_out.read()
+
+    file_path = media_doc.get("file_path", "")
+    if file_path and os.path.exists(file_path):
+        def _read():
+            with open(file_path, "rb") as fh:
+                return fh.read()
+        return await asyncio.to_thread(_read)
+    return None
+
+
+async def find_derivative(key: str, kind: str = PUBLISH_JPEG) -> Optional[Dict[str, Any]]:
+    """fs.files document of the cached derivative (metadata holds signature + etag)"""
+    await _get_bucket()
+    return await get_async_database().db[f"{DERIVATIVES_BUCKET}.files"].find_one(
+        {"metadata.media_key": key, "metadata.kind": kind}
+    )
+
+
+async def open_derivative(file_doc: Dict[str, Any]):
+    """AsyncIOMotorGridOut positioned at the start of the derivative"""
+    bucket = await _get_bucket()
+    return await bucket.open_download_stream(file_doc["_id"])
+
+
+async def store_derivative(key: str, signature: str, data: bytes, kind: str = PUBLISH_JPEG,
+                           content_type: str = "image/jpeg") -> Dict[str, Any]:
+    """Store a freshly rendered derivative, replacing any previous version"""
+    bucket = await _get_bucket()
+    metadata = {
+        "media_key": key,
+        "kind": kind,
+        "source_signature": signature,
+        "etag": '"' + hashlib.sha1(data).hexdigest()[:32] + '"',
+        "content_type": content_type,
+        "created_at": datetime.utcnow(),
+    }
+    new_id = await bucket.upload_from_stream(f"{key}.{kind}", data, metadata=metadata)
+    await invalidate_derivatives(key, kind=kind, keep_id=new_id)
+    return {"_id": new_id, "length": len(data), "uploadDate": metadata["created_at"], "metadata": metadata}
+
+
+async def invalidate_derivatives(key: str, kind: Optional[str] = None, keep_id=None) -> int:
+    """Drop cached derivatives of a media item (on delete/replace)"""
+    bucket = await _get_bucket()
+    query = {"metadata.media_key": key}
+    if kind:
+        query["metadata.kind"] = kind
+    if keep_id is not None:
+        query["_id"] = {"$ne": keep_id}
+    deleted = 0
+    async for file_doc in get_async_database().db[f"{DERIVATIVES_BUCKET}.files"].find(query, {"_id": 1}):
+        try:
+            await bucket.delete(file_doc["_id"])
+            deleted += 1
+        except Exception as e:
+            print(f"⚠️ Failed to delete derivative {file_doc['_id']}: {e}")
+    return deleted
+
+
+async def get_or_create_publish_jpeg(media_doc: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Return the fs.files doc of an up-to-date publish JPEG, rendering it on first use.
+
+    Returns None when the media has no local original (external URL or missing file).
+    Concurrent requests for the same media render it only once per process.
+    """
+    key = media_key(media_doc)
+    signature = await source_signature(media_doc)
+    if signature is None:
+        return None
+
+    cached = await find_derivative(key)
+    if cached and cached.get("metadata", {}).get("source_signature") == signature:
+        return cached
+
+    lock = _render_locks.setdefault(key, asyncio.Lock())
+    try:
+        async with lock:
+            cached = await find_derivative(key)
+            if cached and cached.get("metadata", {}).get("source_signature") == signature:
+                return cached
+
+            source_bytes = await read_source_bytes(media_doc)
+            if not source_bytes:
+                return None
+            jpg_bytes = await run_image_job(render_publish_jpeg, source_bytes)
+            print(f"✅ Publish JPEG rendered for {key}: {len(source_bytes)} → {len(jpg_bytes)} bytes")
+            return await store_derivative(key, signature, jpg_bytes)
+    finally:
+        # Early returns and rendering errors must not leave the lock behind
+        if _render_locks.get(key) is lock:
+            _render_locks.pop(key, None)
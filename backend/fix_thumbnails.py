@@ -12,11 +12,32 @@ sys.path.append('/app/backend')
 
 from database import get_database
 from thumbs import generate_image_thumb_from_bytes
-from routes_thumbs import save_db_thumbnail
 import gridfs
 import requests
 from datetime import datetime
 
+RELATIVE_THUMB_ENDPOINT = "/api/content/{file_id}/thumb"
+
+def save_thumbnail(db, owner_id, media_id, content, content_type="image/webp"):
+    """Upsert the thumbnail and point the media doc to the API endpoint"""
+    now = datetime.utcnow()
+    db.thumbnails.update_one(
+        {"media_id": media_id},
+        {"$set": {
+            "media_id": media_id,
+            "owner_id": owner_id,
+            "content_type": content_type,
+            "size": len(content),
+            "data": content,
+            "updated_at": now
+        }, "$setOnInsert": {"created_at": now}},
+        upsert=True
+    )
+    db.media.update_one(
+        {"id": media_id},
+        {"$set": {"thumb_url": RELATIVE_THUMB_ENDPOINT.format(file_id=media_id)}}
+    )
+
 def fix_thumbnails():
     """Fix missing thumbnails for uploaded images"""
     try:
@@ -110,7 +131,7 @@ def fix_thumbnails():
                         print(f"   ✅ ID ajouté: {image_id}")
                     
                     # Save thumbnail
-                    save_db_thumbnail(image['owner_id'], image_id, thumb_bytes)
+                    save_thumbnail(db, image['owner_id'], image_id, thumb_bytes)
                     print("   ✅ Vignette sauvegardée")
                     
                     # Verify the thumbnail was saved
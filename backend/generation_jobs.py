@@ -0,0 +1,188 @@
+# generation_jobs.py
+"""Post generation jobs stored in MongoDB (`post_generation_jobs` collection).
+
+POST /api/posts/generate only validates the request and queues a job; the
+multi-platform LLM generation runs in a worker and reports each PostsGenerator
+step ("Step 2/6", ...) on the job document, polled through
+GET /api/posts/generate/{job_id}.
+
+Lifecycle: pending -> running (atomic claim with a lease) -> done | failed,
+driven by job_queue.LeaseJobQueue. A job whose worker crashed is re-claimed
+once its lease expires, up to GENERATION_JOB_MAX_ATTEMPTS; generation errors
+are not retried (posts may already be saved).
+
+Workers run inside the API process (GENERATION_WORKERS_IN_API=true, default)
+and can also run standalone: `python generation_jobs.py`.
+"""
+import asyncio
+import os
+import uuid
+from datetime import datetime
+from typing import Optional, Dict, Any, List
+
+from pymongo.errors import DuplicateKeyError
+
+from async_database import get_async_database
+from job_queue import LeaseJobQueue
+
+JOBS_COLLECTION = "post_generation_jobs"
+GENERATION_JOB_CONCURRENCY = int(os.environ.get("GENERATION_JOB_CONCURRENCY", "2"))
+GENERATION_JOB_LEASE_SECONDS = int(os.environ.get("GENERATION_JOB_LEASE_SECONDS", "900"))
+GENERATION_JOB_MAX_ATTEMPTS = int(os.environ.get("GENERATION_JOB_MAX_ATTEMPTS", "2"))
+GENERATION_JOB_POLL_SECONDS = float(os.environ.get("GENERATION_JOB_POLL_SECONDS", "1"))
+GENERATION_JOB_RETENTION_DAYS = int(os.environ.get("GENERATION_JOB_RETENTION_DAYS", "7"))
+GENERATION_WORKERS_IN_API = os.environ.get("GENERATION_WORKERS_IN_API", "true").lower() == "true"
+
+_indexes_ready = False
+
+
+def _jobs():
+    return get_async_database().db[JOBS_COLLECTION]
+
+
+async def ensure_indexes():
+    global _indexes_ready
+    if _indexes_ready:
+        return
+    col = _jobs()
+    try:
+        await col.create_index("id", unique=True)
+        # Claim query: oldest runnable job first
+        await col.create_index([("status", 1), ("run_after", 1)])
+        # At most one queued/running generation per user and month
+        await col.create_index(
+            [("owner_id", 1), ("target_month", 1)], unique=True, name="owner_month_active_unique",
+            partialFilterExpression={"active": True}
+        )
+        # Finished jobs are pruned automatically
+        await col.create_index("finished_at", expireAfterSeconds=GENERATION_JOB_RETENTION_DAYS * 86400)
+    except Exception as e:
+        print(f"⚠️ Generation jobs index creation warning: {e}")
+    _indexes_ready = True
+
+
+def public_job(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Job fields exposed to the API (progress polling)"""
+    return {
+        "job_id": job["id"],
+        "status": job.get("status"),
+        "target_month": job.get("target_month"),
+        "platforms": job.get("connected_platforms", []),
+        "step": job.get("step"),
+        "step_label": job.get("step_label"),
+        "steps": job.get("steps", []),
+        "result": job.get("result"),
+        "error": job.get("error"),
+        "created_at": job.get("created_at"),
+        "updated_at": job.get("updated_at"),
+        "finished_at": job.get("finished_at"),
+    }
+
+
+async def enqueue_generation(owner_id: str, target_month: str, num_posts: int,
+                             connected_platforms: List[str]) -> Dict[str, Any]:
+    """Queue a generation; returns the already active job of that month if there is one"""
+    await ensure_indexes()
+    now = datetime.utcnow()
+    job = {
+        "id": str(uuid.uuid4()),
+        "owner_id": owner_id,
+        "target_month": target_month,
+        "num_posts": num_posts,
+        "connected_platforms": connected_platforms,
+        "status": "pending",
+        "active": True,
+        "attempts": 0,
+        "step": None,
+        "step_label": "En attente",
+        "steps": [],
+        "run_after": now,
+        "created_at": now,
+        "updated_at": now
+    }
+    try:
+        await _jobs().insert_one(job)
+        return job
+    except DuplicateKeyError:
+        existing = await _jobs().find_one({"owner_id": owner_id, "target_month": target_month, "active": True})
+        if existing:
+            return existing
+        raise
+
+
+async def get_job(owner_id: str, job_id: str) -> Optional[Dict[str, Any]]:
+    return await _jobs().find_one({"id": job_id, "owner_id": owner_id})
+
+
+queue = LeaseJobQueue(
+    JOBS_COLLECTION, "Post generation", lease_seconds=GENERATION_JOB_LEASE_SECONDS,
+    max_attempts=GENERATION_JOB_MAX_ATTEMPTS, poll_seconds=GENERATION_JOB_POLL_SECONDS,
+    setup=ensure_indexes
+)
+
+
+async def report_step(job: Dict[str, Any], step: str, label: str):
+    """Record the current generation step (also extends the lease)"""
+    await queue.extend(job, {"step": step, "step_label": label},
+                       push={"steps": {"step": step, "label": label, "at": datetime.utcnow()}})
+
+
+async def finish_job(job: Dict[str, Any], status: str, result: Optional[Dict[str, Any]] = None,
+                     error: Optional[str] = None):
+    await queue.finish(job, status, {"result": result, "error": error})
+
+
+# ----------------------------
+# Worker
+# ----------------------------
+
+async def process_job(job: Dict[str, Any]):
+    """Run PostsGenerator for one job, reporting its steps on the job document"""
+    from posts_generator import PostsGenerator
+
+    async def progress(step: str, label: str):
+        await report_step(job, step, label)
+
+    try:
+        # PostsGenerator opens the sync pymongo connection: keep it off the loop
+        generator = await asyncio.to_thread(PostsGenerator)
+        result = await generator.generate_posts_for_month(
+            user_id=job["owner_id"],
+            target_month=job["target_month"],
+            num_posts=job.get("num_posts", 1),
+            connected_platforms=job.get("connected_platforms"),
+            progress=progress
+        )
+        if result.get("success"):
+            await finish_job(job, "done", result={
+                "posts_count": result["posts_count"],
+                "platforms": result.get("platforms", []),
+                "strategy": result.get("strategy"),
+                "sources_used": result.get("sources_used")
+            })
+            print(f"✅ Generation job {job['id']} done: {result['posts_count']} posts")
+        else:
+            await finish_job(job, "failed", error=result.get("error"))
+            print(f"❌ Generation job {job['id']} failed: {result.get('error')}")
+    except Exception as e:
+        print(f"❌ Generation job {job['id']} failed: {e}")
+        await finish_job(job, "failed", error=str(e))
+
+
+def start_workers(concurrency: int = GENERATION_JOB_CONCURRENCY):
+    """Start `concurrency` worker coroutines on the running loop (API startup)"""
+    queue.start_workers(process_job, concurrency)
+
+
+async def stop_workers():
+    await queue.stop_workers()
+
+
+async def main():
+    await queue.run(process_job, GENERATION_JOB_CONCURRENCY)
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    load_dotenv()
+    asyncio.run(main())
@@ -0,0 +1,83 @@
+# http_cache.py
+"""HTTP caching helpers shared by the media endpoints: ETag / Last-Modified
+validators, conditional requests (304) and single byte-range parsing (206)."""
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Optional, Tuple
+
+
+def make_etag(*parts) -> str:
+    """Strong ETag built from stable identifiers (id, md5, length, date...)"""
+    raw = "-".join(str(p) for p in parts if p is not None)
+    return '"' + hashlib.sha1(raw.encode("utf-8")).hexdigest()[:32] + '"'
+
+
+def content_etag(data: bytes) -> str:
+    """Strong ETag from the bytes themselves"""
+    return '"' + hashlib.sha1(data).hexdigest()[:32] + '"'
+
+
+def http_date(dt: Optional[datetime]) -> Optional[str]:
+    """Format a (naive UTC or aware) datetime as an HTTP-date"""
+    if dt is None:
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return format_datetime(dt.astimezone(timezone.utc), usegmt=True)
+
+
+def is_not_modified(etag: Optional[str], last_modified: Optional[datetime],
+                    if_none_match: Optional[str], if_modified_since: Optional[str]) -> bool:
+    """RFC 7232: If-None-Match wins over If-Modified-Since"""
+    if if_none_match:
+        if not etag:
+            return False
+        candidates = [c.strip() for c in if_none_match.split(",")]
+        bare = etag.replace("W/", "")
+        return "*" in candidates or any(c.replace("W/", "") == bare for c in candidates)
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        modified = last_modified if last_modified.tzinfo else last_modified.replace(tzinfo=timezone.utc)
+        # HTTP dates have one-second resolution
+        return modified.replace(microsecond=0) <= since
+    return False
+
+
+class RangeNotSatisfiable(Exception):
+    """Range header is syntactically valid but outside the resource"""
+
+
+def parse_range(range_header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """Parse a single `bytes=` range into an inclusive (start, end) pair.
+
+    Returns None when there is no usable range (serve the full body);
+    raises RangeNotSatisfiable when the range lies outside the resource.
+    Multi-range requests are answered with the full body.
+    """
+    if not range_header or not range_header.strip().lower().startswith("bytes="):
+        return None
+    spec = range_header.split("=", 1)[1].strip()
+    if "," in spec or "-" not in spec:
+        return None
+    first, last = (p.strip() for p in spec.split("-", 1))
+    try:
+        if first == "":
+            # Suffix range: last N bytes
+            suffix = int(last)
+            if suffix <= 0:
+                raise RangeNotSatisfiable()
+            start, end = max(0, size - suffix), size - 1
+        else:
+            start = int(first)
+            end = int(last) if last else size - 1
+    except ValueError:
+        return None
+    if start >= size or start > end:
+        raise RangeNotSatisfiable()
+    return start, min(end, size - 1)
@@ -0,0 +1,152 @@
+# http_clients.py
+"""Shared HTTP clients of the social network APIs.
+
+One httpx.AsyncClient per upstream ("graph" = graph.facebook.com, "linkedin" =
+api.linkedin.com / www.linkedin.com, "default" for anything else such as image
+downloads), created on first use and closed on API shutdown (close_all). Each
+keeps its connections alive between calls, so publishing or refreshing
+metrics no longer pays a TLS handshake per request. HTTP/2 is negotiated when
+the `h2` package is installed (httpx[http2]).
+
+Every request goes through a timing transport: per-endpoint call counts,
+errors (status >= 400 or network failure) and p50/p95 latency up to the
+response headers, exposed by stats() on /api/diag. Endpoints are labelled
+with ids removed, e.g. "POST graph.facebook.com/{id}/media".
+"""
+import os
+import re
+import time
+from collections import deque
+from typing import Optional, Dict, Any, Deque
+
+import httpx
+
+try:
+    import h2  # noqa: F401  (httpx HTTP/2 support)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+HTTP_CLIENT_HTTP2 = os.environ.get("HTTP_CLIENT_HTTP2", "true").lower() == "true" and HTTP2_AVAILABLE
+HTTP_CLIENT_MAX_CONNECTIONS = int(os.environ.get("HTTP_CLIENT_MAX_CONNECTIONS", "20"))
+HTTP_CLIENT_MAX_KEEPALIVE = int(os.environ.get("HTTP_CLIENT_MAX_KEEPALIVE", "10"))
+HTTP_CLIENT_KEEPALIVE_EXPIRY = float(os.environ.get("HTTP_CLIENT_KEEPALIVE_EXPIRY", "60"))
+HTTP_CLIENT_TIMEOUT = float(os.environ.get("HTTP_CLIENT_TIMEOUT", "30"))
+HTTP_CLIENT_CONNECT_TIMEOUT = float(os.environ.get("HTTP_CLIENT_CONNECT_TIMEOUT", "5"))
+HTTP_METRICS_WINDOW = int(os.environ.get("HTTP_METRICS_WINDOW", "200"))
+
+GRAPH = "graph"
+LINKEDIN = "linkedin"
+DEFAULT = "default"
+
+_clients: Dict[str, httpx.AsyncClient] = {}
+_metrics: Dict[str, "EndpointMetrics"] = {}
+
+_VERSION_SEGMENT = re.compile(r"^v\d+(\.\d+)?$")
+_ID_SEGMENT = re.compile(r"^(\d+(_\d+)?|[0-9a-f]{24}|urn:li:.+|.*%3A.+)$", re.IGNORECASE)
+
+
+class EndpointMetrics:
+    """Rolling latency / error counters of one endpoint"""
+
+    def __init__(self, window: int = HTTP_METRICS_WINDOW):
+        self.calls = 0
+        self.errors = 0
+        self._latencies: Deque[float] = deque(maxlen=window)
+
+    def record(self, latency: float, ok: bool):
+        self.calls += 1
+        if not ok:
+            self.errors += 1
+        self._latencies.append(latency)
+
+    def stats(self) -> Dict[str, Any]:
+        ordered = sorted(self._latencies)
+
+        def pct(p: float) -> Optional[float]:
+            if not ordered:
+                return None
+            return round(ordered[min(len(ordered) - 1, int(round(p * (len(ordered) - 1))))] * 1000, 1)
+
+        return {"calls": self.calls, "errors": self.errors, "p50_ms": pct(0.5), "p95_ms": pct(0.95)}
+
+
+def endpoint_label(request: httpx.Request) -> str:
+    segments = []
+    for segment in request.url.path.strip("/").split("/"):
+        if not segment or _VERSION_SEGMENT.match(segment):
+            continue
+        segments.append("{id}" if _ID_SEGMENT.match(segment) else segment)
+    return f"{request.method} {request.url.host}/{'/'.join(segments)}"
+
+
+class _TimedTransport(httpx.AsyncBaseTransport):
+    """Records the latency of every request on its endpoint"""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport):
+        self._transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        label = endpoint_label(request)
+        started = time.monotonic()
+        try:
+            response = await self._transport.handle_async_request(request)
+        except Exception:
+            _metrics.setdefault(label, EndpointMetrics()).record(time.monotonic() - started, ok=False)
+            raise
+        _metrics.setdefault(label, EndpointMetrics()).record(time.monotonic() - started, ok=response.status_code < 400)
+        return response
+
+    async def aclose(self):
+        await self._transport.aclose()
+
+
+def get_client(name: str = DEFAULT) -> httpx.AsyncClient:
+    """Shared client of an upstream (created on first use)"""
+    client = _clients.get(name)
+    if client is None or client.is_closed:
+        limits = httpx.Limits(
+            max_connections=HTTP_CLIENT_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_CLIENT_MAX_KEEPALIVE,
+            keepalive_expiry=HTTP_CLIENT_KEEPALIVE_EXPIRY
+        )
+        transport = httpx.AsyncHTTPTransport(http2=HTTP_CLIENT_HTTP2, limits=limits, retries=1)
+        client = httpx.AsyncClient(
+            transport=_TimedTransport(transport),
+            timeout=httpx.Timeout(HTTP_CLIENT_TIMEOUT, connect=HTTP_CLIENT_CONNECT_TIMEOUT),
+            follow_redirects=True
+        )
+        _clients[name] = client
+    return client
+
+
+class SharedClientMixin:
+    """`self.http`: the client injected in the constructor, else the shared client of `upstream`"""
+    upstream = DEFAULT
+    _http_client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def http(self) -> httpx.AsyncClient:
+        return self._http_client or get_client(self.upstream)
+
+
+def graph_client() -> httpx.AsyncClient:
+    return get_client(GRAPH)
+
+
+def linkedin_client() -> httpx.AsyncClient:
+    return get_client(LINKEDIN)
+
+
+async def close_all():
+    for client in list(_clients.values()):
+        await client.aclose()
+    _clients.clear()
+
+
+def stats() -> Dict[str, Any]:
+    return {
+        "http2": HTTP_CLIENT_HTTP2,
+        "clients": sorted(name for name, client in _clients.items() if not client.is_closed),
+        "endpoints": {label: metrics.stats() for label, metrics in sorted(_metrics.items())},
+    }
@@ -0,0 +1,256 @@
+# image_pipeline.py
+"""Shared CPU pipeline for image processing.
+
+Pillow work (decode, EXIF rotation, resize, encode) is CPU bound and holds the
+GIL, so request handlers never run it inline: they submit jobs to one process
+pool shared by the whole API. Jobs take and return in-memory bytes (no temp
+files). A semaphore bounds the number of queued + running jobs; when it is full
+callers wait up to IMAGE_QUEUE_TIMEOUT seconds, then get PipelineBusy (503).
+"""
+import asyncio
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Dict, Any
+
+from PIL import Image, ImageOps
+
+IMAGE_WORKERS = int(os.environ.get("IMAGE_WORKERS", str(max(1, (os.cpu_count() or 2) - 1))))
+IMAGE_QUEUE_SIZE = int(os.environ.get("IMAGE_QUEUE_SIZE", str(IMAGE_WORKERS * 4)))
+IMAGE_QUEUE_TIMEOUT = float(os.environ.get("IMAGE_QUEUE_TIMEOUT", "30"))
+
+STORAGE_MIN_SIDE = 1024  # 1024px on the smallest side
+STORAGE_QUALITY = 85
+
+PUBLISH_JPEG_QUALITY = int(os.environ.get("PUBLISH_JPEG_QUALITY", "85"))
+
+THUMB_SIZE = int(os.environ.get("THUMB_SIZE", "200"))  # 200x200 for better performance
+THUMB_FORMAT = os.environ.get("THUMB_FORMAT", "WEBP")  # WEBP|JPEG|PNG
+THUMB_QUALITY = int(os.environ.get("THUMB_QUALITY", "85"))
+# Responsive square variants (srcset / ?w=), all produced from one decode
+THUMB_VARIANT_WIDTHS = sorted({THUMB_SIZE, *(
+    int(w) for w in os.environ.get("THUMB_VARIANT_WIDTHS", "200,400,800").split(",") if w.strip()
+)})
+THUMB_AVIF = os.environ.get("THUMB_AVIF", "false").lower() == "true"
+
+_executor: Optional[ProcessPoolExecutor] = None
+_slots: Optional[asyncio.Semaphore] = None
+
+
+class PipelineBusy(Exception):
+    """The image queue stayed full for longer than IMAGE_QUEUE_TIMEOUT"""
+
+
+# ----------------------------
+# Pure functions (run inside worker processes)
+# ----------------------------
+
+def _worker_init():
+    # Enable HEIC/HEIF support for iPhone photos in each worker (optional)
+    try:
+        import pillow_heif
+        pillow_heif.register_heif_opener()
+    except Exception:
+        pass
+    # AVIF encoder for Pillow < 11.2 (optional)
+    try:
+        import pillow_avif  # noqa: F401
+    except Exception:
+        pass
+
+
+def avif_supported() -> bool:
+    try:
+        from PIL import features
+        return bool(features.check("avif"))
+    except Exception:
+        return False
+
+
+def open_oriented(data: bytes) -> Image.Image:
+    """Decode bytes and apply the EXIF orientation, returning an RGB image"""
+    im = Image.open(io.BytesIO(data))
+    try:
+        im = ImageOps.exif_transpose(im)
+    except Exception:
+        pass  # No EXIF data or orientation
+    return im.convert("RGB")
+
+
+def fit_min_side(im: Image.Image, min_side: int = STORAGE_MIN_SIDE) -> Image.Image:
+    """Downscale so the smallest side is at most `min_side` (never upscales)"""
+    width, height = im.size
+    smallest = min(width, height)
+    if smallest <= min_side:
+        return im
+    ratio = min_side / smallest
+    return im.resize((max(1, int(width * ratio)), max(1, int(height * ratio))), Image.LANCZOS)
+
+
+def square_crop(im: Image.Image) -> Image.Image:
+    """Crop image to square format (center crop)"""
+    w, h = im.size
+    side = min(w, h)
+    left = (w - side) // 2
+    top = (h - side) // 2
+    return im.crop((left, top, left + side, top + side))
+
+
+def encode_storage_jpeg(im: Image.Image) -> bytes:
+    """JPEG with good quality, 72 DPI and optimal compression"""
+    buf = io.BytesIO()
+    im.save(buf, format="JPEG", quality=STORAGE_QUALITY, optimize=True, progressive=True, dpi=(72, 72))
+    return buf.getvalue()
+
+
+def encode_thumb(im: Image.Image, size: int = THUMB_SIZE, fmt: str = THUMB_FORMAT,
+                 quality: int = THUMB_QUALITY) -> bytes:
+    """Square thumbnail in the configured format"""
+    thumb = square_crop(im)
+    thumb.thumbnail((size, size), Image.LANCZOS)
+    buf = io.BytesIO()
+    ext = fmt.lower()
+    if ext == "webp":
+        thumb.save(buf, format="WEBP", quality=quality, method=6)
+    elif ext in ("jpeg", "jpg"):
+        thumb.save(buf, format="JPEG", quality=quality, optimize=True, progressive=True)
+    else:
+        thumb.save(buf, format="PNG", optimize=True)
+    return buf.getvalue()
+
+
+def thumb_content_type(fmt: str = THUMB_FORMAT) -> str:
+    ext = fmt.lower()
+    if ext == "webp":
+        return "image/webp"
+    if ext == "avif":
+        return "image/avif"
+    if ext in ("jpeg", "jpg"):
+        return "image/jpeg"
+    return "image/png"
+
+
+def variant_key(width: int, fmt: str) -> str:
+    """Field name of a variant in thumbnails.variants, e.g. "400_webp" """
+    return f"{int(width)}_{fmt.lower()}"
+
+
+BASE_VARIANT_KEY = variant_key(THUMB_SIZE, THUMB_FORMAT)
+
+
+def encode_thumb_variants(im: Image.Image) -> Dict[str, Any]:
+    """Base thumbnail + every configured square variant from one decoded image.
+
+    Variants are only produced up to the source size (no upscaling); each one is
+    downscaled from the next larger variant. The base (THUMB_SIZE in
+    THUMB_FORMAT) stays in `thumb` and is not duplicated in `variants`.
+    """
+    square = square_crop(im)
+    side = square.size[0]
+    formats = ["webp"] + (["avif"] if THUMB_AVIF and avif_supported() else [])
+
+    variants: Dict[str, bytes] = {}
+    current = square
+    for width in sorted(THUMB_VARIANT_WIDTHS, reverse=True):
+        if width > side and width != THUMB_SIZE:
+            continue
+        if current.size[0] > width:
+            current = current.resize((width, width), Image.LANCZOS)
+        for fmt in formats:
+            key = variant_key(width, fmt)
+            if key == BASE_VARIANT_KEY:
+                continue
+            buf = io.BytesIO()
+            if fmt == "webp":
+                current.save(buf, format="WEBP", quality=THUMB_QUALITY, method=6)
+            else:
+                current.save(buf, format="AVIF", quality=THUMB_QUALITY)
+            variants[key] = buf.getvalue()
+
+    return {
+        "thumb": encode_thumb(square),
+        "thumb_content_type": thumb_content_type(),
+        "variants": variants,
+    }
+
+
+def resize_image_bytes(data: bytes, min_side: int = STORAGE_MIN_SIDE) -> Dict[str, Any]:
+    """Oriented, resized storage JPEG"""
+    im = fit_min_side(open_oriented(data), min_side)
+    return {"data": encode_storage_jpeg(im), "width": im.size[0], "height": im.size[1]}
+
+
+def make_thumb_bytes(data: bytes) -> bytes:
+    """Square thumbnail from original bytes"""
+    return encode_thumb(open_oriented(data))
+
+
+def make_thumb_set(data: bytes) -> Dict[str, Any]:
+    """Base thumbnail + responsive variants from original bytes"""
+    return encode_thumb_variants(open_oriented(data))
+
+
+def render_publish_jpeg(image_bytes: bytes) -> bytes:
+    """Flatten transparency on white and encode a quality-85 optimized JPEG"""
+    image = Image.open(io.BytesIO(image_bytes))
+
+    # Convertir en RGB si nécessaire
+    if image.mode in ('RGBA', 'LA', 'P'):
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        if image.mode == 'P':
+            image = image.convert('RGBA')
+        background.paste(image, mask=image.split()[-1] if image.mode in ('RGBA', 'LA') else None)
+        image = background
+    elif image.mode != 'RGB':
+        image = image.convert('RGB')
+
+    jpg_buffer = io.BytesIO()
+    image.save(jpg_buffer, format='JPEG', quality=PUBLISH_JPEG_QUALITY, optimize=True)
+    return jpg_buffer.getvalue()
+
+
+def process_upload_image(data: bytes) -> Dict[str, Any]:
+    """Upload pipeline in one decode pass: storage JPEG + square thumbnail variants"""
+    im = fit_min_side(open_oriented(data))
+    return {
+        "data": encode_storage_jpeg(im),
+        "width": im.size[0],
+        "height": im.size[1],
+        **encode_thumb_variants(im),
+    }
+
+
+# ----------------------------
+# Async submission (API process)
+# ----------------------------
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=IMAGE_WORKERS, initializer=_worker_init)
+        print(f"✅ Image pipeline started with {IMAGE_WORKERS} worker processes (queue {IMAGE_QUEUE_SIZE})")
+    return _executor
+
+
+async def run_image_job(fn, *args):
+    """Run a module-level pipeline function in the process pool with backpressure"""
+    global _slots
+    if _slots is None:
+        _slots = asyncio.Semaphore(IMAGE_QUEUE_SIZE)
+    try:
+        await asyncio.wait_for(_slots.acquire(), timeout=IMAGE_QUEUE_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise PipelineBusy(f"Image pipeline busy ({IMAGE_QUEUE_SIZE} jobs queued)")
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_get_executor(), fn, *args)
+    finally:
+        _slots.release()
+
+
+def shutdown_pipeline():
+    """Stop worker processes (API shutdown)"""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
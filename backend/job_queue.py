@@ -0,0 +1,155 @@
+# job_queue.py
+"""Lease-based job queue on a MongoDB collection, shared by the background workers
+(thumbnail_jobs.py, generation_jobs.py).
+
+Jobs are documents with at least:
+
+    status: pending | running | done | failed, active: True while queued/running,
+    attempts, run_after, worker_id, lease_until, updated_at, finished_at
+
+Lifecycle: pending -> running (atomic claim with a lease) -> done | failed.
+A claim is a single find_one_and_update, so any number of API instances or
+standalone workers can share a queue. A job whose worker crashed is re-claimed
+once its lease expires, up to `max_attempts`; after the last attempt it is
+failed by the idle workers (fail_abandoned).
+
+Each queue module keeps its settings, indexes and job handler; this module
+only holds the claim / lease / worker-loop machinery.
+"""
+import asyncio
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+from typing import Optional, Dict, Any, List, Callable, Awaitable
+
+from pymongo import ReturnDocument
+
+from async_database import get_async_database
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+JobHandler = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+class LeaseJobQueue:
+    """Claim, lease and worker loop of one job collection"""
+
+    def __init__(self, collection: str, label: str, lease_seconds: int, max_attempts: int,
+                 poll_seconds: float, error_field: str = "error",
+                 setup: Optional[Callable[[], Awaitable[None]]] = None):
+        self.collection_name = collection
+        self.label = label
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.poll_seconds = poll_seconds
+        self.error_field = error_field
+        self._setup = setup
+        self._tasks: List[asyncio.Task] = []
+
+    @property
+    def jobs(self):
+        return get_async_database().db[self.collection_name]
+
+    @staticmethod
+    def owned(job: Dict[str, Any]) -> Dict[str, Any]:
+        """Filter matching the job only while its claimer still holds it"""
+        return {"_id": job["_id"], "worker_id": job.get("worker_id")}
+
+    async def claim(self, worker_id: str = WORKER_ID) -> Optional[Dict[str, Any]]:
+        """Atomically take the next runnable job (pending and due, or running with an expired lease)"""
+        now = datetime.utcnow()
+        return await self.jobs.find_one_and_update(
+            {"$or": [
+                {"status": "pending", "run_after": {"$lte": now}},
+                {"status": "running", "lease_until": {"$lt": now},
+                 "attempts": {"$lt": self.max_attempts}}
+            ]},
+            {
+                "$set": {
+                    "status": "running",
+                    "worker_id": worker_id,
+                    "lease_until": now + timedelta(seconds=self.lease_seconds),
+                    "started_at": now,
+                    "updated_at": now
+                },
+                "$inc": {"attempts": 1}
+            },
+            sort=[("run_after", 1)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def extend(self, job: Dict[str, Any], fields: Optional[Dict[str, Any]] = None,
+                     push: Optional[Dict[str, Any]] = None):
+        """Renew the lease of a running job (optionally with progress fields)"""
+        now = datetime.utcnow()
+        update = {"$set": {**(fields or {}), "lease_until": now + timedelta(seconds=self.lease_seconds),
+                           "updated_at": now}}
+        if push:
+            update["$push"] = push
+        await self.jobs.update_one(self.owned(job), update)
+
+    async def reschedule(self, job: Dict[str, Any], delay_seconds: float, fields: Optional[Dict[str, Any]] = None):
+        """Put a claimed job back in the queue, runnable after `delay_seconds`"""
+        now = datetime.utcnow()
+        await self.jobs.update_one(self.owned(job), {
+            "$set": {**(fields or {}), "status": "pending",
+                     "run_after": now + timedelta(seconds=delay_seconds), "updated_at": now},
+            "$unset": {"lease_until": ""}
+        })
+
+    async def finish(self, job: Dict[str, Any], status: str, fields: Optional[Dict[str, Any]] = None):
+        """End a claimed job (done | failed); `active` is unset so a new job can be queued"""
+        now = datetime.utcnow()
+        await self.jobs.update_one(self.owned(job), {
+            "$set": {**(fields or {}), "status": status, "finished_at": now, "updated_at": now},
+            "$unset": {"active": "", "lease_until": ""}
+        })
+
+    async def fail_abandoned(self) -> int:
+        """Close jobs whose lease expired after the last allowed attempt"""
+        now = datetime.utcnow()
+        result = await self.jobs.update_many(
+            {"status": "running", "lease_until": {"$lt": now}, "attempts": {"$gte": self.max_attempts}},
+            {"$set": {"status": "failed", self.error_field: "worker lost", "finished_at": now, "updated_at": now},
+             "$unset": {"active": "", "lease_until": ""}}
+        )
+        return result.modified_count
+
+    async def worker_loop(self, handler: JobHandler, worker_id: str = WORKER_ID):
+        """Claim and run jobs forever; sleeps poll_seconds when the queue is empty"""
+        if self._setup:
+            await self._setup()
+        while True:
+            try:
+                job = await self.claim(worker_id)
+                if job is None:
+                    await self.fail_abandoned()
+                    await asyncio.sleep(self.poll_seconds)
+                    continue
+                await handler(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"❌ {self.label} worker error: {e}")
+                await asyncio.sleep(self.poll_seconds)
+
+    def start_workers(self, handler: JobHandler, concurrency: int):
+        """Start `concurrency` worker coroutines on the running loop (API startup)"""
+        if self._tasks:
+            return
+        for i in range(max(1, concurrency)):
+            self._tasks.append(asyncio.create_task(self.worker_loop(handler, f"{WORKER_ID}:{i}")))
+        print(f"✅ {self.label} workers started ({concurrency})")
+
+    async def stop_workers(self):
+        """Cancel worker coroutines; interrupted jobs are re-claimed after their lease"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+
+    async def run(self, handler: JobHandler, concurrency: int):
+        """Standalone worker process: run `concurrency` loops until cancelled"""
+        print(f"🚀 {self.label} worker {WORKER_ID} (concurrency {concurrency})")
+        await asyncio.gather(*(self.worker_loop(handler, f"{WORKER_ID}:{i}") for i in range(max(1, concurrency))))
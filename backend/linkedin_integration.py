@@ -12,6 +12,8 @@ import httpx
 from fastapi import HTTPException
 from datetime import datetime
 
+from http_clients import SharedClientMixin, LINKEDIN
+
 # Configure logging
 logger = logging.getLogger(__name__)
 
@@ -24,10 +26,12 @@ LINKEDIN_AUTH_BASE_URL = "https://www.linkedin.com/oauth/v2/authorization"
 LINKEDIN_TOKEN_URL = "https://www.linkedin.com/oauth/v2/accessToken"
 LINKEDIN_API_BASE_URL = "https://api.linkedin.com/v2"
 
-class LinkedInAuthManager:
+class LinkedInAuthManager(SharedClientMixin):
     """Handles LinkedIn OAuth 2.0 authentication flow"""
+    upstream = LINKEDIN
     
-    def __init__(self):
+    def __init__(self, http_client: Optional[httpx.AsyncClient] = None):
+        self._http_client = http_client
         self.client_id = LINKEDIN_CLIENT_ID
         self.client_secret = LINKEDIN_CLIENT_SECRET
         self.redirect_uri = LINKEDIN_REDIRECT_URI
@@ -67,30 +71,34 @@ class LinkedInAuthManager:
         }
         
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(LINKEDIN_TOKEN_URL, data=token_data, headers=headers)
-                
-                if response.status_code == 200:
-                    token_response = response.json()
-                    return {
-                        "access_token": token_response.get("access_token"),
-                        "expires_in": token_response.get("expires_in"),
-                        "refresh_token": token_response.get("refresh_token"),
-                        "scope": token_response.get("scope")
-                    }
-                else:
-                    logger.error(f"LinkedIn token exchange failed: {response.status_code} - {response.text}")
-                    raise HTTPException(
-                        status_code=400, 
-                        detail=f"Token exchange failed: {response.text}"
-                    )
+            client = self.http
+            response = await client.post(LINKEDIN_TOKEN_URL, data=token_data, headers=headers)
+            
+            if response.status_code == 200:
+                token_response = response.json()
+                return {
+                    "access_token": token_response.get("access_token"),
+                    "expires_in": token_response.get("expires_in"),
+                    "refresh_token": token_response.get("refresh_token"),
+                    "scope": token_response.get("scope")
+                }
+            else:
+                logger.error(f"LinkedIn token exchange failed: {response.status_code} - {response.text}")
+                raise HTTPException(
+                    status_code=400, 
+                    detail=f"Token exchange failed: {response.text}"
+                )
         except httpx.RequestError as e:
             logger.error(f"Network error during token exchange: {str(e)}")
             raise HTTPException(status_code=500, detail="Network error during authentication")
 
 
-class LinkedInProfileManager:
+class LinkedInProfileManager(SharedClientMixin):
     """Handles LinkedIn profile and organization information"""
+    upstream = LINKEDIN
+    
+    def __init__(self, http_client: Optional[httpx.AsyncClient] = None):
+        self._http_client = http_client
     
     async def get_user_profile(self, access_token: str) -> Dict[str, Any]:
         """Get LinkedIn user profile information"""
@@ -100,41 +108,41 @@ class LinkedInProfileManager:
         }
         
         try:
-            async with httpx.AsyncClient() as client:
-                # Get basic profile information
-                profile_response = await client.get(f"{LINKEDIN_API_BASE_URL}/me", headers=headers)
-                
-                if profile_response.status_code != 200:
-                    logger.error(f"Failed to get LinkedIn profile: {profile_response.status_code}")
-                    raise HTTPException(status_code=400, detail="Failed to retrieve LinkedIn profile")
-                
-                profile_data = profile_response.json()
-                
-                # Try to get email address if scope permits
-                email_data = {}
-                try:
-                    email_response = await client.get(
-                        f"{LINKEDIN_API_BASE_URL}/emailAddress?q=members&projection=(elements*(handle~))", 
-                        headers=headers
-                    )
-                    if email_response.status_code == 200:
-                        email_data = email_response.json()
-                except:
-                    logger.info("Email scope not available or failed")
-                
-                return {
-                    "id": profile_data.get("id"),
-                    "first_name": profile_data.get("localizedFirstName"),
-                    "last_name": profile_data.get("localizedLastName"),
-                    "profile_picture": profile_data.get("profilePicture"),
-                    "email": (
-                        email_data.get("elements", [{}])[0]
-                        .get("handle~", {})
-                        .get("emailAddress")
-                        if email_data.get("elements") 
-                        else None
-                    )
-                }
+            client = self.http
+            # Get basic profile information
+            profile_response = await client.get(f"{LINKEDIN_API_BASE_URL}/me", headers=headers)
+            
+            if profile_response.status_code != 200:
+                logger.error(f"Failed to get LinkedIn profile: {profile_response.status_code}")
+                raise HTTPException(status_code=400, detail="Failed to retrieve LinkedIn profile")
+            
+            profile_data = profile_response.json()
+            
+            # Try to get email address if scope permits
+            email_data = {}
+            try:
+                email_response = await client.get(
+                    f"{LINKEDIN_API_BASE_URL}/emailAddress?q=members&projection=(elements*(handle~))", 
+                    headers=headers
+                )
+                if email_response.status_code == 200:
+                    email_data = email_response.json()
+            except:
+                logger.info("Email scope not available or failed")
+            
+            return {
+                "id": profile_data.get("id"),
+                "first_name": profile_data.get("localizedFirstName"),
+                "last_name": profile_data.get("localizedLastName"),
+                "profile_picture": profile_data.get("profilePicture"),
+                "email": (
+                    email_data.get("elements", [{}])[0]
+                    .get("handle~", {})
+                    .get("emailAddress")
+                    if email_data.get("elements") 
+                    else None
+                )
+            }
         except httpx.RequestError as e:
             logger.error(f"Network error getting profile: {str(e)}")
             raise HTTPException(status_code=500, detail="Network error retrieving profile")
@@ -153,38 +161,38 @@ class LinkedInProfileManager:
         }
         
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    f"{LINKEDIN_API_BASE_URL}/organizationAcls", 
-                    headers=headers, 
-                    params=params
-                )
+            client = self.http
+            response = await client.get(
+                f"{LINKEDIN_API_BASE_URL}/organizationAcls", 
+                headers=headers, 
+                params=params
+            )
+            
+            if response.status_code == 200:
+                acl_data = response.json()
+                organizations = []
                 
-                if response.status_code == 200:
-                    acl_data = response.json()
-                    organizations = []
-                    
-                    for element in acl_data.get("elements", []):
-                        if element.get("state") == "APPROVED":
-                            org_urn = element.get("organizationTarget")
-                            role = element.get("role")
-                            
-                            # Get organization details
-                            org_details = await self._get_organization_details(access_token, org_urn)
-                            
-                            organizations.append({
-                                "urn": org_urn,
-                                "role": role,
-                                "details": org_details
-                            })
-                    
-                    return {
-                        "status": "success",
-                        "organizations": organizations
-                    }
-                else:
-                    logger.error(f"Failed to get organizations: {response.status_code}")
-                    return {"status": "error", "organizations": []}
+                for element in acl_data.get("elements", []):
+                    if element.get("state") == "APPROVED":
+                        org_urn = element.get("organizationTarget")
+                        role = element.get("role")
+                        
+                        # Get organization details
+                        org_details = await self._get_organization_details(access_token, org_urn)
+                        
+                        organizations.append({
+                            "urn": org_urn,
+                            "role": role,
+                            "details": org_details
+                        })
+                
+                return {
+                    "status": "success",
+                    "organizations": organizations
+                }
+            else:
+                logger.error(f"Failed to get organizations: {response.status_code}")
+                return {"status": "error", "organizations": []}
         except httpx.RequestError as e:
             logger.error(f"Network error getting organizations: {str(e)}")
             return {"status": "error", "organizations": []}
@@ -200,27 +208,31 @@ class LinkedInProfileManager:
             # Extract organization ID from URN
             org_id = organization_urn.split(":")[-1]
             
-            async with httpx.AsyncClient() as client:
-                response = await client.get(f"{LINKEDIN_API_BASE_URL}/organizations/{org_id}", headers=headers)
-                
-                if response.status_code == 200:
-                    org_data = response.json()
-                    return {
-                        "id": org_data.get("id"),
-                        "name": org_data.get("localizedName"),
-                        "vanityName": org_data.get("vanityName"),
-                        "logoV2": org_data.get("logoV2")
-                    }
-                else:
-                    logger.warning(f"Failed to get org details for {org_id}")
-                    return {"error": "Failed to retrieve organization details"}
+            client = self.http
+            response = await client.get(f"{LINKEDIN_API_BASE_URL}/organizations/{org_id}", headers=headers)
+            
+            if response.status_code == 200:
+                org_data = response.json()
+                return {
+                    "id": org_data.get("id"),
+                    "name": org_data.get("localizedName"),
+                    "vanityName": org_data.get("vanityName"),
+                    "logoV2": org_data.get("logoV2")
+                }
+            else:
+                logger.warning(f"Failed to get org details for {org_id}")
+                return {"error": "Failed to retrieve organization details"}
         except Exception as e:
             logger.error(f"Error getting org details: {str(e)}")
             return {"error": str(e)}
 
 
-class LinkedInPostManager:
+class LinkedInPostManager(SharedClientMixin):
     """Handles LinkedIn post creation and management"""
+    upstream = LINKEDIN
+    
+    def __init__(self, http_client: Optional[httpx.AsyncClient] = None):
+        self._http_client = http_client
     
     async def create_text_post(
         self, 
@@ -253,28 +265,28 @@ class LinkedInPostManager:
         }
         
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    f"{LINKEDIN_API_BASE_URL}/ugcPosts", 
-                    headers=headers, 
-                    json=post_data
+            client = self.http
+            response = await client.post(
+                f"{LINKEDIN_API_BASE_URL}/ugcPosts", 
+                headers=headers, 
+                json=post_data
+            )
+            
+            if response.status_code == 201:
+                post_id = response.headers.get("X-RestLi-Id")
+                logger.info(f"LinkedIn post created successfully: {post_id}")
+                return {
+                    "status": "success",
+                    "post_id": post_id,
+                    "message": "Post created successfully",
+                    "platform": "linkedin"
+                }
+            else:
+                logger.error(f"Failed to create LinkedIn post: {response.status_code} - {response.text}")
+                raise HTTPException(
+                    status_code=response.status_code, 
+                    detail=f"Failed to create post: {response.text}"
                 )
-                
-                if response.status_code == 201:
-                    post_id = response.headers.get("X-RestLi-Id")
-                    logger.info(f"LinkedIn post created successfully: {post_id}")
-                    return {
-                        "status": "success",
-                        "post_id": post_id,
-                        "message": "Post created successfully",
-                        "platform": "linkedin"
-                    }
-                else:
-                    logger.error(f"Failed to create LinkedIn post: {response.status_code} - {response.text}")
-                    raise HTTPException(
-                        status_code=response.status_code, 
-                        detail=f"Failed to create post: {response.text}"
-                    )
         except httpx.RequestError as e:
             logger.error(f"Network error creating post: {str(e)}")
             raise HTTPException(status_code=500, detail="Network error during post creation")
@@ -325,28 +337,28 @@ class LinkedInPostManager:
         }
         
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    f"{LINKEDIN_API_BASE_URL}/ugcPosts", 
-                    headers=headers, 
-                    json=post_data
+            client = self.http
+            response = await client.post(
+                f"{LINKEDIN_API_BASE_URL}/ugcPosts", 
+                headers=headers, 
+                json=post_data
+            )
+            
+            if response.status_code == 201:
+                post_id = response.headers.get("X-RestLi-Id")
+                logger.info(f"LinkedIn article post created: {post_id}")
+                return {
+                    "status": "success",
+                    "post_id": post_id,
+                    "message": "Article post created successfully",
+                    "platform": "linkedin"
+                }
+            else:
+                logger.error(f"Failed to create article post: {response.status_code}")
+                raise HTTPException(
+                    status_code=response.status_code, 
+                    detail=f"Failed to create article post: {response.text}"
                 )
-                
-                if response.status_code == 201:
-                    post_id = response.headers.get("X-RestLi-Id")
-                    logger.info(f"LinkedIn article post created: {post_id}")
-                    return {
-                        "status": "success",
-                        "post_id": post_id,
-                        "message": "Article post created successfully",
-                        "platform": "linkedin"
-                    }
-                else:
-                    logger.error(f"Failed to create article post: {response.status_code}")
-                    raise HTTPException(
-                        status_code=response.status_code, 
-                        detail=f"Failed to create article post: {response.text}"
-                    )
         except httpx.RequestError as e:
             logger.error(f"Network error creating article post: {str(e)}")
             raise HTTPException(status_code=500, detail="Network error during article post creation")
@@ -3,12 +3,17 @@ Système de backup LLM unifié : OpenAI GPT-4o + Claude Sonnet 4
 Utilisé partout dans l'application pour avoir un fallback robuste
 """
 import os
+import asyncio
 import logging
 import json
-from typing import Dict, Any, Optional, List
+import time
+from typing import AsyncIterator, Dict, Any, Optional, List
 from pathlib import Path
 from dotenv import load_dotenv
 
+import llm_cache
+from llm_router import ProviderHealth, timed, hedged
+
 # Charger les variables d'environnement
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -17,13 +22,20 @@ load_dotenv(ROOT_DIR / '.env')
 OPENAI_API_KEY = os.environ.get('OPENAI_API_KEY')
 CLAUDE_API_KEY = os.environ.get('CLAUDE_API_KEY')
 
+# Pool HTTP partagé et concurrence par fournisseur
+LLM_OPENAI_CONCURRENCY = int(os.environ.get('LLM_OPENAI_CONCURRENCY', '8'))
+LLM_CLAUDE_CONCURRENCY = int(os.environ.get('LLM_CLAUDE_CONCURRENCY', '4'))
+LLM_HTTP_MAX_CONNECTIONS = int(os.environ.get('LLM_HTTP_MAX_CONNECTIONS', '20'))
+LLM_HTTP_TIMEOUT = float(os.environ.get('LLM_HTTP_TIMEOUT', '120'))
+
 # Imports des bibliothèques
 try:
-    from openai import OpenAI
+    import httpx
+    from openai import AsyncOpenAI
     OPENAI_AVAILABLE = True
 except ImportError:
     OPENAI_AVAILABLE = False
-    OpenAI = None
+    AsyncOpenAI = None
 
 try:
     from emergentintegrations.llm.chat import LlmChat, UserMessage
@@ -38,18 +50,43 @@ print(f"   - OpenAI GPT-4o: {'✅' if OPENAI_AVAILABLE and OPENAI_API_KEY else '
 print(f"   - Claude Sonnet 4: {'✅' if CLAUDE_AVAILABLE and CLAUDE_API_KEY else '❌'}")
 
 
+CLAUDE_MODEL = ("anthropic", "claude-4-sonnet-20250514")
+CLAUDE_DEFAULT_SYSTEM = "You are Claude, a helpful AI assistant. You will receive prompts that were originally designed for GPT-4o. Please provide equivalent quality responses."
+
+
 class LLMBackupSystem:
-    """Système de backup LLM avec OpenAI + Claude et sélection intelligente selon objectifs"""
+    """Système de backup LLM avec OpenAI + Claude et sélection intelligente selon objectifs
+
+    Une seule instance par process (`llm_backup`) : le client AsyncOpenAI garde un
+    pool de connexions keep-alive partagé, et un sémaphore par fournisseur borne
+    les appels en vol pour qu'une grosse génération ne bloque pas le reste de l'API.
+    """
     
     def __init__(self):
         self.openai_client = None
         self.claude_chat = None
+        self._semaphores = {
+            "openai": asyncio.Semaphore(LLM_OPENAI_CONCURRENCY),
+            "claude": asyncio.Semaphore(LLM_CLAUDE_CONCURRENCY),
+        }
+        # Latence p50/p95, taux d'erreur et circuit breaker par fournisseur
+        self.health = {"openai": ProviderHealth("openai"), "claude": ProviderHealth("claude")}
         
         # Initialiser OpenAI si disponible
         if OPENAI_AVAILABLE and OPENAI_API_KEY:
             try:
-                self.openai_client = OpenAI(api_key=OPENAI_API_KEY)
-                print("✅ OpenAI GPT-4o client initialized")
+                self.openai_client = AsyncOpenAI(
+                    api_key=OPENAI_API_KEY,
+                    http_client=httpx.AsyncClient(
+                        limits=httpx.Limits(
+                            max_connections=LLM_HTTP_MAX_CONNECTIONS,
+                            max_keepalive_connections=LLM_HTTP_MAX_CONNECTIONS,
+                            keepalive_expiry=60
+                        ),
+                        timeout=httpx.Timeout(LLM_HTTP_TIMEOUT, connect=10.0)
+                    )
+                )
+                print(f"✅ OpenAI GPT-4o async client initialized (concurrency {LLM_OPENAI_CONCURRENCY})")
             except Exception as e:
                 print(f"❌ OpenAI initialization error: {e}")
         
@@ -59,12 +96,132 @@ class LLMBackupSystem:
                 self.claude_chat = LlmChat(
                     api_key=CLAUDE_API_KEY,
                     session_id="backup-system",
-                    system_message="You are Claude, a helpful AI assistant. You will receive prompts that were originally designed for GPT-4o. Please provide equivalent quality responses."
-                ).with_model("anthropic", "claude-4-sonnet-20250514")
+                    system_message=CLAUDE_DEFAULT_SYSTEM
+                ).with_model(*CLAUDE_MODEL)
                 print("✅ Claude Sonnet 4 client initialized")
             except Exception as e:
                 print(f"❌ Claude initialization error: {e}")
     
+    async def openai_chat(
+        self,
+        messages: List[Dict[str, str]],
+        model: str = "gpt-4o",
+        temperature: float = 0.7,
+        max_tokens: int = 2000,
+        cache: bool = True,
+        **kwargs
+    ) -> str:
+        """Appel OpenAI non bloquant via le pool partagé (borné par LLM_OPENAI_CONCURRENCY)
+
+        cache=False pour les appels créatifs (réponse différente attendue à chaque fois).
+        """
+        if not self.openai_client:
+            raise Exception("OpenAI client not initialized")
+        key, cached = await self._cache_lookup("openai", model, messages, temperature, max_tokens, cache, **kwargs)
+        if cached is not None:
+            return cached
+        async with self._semaphores["openai"]:
+            response = await timed(self.health["openai"], self.openai_client.chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                **kwargs
+            ))
+        result = response.choices[0].message.content
+        if key:
+            await llm_cache.put(key, result, "openai", model)
+        return result
+    
+    async def openai_chat_stream(
+        self,
+        messages: List[Dict[str, str]],
+        model: str = "gpt-4o",
+        temperature: float = 0.7,
+        max_tokens: int = 2000
+    ) -> AsyncIterator[str]:
+        """Tokens OpenAI au fil de l'eau (stream=True), même pool et même sémaphore ; jamais mis en cache"""
+        if not self.openai_client:
+            raise Exception("OpenAI client not initialized")
+        health = self.health["openai"]
+        async with self._semaphores["openai"]:
+            health.call_started()
+            started = time.monotonic()
+            try:
+                stream = await self.openai_client.chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                    stream=True
+                )
+                async for chunk in stream:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+            except (asyncio.CancelledError, GeneratorExit):
+                health._trial_in_flight = False
+                raise
+            except Exception:
+                health.record_failure()
+                raise
+            health.record_success(time.monotonic() - started)
+    
+    async def claude_completion(self, prompt: str, system_message: Optional[str] = None,
+                                session_id: str = "backup-system", cache: bool = True) -> str:
+        """Appel Claude borné par LLM_CLAUDE_CONCURRENCY (system message spécifique optionnel)"""
+        cache_messages = [
+            {"role": "system", "content": system_message or CLAUDE_DEFAULT_SYSTEM},
+            {"role": "user", "content": prompt}
+        ]
+        key, cached = await self._cache_lookup("claude", CLAUDE_MODEL[1], cache_messages, None, None, cache)
+        if cached is not None:
+            return cached
+        if system_message:
+            if not (CLAUDE_AVAILABLE and CLAUDE_API_KEY):
+                raise Exception("Claude not available or API key missing")
+            chat = LlmChat(
+                api_key=CLAUDE_API_KEY,
+                session_id=session_id,
+                system_message=system_message
+            ).with_model(*CLAUDE_MODEL)
+        elif self.claude_chat:
+            chat = self.claude_chat
+        else:
+            raise Exception("Claude client not initialized")
+        async with self._semaphores["claude"]:
+            result = await timed(self.health["claude"], chat.send_message(UserMessage(text=prompt)))
+        if key:
+            await llm_cache.put(key, result, "claude", CLAUDE_MODEL[1])
+        return result
+    
+    async def _cache_lookup(self, provider: str, model: str, messages, temperature, max_tokens,
+                            cache: bool, **params) -> tuple:
+        """(clé de cache, réponse en cache ou None) ; clé None quand le cache est désactivé"""
+        if not (cache and llm_cache.LLM_CACHE_ENABLED):
+            llm_cache.bypass()
+            return None, None
+        key = llm_cache.cache_key(provider, model, messages, temperature, max_tokens, **params)
+        cached = await llm_cache.get(key)
+        if cached is not None:
+            logging.info(f"♻️ LLM cache hit ({provider})")
+        return key, cached
+    
+    def router_stats(self) -> Dict[str, Any]:
+        """Latence p50/p95, taux d'erreur et état du circuit breaker par fournisseur"""
+        return {name: health.stats() for name, health in self.health.items()}
+    
+    def _provider_configured(self, provider: str) -> bool:
+        return bool(self.openai_client) if provider == "openai" else bool(self.claude_chat)
+    
+    def cache_stats(self) -> Dict[str, Any]:
+        """Compteurs du cache de réponses LLM (hits mémoire/Mongo, misses, bypass)"""
+        return llm_cache.stats()
+    
+    async def close(self):
+        """Ferme le pool HTTP OpenAI (shutdown de l'API)"""
+        if self.openai_client:
+            await self.openai_client.close()
+    
     def select_primary_llm(
         self,
         business_objective: str = "equilibre",
@@ -122,7 +279,8 @@ class LLMBackupSystem:
         model: str = "gpt-4o",
         temperature: float = 0.7,
         max_tokens: int = 2000,
-        system_message: Optional[str] = None
+        system_message: Optional[str] = None,
+        cache: bool = True
     ) -> str:
         """
         Génère une completion avec sélection intelligente LLM selon la stratégie business
@@ -142,70 +300,48 @@ class LLMBackupSystem:
             content = msg.get("content", "")
             full_prompt += f"{role.capitalize()}: {content}\n\n"
         
-        # Tentative 1: LLM primaire
-        try:
-            if primary_llm == "openai" and self.openai_client:
-                logging.info(f"🚀 Primary OpenAI (objective: {business_objective}, platform: {platform})...")
-                
-                response = self.openai_client.chat.completions.create(
-                    model=model,
-                    messages=messages,
-                    temperature=temperature,
-                    max_tokens=max_tokens
-                )
-                
-                result = response.choices[0].message.content
-                logging.info(f"✅ OpenAI primary réussi - {len(result)} chars")
-                return result
-                
-            elif primary_llm == "claude" and self.claude_chat:
-                logging.info(f"🧠 Primary Claude (objective: {business_objective}, platform: {platform})...")
-                
-                user_message = UserMessage(text=full_prompt.strip())
-                response = await self.claude_chat.send_message(user_message)
-                
-                logging.info(f"✅ Claude primary réussi - {len(response)} chars")
-                return response
-                
-        except Exception as primary_error:
-            logging.error(f"❌ Primary {primary_llm} échoué: {primary_error}")
-            print(f"⚠️ Primary {primary_llm} failed, trying {backup_llm} backup...")
+        # Fournisseurs configurés ; un fournisseur dont le circuit breaker est ouvert passe en dernier
+        providers = [p for p in (primary_llm, backup_llm) if self._provider_configured(p)]
+        providers.sort(key=lambda p: not self.health[p].available())
+        if not providers:
+            raise Exception(f"Both {primary_llm} (primary) and {backup_llm} (backup) unavailable")
+        if providers[0] != primary_llm:
+            print(f"🔌 {primary_llm} unavailable (circuit open or not configured), routing to {providers[0]}")
+        
+        def call(provider: str):
+            async def run() -> str:
+                if provider == "openai":
+                    return await self.openai_chat(
+                        messages=messages,
+                        model=model,
+                        temperature=temperature,
+                        max_tokens=max_tokens,
+                        cache=cache
+                    )
+                return await self.claude_completion(full_prompt.strip(), cache=cache)
+            return (provider, run)
+        
+        first = providers[0]
+        second = providers[1] if len(providers) > 1 and self.health[providers[1]].available() else None
+        logging.info(f"🚀 Primary {first} (objective: {business_objective}, platform: {platform})...")
         
-        # Tentative 2: LLM backup
+        # Backup lancé si le primaire dépasse son p95 (ou échoue) ; le premier qui répond gagne
         try:
-            if backup_llm == "openai" and self.openai_client:
-                logging.info(f"🔄 Backup OpenAI...")
-                
-                response = self.openai_client.chat.completions.create(
-                    model=model,
-                    messages=messages,
-                    temperature=temperature,
-                    max_tokens=max_tokens
-                )
-                
-                result = response.choices[0].message.content
-                logging.info(f"✅ OpenAI backup réussi - {len(result)} chars")
-                print("✅ OpenAI backup successful!")
-                return result
-                
-            elif backup_llm == "claude" and self.claude_chat:
-                logging.info(f"🔄 Backup Claude...")
-                
-                user_message = UserMessage(text=full_prompt.strip())
-                response = await self.claude_chat.send_message(user_message)
-                
-                logging.info(f"✅ Claude backup réussi - {len(response)} chars")
-                print("✅ Claude backup successful!")
-                return response
-                
-        except Exception as backup_error:
-            logging.error(f"❌ Backup {backup_llm} échoué: {backup_error}")
-            print(f"❌ Backup {backup_llm} failed: {str(backup_error)[:100]}...")
+            winner, result = await hedged(
+                call(first),
+                call(second) if second else None,
+                delay=self.health[first].hedge_delay()
+            )
+        except Exception as error:
+            error_msg = f"Both {primary_llm} (primary) and {backup_llm} (backup) failed: {error}"
+            logging.error(error_msg)
+            raise Exception(error_msg)
         
-        # Si les deux échouent
-        error_msg = f"Both {primary_llm} (primary) and {backup_llm} (backup) failed"
-        logging.error(error_msg)
-        raise Exception(error_msg)
+        if winner != first:
+            self.health[winner].backup_wins += 1
+            print(f"✅ {winner.capitalize()} backup successful!")
+        logging.info(f"✅ {winner} réussi - {len(result)} chars")
+        return result
     
     async def generate_completion(
         self,
@@ -213,7 +349,8 @@ class LLMBackupSystem:
         model: str = "gpt-4o",
         temperature: float = 0.7,
         max_tokens: int = 2000,
-        system_message: Optional[str] = None
+        system_message: Optional[str] = None,
+        cache: bool = True
     ) -> str:
         """
         Génère une completion avec backup automatique (mode compatible ancien système)
@@ -227,7 +364,8 @@ class LLMBackupSystem:
             model=model,
             temperature=temperature,
             max_tokens=max_tokens,
-            system_message=system_message
+            system_message=system_message,
+            cache=cache
         )
     
     async def analyze_website_content(
@@ -0,0 +1,144 @@
+# llm_cache.py
+"""Content-addressed cache of LLM responses.
+
+Key = sha256 of (provider, model, messages, temperature, max_tokens, tenant), so
+an identical deterministic call (re-analysis of an unchanged page, comparison
+endpoints, retry after a timeout) is answered without tokens or latency.
+
+- front: bounded in-process LRU (per uvicorn worker), keyed (owner_id, key)
+- back: `llm_cache` collection, TTL index on `expires_at` (LLM_CACHE_TTL_HOURS)
+
+Entries are scoped to the tenant set with set_cache_owner() for the current
+task (request handler, job, scheduler iteration); evict_owner() drops one
+tenant's entries. Creative calls opt out with cache=False on the
+LLMBackupSystem methods; LLM_CACHE_ENABLED=false disables the cache entirely.
+"""
+import hashlib
+import json
+import os
+from contextvars import ContextVar
+from datetime import datetime, timedelta
+from typing import Optional, Dict, Any, List
+
+from async_database import get_async_database
+from memory_cache import LRUCache
+
+LLM_CACHE_ENABLED = os.environ.get("LLM_CACHE_ENABLED", "true").lower() == "true"
+LLM_CACHE_TTL_HOURS = int(os.environ.get("LLM_CACHE_TTL_HOURS", "168"))
+LLM_CACHE_MEMORY_ENTRIES = int(os.environ.get("LLM_CACHE_MEMORY_ENTRIES", "1000"))
+LLM_CACHE_MEMORY_BYTES = int(os.environ.get("LLM_CACHE_MEMORY_MB", "16")) * 1024 * 1024
+
+CACHE_COLLECTION = "llm_cache"
+
+_owner: ContextVar[Optional[str]] = ContextVar("llm_cache_owner", default=None)
+_memory = LRUCache(
+    max_entries=LLM_CACHE_MEMORY_ENTRIES,
+    max_bytes=LLM_CACHE_MEMORY_BYTES,
+    sizeof=lambda entry: len(entry["response"].encode("utf-8"))
+)
+_counters = {"memory_hits": 0, "mongo_hits": 0, "misses": 0, "stores": 0, "bypassed": 0, "errors": 0}
+_indexes_ready = False
+
+
+def set_cache_owner(owner_id: Optional[str]):
+    """Scope the LLM calls of the current task to a tenant"""
+    _owner.set(owner_id)
+
+
+def cache_key(provider: str, model: str, messages: List[Dict[str, str]],
+              temperature: Optional[float], max_tokens: Optional[int], **params) -> str:
+    payload = json.dumps({
+        "provider": provider,
+        "model": model,
+        "messages": messages,
+        "temperature": temperature,
+        "max_tokens": max_tokens,
+        "params": params,
+        "owner_id": _owner.get(),
+    }, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _collection():
+    return get_async_database().db[CACHE_COLLECTION]
+
+
+async def _ensure_indexes():
+    global _indexes_ready
+    if _indexes_ready:
+        return
+    try:
+        await _collection().create_index("key", unique=True)
+        await _collection().create_index("owner_id")
+        await _collection().create_index("expires_at", expireAfterSeconds=0)
+    except Exception as e:
+        print(f"⚠️ LLM cache index creation warning: {e}")
+    _indexes_ready = True
+
+
+def bypass():
+    """Count a call made with cache=False"""
+    _counters["bypassed"] += 1
+
+
+async def get(key: str) -> Optional[str]:
+    entry = _memory.get((_owner.get(), key))
+    if entry and entry["expires_at"] > datetime.utcnow():
+        _counters["memory_hits"] += 1
+        return entry["response"]
+    try:
+        doc = await _collection().find_one(
+            {"key": key, "expires_at": {"$gt": datetime.utcnow()}},
+            {"response": 1, "expires_at": 1}
+        )
+    except Exception as e:
+        _counters["errors"] += 1
+        print(f"⚠️ LLM cache read failed: {e}")
+        return None
+    if not doc:
+        _counters["misses"] += 1
+        return None
+    _counters["mongo_hits"] += 1
+    _memory.set((_owner.get(), key), {"response": doc["response"], "expires_at": doc["expires_at"]})
+    return doc["response"]
+
+
+async def put(key: str, response: str, provider: str, model: str):
+    if not response:
+        return
+    now = datetime.utcnow()
+    entry = {
+        "response": response,
+        "expires_at": now + timedelta(hours=LLM_CACHE_TTL_HOURS),
+        "owner_id": _owner.get(),
+    }
+    _memory.set((entry["owner_id"], key), {"response": response, "expires_at": entry["expires_at"]})
+    try:
+        await _ensure_indexes()
+        await _collection().update_one(
+            {"key": key},
+            {"$set": {**entry, "provider": provider, "model": model, "created_at": now}},
+            upsert=True
+        )
+        _counters["stores"] += 1
+    except Exception as e:
+        _counters["errors"] += 1
+        print(f"⚠️ LLM cache write failed: {e}")
+
+
+async def evict_owner(owner_id: str) -> int:
+    """Drop every cached response of one tenant (memory and Mongo)"""
+    _memory.invalidate_where(lambda key: key[0] == owner_id)
+    result = await _collection().delete_many({"owner_id": owner_id})
+    return result.deleted_count
+
+
+def stats() -> Dict[str, Any]:
+    hits = _counters["memory_hits"] + _counters["mongo_hits"]
+    lookups = hits + _counters["misses"]
+    return {
+        "enabled": LLM_CACHE_ENABLED,
+        **_counters,
+        "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+        "memory": _memory.stats(),
+    }
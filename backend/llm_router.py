@@ -0,0 +1,163 @@
+# llm_router.py
+"""Latency-aware routing between LLM providers.
+
+ProviderHealth keeps a rolling window of call latencies and outcomes per
+provider (p50/p95, error rate) and a circuit breaker: after
+LLM_BREAKER_FAILURES consecutive failures (or an error rate above
+LLM_BREAKER_ERROR_RATE over the window) the provider is skipped for
+LLM_BREAKER_COOLDOWN seconds, then a single trial call is let through.
+
+hedged() starts the primary call and, once it has run longer than the
+primary's p95, fires the backup; the first successful answer wins and the
+other call is cancelled.
+"""
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Any, Optional, Tuple
+
+LLM_LATENCY_WINDOW = int(os.environ.get("LLM_LATENCY_WINDOW", "100"))
+LLM_HEDGE_ENABLED = os.environ.get("LLM_HEDGE_ENABLED", "true").lower() == "true"
+LLM_HEDGE_MIN_SAMPLES = int(os.environ.get("LLM_HEDGE_MIN_SAMPLES", "20"))
+LLM_HEDGE_DEFAULT_SECONDS = float(os.environ.get("LLM_HEDGE_DEFAULT_SECONDS", "15"))
+LLM_BREAKER_FAILURES = int(os.environ.get("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_ERROR_RATE = float(os.environ.get("LLM_BREAKER_ERROR_RATE", "0.5"))
+LLM_BREAKER_COOLDOWN = float(os.environ.get("LLM_BREAKER_COOLDOWN", "60"))
+
+
+def _percentile(sorted_values, pct: float) -> Optional[float]:
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(pct * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class ProviderHealth:
+    """Rolling latency / error statistics and circuit breaker of one provider"""
+
+    def __init__(self, name: str, window: int = LLM_LATENCY_WINDOW):
+        self.name = name
+        self._latencies: Deque[float] = deque(maxlen=window)
+        self._outcomes: Deque[bool] = deque(maxlen=window)
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self._trial_in_flight = False
+        self.calls = 0
+        self.failures = 0
+        self.backup_wins = 0
+
+    def record_success(self, latency: float):
+        self.calls += 1
+        self._latencies.append(latency)
+        self._outcomes.append(True)
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        self.calls += 1
+        self.failures += 1
+        self._outcomes.append(False)
+        self.consecutive_failures += 1
+        self._trial_in_flight = False
+        if self.consecutive_failures >= LLM_BREAKER_FAILURES or (
+            len(self._outcomes) >= 10 and self.error_rate() > LLM_BREAKER_ERROR_RATE
+        ):
+            self.open_until = time.monotonic() + LLM_BREAKER_COOLDOWN
+            print(f"🔌 LLM circuit breaker OPEN for {self.name} ({LLM_BREAKER_COOLDOWN:.0f}s)")
+
+    def error_rate(self) -> float:
+        if not self._outcomes:
+            return 0.0
+        return self._outcomes.count(False) / len(self._outcomes)
+
+    def available(self) -> bool:
+        """Closed breaker, or cooldown over and no trial call running (half-open)"""
+        if self.open_until == 0.0:
+            return True
+        return time.monotonic() >= self.open_until and not self._trial_in_flight
+
+    def call_started(self):
+        if self.open_until != 0.0:
+            self._trial_in_flight = True
+
+    def percentile(self, pct: float) -> Optional[float]:
+        return _percentile(sorted(self._latencies), pct)
+
+    def hedge_delay(self) -> float:
+        """Seconds to wait on this provider before firing the backup"""
+        if len(self._latencies) < LLM_HEDGE_MIN_SAMPLES:
+            return LLM_HEDGE_DEFAULT_SECONDS
+        return self.percentile(0.95)
+
+    def stats(self) -> Dict[str, Any]:
+        p50, p95 = self.percentile(0.5), self.percentile(0.95)
+        return {
+            "calls": self.calls,
+            "failures": self.failures,
+            "error_rate": round(self.error_rate(), 3),
+            "p50_s": round(p50, 2) if p50 is not None else None,
+            "p95_s": round(p95, 2) if p95 is not None else None,
+            "circuit_open": self.open_until > time.monotonic(),
+            "backup_wins": self.backup_wins,
+        }
+
+
+async def timed(health: ProviderHealth, call: Awaitable[str]) -> str:
+    """Await a provider call and record its latency / failure (cancellation is not a failure)"""
+    health.call_started()
+    started = time.monotonic()
+    try:
+        result = await call
+    except asyncio.CancelledError:
+        health._trial_in_flight = False
+        raise
+    except Exception:
+        health.record_failure()
+        raise
+    health.record_success(time.monotonic() - started)
+    return result
+
+
+async def hedged(primary: Tuple[str, Callable[[], Awaitable[str]]],
+                 backup: Optional[Tuple[str, Callable[[], Awaitable[str]]]],
+                 delay: float) -> Tuple[str, str]:
+    """Run primary; start backup after `delay` seconds (or on primary failure).
+
+    Returns (provider, response) of the first successful call; the slower call is
+    cancelled. Raises the last error when every started call failed.
+    """
+    primary_name, primary_call = primary
+    tasks: Dict[asyncio.Task, str] = {asyncio.create_task(primary_call()): primary_name}
+    backup_started = backup is None
+    last_error: Optional[BaseException] = None
+
+    try:
+        while tasks:
+            timeout = delay if (LLM_HEDGE_ENABLED and not backup_started) else None
+            done, _ = await asyncio.wait(tasks.keys(), timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+            if not done:
+                # Primary slower than its p95: hedge with the backup
+                print(f"⏱️ {primary_name} slower than {delay:.1f}s, hedging with {backup[0]}")
+                tasks[asyncio.create_task(backup[1]())] = backup[0]
+                backup_started = True
+                continue
+
+            for task in done:
+                name = tasks.pop(task)
+                if task.exception() is None:
+                    return name, task.result()
+                last_error = task.exception()
+                print(f"⚠️ {name} failed: {str(last_error)[:100]}")
+
+            if not backup_started:
+                # Primary failed before the hedge delay: backup immediately
+                tasks[asyncio.create_task(backup[1]())] = backup[0]
+                backup_started = True
+    finally:
+        for task in tasks:
+            task.cancel()
+
+    raise last_error or Exception("No LLM provider available")
@@ -0,0 +1,147 @@
+# media_resolver.py
+"""Public image URLs and publish-ready image bytes of the social publications.
+
+Images of our own library are referenced by their public URL
+({REACT_APP_BACKEND_URL}/api/public/image/{id}.jpg, built by
+convert_to_public_image_url from the protected /api/content URLs). Downloading that URL from the API itself
+made every publication go API -> internet -> API -> GridFS. resolve_publish_image()
+recognises our URLs and reads the JPEG straight from the derivative cache
+(rendered once per media, see derivatives.py), falling back to the original
+bytes when rendering fails.
+
+Only external images (Pixabay, media stored as an external URL, foreign hosts)
+are still downloaded over HTTP, then rendered to JPEG in the image pipeline.
+"""
+import os
+import re
+from typing import Optional, Dict, Any
+from urllib.parse import urlparse
+
+from async_database import get_async_database
+from derivatives import get_or_create_publish_jpeg, open_derivative, read_source_bytes
+from http_clients import get_client
+from image_pipeline import run_image_job, render_publish_jpeg
+
+PUBLIC_IMAGE_PATH = re.compile(r"^/api/public/image/([^/.]+)(\.(jpg|webp))?$")
+
+
+class ImageUnavailable(Exception):
+    """The image of a post could not be resolved nor downloaded"""
+
+
+def convert_to_public_image_url(image_url: str) -> str:
+    """Convertir URL protégée en URL publique accessible par Facebook (avec support carousel)"""
+    if not image_url:
+        return None
+    
+    # Si c'est déjà une URL publique externe, la garder
+    if image_url.startswith("http") and not "/api/" in image_url:
+        return image_url
+    
+    backend_url = os.environ.get('REACT_APP_BACKEND_URL', 'https://claire-marcus.com')
+    
+    # CORRECTION CHATGPT: Support des carousels
+    if "carousel_" in image_url:
+        # Exemple : /api/content/carousel/carousel_90e5d8c2... ➜ id = 90e5d8c2...
+        match = re.search(r'carousel_([^/.]+)', image_url)
+        if match:
+            file_id = match.group(1)
+            print(f"🔄 Converting carousel URL: {image_url} → /api/public/image/{file_id}.jpg")
+            return f"{backend_url}/api/public/image/{file_id}.jpg"
+    
+    # Si c'est une URL protégée /api/content/{id}/file, convertir
+    if "/api/content/" in image_url and "/file" in image_url:
+        # Extraire l'ID du fichier
+        match = re.search(r'/api/content/([^/]+)/file', image_url)
+        if match:
+            file_id = match.group(1)
+            print(f"🔄 Converting content URL: {image_url} → /api/public/image/{file_id}.jpg")
+            return f"{backend_url}/api/public/image/{file_id}.jpg"
+    
+    # Support uploads/ (selon ChatGPT)
+    if "uploads/" in image_url:
+        # Extraire l'ID du fichier uploads
+        match = re.search(r'uploads/[^/]+/([^/.]+)', image_url)
+        if match:
+            file_id = match.group(1)
+            print(f"🔄 Converting uploads URL: {image_url} → /api/public/image/{file_id}.jpg")
+            return f"{backend_url}/api/public/image/{file_id}.jpg"
+    
+    # Si c'est une URL relative, la convertir en absolue
+    if image_url.startswith("/"):
+        return f"{backend_url}{image_url}"
+    
+    # Sinon, retourner telle quelle
+    return image_url
+
+
+def _backend_host() -> str:
+    return urlparse(os.environ.get('REACT_APP_BACKEND_URL', 'https://claire-marcus.com')).netloc.lower()
+
+
+def local_media_id(image_url: str) -> Optional[str]:
+    """Media id when image_url is one of our public image URLs (absolute or relative)"""
+    if not image_url:
+        return None
+    parsed = urlparse(image_url)
+    if parsed.netloc and parsed.netloc.lower() != _backend_host():
+        return None
+    match = PUBLIC_IMAGE_PATH.match(parsed.path)
+    return match.group(1) if match else None
+
+
+async def _resolve_local(media_id: str) -> Optional[Dict[str, Any]]:
+    """JPEG of a library media (external URL media are downloaded); None when unknown"""
+    media_item = await get_async_database().media.find_public(media_id)
+    if not media_item:
+        return None
+    url = media_item.get("url", "")
+    if url and url.startswith("http"):
+        return await _download(url)
+
+    try:
+        derivative = await get_or_create_publish_jpeg(media_item)
+    except Exception as e:
+        print(f"❌ Publish JPEG rendering failed for {media_id}, using original: {e}")
+        original_bytes = await read_source_bytes(media_item)
+        if not original_bytes:
+            raise ImageUnavailable(f"Fichier image introuvable: {media_id}")
+        return {"data": original_bytes, "content_type": media_item.get("file_type") or "image/jpeg",
+                "source": "original"}
+
+    if not derivative:
+        raise ImageUnavailable(f"Fichier image introuvable: {media_id}")
+    grid_out = await open_derivative(derivative)
+    return {"data": await grid_out.read(), "content_type": "image/jpeg", "source": "derivative"}
+
+
+async def _download(image_url: str) -> Dict[str, Any]:
+    """Download an external image and render it as a publish JPEG"""
+    response = await get_client().get(image_url)
+    if response.status_code != 200:
+        raise ImageUnavailable(f"Impossible de télécharger l'image: {response.status_code} - {image_url}")
+    original_bytes = response.content
+    try:
+        return {"data": await run_image_job(render_publish_jpeg, original_bytes), "content_type": "image/jpeg",
+                "source": "http"}
+    except Exception as e:
+        print(f"❌ Erreur conversion JPG: {e}")
+        return {"data": original_bytes, "content_type": response.headers.get('Content-Type', 'image/jpeg'),
+                "source": "http"}
+
+
+async def resolve_publish_image(image_url: str) -> Dict[str, Any]:
+    """{"data", "content_type", "source"} of the image to upload ("derivative", "original" or "http")
+
+    Raises ImageUnavailable when the image cannot be obtained.
+    """
+    media_id = local_media_id(image_url)
+    if media_id:
+        resolved = await _resolve_local(media_id)
+        if not resolved:
+            # Notre endpoint public répondrait 404 : inutile de le télécharger
+            raise ImageUnavailable(f"Image introuvable: {media_id}")
+        return resolved
+    if not image_url.startswith("http"):
+        raise ImageUnavailable(f"URL d'image invalide: {image_url}")
+    return await _download(image_url)
@@ -0,0 +1,137 @@
+# memory_cache.py
+"""Bounded in-process LRU caches for hot media lookups.
+
+- media_ref_cache: (owner_id, file_id as requested) -> resolved media reference
+  (skips the UUID / ObjectId / external_id probing on every thumbnail request)
+- thumbnail_cache: (media_id, width, variant keys) -> thumbnail bytes + validators,
+  evicted by total byte size
+
+Per process (each uvicorn worker has its own); entries are invalidated when a
+media item is deleted or its thumbnail is rewritten in this process. Writes made
+by another instance or a standalone thumbnail worker are not seen here, so both
+caches also expire their entries (MEDIA_REF_CACHE_TTL_SECONDS,
+THUMB_CACHE_TTL_SECONDS): a deleted media or rebuilt thumbnail is served stale
+for at most that long.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+class LRUCache:
+    """Thread-safe LRU bounded by entry count and (optionally) total size in bytes.
+
+    With `ttl` (seconds) entries also expire that long after being set.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: Optional[int] = None,
+                 sizeof: Callable[[Any], int] = lambda value: 0, ttl: Optional[float] = None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._sizeof = sizeof
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._sizes: Dict[Hashable, int] = {}
+        self._expires: Dict[Hashable, float] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            if key not in self._data:
+                self.misses += 1
+                return None
+            if self.ttl is not None and self._expires.get(key, 0) <= time.monotonic():
+                self._pop_locked(key)
+                self.expired += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return self._data[key]
+
+    def set(self, key: Hashable, value: Any):
+        size = self._sizeof(value)
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        with self._lock:
+            self._pop_locked(key)
+            self._data[key] = value
+            self._sizes[key] = size
+            if self.ttl is not None:
+                self._expires[key] = time.monotonic() + self.ttl
+            self._bytes += size
+            while self._data and (
+                len(self._data) > self.max_entries
+                or (self.max_bytes is not None and self._bytes > self.max_bytes)
+            ):
+                oldest = next(iter(self._data))
+                self._pop_locked(oldest)
+
+    def pop(self, key: Hashable):
+        with self._lock:
+            self._pop_locked(key)
+
+    def invalidate_where(self, predicate: Callable[[Hashable], bool]) -> int:
+        """Drop every entry whose key matches (linear scan, used on delete/rewrite)"""
+        with self._lock:
+            keys = [k for k in self._data if predicate(k)]
+            for k in keys:
+                self._pop_locked(k)
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._sizes.clear()
+            self._expires.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._data),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "expired": self.expired,
+        }
+
+    def _pop_locked(self, key: Hashable):
+        if key in self._data:
+            del self._data[key]
+            self._bytes -= self._sizes.pop(key, 0)
+            self._expires.pop(key, None)
+
+
+MEDIA_REF_CACHE_SIZE = int(os.environ.get("MEDIA_REF_CACHE_SIZE", "10000"))
+MEDIA_REF_CACHE_TTL_SECONDS = float(os.environ.get("MEDIA_REF_CACHE_TTL_SECONDS", "300"))
+THUMB_CACHE_MAX_BYTES = int(os.environ.get("THUMB_CACHE_MAX_MB", "64")) * 1024 * 1024
+THUMB_CACHE_TTL_SECONDS = float(os.environ.get("THUMB_CACHE_TTL_SECONDS", "60"))
+
+media_ref_cache = LRUCache(max_entries=MEDIA_REF_CACHE_SIZE, ttl=MEDIA_REF_CACHE_TTL_SECONDS)
+thumbnail_cache = LRUCache(
+    max_entries=MEDIA_REF_CACHE_SIZE,
+    max_bytes=THUMB_CACHE_MAX_BYTES,
+    sizeof=lambda entry: len(entry["data"]),
+    ttl=THUMB_CACHE_TTL_SECONDS
+)
+
+
+def invalidate_thumbnail(media_id):
+    """Forget cached thumbnail bytes of one media (thumbnail rewritten or deleted)"""
+    thumbnail_cache.invalidate_where(lambda key: key[0] == media_id)
+
+
+def invalidate_media(media_doc: Optional[Dict[str, Any]]):
+    """Forget everything cached for a media document (delete)"""
+    if not media_doc:
+        return
+    ids = {v for v in (media_doc.get("_id"), media_doc.get("id")) if v is not None}
+    aliases = {str(v) for v in (media_doc.get("_id"), media_doc.get("id"), media_doc.get("external_id")) if v}
+    thumbnail_cache.invalidate_where(lambda key: key[0] in ids)
+    media_ref_cache.invalidate_where(lambda key: key[1] in aliases)
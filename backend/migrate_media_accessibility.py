@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+🔧 MIGRATION SCRIPT - MEDIA ACCESSIBILITY FLAG
+
+/api/content/pending now paginates in MongoDB on the
+(owner_id, deleted, created_at, _id) index and only returns documents flagged
+`accessible: True`. New uploads, Pixabay saves and repair scripts write the flag;
+this script backfills existing documents:
+- `deleted` missing → False (the index query uses equality on deleted)
+- `created_at` stored as ISO string → datetime (keyset cursors compare dates);
+  missing or unreadable dates use the ObjectId creation time
+- `accessible` computed once (disk file / GridFS original / external URL)
+
+Usage: python migrate_media_accessibility.py [--all]
+  --all  recompute the flag even on documents that already have it
+"""
+
+import sys
+from datetime import datetime
+from bson import ObjectId
+from pymongo import UpdateOne
+from database import get_database
+
+BATCH_SIZE = 500
+
+def main():
+    recompute_all = "--all" in sys.argv
+
+    print("🔧 Starting media accessibility migration...")
+    print(f"⏰ Migration started at: {datetime.utcnow().isoformat()}")
+
+    dbm = get_database()
+    if not dbm.is_connected():
+        print("❌ Database not connected!")
+        sys.exit(1)
+
+    media_collection = dbm.db.media
+
+    # 1. Normaliser le champ deleted
+    result = media_collection.update_many({"deleted": {"$exists": False}}, {"$set": {"deleted": False}})
+    print(f"✅ deleted=False set on {result.modified_count} documents")
+
+    # 2. Calculer le flag accessible
+    query = {} if recompute_all else {"accessible": {"$exists": False}}
+    projection = {"deleted": 1, "file_path": 1, "gridfs_id": 1, "grid_file_id": 1, "url": 1, "created_at": 1}
+
+    ops = []
+    accessible_count = 0
+    inaccessible_count = 0
+    checked_at = datetime.utcnow()
+
+    for doc in media_collection.find(query, projection):
+        update = {"accessibility_checked_at": checked_at}
+
+        accessible = dbm.compute_media_accessibility(doc)
+        update["accessible"] = accessible
+        if accessible:
+            accessible_count += 1
+        else:
+            inaccessible_count += 1
+
+        created_at = doc.get("created_at")
+        if not isinstance(created_at, datetime):
+            try:
+                update["created_at"] = datetime.fromisoformat(created_at.replace("Z", "+00:00")).replace(tzinfo=None)
+            except (AttributeError, ValueError):
+                # Date absente ou illisible : date de création de l'ObjectId
+                if isinstance(doc["_id"], ObjectId):
+                    update["created_at"] = doc["_id"].generation_time.replace(tzinfo=None)
+
+        ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": update}))
+        if len(ops) >= BATCH_SIZE:
+            media_collection.bulk_write(ops, ordered=False)
+            ops = []
+
+    if ops:
+        media_collection.bulk_write(ops, ordered=False)
+
+    print("\n🎉 Migration complete!")
+    print(f"   Accessible: {accessible_count}")
+    print(f"   Not accessible: {inaccessible_count}")
+
+if __name__ == "__main__":
+    main()
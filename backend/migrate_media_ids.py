@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+🔧 MIGRATION SCRIPT - CANONICAL MEDIA IDS
+
+Media documents are addressed by one canonical string `id` (unique index):
+- documents without `id` get `id = str(_id)`, so existing URLs built from the
+  ObjectId keep working
+- legacy identifiers (ObjectId string when it differs from `id`, `external_id`,
+  `file_id`) are written to the compact `media_aliases` collection
+  ({alias, owner_id} → media_id)
+- thumbnails keyed by ObjectId are re-keyed to the canonical `id`
+
+After this runs, parse_any_id() and the thumbnail endpoint resolve media with a
+single indexed equality on `id` (aliases only on a miss).
+
+Usage: python migrate_media_ids.py
+"""
+
+import sys
+from datetime import datetime
+from pymongo import UpdateOne, DeleteOne
+from database import get_database
+
+BATCH_SIZE = 500
+
+
+def _flush(collection, ops):
+    if ops:
+        collection.bulk_write(ops, ordered=False)
+    return []
+
+
+def main():
+    print("🔧 Starting canonical media id migration...")
+    print(f"⏰ Migration started at: {datetime.utcnow().isoformat()}")
+
+    dbm = get_database()
+    if not dbm.is_connected():
+        print("❌ Database not connected!")
+        sys.exit(1)
+
+    db = dbm.db
+    media_collection = db.media
+
+    # 1. Donner un id canonique à chaque média
+    ops = []
+    assigned = 0
+    for doc in media_collection.find({"$or": [{"id": {"$exists": False}}, {"id": None}, {"id": ""}]}, {"_id": 1}):
+        ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"id": str(doc["_id"])}}))
+        assigned += 1
+        if len(ops) >= BATCH_SIZE:
+            ops = _flush(media_collection, ops)
+    _flush(media_collection, ops)
+    print(f"✅ id assigned on {assigned} documents")
+
+    # 2. Table d'alias pour les identifiants hérités
+    ops = []
+    aliases = 0
+    projection = {"_id": 1, "id": 1, "owner_id": 1, "external_id": 1, "file_id": 1}
+    for doc in media_collection.find({}, projection):
+        canonical = doc["id"]
+        for alias in {str(doc["_id"]), doc.get("external_id"), doc.get("file_id")}:
+            if not alias or alias == canonical:
+                continue
+            ops.append(UpdateOne(
+                {"alias": str(alias), "owner_id": doc.get("owner_id")},
+                {"$set": {"media_id": canonical}},
+                upsert=True
+            ))
+            aliases += 1
+            if len(ops) >= BATCH_SIZE:
+                ops = _flush(db.media_aliases, ops)
+    _flush(db.media_aliases, ops)
+    print(f"✅ {aliases} aliases written")
+
+    # 3. Vignettes indexées par ObjectId → id canonique
+    ops = []
+    rekeyed = 0
+    duplicates = 0
+    for thumb in db.thumbnails.find({"media_id": {"$not": {"$type": "string"}}}, {"_id": 1, "media_id": 1}):
+        media = media_collection.find_one({"_id": thumb["media_id"]}, {"id": 1})
+        if not media:
+            continue
+        if db.thumbnails.find_one({"media_id": media["id"]}, {"_id": 1}):
+            # A thumbnail already exists under the canonical id: keep that one
+            ops.append(DeleteOne({"_id": thumb["_id"]}))
+            duplicates += 1
+        else:
+            ops.append(UpdateOne({"_id": thumb["_id"]}, {"$set": {"media_id": media["id"]}}))
+            rekeyed += 1
+        if len(ops) >= BATCH_SIZE:
+            ops = _flush(db.thumbnails, ops)
+    _flush(db.thumbnails, ops)
+    print(f"✅ {rekeyed} thumbnails re-keyed, {duplicates} duplicates removed")
+
+    # 4. thumb_url pointant vers l'id canonique
+    ops = []
+    for doc in media_collection.find({}, {"id": 1, "thumb_url": 1}):
+        thumb_url = f"/api/content/{doc['id']}/thumb"
+        if doc.get("thumb_url", "").startswith("/api/content/") and doc.get("thumb_url") != thumb_url:
+            ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"thumb_url": thumb_url}}))
+            if len(ops) >= BATCH_SIZE:
+                ops = _flush(media_collection, ops)
+    _flush(media_collection, ops)
+
+    # 5. Index uniques
+    dbm._initialize_collections()
+
+    print("\n🎉 Migration complete!")
+
+
+if __name__ == "__main__":
+    main()
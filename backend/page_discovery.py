@@ -0,0 +1,217 @@
+# page_discovery.py
+"""Candidate pages of a website for the analyzer.
+
+Sources, merged into one candidate table {url: {"lastmod", "text"}}:
+- robots.txt: `Sitemap:` entries and the `Disallow:` rules of `User-agent: *`
+- sitemaps (default /sitemap.xml), sitemap indexes followed up to
+  SITEMAP_MAX_FILES, parsed incrementally while they download (also .xml.gz)
+- links of the homepage, with their anchor text
+
+rank_pages() scores candidates with IMPORTANT_KEYWORDS (path + anchor text),
+URL depth, query strings and sitemap lastmod, and keeps the top N.
+"""
+import os
+import zlib
+import xml.etree.ElementTree as ET
+from datetime import datetime
+from typing import Optional, Dict, Any, List, Tuple
+from urllib.parse import urljoin, urlparse
+
+from bs4 import BeautifulSoup
+
+import web_fetcher
+
+WEBSITE_DISCOVERY_BUDGET = float(os.environ.get("WEBSITE_DISCOVERY_BUDGET_SECONDS", "8"))
+SITEMAP_MAX_URLS = int(os.environ.get("SITEMAP_MAX_URLS", "5000"))
+SITEMAP_MAX_FILES = int(os.environ.get("SITEMAP_MAX_FILES", "10"))
+SITEMAP_MAX_BYTES = int(os.environ.get("SITEMAP_MAX_BYTES", str(10_000_000)))
+
+# Keywords to look for in URLs and link text
+IMPORTANT_KEYWORDS = [
+    'about', 'qui-sommes-nous', 'notre-histoire', 'entreprise',
+    'services', 'produits', 'solutions', 'offres',
+    'contact', 'contacts', 'nous-contacter',
+    'concept', 'notre-concept', 'philosophie',
+    'portfolio', 'realisations', 'projets',
+    'equipe', 'team', 'notre-equipe'
+]
+
+# Skip technical pages
+SKIP_KEYWORDS = [
+    'mentions-legales', 'legal', 'privacy', 'cookies', 'cgv', 'cgu',
+    'terms', 'politique', 'sitemap', 'admin', 'login', 'wp-',
+    'feed', 'rss', 'xml'
+]
+
+NON_HTML_EXTENSIONS = ('.pdf', '.jpg', '.jpeg', '.png', '.gif', '.webp', '.svg', '.zip', '.mp4', '.mp3', '.doc', '.docx')
+
+Candidates = Dict[str, Dict[str, Any]]
+
+
+def _site(netloc: str) -> str:
+    netloc = netloc.lower()
+    return netloc[4:] if netloc.startswith("www.") else netloc
+
+
+def _url_key(url: str) -> str:
+    parsed = urlparse(url)
+    return f"{_site(parsed.netloc)}{parsed.path.rstrip('/')}?{parsed.query}"
+
+
+def _local(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+
+def add_candidate(candidates: Candidates, url: str, lastmod: Optional[str] = None, text: str = ""):
+    url = url.split("#", 1)[0]
+    entry = candidates.setdefault(url, {"lastmod": None, "text": ""})
+    entry["lastmod"] = entry["lastmod"] or lastmod
+    entry["text"] = entry["text"] or text
+
+
+# ----------------------------
+# robots.txt / sitemaps
+# ----------------------------
+
+def parse_robots_txt(text: str) -> Tuple[List[str], List[str]]:
+    """(sitemap URLs, Disallow prefixes applying to every user agent)"""
+    sitemaps, disallowed = [], []
+    agents, in_rules = [], False
+    for raw_line in text.splitlines():
+        line = raw_line.split("#", 1)[0].strip()
+        if ":" not in line:
+            continue
+        field, value = (part.strip() for part in line.split(":", 1))
+        field = field.lower()
+        if field == "sitemap" and value:
+            sitemaps.append(value)
+        elif field == "user-agent":
+            if in_rules:
+                agents, in_rules = [], False
+            agents.append(value)
+        elif field in ("disallow", "allow"):
+            in_rules = True
+            if field == "disallow" and value and "*" in agents:
+                disallowed.append(value.split("*", 1)[0])
+    return sitemaps, [prefix for prefix in disallowed if prefix]
+
+
+async def read_robots(base_url: str) -> Tuple[List[str], List[str]]:
+    page = await web_fetcher.fetch(urljoin(base_url, "/robots.txt"), max_bytes=500_000, html_only=False)
+    if "error" in page or page["status"] != 200:
+        return [], []
+    return parse_robots_txt(page["body"].decode("utf-8", errors="replace"))
+
+
+async def stream_sitemap(url: str, candidates: Candidates, nested: List[str]):
+    """Parse one sitemap while it downloads: <url> entries -> candidates, <sitemap> -> nested"""
+    parser = ET.XMLPullParser(events=("end",))
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS) if url.endswith(".gz") else None
+    async for chunk in web_fetcher.stream(url, max_bytes=SITEMAP_MAX_BYTES):
+        parser.feed(decompressor.decompress(chunk) if decompressor else chunk)
+        for _, elem in parser.read_events():
+            kind = _local(elem.tag)
+            if kind not in ("url", "sitemap"):
+                continue
+            loc = lastmod = None
+            for child in elem:
+                if _local(child.tag) == "loc":
+                    loc = (child.text or "").strip()
+                elif _local(child.tag) == "lastmod":
+                    lastmod = (child.text or "").strip()
+            elem.clear()
+            if not loc:
+                continue
+            if kind == "sitemap":
+                nested.append(loc)
+            else:
+                add_candidate(candidates, loc, lastmod=lastmod)
+                if len(candidates) >= SITEMAP_MAX_URLS:
+                    return
+
+
+async def collect_sitemap_urls(base_url: str, sitemaps: List[str], candidates: Candidates):
+    """Walk sitemaps and sitemap indexes breadth-first, within the file and URL limits"""
+    queue = list(dict.fromkeys(sitemaps or [urljoin(base_url, "/sitemap.xml")]))
+    seen = set()
+    while queue and len(seen) < SITEMAP_MAX_FILES and len(candidates) < SITEMAP_MAX_URLS:
+        url = queue.pop(0)
+        if url in seen:
+            continue
+        seen.add(url)
+        nested: List[str] = []
+        try:
+            await stream_sitemap(url, candidates, nested)
+        except Exception as e:
+            print(f"⚠️ Sitemap {url} unreadable: {e}")
+        # Sitemaps de pages avant ceux de produits / articles
+        nested.sort(key=lambda loc: 0 if any(k in loc.lower() for k in ("page", "static")) else 1)
+        queue.extend(nested)
+
+
+# ----------------------------
+# Homepage links / ranking
+# ----------------------------
+
+def homepage_links(html: bytes, base_url: str) -> List[Tuple[str, str]]:
+    """(absolute URL, anchor text) of every link of the homepage (CPU-bound, run in a thread)"""
+    soup = BeautifulSoup(html, 'html.parser')
+    links = []
+    for link in soup.find_all('a', href=True):
+        href = link.get('href', '').strip()
+        # Skip empty links, anchors, mail/phone links
+        if not href or href.startswith('#') or href.lower().startswith(('mailto:', 'tel:', 'javascript:')):
+            continue
+        links.append((urljoin(base_url, href), link.get_text(strip=True).lower()))
+    return links
+
+
+def _lastmod_age_days(lastmod: Optional[str]) -> Optional[int]:
+    if not lastmod:
+        return None
+    try:
+        return (datetime.utcnow() - datetime.strptime(lastmod[:10], "%Y-%m-%d")).days
+    except ValueError:
+        return None
+
+
+def score_candidate(url: str, text: str = "", lastmod: Optional[str] = None) -> Optional[float]:
+    """Higher is more informative; None for pages that must not be analyzed"""
+    parsed = urlparse(url)
+    path = parsed.path.lower()
+    haystack = f"{path} {text}"
+    if any(skip in haystack for skip in SKIP_KEYWORDS) or path.endswith(NON_HTML_EXTENSIONS):
+        return None
+
+    score = 3.0 * min(sum(1 for keyword in IMPORTANT_KEYWORDS if keyword in haystack), 2)
+    depth = len([segment for segment in path.split("/") if segment])
+    score -= 0.5 * max(depth - 1, 0)
+    if parsed.query:
+        score -= 1.0
+    if text:
+        score += 0.5  # lien de navigation de la page d'accueil
+    age = _lastmod_age_days(lastmod)
+    if age is not None:
+        score += 1.0 if age <= 90 else (0.5 if age <= 365 else 0.0)
+    return score
+
+
+def rank_pages(base_url: str, candidates: Candidates, disallowed: List[str], max_pages: int) -> List[str]:
+    """Homepage first, then the best scored same-site candidates"""
+    base = urlparse(base_url)
+    seen = {_url_key(base_url)}
+    scored = []
+    for url, info in candidates.items():
+        parsed = urlparse(url)
+        if parsed.scheme not in ("http", "https") or _site(parsed.netloc) != _site(base.netloc):
+            continue
+        key = _url_key(url)
+        if key in seen or any(parsed.path.startswith(prefix) for prefix in disallowed):
+            continue
+        score = score_candidate(url, info.get("text", ""), info.get("lastmod"))
+        if score is None:
+            continue
+        seen.add(key)
+        scored.append((score, url))
+    scored.sort(key=lambda item: -item[0])  # tri stable : ordre sitemap/liens en cas d'égalité
+    return [base_url] + [url for _, url in scored[:max(max_pages - 1, 0)]]
@@ -7,7 +7,7 @@ import os
 from dotenv import load_dotenv
 from pathlib import Path
 import logging
-from motor.motor_asyncio import AsyncIOMotorClient
+from async_database import get_async_db
 from auth import get_current_active_user, User
 
 # Simple Stripe integration without emergentintegrations
@@ -108,9 +108,7 @@ ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
 # MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+db = get_async_db()  # Shared Motor pool (async_database.py)
 
 # Stripe configuration
 if STRIPE_AVAILABLE:
@@ -3,9 +3,10 @@ Advanced Post Generation System for Claire et Marcus
 Generates intelligent social media posts based on user content, business profile, and website analysis.
 """
 
+import asyncio
 import logging
 from datetime import datetime, timedelta
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Callable, Awaitable
 from dataclasses import dataclass
 import random
 import json
@@ -15,11 +16,17 @@ from dotenv import load_dotenv
 # Load environment variables
 load_dotenv('/app/backend/.env')
 
-from openai import OpenAI
+from pymongo import UpdateOne
+
 from database import get_database
+from async_database import get_async_database
+from business_context import aget_compiled as get_compiled_context, month_key as context_month_key
 
 logger = logging.getLogger(__name__)
 
+# Nombre de plateformes générées en parallèle (chaque génération = un appel LLM)
+POSTS_PLATFORM_CONCURRENCY = int(os.environ.get('POSTS_PLATFORM_CONCURRENCY', '3'))
+
 @dataclass
 class PostContent:
     """Structure for a generated post"""
@@ -61,15 +68,11 @@ class PostsGenerator:
             from llm_backup_system import llm_backup
             self.llm_backup = llm_backup
             
-            # Garder l'ancien client OpenAI pour compatibilité
-            api_key = os.getenv('OPENAI_API_KEY')
-            print(f"🔍 DEBUG: API key loaded: {api_key[:20] if api_key else 'None'}...")
-            
-            if api_key:
-                self.openai_client = OpenAI(api_key=api_key)
+            # Client AsyncOpenAI partagé (pool de connexions du système de backup)
+            self.openai_client = llm_backup.openai_client
+            if self.openai_client:
                 print("✅ OpenAI client initialized for posts generation")
             else:
-                self.openai_client = None
                 print("⚠️ No OpenAI API key, using backup system only")
             
             print("✅ LLM Backup System initialized for posts generation")
@@ -103,7 +106,8 @@ Tu réponds EXCLUSIVEMENT au format JSON exact demandé."""
             logger.error(f"❌ Failed to initialize OpenAI client: {str(e)}")
             self.openai_client = None
     
-    async def generate_posts_for_month(self, user_id: str, target_month: str, num_posts: int = 20, connected_platforms: List[str] = None) -> Dict[str, Any]:
+    async def generate_posts_for_month(self, user_id: str, target_month: str, num_posts: int = 20, connected_platforms: List[str] = None,
+                                       progress: Optional[Callable[[str, str], Awaitable[None]]] = None) -> Dict[str, Any]:
         """
         Generate complete post calendar for a specific month for connected platforms
         
@@ -112,6 +116,7 @@ Tu réponds EXCLUSIVEMENT au format JSON exact demandé."""
             target_month: Month in format "octobre_2025"
             num_posts: Number of posts to generate per platform
             connected_platforms: List of connected social platforms ['facebook', 'instagram', 'linkedin']
+            progress: Optional async callback(step, label) called at each step (generation jobs)
             
         Returns:
             Dict with generated posts and metadata
@@ -129,10 +134,11 @@ Tu réponds EXCLUSIVEMENT au format JSON exact demandé."""
             all_scheduled_posts = []
             
             # STEP 1: Gather all source data
-            source_data = self._gather_source_data(user_id, target_month)
+            await self._report_progress(progress, "1/6", "Collecte des données sources")
+            source_data = await self._gather_source_data(user_id, target_month)
             
             # STEP 1.5: Vérifier les plateformes connectées
-            connected_platforms = self._get_connected_platforms(user_id)
+            connected_platforms = await asyncio.to_thread(self._get_connected_platforms, user_id)
             
             # Nouvelle logique : pas de fallback, erreur si aucune connexion
             if not connected_platforms:
@@ -148,31 +154,47 @@ Tu réponds EXCLUSIVEMENT au format JSON exact demandé."""
             logger.info(f"🎯 Plateformes connectées trouvées: {connected_platforms}")
             
             # STEP 2: Collect available content
-            available_content = self._collect_available_content(user_id, target_month)
+            await self._report_progress(progress, "2/6", "Collecte des contenus disponibles")
+            available_content = await asyncio.to_thread(self._collect_available_content, user_id, target_month)
             
             # STEP 3: Determine content mix strategy  
+            await self._report_progress(progress, "3/6", "Choix de la stratégie de contenu")
             content_strategy = self._determine_content_strategy(source_data, num_posts)
             
             # STEP 4: Generate posts for each connected platform independently
             all_generated_posts = []
             all_scheduled_posts = []
             
-            for platform in connected_platforms:
-                logger.info(f"🎯 Génération pour la plateforme: {platform}")
-                
-                # Generate posts for this specific platform
-                platform_posts = await self._generate_posts_with_strategy(
-                    source_data, available_content, content_strategy, num_posts, user_id, platform
-                )
-                
-                # Mark used content with timestamps
-                await self._mark_used_content(platform_posts, platform)
-                
+            # Les plateformes sont indépendantes : appels LLM en parallèle (bornés)
+            connected_platforms = list(dict.fromkeys(connected_platforms))
+            semaphore = asyncio.Semaphore(max(1, POSTS_PLATFORM_CONCURRENCY))
+            
+            async def generate_for_platform(platform: str) -> List[PostContent]:
+                async with semaphore:
+                    logger.info(f"🎯 Génération pour la plateforme: {platform}")
+                    platform_posts = await self._generate_posts_with_strategy(
+                        source_data, available_content, content_strategy, num_posts, user_id, platform
+                    )
+                await self._report_progress(progress, "4/6", f"Posts générés pour {platform}")
+                return platform_posts
+            
+            await self._report_progress(progress, "4/6", f"Génération IA pour {', '.join(connected_platforms)}")
+            results = await asyncio.gather(*(generate_for_platform(p) for p in connected_platforms))
+            
+            # Merge déterministe (ordre des plateformes connectées)
+            posts_by_platform = self._merge_platform_posts(connected_platforms, results)
+            
+            # Mark used content with timestamps (one bulk write for all platforms)
+            await self._mark_used_content(posts_by_platform)
+            
+            for platform, platform_posts in posts_by_platform.items():
                 # Create posting schedule for this platform
+                await self._report_progress(progress, "5/6", f"Programmation des posts {platform}")
                 platform_scheduled_posts = self._create_posting_schedule(platform_posts, target_month, platform)
                 
                 # Save to database
-                self._save_generated_posts(user_id, platform_scheduled_posts)
+                await self._report_progress(progress, "6/6", f"Enregistrement des posts {platform}")
+                await asyncio.to_thread(self._save_generated_posts, user_id, platform_scheduled_posts)
                 
                 all_generated_posts.extend(platform_posts)
                 all_scheduled_posts.extend(platform_scheduled_posts)
@@ -207,6 +229,15 @@ Tu réponds EXCLUSIVEMENT au format JSON exact demandé."""
                 "posts": []
             }
     
+    async def _report_progress(self, progress, step: str, label: str):
+        """Forward a step to the progress callback (never fails the generation)"""
+        if progress is None:
+            return
+        try:
+            await progress(step, label)
+        except Exception as e:
+            logger.warning(f"⚠️ Progress report failed ({step}): {e}")
+    
     def _get_connected_platforms(self, user_id: str) -> List[str]:
         """Récupérer toutes les plateformes connectées pour l'utilisateur"""
         try:
@@ -225,47 +256,71 @@ Tu réponds EXCLUSIVEMENT au format JSON exact demandé."""
             logger.error(f"❌ Erreur récupération plateformes: {str(e)}")
             return []
 
-    def _gather_source_data(self, user_id: str, target_month: str) -> Dict[str, Any]:
-        """Gather all source data for post generation"""
+    async def _gather_source_data(self, user_id: str, target_month: str) -> Dict[str, Any]:
+        """Gather all source data for post generation (from the compiled business context)"""
         logger.info("📊 Step 1/6: Gathering source data...")
         
-        source_data = {}
-        
-        # Business profile
-        business_profile = self.db.business_profiles.find_one({"user_id": user_id})
-        source_data["business_profile"] = business_profile
-        logger.info(f"   📋 Business profile: {'✅' if business_profile else '❌'}")
-        
-        # Website analysis
-        website_analysis = self.db.website_analyses.find_one(
-            {"user_id": user_id}, 
-            sort=[("created_at", -1)]
+        compiled = await get_compiled_context(get_async_database().db, user_id, self._compile_business_context)
+        month_lines = compiled.get("month_notes", {}).get(
+            context_month_key(self._parse_month_number(target_month), self._parse_year(target_month)), []
         )
-        source_data["website_analysis"] = website_analysis
-        logger.info(f"   🌐 Website analysis: {'✅' if website_analysis else '❌'}")
         
-        # Always valid notes
-        always_valid_notes = list(self.db.content_notes.find({
-            "owner_id": user_id,
-            "is_monthly_note": True,
-            "deleted": {"$ne": True}
-        }).limit(100))
-        source_data["always_valid_notes"] = always_valid_notes
-        logger.info(f"   📝 Always valid notes: {len(always_valid_notes)}")
-        
-        # Month-specific notes  
-        month_notes = list(self.db.content_notes.find({
-            "owner_id": user_id,
-            "is_monthly_note": False,
-            "note_month": self._parse_month_number(target_month),
-            "note_year": self._parse_year(target_month),
-            "deleted": {"$ne": True}
-        }).limit(100))
-        source_data["month_notes"] = month_notes
-        logger.info(f"   📅 Month notes: {len(month_notes)}")
+        source_data = {
+            "business_profile": compiled.get("profile"),
+            "website_analysis": compiled.get("has_website_analysis") or None,
+            "always_valid_notes": compiled.get("always_valid_notes", []),
+            "month_notes": month_lines,
+            "business_context": compiled.get("business_context"),
+            "website_context": compiled.get("website_context"),
+            "context_version": compiled.get("compiled_version"),
+        }
+        logger.info(f"   📋 Business profile: {'✅' if source_data['business_profile'] else '❌'}")
+        logger.info(f"   🌐 Website analysis: {'✅' if source_data['website_analysis'] else '❌'}")
+        logger.info(f"   📝 Always valid notes: {len(source_data['always_valid_notes'])}")
+        logger.info(f"   📅 Month notes: {len(month_lines)}")
+        logger.info(f"   🧱 Compiled context v{source_data['context_version']} (~{compiled.get('tokens', 0)} tokens)")
         
         return source_data
     
+    async def _compile_business_context(self, user_id: str) -> Dict[str, Any]:
+        """Read profile, latest website analysis and notes and render the prompt sections"""
+        adb = get_async_database().db
+        business_profile, website_analysis, notes = await asyncio.gather(
+            adb.business_profiles.find_one({"user_id": user_id}),
+            adb.website_analyses.find_one({"user_id": user_id}, sort=[("created_at", -1)]),
+            adb.content_notes.find(
+                {"owner_id": user_id, "deleted": {"$ne": True}},
+                {"_id": 0, "description": 1, "title": 1, "content": 1, "is_monthly_note": 1,
+                 "note_month": 1, "note_year": 1}
+            ).sort("created_at", 1).limit(500).to_list(length=500)
+        )
+        
+        always_valid_notes = []
+        month_notes: Dict[str, List[str]] = {}
+        for note in notes:
+            line = self._format_note_line(note)
+            if not line:
+                continue
+            if note.get("is_monthly_note"):
+                always_valid_notes.append(line)
+            elif note.get("note_month") and note.get("note_year"):
+                month_notes.setdefault(context_month_key(note["note_month"], note["note_year"]), []).append(line)
+        
+        profile = None
+        if business_profile:
+            profile = {field: business_profile.get(field) for field in
+                       ("business_type", "business_objective", "brand_voice") if business_profile.get(field)}
+        
+        return {
+            "profile": profile,
+            "has_website_analysis": website_analysis is not None,
+            "business_context": self._format_business_context(business_profile),
+            "website_context": self._format_website_analysis_context(website_analysis),
+            # Limité comme _format_notes_context (10 notes au total dans le prompt)
+            "always_valid_notes": always_valid_notes[:10],
+            "month_notes": {key: lines[:10] for key, lines in month_notes.items()},
+        }
+    
     def _parse_target_month(self, target_month: str) -> tuple:
         """Parse target_month string (e.g., 'septembre_2025') into month number and year"""
         try:
@@ -524,10 +579,10 @@ Tu réponds EXCLUSIVEMENT au format JSON exact demandé."""
         if not self.openai_client:
             raise Exception("OpenAI client not initialized")
         
-        # Get contexts for AI
-        business_context = self._format_business_context(source_data.get("business_profile"))
-        all_notes = source_data.get("always_valid_notes", []) + source_data.get("month_notes", [])
-        notes_context = self._format_notes_context(all_notes)
+        # Get contexts for AI (pre-rendered in the compiled business context)
+        business_context = source_data.get("business_context") or self._format_business_context(None)
+        note_lines = (source_data.get("always_valid_notes", []) + source_data.get("month_notes", []))[:10]
+        notes_context = "\n".join(note_lines) if note_lines else "Aucune note disponible."
         recent_posts_context = await self._get_recent_posts_context(user_id)
         
         # Prepare content inventory for AI
@@ -548,61 +603,74 @@ Tu réponds EXCLUSIVEMENT au format JSON exact demandé."""
         
         return generated_posts
     
-    async def _mark_used_content(self, generated_posts: List[PostContent], platform: str):
+    def _merge_platform_posts(self, platforms: List[str], results: List[List[PostContent]]) -> Dict[str, List[PostContent]]:
+        """Merge per-platform results in platform order.
+
+        A visual already assigned earlier in the same platform calendar is dropped
+        from the later post (text kept, status needs_image), so an image is never
+        assigned twice on one platform whatever order the generations finished in.
+        """
+        merged = {}
+        for platform, platform_posts in zip(platforms, results):
+            assigned = set()
+            for post in platform_posts or []:
+                if post.visual_id and post.visual_id in assigned:
+                    logger.info(f"   📝 {platform}: visual {post.visual_id} already assigned, post kept without image")
+                    post.visual_id = ""
+                    post.visual_url = ""
+                    post.status = "needs_image"
+                elif post.visual_id:
+                    assigned.add(post.visual_id)
+            merged[platform] = list(platform_posts or [])
+        return merged
+    
+    async def _mark_used_content(self, posts_by_platform: Dict[str, List[PostContent]]):
         """Mark used content with timestamps and platform info"""
-        logger.info(f"🏷️ Step 4.5/6: Marking used content for {platform}...")
-        
-        # Collect all used content IDs from generated posts
-        used_content = []
-        for post in generated_posts:
-            if post.visual_id:
-                used_content.append(post.visual_id)
-        
-        logger.info(f"   📊 Found {len(used_content)} content items to mark as used for {platform}")
-        
-        # Mark used content with timestamps and platform info
-        if used_content:
-            from bson import ObjectId
-            from datetime import datetime
-            
-            # Map platform names to field names
-            platform_field_map = {
-                'facebook': 'used_on_facebook',
-                'instagram': 'used_on_instagram', 
-                'linkedin': 'used_on_linkedin'
-            }
-            
+        logger.info(f"🏷️ Step 4.5/6: Marking used content for {list(posts_by_platform.keys())}...")
+        
+        # Map platform names to field names
+        platform_field_map = {
+            'facebook': 'used_on_facebook',
+            'instagram': 'used_on_instagram', 
+            'linkedin': 'used_on_linkedin'
+        }
+        
+        # content_id -> (champs par plateforme, nombre d'utilisations), ordre d'insertion stable
+        usage = {}
+        for platform, platform_posts in posts_by_platform.items():
             platform_field = platform_field_map.get(platform.lower(), 'used_in_posts')
-            
-            # Handle both ObjectId and UUID formats
-            for content_id in used_content:
-                try:
-                    # Try UUID format first (GridFS file_id)
-                    update_fields = {
-                        "used_in_posts": True,  # Keep general flag for backward compatibility
-                        platform_field: True,  # Mark as used on specific platform
-                        "last_used": datetime.utcnow().isoformat(),
-                        "usage_count": {"$inc": 1}
-                    }
-                    
-                    result = self.db.media.update_one(
-                        {"$or": [
-                            {"file_id": content_id},
-                            {"id": content_id},
-                            {"_id": ObjectId(content_id) if len(content_id) == 24 else None}
-                        ]},
-                        {"$set": update_fields}
-                    )
-                    
-                    if result.matched_count > 0:
-                        logger.info(f"   ✅ Marked content {content_id} as used on {platform}")
-                    else:
-                        logger.warning(f"   ⚠️ Content {content_id} not found for marking as used on {platform}")
-                        
-                except Exception as e:
-                    logger.error(f"   ❌ Error marking content {content_id} as used on {platform}: {str(e)}")
-        
-        logger.info(f"✅ Marking used content completed for {platform}")
+            for post in platform_posts:
+                if post.visual_id:
+                    fields, count = usage.get(post.visual_id, (set(), 0))
+                    fields.add(platform_field)
+                    usage[post.visual_id] = (fields, count + 1)
+        
+        logger.info(f"   📊 Found {len(usage)} content items to mark as used")
+        if not usage:
+            return
+        
+        last_used = datetime.utcnow().isoformat()
+        operations = []
+        for content_id, (fields, count) in usage.items():
+            update_fields = {
+                "used_in_posts": True,  # Keep general flag for backward compatibility
+                "last_used": last_used
+            }
+            for field in sorted(fields):
+                update_fields[field] = True  # Mark as used on specific platform
+            # Canonical media id (unique index on media.id)
+            operations.append(UpdateOne(
+                {"id": content_id},
+                {"$set": update_fields, "$inc": {"usage_count": count}}
+            ))
+        
+        try:
+            result = await asyncio.to_thread(self.db.media.bulk_write, operations, ordered=False)
+            if result.matched_count < len(operations):
+                logger.warning(f"   ⚠️ {len(operations) - result.matched_count} content items not found for marking as used")
+            logger.info(f"✅ Marked {result.matched_count} content items as used")
+        except Exception as e:
+            logger.error(f"   ❌ Error marking content as used: {str(e)}")
     
     def _build_business_context(self, business_profile: Dict, website_analysis: Dict) -> str:
         """Build business context for AI generation"""
@@ -649,10 +717,10 @@ Tu réponds EXCLUSIVEMENT au format JSON exact demandé."""
             from datetime import datetime, timedelta
             cutoff_date = datetime.utcnow() - timedelta(days=60)
             
-            recent_posts = list(self.db.generated_posts.find({
+            recent_posts = await asyncio.to_thread(lambda: list(self.db.generated_posts.find({
                 "owner_id": user_id,
                 "created_at": {"$gte": cutoff_date.isoformat()}
-            }).sort([("created_at", -1)]).limit(20))
+            }).sort([("created_at", -1)]).limit(20)))
             
             if not recent_posts:
                 return "Aucun post récent à éviter."
@@ -750,16 +818,23 @@ Tu réponds EXCLUSIVEMENT au format JSON exact demandé."""
         
         context_parts = []
         for note in notes[:10]:  # Limit to avoid token overflow
-            # Use 'description' field instead of 'title' as notes have description, not title
-            description = note.get('description', '') or note.get('title', '')
-            content = note.get('content', '')
-            if description and content:
-                context_parts.append(f"- {description}: {content}")
-            elif content:
-                context_parts.append(f"- {content}")
+            line = self._format_note_line(note)
+            if line:
+                context_parts.append(line)
         
         return "\n".join(context_parts)
     
+    def _format_note_line(self, note: Dict) -> Optional[str]:
+        """One prompt line per note"""
+        # Use 'description' field instead of 'title' as notes have description, not title
+        description = note.get('description', '') or note.get('title', '')
+        content = note.get('content', '')
+        if description and content:
+            return f"- {description}: {content}"
+        elif content:
+            return f"- {content}"
+        return None
+    
     def _format_website_analysis_context(self, website_analysis: Dict) -> str:
         """Format complete website analysis for AI context - ALL DATA"""
         if not website_analysis:
@@ -862,7 +937,7 @@ Tu réponds EXCLUSIVEMENT au format JSON exact demandé."""
         """Generate entire posts calendar with intelligent LLM selection based on business objectives"""
         try:
             # Récupérer les informations du profil business pour la sélection LLM
-            business_profile = source_data.get("business_profile", {}) if source_data else {}
+            business_profile = (source_data or {}).get("business_profile") or {}
             business_objective = business_profile.get("business_objective", "equilibre")
             brand_tone = business_profile.get("brand_voice", "professionnel")
             platform = target_platform  # Utilise la plateforme déterminée selon les connexions
@@ -872,17 +947,18 @@ Tu réponds EXCLUSIVEMENT au format JSON exact demandé."""
             print(f"   - Brand Tone: {brand_tone}")
             print(f"   - Platform: {platform}")
             
-            # Get website analysis context from source_data
-            website_analysis = source_data.get("website_analysis", {}) if source_data else {}
-            website_context = self._format_website_analysis_context(website_analysis)
+            # Website analysis context (pre-rendered in the compiled business context)
+            website_context = (source_data or {}).get("website_context") or self._format_website_analysis_context(None)
             
-            # Build the global prompt for generating all posts at once
-            prompt = f"""Tu dois créer EXACTEMENT {num_posts} posts {target_platform.title()} pour ce business (PAS PLUS, PAS MOINS).
-
-{business_context}
+            # Build the global prompt for generating all posts at once.
+            # Le contexte business compilé ouvre le prompt : préfixe stable d'une génération
+            # à l'autre (cache de prompt côté fournisseur), les parties variables suivent.
+            prompt = f"""{business_context}
 
 {website_context}
 
+Tu dois créer EXACTEMENT {num_posts} posts {target_platform.title()} pour ce business (PAS PLUS, PAS MOINS).
+
 NOTES IMPORTANTES À INTÉGRER OBLIGATOIREMENT:
 {notes_context}
 
@@ -986,7 +1062,8 @@ IMPORTANT: Varie intelligemment les content_type selon ce qui sera le plus effic
                     platform=platform,
                     model="gpt-4o",
                     temperature=0.7,
-                    max_tokens=4000
+                    max_tokens=4000,
+                    cache=False  # création : réponse différente à chaque génération
                 )
                 
                 logger.info(f"🤖 Strategic LLM Response length: {len(response_text) if response_text else 0}")
@@ -1003,16 +1080,16 @@ IMPORTANT: Varie intelligemment les content_type selon ce qui sera le plus effic
                 # Fallback to direct OpenAI if backup system fails
                 if self.openai_client:
                     logger.info("🔄 Falling back to direct OpenAI...")
-                    response = self.openai_client.chat.completions.create(
+                    response_text = await self.llm_backup.openai_chat(
                         model="gpt-4o",
                         messages=[
                             {"role": "system", "content": self.system_message},
                             {"role": "user", "content": prompt}
                         ],
                         temperature=0.7,
-                        max_tokens=4000
+                        max_tokens=4000,
+                        cache=False
                     )
-                    response_text = response.choices[0].message.content
                     return self._parse_global_response(response_text, strategy, available_content, num_posts, target_platform)
                 else:
                     raise llm_error
@@ -1208,7 +1285,8 @@ RÉPONSE ATTENDUE (JSON exact):
                     messages=messages,
                     model="gpt-4o",
                     temperature=0.7,
-                    max_tokens=1000
+                    max_tokens=1000,
+                    cache=False
                 )
                 
                 print(f"🤖 DEBUG: LLM Backup response: '{response_text}'")
@@ -1222,16 +1300,16 @@ RÉPONSE ATTENDUE (JSON exact):
                 # Fallback to direct OpenAI if backup system fails
                 if self.openai_client:
                     logger.info("🔄 Falling back to direct OpenAI for single post...")
-                    response = self.openai_client.chat.completions.create(
+                    response_text = await self.llm_backup.openai_chat(
                         model="gpt-4o",
                         messages=[
                             {"role": "system", "content": self.system_message},
                             {"role": "user", "content": prompt}
                         ],
                         temperature=0.7,
-                        max_tokens=1000
+                        max_tokens=1000,
+                        cache=False
                     )
-                    response_text = response.choices[0].message.content
                 else:
                     raise llm_error
             
@@ -1389,7 +1467,7 @@ CTA: "Apprenez plus", "Essayez", "Suivez le guide"
         
         for post in posts:
             post_doc = {
-                "id": f"post_{user_id}_{int(datetime.now().timestamp())}_{posts.index(post)}",
+                "id": f"post_{user_id}_{post.platform}_{int(datetime.now().timestamp())}_{posts.index(post)}",
                 "owner_id": user_id,
                 "visual_url": post.visual_url,
                 "visual_id": post.visual_id,
@@ -0,0 +1,279 @@
+# publication_dispatcher.py
+"""Publication of scheduled posts when they are due.
+
+POST /api/posts/schedule queues a post on generated_posts itself:
+
+    publication_state: "queued", publish_due_at: <UTC datetime>, publish_attempts: 0
+
+`publish_due_at` is a real datetime (the user's date/time is read in
+SCHEDULE_TIMEZONE) indexed with the state, so workers take the oldest due
+post first without scanning. Lifecycle:
+
+    queued -> publishing (atomic claim with a lease) -> published | failed
+
+A claim is a single find_one_and_update, so any number of API instances or
+standalone dispatchers can run side by side without publishing a post twice.
+Only errors that certainly published nothing (PublishError.retryable: upstream
+5xx, connection refused) are retried after PUBLICATION_RETRY_SECONDS x attempt,
+up to PUBLICATION_MAX_ATTEMPTS; rejected posts (no connection, bad token, Graph
+4xx) fail at once. Like a post whose worker died mid-publication, a timeout or
+unknown error once the publish request was sent is NOT retried: Graph may have
+accepted it, so it is marked failed for the user to check.
+
+Workers run inside the API process (PUBLICATION_DISPATCHER_IN_API=true, default)
+and can also run standalone: `python publication_dispatcher.py`.
+"""
+import asyncio
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Dict, Any, List
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from async_database import get_async_database
+from publisher import publish_post, claim_post as claim_for_publication, PublishError, QUEUE_FIELDS, PUBLICATION_LEASE_SECONDS
+
+PUBLICATION_CONCURRENCY = int(os.environ.get("PUBLICATION_CONCURRENCY", "10"))
+PUBLICATION_MAX_ATTEMPTS = int(os.environ.get("PUBLICATION_MAX_ATTEMPTS", "3"))
+PUBLICATION_RETRY_SECONDS = int(os.environ.get("PUBLICATION_RETRY_SECONDS", "120"))
+PUBLICATION_POLL_SECONDS = float(os.environ.get("PUBLICATION_POLL_SECONDS", "5"))
+PUBLICATION_BACKFILL_MAX_AGE_HOURS = int(os.environ.get("PUBLICATION_BACKFILL_MAX_AGE_HOURS", "24"))
+PUBLICATION_DISPATCHER_IN_API = os.environ.get("PUBLICATION_DISPATCHER_IN_API", "true").lower() == "true"
+SCHEDULE_TIMEZONE = os.environ.get("SCHEDULE_TIMEZONE", "Europe/Paris")
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+_indexes_ready = False
+_worker_tasks: List[asyncio.Task] = []
+_counters = {"claimed": 0, "published": 0, "retried": 0, "failed": 0}
+
+
+def _posts():
+    return get_async_database().db.generated_posts
+
+
+def to_utc(local_dt: datetime) -> datetime:
+    """Naive UTC datetime of a naive date/time entered in SCHEDULE_TIMEZONE"""
+    if local_dt.tzinfo is not None:
+        return local_dt.astimezone(timezone.utc).replace(tzinfo=None)
+    try:
+        tz = ZoneInfo(SCHEDULE_TIMEZONE)
+    except ZoneInfoNotFoundError:
+        print(f"⚠️ Unknown SCHEDULE_TIMEZONE {SCHEDULE_TIMEZONE}, scheduled times read as UTC")
+        return local_dt
+    return local_dt.replace(tzinfo=tz).astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def queue_fields(scheduled_datetime: datetime) -> Dict[str, Any]:
+    """Fields to $set on a generated post to queue it (POST /posts/schedule)"""
+    return {
+        "publication_state": "queued",
+        "publish_due_at": to_utc(scheduled_datetime),
+        "publish_attempts": 0,
+        "publication_error": None
+    }
+
+
+async def ensure_indexes():
+    global _indexes_ready
+    if _indexes_ready:
+        return
+    try:
+        # Claim query: oldest due post first; only queued/publishing posts carry publish_due_at
+        await _posts().create_index(
+            [("publication_state", 1), ("publish_due_at", 1)], name="publication_queue",
+            partialFilterExpression={"publish_due_at": {"$exists": True}}
+        )
+        # Abandoned claims (scheduled or manual): only claimed posts carry a lease
+        await _posts().create_index(
+            [("publication_state", 1), ("publish_lease_until", 1)], name="publication_leases",
+            partialFilterExpression={"publish_lease_until": {"$exists": True}}
+        )
+    except Exception as e:
+        print(f"⚠️ Publication queue index creation warning: {e}")
+    _indexes_ready = True
+
+
+async def backfill_scheduled_posts():
+    """Queue posts scheduled before the dispatcher existed (ISO string scheduled_at only).
+
+    Posts already overdue by more than PUBLICATION_BACKFILL_MAX_AGE_HOURS are
+    marked "missed" instead of being published late.
+    """
+    now = datetime.utcnow()
+    cutoff = now - timedelta(hours=PUBLICATION_BACKFILL_MAX_AGE_HOURS)
+    queued = missed = 0
+    cursor = _posts().find(
+        {"status": "scheduled", "scheduled_at": {"$type": "string"},
+         "publication_state": {"$exists": False}, "published": {"$ne": True}},
+        {"_id": 1, "scheduled_at": 1}
+    )
+    async for post in cursor:
+        try:
+            due_at = to_utc(datetime.fromisoformat(post["scheduled_at"]))
+        except ValueError:
+            continue
+        if due_at < cutoff:
+            await _posts().update_one({"_id": post["_id"]}, {"$set": {"publication_state": "missed"}})
+            missed += 1
+        else:
+            await _posts().update_one(
+                {"_id": post["_id"], "publication_state": {"$exists": False}},
+                {"$set": {"publication_state": "queued", "publish_due_at": due_at, "publish_attempts": 0}}
+            )
+            queued += 1
+    if queued or missed:
+        print(f"⏰ Scheduled posts backfilled: {queued} queued, {missed} missed")
+
+
+async def claim_post(worker_id: str = WORKER_ID) -> Optional[Dict[str, Any]]:
+    """Atomically take the oldest due post (same claim as a manual publish, see publisher.claim_post)"""
+    return await claim_for_publication(
+        {"publication_state": "queued", "publish_due_at": {"$lte": datetime.utcnow()}},
+        worker_id,
+        sort=[("publish_due_at", 1)],
+        projection={"_id": 1, "id": 1, "owner_id": 1, "publish_attempts": 1, "publish_worker_id": 1},
+        inc={"publish_attempts": 1}
+    )
+
+
+async def _record_failure(post: Dict[str, Any], error: str, retry: bool):
+    now = datetime.utcnow()
+    owned = {"_id": post["_id"], "publish_worker_id": post["publish_worker_id"], "publication_state": "publishing"}
+    if retry and post.get("publish_attempts", 1) < PUBLICATION_MAX_ATTEMPTS:
+        _counters["retried"] += 1
+        delay = PUBLICATION_RETRY_SECONDS * post.get("publish_attempts", 1)
+        await _posts().update_one(owned, {
+            "$set": {"publication_state": "queued", "publish_due_at": now + timedelta(seconds=delay),
+                     "publication_error": error},
+            "$unset": {"publish_lease_until": "", "publish_worker_id": ""}
+        })
+        print(f"🔁 Scheduled post {post['id']} retried in {delay}s: {error}")
+        return
+
+    _counters["failed"] += 1
+    await _posts().update_one(owned, {
+        "$set": {"publication_state": "failed", "publication_error": error, "publication_failed_at": now},
+        "$unset": QUEUE_FIELDS
+    })
+    await get_async_database().db.calendar_posts.update_one(
+        {"id": post["id"]}, {"$set": {"publication_state": "failed", "publication_error": error}}
+    )
+    print(f"❌ Scheduled post {post['id']} failed: {error}")
+
+
+async def fail_abandoned_posts():
+    """Posts whose worker (dispatcher or manual publish) died mid-publication:
+    failed, not retried (Graph may have published them)"""
+    now = datetime.utcnow()
+    result = await _posts().update_many(
+        {"publication_state": "publishing", "publish_lease_until": {"$lt": now}},
+        {"$set": {"publication_state": "failed", "publication_failed_at": now,
+                  "publication_error": "Publication interrompue - vérifiez la page avant de reprogrammer"},
+         "$unset": QUEUE_FIELDS}
+    )
+    if result.modified_count:
+        _counters["failed"] += result.modified_count
+        print(f"⚠️ {result.modified_count} publications abandoned by their worker")
+
+
+async def next_due_in() -> Optional[float]:
+    """Seconds until the next queued post is due (None when the queue is empty)"""
+    post = await _posts().find_one(
+        {"publication_state": "queued", "publish_due_at": {"$exists": True}},
+        {"publish_due_at": 1}, sort=[("publish_due_at", 1)]
+    )
+    if not post:
+        return None
+    return max(0.0, (post["publish_due_at"] - datetime.utcnow()).total_seconds())
+
+
+# ----------------------------
+# Worker
+# ----------------------------
+
+async def process_post(post: Dict[str, Any]):
+    """Publish one claimed post and record the outcome"""
+    _counters["claimed"] += 1
+    try:
+        result = await publish_post(post["id"], post["owner_id"], method="scheduled",
+                                    worker_id=post["publish_worker_id"])
+    except PublishError as e:
+        await _record_failure(post, e.detail, retry=e.retryable)
+        return
+    except Exception as e:
+        await _record_failure(post, str(e), retry=False)
+        return
+
+    _counters["published"] += 1
+    await get_async_database().db.calendar_posts.update_one(
+        {"id": post["id"]},
+        {"$set": {"status": "published", "published": True, "published_at": result["published_at"],
+                  "platform_post_id": result.get("post_id"), "publication_state": "published"}}
+    )
+    print(f"✅ Scheduled post {post['id']} published on {result.get('platform')}")
+
+
+async def worker_loop(worker_id: str = WORKER_ID):
+    """Claim and publish due posts forever; sleeps until the next due post when idle"""
+    await ensure_indexes()
+    while True:
+        try:
+            post = await claim_post(worker_id)
+            if post is None:
+                await fail_abandoned_posts()
+                due_in = await next_due_in()
+                await asyncio.sleep(PUBLICATION_POLL_SECONDS if due_in is None else min(due_in, PUBLICATION_POLL_SECONDS))
+                continue
+            await process_post(post)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"❌ Publication worker error: {e}")
+            await asyncio.sleep(PUBLICATION_POLL_SECONDS)
+
+
+async def _run(concurrency: int):
+    await ensure_indexes()
+    await backfill_scheduled_posts()
+    await asyncio.gather(*(worker_loop(f"{WORKER_ID}:{i}") for i in range(max(1, concurrency))))
+
+
+def start_workers(concurrency: int = PUBLICATION_CONCURRENCY):
+    """Start the dispatcher on the running loop (API startup)"""
+    if _worker_tasks:
+        return
+    _worker_tasks.append(asyncio.create_task(_run(concurrency)))
+    print(f"✅ Publication dispatcher started ({concurrency} workers)")
+
+
+async def stop_workers():
+    """Cancel the dispatcher; posts being published are failed after their lease"""
+    for task in _worker_tasks:
+        task.cancel()
+    await asyncio.gather(*_worker_tasks, return_exceptions=True)
+    _worker_tasks.clear()
+
+
+async def stats() -> Dict[str, Any]:
+    try:
+        due = await _posts().count_documents(
+            {"publication_state": "queued", "publish_due_at": {"$lte": datetime.utcnow()}}
+        )
+    except Exception as e:
+        print(f"⚠️ Publication queue stats unavailable: {e}")
+        due = None
+    return {"in_api": PUBLICATION_DISPATCHER_IN_API, "concurrency": PUBLICATION_CONCURRENCY,
+            "due": due, **_counters}
+
+
+async def main():
+    print(f"🚀 Publication dispatcher {WORKER_ID} (concurrency {PUBLICATION_CONCURRENCY})")
+    await _run(PUBLICATION_CONCURRENCY)
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    load_dotenv()
+    asyncio.run(main())
@@ -0,0 +1,396 @@
+# publisher.py
+"""Publication of a generated post on the connected social network.
+
+Shared by POST /api/posts/publish and the scheduled publication dispatcher
+(publication_dispatcher.py). Both first claim the post with claim_post(): a
+single find_one_and_update moving publication_state to "publishing" under a
+lease, refused when the post is already publishing or published. A manual
+publish racing with the dispatcher therefore cannot send the post twice. The
+post is published on the connection of its platform (Facebook page by
+default), then marked published in generated_posts; every path clears the
+scheduling queue fields so a post published by hand is never published again
+by the dispatcher.
+
+Errors are raised as PublishError(status_code, detail, retryable); server.py
+turns them into HTTPException. Only failures that certainly published nothing
+are retryable (upstream 5xx, connection refused before the request was sent):
+rejected requests (token, Graph 4xx) and timeouts or unknown errors once the
+publish request may have reached Graph are not, so the dispatcher never
+publishes a post twice.
+"""
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+from typing import Optional, Dict, Any, List
+
+import httpx
+from fastapi import HTTPException
+from pymongo import ReturnDocument
+
+from async_database import get_async_database
+from http_clients import graph_client
+from media_resolver import resolve_publish_image, convert_to_public_image_url, ImageUnavailable
+
+INSTAGRAM_API_BASE = "https://graph.facebook.com/v21.0"
+PUBLICATION_LEASE_SECONDS = int(os.environ.get("PUBLICATION_LEASE_SECONDS", "300"))
+
+# Champs de la file de publication programmée (voir publication_dispatcher.py)
+QUEUE_FIELDS = {"publish_due_at": "", "publish_lease_until": "", "publish_worker_id": ""}
+# États dans lesquels un post ne peut plus être réclamé ni reprogrammé
+LOCKED_STATES = ["publishing", "published"]
+
+MANUAL_WORKER_ID = f"manual:{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+class PublishError(Exception):
+    def __init__(self, status_code: int, detail: str, retryable: bool = False):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retryable = retryable
+
+
+def graph_error(label: str, response: httpx.Response) -> PublishError:
+    """PublishError of a non-200 Graph response: 4xx are rejections, 5xx may be retried"""
+    try:
+        message = response.json().get('error', {}).get('message') or response.text
+    except ValueError:
+        message = response.text
+    retryable = response.status_code >= 500
+    return PublishError(502 if retryable else 400, f"{label}: {response.status_code} - {message}", retryable)
+
+
+def publish_failure(platform: str, error: Exception) -> PublishError:
+    """Classify an error raised while publishing on `platform`"""
+    print(f"❌ {platform} publishing error: {str(error)}")
+    prefix = f"Erreur de publication {platform}"
+    if isinstance(error, PublishError):
+        return PublishError(error.status_code, f"{prefix}: {error.detail}", error.retryable)
+    if isinstance(error, (httpx.ConnectError, httpx.ConnectTimeout)):
+        # La requête n'a jamais atteint Graph : rien n'a été publié
+        return PublishError(503, f"{prefix}: connexion impossible ({error.__class__.__name__})", retryable=True)
+    if isinstance(error, (httpx.TimeoutException, httpx.TransportError)):
+        # Graph a peut-être publié le post : ne pas republier automatiquement
+        return PublishError(504, f"{prefix}: résultat inconnu ({error.__class__.__name__}) - vérifiez la page")
+    if isinstance(error, HTTPException):
+        # InstagramAPIClient : Graph a refusé le conteneur ou la publication
+        return PublishError(400, f"{prefix}: {error.detail}")
+    if isinstance(error, ImageUnavailable):
+        return PublishError(400, f"{prefix}: {str(error)}")
+    return PublishError(500, f"{prefix}: {str(error)}")
+
+
+async def claim_post(query: Dict[str, Any], worker_id: str, sort=None, projection=None,
+                     inc: Optional[Dict[str, int]] = None,
+                     return_document=ReturnDocument.AFTER) -> Optional[Dict[str, Any]]:
+    """Atomically move one post matching `query` to "publishing" under a lease.
+
+    Posts already publishing or published are never matched. Returns None when
+    nothing could be claimed.
+    """
+    now = datetime.utcnow()
+    update = {
+        "$set": {
+            "publication_state": "publishing",
+            "publish_worker_id": worker_id,
+            "publish_lease_until": now + timedelta(seconds=PUBLICATION_LEASE_SECONDS),
+            "publish_started_at": now
+        }
+    }
+    if inc:
+        update["$inc"] = inc
+    if "publication_state" not in query:
+        query = {**query, "publication_state": {"$nin": LOCKED_STATES}}
+    return await get_async_database().db.generated_posts.find_one_and_update(
+        query, update, sort=sort, projection=projection, return_document=return_document
+    )
+
+
+async def _release_claim(post: Dict[str, Any], worker_id: str, error: PublishError):
+    """End a manual claim that failed: restore the previous state when nothing was
+    published, otherwise mark the post failed so nobody republishes it blindly"""
+    owned = {"_id": post["_id"], "publish_worker_id": worker_id, "publication_state": "publishing"}
+    posts = get_async_database().db.generated_posts
+    if error.retryable or error.status_code < 500:
+        previous = post.get("publication_state")
+        update = {"$unset": {"publish_lease_until": "", "publish_worker_id": ""}}
+        if previous is None:
+            update["$unset"]["publication_state"] = ""
+        else:
+            update["$set"] = {"publication_state": previous}
+        await posts.update_one(owned, update)
+        return
+    await posts.update_one(owned, {
+        "$set": {"publication_state": "failed", "publication_error": error.detail,
+                 "publication_failed_at": datetime.utcnow()},
+        "$unset": QUEUE_FIELDS
+    })
+
+
+def post_content(post: Dict[str, Any]) -> str:
+    content = post.get("text", "")
+    if post.get("hashtags"):
+        hashtags = " ".join([f"#{tag.strip('#')}" for tag in post["hashtags"][:10]])  # Limiter à 10 hashtags
+        content = f"{content}\n\n{hashtags}"
+    return content
+
+
+def post_image_url(post: Dict[str, Any]) -> Optional[str]:
+    """Public URL of the post image (first carousel image), None for text-only posts"""
+    image_url = None
+    if post.get("image_url"):
+        image_url = post["image_url"]
+    elif post.get("images") and len(post["images"]) > 0:
+        # Prendre la première image du carrousel
+        image_url = post["images"][0].get("url")
+    # CONVERTIR URL PROTÉGÉE EN URL PUBLIQUE pour Facebook
+    return convert_to_public_image_url(image_url) if image_url else None
+
+
+async def post_image_urls(post: Dict[str, Any]) -> List[str]:
+    """Public URLs of every image of the post, in carousel order"""
+    items = post.get("carousel_images") or post.get("images") or []
+    urls = [item.get("url") if isinstance(item, dict) else item for item in items]
+
+    visual_id = post.get("visual_id") or ""
+    if not urls and visual_id.startswith("carousel_"):
+        carousel = await get_async_database().db.carousels.find_one(
+            {"id": visual_id, "owner_id": post.get("owner_id")}, {"images": 1}
+        )
+        urls = [image.get("url") for image in (carousel or {}).get("images", [])]
+
+    public_urls = [convert_to_public_image_url(url) for url in urls if url]
+    if not public_urls:
+        single = post_image_url(post)
+        public_urls = [single] if single else []
+    return public_urls
+
+
+async def find_connection(user_id: str, platform: str) -> Dict[str, Any]:
+    """Active connection of the platform, else the Facebook one"""
+    social_connections = await get_async_database().db.social_media_connections.find(
+        {"user_id": user_id, "active": True}
+    ).to_list(length=None)
+
+    if not social_connections:
+        raise PublishError(400, "Aucune connexion sociale active trouvée")
+
+    for platform_name in (platform, "facebook"):
+        for conn in social_connections:
+            if conn["platform"] == platform_name:
+                return conn
+    raise PublishError(400, f"Aucune connexion {platform} trouvée")
+
+
+async def publish_to_facebook(connection: Dict[str, Any], content: str, image_url: Optional[str]) -> Dict[str, Any]:
+    access_token = connection.get("access_token", "")
+    page_id = connection.get("page_id")
+
+    print(f"📘 Publishing to Facebook: {content[:100]}...")
+    print(f"   Page ID: {page_id}")
+    print(f"   Token: {access_token[:20]}..." if access_token else "No token")
+
+    # Validation du token avant publication (selon ChatGPT)
+    if not access_token:
+        raise PublishError(400, "Aucun token Facebook trouvé - Reconnectez votre compte")
+    if access_token.startswith("temp_"):
+        raise PublishError(400, "Token Facebook temporaire détecté - Reconnectez votre compte pour obtenir un vrai token OAuth")
+    if not access_token.startswith("EAAG") and not access_token.startswith("EAA"):
+        raise PublishError(400, f"Format de token Facebook invalide - Token reçu: {access_token[:20]}...")
+
+    if not image_url:
+        # Publication texte seul (sans image)
+        fb_url = f"https://graph.facebook.com/v20.0/{page_id}/feed"
+        fb_response = await graph_client().post(fb_url, data={'message': content, 'access_token': access_token})
+        if fb_response.status_code != 200:
+            raise graph_error("Facebook text post failed", fb_response)
+        result = {"id": fb_response.json().get('id'), "platform": "facebook", "method": "text_only"}
+        print(f"✅ Facebook text post successful: {result['id']}")
+        return result
+
+    # MÉTHODE BINAIRE + CONVERSION JPG selon analyse ChatGPT
+    print(f"🔄 Facebook JPG Upload: resolving image {image_url}")
+
+    # Nos images sont lues directement depuis le cache de dérivés (pas de boucle HTTP)
+    resolved_image = await resolve_publish_image(image_url)
+    jpg_bytes = resolved_image["data"]
+    print(f"✅ Image prête ({resolved_image['source']}): {len(jpg_bytes)} bytes")
+
+    # Upload binaire JPG à Facebook (solution ChatGPT)
+    fb_url = f"https://graph.facebook.com/v20.0/{page_id}/photos"
+
+    print(f"🔄 Envoi à Facebook: {len(jpg_bytes)} bytes JPG, caption: {content[:50]}...")
+
+    fb_response = await graph_client().post(
+        fb_url,
+        data={'caption': content, 'access_token': access_token, 'published': 'true'},  # published critique selon analyse
+        files={'source': ('post_image.jpg', jpg_bytes, resolved_image['content_type'])}
+    )
+    fb_response_text = fb_response.text
+
+    if fb_response.status_code != 200:
+        print(f"❌ Facebook API error: {fb_response.status_code}")
+        print(f"   Réponse: {fb_response_text}")
+        raise graph_error("Facebook JPG upload failed", fb_response)
+
+    # Réponse 200 : la photo est publiée, une erreur ici ne doit pas être rejouée
+    try:
+        facebook_post_id = fb_response.json().get('id')
+    except ValueError:
+        print(f"❌ Erreur parsing réponse Facebook: {fb_response_text}")
+        raise PublishError(502, f"Erreur parsing réponse Facebook: {fb_response_text}")
+    if not facebook_post_id:
+        print(f"❌ Pas d'ID post dans la réponse Facebook: {fb_response_text}")
+        raise PublishError(502, f"Pas d'ID post dans la réponse Facebook: {fb_response_text}")
+
+    print(f"🎉 Facebook JPG publication successful: {facebook_post_id}")
+    return {
+        "id": facebook_post_id,
+        "platform": "facebook",
+        "method": "binary_jpg_upload",
+        "image_size": len(jpg_bytes)
+    }
+
+
+async def publish_to_instagram(connection: Dict[str, Any], content: str, image_urls: List[str]) -> Dict[str, Any]:
+    """Single image or carousel (2+ images); containers are published once Instagram has processed them"""
+    from social_media import InstagramAPIClient
+
+    access_token = connection.get("access_token", "")
+    page_id = connection.get("page_id")
+
+    print(f"📷 Publishing to Instagram: {content[:100]}...")
+    print(f"   Page ID: {page_id}")
+    print(f"   Token: {access_token[:20]}..." if access_token else "No token")
+
+    # Validation du token avant publication
+    if not access_token or access_token.startswith("temp_"):
+        raise PublishError(400, "Token Instagram invalide ou temporaire détecté")
+    if not image_urls:
+        raise PublishError(400, "Instagram nécessite au moins une image")
+
+    # Publication Instagram via Facebook Graph API
+    instagram = InstagramAPIClient(access_token, http_client=graph_client(), base_url=INSTAGRAM_API_BASE)
+    if len(image_urls) > 1:
+        print(f"🎠 Instagram carousel: {len(image_urls)} images")
+        published = await instagram.post_carousel_to_instagram(page_id, image_urls, content)
+    else:
+        published = await instagram.post_to_instagram(page_id, image_urls[0], content)
+
+    print(f"✅ Successfully published to Instagram: {published['media_id']}")
+
+    return {
+        "id": published["media_id"],
+        "media_id": published["container_id"],
+        "status": "published"
+    }
+
+
+async def publish_post(post_id: str, user_id: str, method: str = "manual",
+                       worker_id: Optional[str] = None) -> Dict[str, Any]:
+    """Publish a post of `user_id` and mark it published; returns the API response
+
+    The dispatcher passes the `worker_id` of the claim it already holds; a manual
+    publish claims the post here and releases the claim if publication fails.
+    """
+    adb = get_async_database().db
+
+    if worker_id:
+        post = await adb.generated_posts.find_one(
+            {"id": post_id, "owner_id": user_id, "publication_state": "publishing", "publish_worker_id": worker_id}
+        )
+        if not post:
+            raise PublishError(409, "Publication déjà reprise par un autre processus")
+        return await _publish_claimed(post, user_id, method)
+
+    # Ancien état (BEFORE) pour pouvoir le restaurer si rien n'a été publié
+    post = await claim_post({"id": post_id, "owner_id": user_id}, MANUAL_WORKER_ID,
+                            return_document=ReturnDocument.BEFORE)
+    if not post:
+        existing = await adb.generated_posts.find_one({"id": post_id, "owner_id": user_id}, {"publication_state": 1})
+        if not existing:
+            raise PublishError(404, "Post non trouvé")
+        if existing.get("publication_state") == "published":
+            raise PublishError(409, "Post déjà publié")
+        raise PublishError(409, "Publication déjà en cours pour ce post")
+    try:
+        return await _publish_claimed(post, user_id, method)
+    except PublishError as e:
+        await _release_claim(post, MANUAL_WORKER_ID, e)
+        raise
+    except Exception as e:
+        error = PublishError(500, f"Erreur de publication: {str(e)}")
+        await _release_claim(post, MANUAL_WORKER_ID, error)
+        raise error
+
+
+async def _publish_claimed(post: Dict[str, Any], user_id: str, method: str) -> Dict[str, Any]:
+    adb = get_async_database().db
+    post_id = post["id"]
+
+    # Déterminer sur quelle plateforme publier
+    target_platform = post.get("platform", "facebook").lower()
+    print(f"📱 Target platform: {target_platform}")
+
+    target_connection = await find_connection(user_id, target_platform)
+    target_platform = target_connection["platform"]
+    print(f"📱 Using connection: {target_platform} - {target_connection.get('page_name', 'Unknown')}")
+
+    content = post_content(post)
+    image_urls = await post_image_urls(post)
+    # Facebook : première image du carrousel
+    image_url = image_urls[0] if image_urls else None
+
+    print(f"📝 Content: {content[:100]}...")
+    print(f"🖼️ Image URLs: {image_urls}")
+
+    if target_platform == "facebook":
+        try:
+            result = await publish_to_facebook(target_connection, content, image_url)
+        except Exception as fb_error:
+            raise publish_failure("Facebook", fb_error)
+        print(f"✅ Successfully published to Facebook: {result}")
+        page_name = target_connection.get("page_name", "")
+        message = f"Post publié avec succès sur {page_name or 'Facebook'} !"
+    elif target_platform == "instagram":
+        try:
+            result = await publish_to_instagram(target_connection, content, image_urls)
+        except Exception as ig_error:
+            raise publish_failure("Instagram", ig_error)
+        page_name = target_connection.get("username", "")
+        message = f"Post publié avec succès sur Instagram (@{page_name or 'instagram'}) !"
+    else:
+        raise PublishError(400, f"Publication sur {target_platform} non supportée pour le moment")
+
+    published_at = datetime.utcnow().isoformat()
+
+    # Marquer le post comme publié (et le retirer de la file programmée)
+    update_result = await adb.generated_posts.update_one(
+        {"id": post_id, "owner_id": user_id},
+        {
+            "$set": {
+                "status": "published",
+                "published": True,
+                "published_at": published_at,
+                "platform_post_id": result.get("id"),
+                "publication_platform": target_platform,
+                "publication_page": page_name,
+                "publication_method": method,
+                "publication_state": "published"
+            },
+            "$unset": QUEUE_FIELDS
+        }
+    )
+
+    if update_result.matched_count == 0:
+        print("⚠️ Warning: Could not update post status in database")
+
+    return {
+        "success": True,
+        "message": message,
+        "platform": target_platform,
+        "page_name": str(page_name),
+        "post_id": str(result.get("id", "")),
+        "published_at": published_at
+    }
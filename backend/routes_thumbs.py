@@ -1,26 +1,28 @@
 # routes_thumbs.py
 import os
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Header
+from fastapi import APIRouter, Depends, HTTPException, Header
 from bson import ObjectId
-from datetime import datetime
+from datetime import datetime, timedelta
 from thumbs import (
     generate_image_thumb, generate_video_thumb, build_thumb_path,
     generate_image_thumb_bytes, generate_video_thumb_bytes,
-    generate_image_thumb_from_bytes, generate_video_thumb_from_bytes
+    generate_video_thumb_from_bytes
 )
 from database import get_database
-# Local function to avoid circular import
-def get_media_collection():
-    """Get media collection for thumbnails"""
-    from database import get_database
-    dbm = get_database()
-    return dbm.db.media
+from async_database import get_async_database, to_object_id, canonical_media_id
+from image_pipeline import (
+    run_image_job, make_thumb_set, PipelineBusy, THUMB_SIZE, THUMB_VARIANT_WIDTHS, THUMB_AVIF,
+    BASE_VARIANT_KEY, variant_key, thumb_content_type
+)
+from thumbnail_jobs import enqueue_thumbnail, enqueue_many, job_stats
+from memory_cache import media_ref_cache, thumbnail_cache
+from http_cache import content_etag, http_date, is_not_modified
 import asyncio
 import pymongo
+from pymongo import UpdateOne
 import jwt
 from typing import Optional
-from fastapi.responses import StreamingResponse, JSONResponse
-from io import BytesIO
+from fastapi.responses import JSONResponse, Response
 import requests
 
 router = APIRouter()
@@ -34,65 +36,11 @@ JWT_ALG = os.environ.get("JWT_ALG", "HS256")
 JWT_TTL = int(os.environ.get("JWT_TTL_SECONDS", "604800"))
 JWT_ISS = os.environ.get("JWT_ISS", "claire-marcus-api")
 
-# Sync DB client for GridFS access
-_sync_client = None
-
 def get_sync_db():
-    global _sync_client
-    if _sync_client is None:
-        from pymongo import MongoClient
-        mongo_url = os.environ.get("MONGO_URL")
-        _sync_client = MongoClient(mongo_url)
-    return _sync_client[os.environ.get("DB_NAME", "claire_marcus")]
-
-async def get_media_collection():
-    db = get_database()
-    return db.db.media
-
-def get_sync_media_collection():
-    db = get_database()
-    return db.db.media
-
-THUMBS_COLLECTION = "thumbnails"
-
-def save_db_thumbnail(owner_id: str, media_obj_id, content: bytes, content_type: str = "image/webp"):
-    dbp = get_sync_db()
-    thumbs_col = dbp[THUMBS_COLLECTION]
-    now = datetime.utcnow()
-    thumbs_col.update_one(
-        {"media_id": media_obj_id},
-        {"$set": {
-            "media_id": media_obj_id,
-            "owner_id": owner_id,
-            "content_type": content_type,
-            "size": len(content),
-            "data": content,
-            "updated_at": now
-        }, "$setOnInsert": {"created_at": now}},
-        upsert=True
-    )
-    # update media doc to point to API relative endpoint
-    # Handle both ObjectId (old) and string UUID (new) media IDs
-    if isinstance(media_obj_id, str):
-        # New UUID string format - use sync collection
-        media_collection = get_sync_media_collection()  # Use sync version
-        media_collection.update_one(
-            {"id": media_obj_id}, 
-            {"$set": {"thumb_url": RELATIVE_THUMB_ENDPOINT.format(file_id=media_obj_id)}}
-        )
-    else:
-        # Old ObjectId format
-        media_collection = get_sync_media_collection()  # Use sync version
-        media_collection.update_one(
-            {"_id": media_obj_id}, 
-            {"$set": {"thumb_url": RELATIVE_THUMB_ENDPOINT.format(file_id=str(media_obj_id))}}
-        )
+    """Sync database for background jobs (GridFS reads) - shared pymongo pool"""
+    return get_database().db
 
-def get_db_thumbnail(media_obj_id):
-    """Get thumbnail from DB - supports both ObjectId and string UUID"""
-    dbp = get_sync_db()
-    thumbs_col = dbp[THUMBS_COLLECTION]
-    return thumbs_col.find_one({"media_id": media_obj_id})
+NORMALIZE_BATCH_SIZE = 500
 
 # Robust auth (duplicated to avoid import cycles)
 def get_current_user_id_robust(authorization: Optional[str] = Header(None)) -> str:
@@ -187,8 +135,27 @@ def _decode_user_from_token(token: str) -> Optional[str]:
     except Exception:
         return None
 
+def _requested_variant_keys(w: Optional[int], accept: Optional[str]):
+    """Variant keys to try for ?w= and Accept, best first (nearest configured width at or above w)"""
+    width = THUMB_SIZE
+    if w:
+        larger = [vw for vw in THUMB_VARIANT_WIDTHS if vw >= w]
+        width = larger[0] if larger else THUMB_VARIANT_WIDTHS[-1]
+    formats = ["webp"]
+    if THUMB_AVIF and accept and "image/avif" in accept:
+        formats.insert(0, "avif")
+    return width, [variant_key(width, fmt) for fmt in formats if variant_key(width, fmt) != BASE_VARIANT_KEY]
+
 @router.get("/content/{file_id}/thumb")
-async def stream_thumbnail(file_id: str, token: Optional[str] = None, authorization: Optional[str] = Header(None)):
+async def stream_thumbnail(
+    file_id: str,
+    token: Optional[str] = None,
+    w: Optional[int] = None,
+    authorization: Optional[str] = Header(None),
+    accept: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None),
+    if_modified_since: Optional[str] = Header(None),
+):
     # Allow auth via Authorization header or ?token=
     user_id = None
     if token:
@@ -197,169 +164,183 @@ async def stream_thumbnail(file_id: str, token: Optional[str] = None, authorizat
         user_id = _decode_user_from_token(authorization.split(" ", 1)[1])
     if not user_id:
         raise HTTPException(status_code=401, detail="Unauthorized")
-    """Stream thumbnail from MongoDB; if missing, attempt generation from original (GridFS or disk) and save to DB."""
-    media_collection = get_sync_media_collection()
-    # Try multiple ID formats: new UUID string, old ObjectId, external_id
+    """Stream a thumbnail variant from MongoDB (?w= picks the nearest width, Accept the format);
+    if missing, attempt generation from original (GridFS or disk) and save to DB.
+    Resolved ids and thumbnail bytes are kept in the in-process LRU (memory_cache.py)."""
+    adb = get_async_database()
+    width, wanted_keys = _requested_variant_keys(w, accept)
+
+    # Resolve the media (canonical id, legacy ids through the alias table) once per process
     media_doc = None
-    
-    # First try: new format with string UUID
-    media_doc = media_collection.find_one({"id": file_id, "owner_id": user_id, "deleted": {"$ne": True}})
-    
-    if not media_doc:
-        # Second try: old format with ObjectId
-        try:
-            media_doc = media_collection.find_one({"_id": ObjectId(file_id), "owner_id": user_id, "deleted": {"$ne": True}})
-        except Exception:
-            pass
-    
-    if not media_doc:
-        # Third try: external_id fallback
-        media_doc = media_collection.find_one({"external_id": file_id, "owner_id": user_id, "deleted": {"$ne": True}})
-    if not media_doc:
-        raise HTTPException(status_code=404, detail="Media not found")
+    ref = media_ref_cache.get((user_id, file_id))
+    if ref is None:
+        media_doc = await adb.media.find_for_owner(file_id, user_id)
+        if not media_doc:
+            raise HTTPException(status_code=404, detail="Media not found")
+        # Thumbnails are keyed by the canonical media id
+        ref = {
+            "media_id": canonical_media_id(media_doc),
+            "owner_id": media_doc.get("owner_id"),
+            "file_type": media_doc.get("file_type"),
+        }
+        media_ref_cache.set((user_id, file_id), ref)
+    media_obj_id = ref["media_id"]
+
+    cache_key = (media_obj_id, width, tuple(wanted_keys))
+    entry = thumbnail_cache.get(cache_key)
+    if entry is None:
+        entry = await _load_thumbnail(adb, file_id, user_id, media_doc, ref, width, wanted_keys)
+        if entry["cacheable"]:
+            thumbnail_cache.set(cache_key, entry)
 
-    # Get the media identifier (ObjectId or string UUID)
-    media_obj_id = media_doc.get("_id") or media_doc.get("id")
-    thumb_doc = get_db_thumbnail(media_obj_id)
+    headers = {
+        "ETag": entry["etag"],
+        "Vary": "Accept",
+        "Cache-Control": "public, max-age=604800",  # 1 week, then revalidate with If-None-Match
+        "Expires": http_date(datetime.utcnow() + timedelta(days=7)),
+    }
+    if entry.get("last_modified"):
+        headers["Last-Modified"] = http_date(entry["last_modified"])
+    if not entry["cacheable"]:
+        # Base served in place of a variant still being built
+        headers["Cache-Control"] = "private, max-age=300"
+        headers.pop("Expires")
+
+    if is_not_modified(entry["etag"], entry.get("last_modified"), if_none_match, if_modified_since):
+        return Response(status_code=304, headers=headers)
+    headers["Content-Length"] = str(len(entry["data"]))
+    return Response(content=entry["data"], media_type=entry["content_type"], headers=headers)
+
+async def _load_thumbnail(adb, file_id: str, user_id: str, media_doc, ref, width: int, wanted_keys):
+    """Fetch (or generate) the best thumbnail for the request; returns a cache entry"""
+    media_obj_id = ref["media_id"]
+    thumb_doc = await adb.thumbnails.get(media_obj_id, wanted_keys)
 
     if not thumb_doc:
         # try to generate from original
+        if media_doc is None:
+            media_doc = await adb.media.find_for_owner(file_id, user_id)
+            if not media_doc:
+                raise HTTPException(status_code=404, detail="Media not found")
         file_type = media_doc.get("file_type")
-        original_bytes = _fetch_original_bytes(media_doc)
+        original_bytes = await asyncio.to_thread(_fetch_original_bytes, media_doc)
         if not original_bytes:
             raise HTTPException(status_code=404, detail="Original media missing")
         try:
             if is_image(file_type):
-                content = generate_image_thumb_from_bytes(original_bytes)
+                result = await run_image_job(make_thumb_set, original_bytes)
+                thumb_doc = {"content_type": result["thumb_content_type"], "data": result["thumb"],
+                             "variants": result["variants"], "variant_keys": sorted(result["variants"])}
             elif is_video(file_type):
-                content = generate_video_thumb_from_bytes(original_bytes)
+                content = await asyncio.to_thread(generate_video_thumb_from_bytes, original_bytes)
+                thumb_doc = {"content_type": "image/webp", "data": content}
             else:
                 raise HTTPException(status_code=415, detail="Unsupported media type for thumbnail")
-            save_db_thumbnail(media_doc.get("owner_id"), media_obj_id, content)
-            thumb_doc = get_db_thumbnail(media_obj_id)
+            await adb.thumbnails.save(media_doc.get("owner_id"), media_obj_id, thumb_doc["data"],
+                                      thumb_doc["content_type"], variants=thumb_doc.get("variants"))
+            thumb_doc["updated_at"] = datetime.utcnow()
         except HTTPException:
             raise
+        except PipelineBusy as e:
+            raise HTTPException(status_code=503, detail=f"Thumbnail generation busy: {str(e)}")
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Thumbnail generation failed: {str(e)}")
 
+    # Requested variant, else the base thumbnail
+    served_key = BASE_VARIANT_KEY
     content_type = thumb_doc.get("content_type", "image/webp")
     data = thumb_doc.get("data")
+    variants = thumb_doc.get("variants") or {}
+    for key in wanted_keys:
+        if variants.get(key):
+            served_key, data = key, variants[key]
+            content_type = thumb_content_type(key.split("_", 1)[1])
+            break
     if data is None:
         raise HTTPException(status_code=500, detail="Thumbnail data not found")
 
-    # Add aggressive cache headers for better performance
-    headers = {
-        "Cache-Control": "public, max-age=604800, immutable",  # Cache for 1 week, immutable
-        "ETag": f'"{file_id}-thumb-v2"',
-        "Expires": "Thu, 31 Dec 2025 23:59:59 GMT"
+    cacheable = True
+    if width > THUMB_SIZE and served_key == BASE_VARIANT_KEY and "variant_keys" not in thumb_doc and is_image(ref.get("file_type")):
+        # Thumbnail predates variants: serve the base now, build the set in the background
+        await enqueue_thumbnail(ref.get("owner_id"), media_obj_id, reason="variants")
+        cacheable = False
+
+    return {
+        "data": bytes(data),
+        "content_type": content_type,
+        "etag": content_etag(data),
+        "last_modified": thumb_doc.get("updated_at"),
+        "cacheable": cacheable,
     }
-    return StreamingResponse(BytesIO(data), media_type=content_type, headers=headers)
 
 @router.post("/content/{file_id}/thumbnail")
 async def generate_single_thumb(
     file_id: str,
-    bg: BackgroundTasks,
     user_id: str = Depends(get_current_user_id_robust),
 ):
-    """Generate and store thumbnail in DB for a single file; source may be GridFS or disk."""
-    media_collection = get_sync_media_collection()
-    try:
-        id_filter = {"_id": ObjectId(file_id)}
-    except Exception:
-        id_filter = {"external_id": file_id}
-    doc = media_collection.find_one({**id_filter, "owner_id": user_id, "deleted": {"$ne": True}})
+    """Queue thumbnail generation for a single file; source may be GridFS or disk."""
+    doc = await get_async_database().media.find_for_owner(file_id, user_id)
     if not doc:
         raise HTTPException(status_code=404, detail="Media not found")
 
-    def _job():
-        try:
-            file_type = doc.get("file_type")
-            original_bytes = _fetch_original_bytes(doc)
-            if not original_bytes:
-                print(f"❌ Original missing for media {doc.get('_id')}")
-                return
-            if is_image(file_type):
-                content = generate_image_thumb_from_bytes(original_bytes)
-            elif is_video(file_type):
-                content = generate_video_thumb_from_bytes(original_bytes)
-            else:
-                return
-            save_db_thumbnail(doc.get("owner_id"), doc["_id"], content)
-            print(f"✅ DB thumbnail saved for {doc.get('filename')}")
-        except Exception as e:
-            print(f"❌ Thumbnail generation failed for {doc.get('filename')}: {str(e)}")
-
-    bg.add_task(_job)
-    return {"ok": True, "scheduled": True, "file_id": str(doc["_id"])}
+    media_id = canonical_media_id(doc)
+    await enqueue_thumbnail(user_id, media_id, reason="manual")
+    return {"ok": True, "scheduled": True, "file_id": media_id}
 
 @router.post("/content/thumbnails/rebuild")
 async def rebuild_missing_thumbs(
     limit: int = 500,
-    bg: BackgroundTasks = None,
     user_id: str = Depends(get_current_user_id_robust),
 ):
-    """Rebuild missing DB thumbnails for user (backfill)"""
-    media_collection = get_sync_media_collection()
+    """Rebuild missing DB thumbnails for user (backfill through the durable job queue)"""
+    adb = get_async_database()
+    media_collection = adb.media.collection
     q = {"owner_id": user_id, "deleted": {"$ne": True}}
-    cursor = media_collection.find(q).sort([("created_at", -1)]).limit(limit)
-    docs = list(cursor)
+    cursor = media_collection.find(q, {"_id": 1, "id": 1, "thumb_url": 1}).sort([("created_at", -1)]).limit(limit)
+    docs = await cursor.to_list(length=limit)
 
-    scheduled = 0
-    for d in docs:
-        media_obj_id = d.get("_id")
-        if get_db_thumbnail(media_obj_id):
-            media_collection.update_one({"_id": media_obj_id}, {"$set": {"thumb_url": RELATIVE_THUMB_ENDPOINT.format(file_id=str(media_obj_id))}})
-            continue
+    # One $in query returning only media_ids (no thumbnail blobs)
+    media_ids = [canonical_media_id(d) for d in docs]
+    with_thumbs = await adb.thumbnails.existing_media_ids(media_ids)
 
-        def make_job(doc):
-            def _job():
-                try:
-                    original_bytes = _fetch_original_bytes(doc)
-                    if not original_bytes:
-                        return
-                    if is_image(doc.get("file_type")):
-                        content = generate_image_thumb_from_bytes(original_bytes)
-                    elif is_video(doc.get("file_type")):
-                        content = generate_video_thumb_from_bytes(original_bytes)
-                    else:
-                        return
-                    save_db_thumbnail(doc.get("owner_id"), doc["_id"], content)
-                    print(f"✅ DB thumbnail backfilled for {doc.get('filename')}")
-                except Exception as e:
-                    print(f"❌ Thumbnail generation failed for {doc.get('filename')}: {str(e)}")
-            return _job
-
-        if bg is not None:
-            bg.add_task(make_job(d))
-            scheduled += 1
-        else:
-            job = make_job(d)
-            job()
-            scheduled += 1
+    url_updates = [
+        UpdateOne({"_id": d["_id"]}, {"$set": {"thumb_url": RELATIVE_THUMB_ENDPOINT.format(file_id=mid)}})
+        for d, mid in zip(docs, media_ids)
+        if mid in with_thumbs and d.get("thumb_url") != RELATIVE_THUMB_ENDPOINT.format(file_id=mid)
+    ]
+    if url_updates:
+        await media_collection.bulk_write(url_updates, ordered=False)
+    missing = [mid for mid in media_ids if mid not in with_thumbs]
+
+    # Jobs hold ids only; workers load each original when they run it
+    scheduled = await enqueue_many(user_id, missing, reason="rebuild")
 
-    return {"ok": True, "scheduled": scheduled, "files_found": len(docs)}
+    return {"ok": True, "scheduled": scheduled, "already_queued": len(missing) - scheduled, "files_found": len(docs)}
 
 @router.get("/content/thumbnails/status")
 async def get_thumbnail_status(
     user_id: str = Depends(get_current_user_id_robust),
 ):
     """Get thumbnail generation status for user (DB-based)"""
-    media_collection = get_sync_media_collection()
-    dbp = get_sync_db()
-    thumbs_col = dbp[THUMBS_COLLECTION]
+    adb = get_async_database()
 
     total_query = {"owner_id": user_id, "deleted": {"$ne": True}}
-    total_files = media_collection.count_documents(total_query)
+    total_files = await adb.media.collection.count_documents(total_query)
 
-    with_thumbs = thumbs_col.count_documents({"owner_id": user_id})
+    with_thumbs = await adb.thumbnails.count_for_owner(user_id)
 
     missing_thumbs = max(total_files - with_thumbs, 0)
 
+    # Durable job queue progress (pending/running/done/failed)
+    jobs = await job_stats(user_id)
+
     return {
         "total_files": total_files,
         "with_thumbnails": with_thumbs,
         "missing_thumbnails": missing_thumbs,
-        "completion_percentage": round((with_thumbs / total_files * 100) if total_files > 0 else 0, 1)
+        "completion_percentage": round((with_thumbs / total_files * 100) if total_files > 0 else 0, 1),
+        "jobs": jobs,
+        "in_progress": jobs["pending"] + jobs["running"] > 0
     }
 
 @router.post("/content/thumbnails/normalize")
@@ -367,13 +348,23 @@ async def normalize_thumb_urls(
     user_id: str = Depends(get_current_user_id_robust),
 ):
     """Normalize all media.thumb_url to relative API endpoint for this user"""
-    media_collection = get_sync_media_collection()
+    media_collection = get_async_database().media.collection
     q = {"owner_id": user_id, "$or": [{"deleted": {"$ne": True}}, {"deleted": {"$exists": False}}]}
-    cursor = media_collection.find(q, {"_id": 1})
+    cursor = media_collection.find(q, {"_id": 1, "id": 1, "thumb_url": 1})
     updated = 0
-    for d in cursor:
-        media_collection.update_one({"_id": d["_id"]}, {"$set": {"thumb_url": RELATIVE_THUMB_ENDPOINT.format(file_id=str(d["_id"]))}})
-        updated += 1
+    ops = []
+    async for d in cursor:
+        thumb_url = RELATIVE_THUMB_ENDPOINT.format(file_id=canonical_media_id(d))
+        if d.get("thumb_url") == thumb_url:
+            continue
+        ops.append(UpdateOne({"_id": d["_id"]}, {"$set": {"thumb_url": thumb_url}}))
+        if len(ops) >= NORMALIZE_BATCH_SIZE:
+            result = await media_collection.bulk_write(ops, ordered=False)
+            updated += result.modified_count
+            ops = []
+    if ops:
+        result = await media_collection.bulk_write(ops, ordered=False)
+        updated += result.modified_count
     return {"ok": True, "updated": updated}
 
 @router.get("/content/thumbnails/orphans")
@@ -382,35 +373,44 @@ async def list_orphan_media(
     user_id: str = Depends(get_current_user_id_robust),
 ):
     """List media records where source file is missing on disk and not present in GridFS"""
-    media_collection = get_sync_media_collection()
-    from gridfs import GridFS
-    dbp = get_sync_db()
-    fs = GridFS(dbp)
+    adb = get_async_database()
+    media_collection = adb.media.collection
 
     q = {"owner_id": user_id, "$or": [{"deleted": {"$ne": True}}, {"deleted": {"$exists": False}}]}
-    cursor = media_collection.find(q).limit(max(1, int(limit)))
+    docs = await media_collection.find(q).limit(max(1, int(limit))).to_list(length=max(1, int(limit)))
+
+    # One query for all GridFS originals instead of fs.exists() per document
+    grid_ids = [to_object_id(d.get("gridfs_id")) for d in docs if d.get("storage") == "gridfs"]
+    grid_ids = [gid for gid in grid_ids if gid is not None]
+    existing_grid_ids = set()
+    if grid_ids:
+        async for f in adb.db["fs.files"].find({"_id": {"$in": grid_ids}}, {"_id": 1}):
+            existing_grid_ids.add(f["_id"])
+
     orphans = []
-    for d in cursor:
+    for d in docs:
         storage = d.get("storage")
         filename = d.get("filename")
         is_missing = False
         if storage == "gridfs":
-            gid = d.get("gridfs_id")
-            try:
-                gid = ObjectId(gid) if isinstance(gid, str) else gid
-                file_exists = gid is not None and fs.exists(gid)
-                is_missing = not file_exists
-            except Exception:
-                is_missing = True
+            gid = to_object_id(d.get("gridfs_id"))
+            is_missing = gid is None or gid not in existing_grid_ids
         else:
             src_path = os.path.join(UPLOADS_DIR, filename) if filename else None
             is_missing = (not filename) or (not os.path.isfile(src_path))
         if is_missing:
             orphans.append({
-                "id": str(d.get("_id")),
+                "id": canonical_media_id(d),
                 "filename": filename,
                 "file_type": d.get("file_type"),
                 "storage": storage or "disk",
                 "reason": "missing_in_gridfs" if storage == "gridfs" else ("no_filename" if not filename else "missing_on_disk")
             })
+    # Keep the accessibility flag used by /content/pending in sync with what we found
+    orphan_ids = [o["id"] for o in orphans if o["reason"] == "missing_in_gridfs"]
+    if orphan_ids:
+        await media_collection.update_many(
+            {"id": {"$in": orphan_ids}, "owner_id": user_id},
+            {"$set": {"accessible": False, "accessibility_checked_at": datetime.utcnow()}}
+        )
     return {"orphans": orphans, "count": len(orphans)}
\ No newline at end of file
@@ -1,12 +1,16 @@
-from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, BackgroundTasks, Header, Form, Response
+from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, Header, Form, Response, Request
 from fastapi.responses import StreamingResponse
 from typing import Optional, List
 from datetime import datetime
 from bson import ObjectId
 from database import get_database
-from routes_thumbs import save_db_thumbnail
-from thumbs import generate_image_thumb_from_bytes, generate_video_thumb_from_bytes
-from server import get_media_collection
+from async_database import get_async_database, canonical_media_id
+from thumbnail_jobs import enqueue_thumbnail
+from image_pipeline import run_image_job, process_upload_image, PipelineBusy
+from derivatives import invalidate_derivatives, media_key
+from memory_cache import invalidate_media
+from http_cache import make_etag, http_date, is_not_modified, parse_range, RangeNotSatisfiable
+import asyncio
 import jwt
 import uuid
 import subprocess
@@ -94,6 +98,43 @@ def compress_video_to_720p(input_data: bytes, max_duration_seconds: int = 300) -
             pass
         return input_data
 
+async def _process_upload_bytes(data: bytes, content_type: Optional[str], filename: Optional[str]):
+    """Prepare an uploaded file for storage: (final_data, thumb_bytes, thumb_content_type, thumb_variants).
+
+    Images go through the shared image process pool (EXIF rotate, resize to
+    1024px, progressive JPEG and the square thumbnail variants in one decode); videos
+    larger than 5MB are compressed to 720p by ffmpeg in a worker thread.
+    PipelineBusy propagates so the endpoint can answer 503.
+    """
+    if content_type and content_type.startswith('image/'):
+        try:
+            result = await run_image_job(process_upload_image, data)
+            print(f"✅ Image resized: {result['width']}x{result['height']}")
+            return result["data"], result["thumb"], result["thumb_content_type"], result["variants"]
+        except PipelineBusy:
+            raise
+        except Exception as e:
+            print(f"⚠️ Image resize failed, using original: {e}")
+            return data, None, None, None
+
+    if content_type and content_type.startswith('video/'):
+        # Compress video to 720p max
+        try:
+            print(f"🎥 Processing video file: {filename}")
+            original_size_mb = len(data) / 1024 / 1024
+            print(f"📊 Original video size: {original_size_mb:.1f}MB")
+
+            # Only compress if video is large enough to benefit
+            if original_size_mb > 5:  # Only compress videos larger than 5MB
+                final_data = await asyncio.to_thread(compress_video_to_720p, data)
+                print(f"📊 Final video size: {len(final_data) / 1024 / 1024:.1f}MB")
+                return final_data, None, None, None
+            print(f"📊 Video too small to compress, keeping original")
+        except Exception as e:
+            print(f"⚠️ Video compression failed, using original: {e}")
+
+    return data, None, None, None
+
 # JWT / Auth configuration (align with server.py)
 import os
 JWT_SECRET = os.environ.get('JWT_SECRET_KEY', 'your-secret-key-change-this-in-production')
@@ -136,13 +177,11 @@ async def upload_content(
     file: UploadFile = File(...),
     attributed_month: Optional[str] = Form(None),
     upload_type: Optional[str] = Form(None),
-    bg: BackgroundTasks = None,
     user_id: str = Depends(get_current_user_id_robust)
 ):
-    """Upload a single file to GridFS and create media record; schedule thumbnail generation."""
+    """Upload a single file to GridFS and create media record; thumbnail stored or queued."""
     try:
-        dbm = get_database()
-        db = dbm.db
+        adb = get_async_database()
 
         # Read file bytes
         data = await file.read()
@@ -150,123 +189,13 @@ async def upload_content(
         if size == 0:
             raise HTTPException(400, "Empty file")
 
-        # Resize image if it's an image file
-        final_data = data
-        if file.content_type and file.content_type.startswith('image/'):
-            try:
-                import tempfile
-                import os
-                from PIL import Image
-                import PIL.ExifTags
-                
-                # Create temp files
-                with tempfile.NamedTemporaryFile(delete=False, suffix='.tmp') as temp_input:
-                    temp_input.write(data)
-                    temp_input_path = temp_input.name
-                
-                with tempfile.NamedTemporaryFile(delete=False, suffix='.jpg') as temp_output:
-                    temp_output_path = temp_output.name
-                
-                # Resize image inline instead of importing
-                try:
-                    with Image.open(temp_input_path) as im:
-                        # Fix EXIF orientation (Pillow 11.x compatible)
-                        try:
-                            exif = im._getexif()
-                            if exif is not None:
-                                # Use the orientation value directly (Pillow 11.x compatibility)
-                                orientation_key = None
-                                for tag, value in PIL.ExifTags.TAGS.items():
-                                    if value == 'Orientation':
-                                        orientation_key = tag
-                                        break
-                                
-                                if orientation_key and orientation_key in exif:
-                                    orientation = exif[orientation_key]
-                                    if orientation == 3:
-                                        im = im.rotate(180, expand=True)
-                                    elif orientation == 6:
-                                        im = im.rotate(270, expand=True)
-                                    elif orientation == 8:
-                                        im = im.rotate(90, expand=True)
-                        except (AttributeError, KeyError, TypeError):
-                            pass
-                        
-                        # Convert to RGB
-                        im = im.convert("RGB")
-                        original_width, original_height = im.size
-                        
-                        # Calculate new dimensions (1024px on smallest side)
-                        min_dimension = 1024
-                        
-                        if original_width <= original_height:
-                            # Width is smaller - resize to 1024 width
-                            if original_width > min_dimension:
-                                new_width = min_dimension
-                                new_height = int((original_height * new_width) / original_width)
-                            else:
-                                new_width = original_width
-                                new_height = original_height
-                        else:
-                            # Height is smaller - resize to 1024 height
-                            if original_height > min_dimension:
-                                new_height = min_dimension
-                                new_width = int((original_width * new_height) / original_height)
-                            else:
-                                new_width = original_width
-                                new_height = original_height
-                        
-                        # Resize if needed
-                        if new_width != original_width or new_height != original_height:
-                            im = im.resize((new_width, new_height), Image.LANCZOS)
-                        
-                        # Save with optimizations
-                        im.save(temp_output_path, format="JPEG", quality=85, optimize=True, progressive=True, dpi=(72, 72))
-                        
-                        # Read resized data if successful
-                        with open(temp_output_path, 'rb') as f:
-                            final_data = f.read()
-                        
-                        print(f"✅ Image resized: {new_width}x{new_height}")
-                        
-                except Exception as resize_error:
-                    print(f"⚠️ Image resize failed: {resize_error}")
-                    # Use original data if resize fails
-                    final_data = data
-                
-                # Cleanup temp files
-                os.unlink(temp_input_path)
-                if os.path.exists(temp_output_path):
-                    os.unlink(temp_output_path)
-                
-            except Exception as e:
-                print(f"⚠️ Image resize failed, using original: {e}")
-                final_data = data
-        
-        elif file.content_type and file.content_type.startswith('video/'):
-            # Compress video to 720p max
-            try:
-                print(f"🎥 Processing video file: {file.filename}")
-                original_size_mb = len(data) / 1024 / 1024
-                print(f"📊 Original video size: {original_size_mb:.1f}MB")
-                
-                # Only compress if video is large enough to benefit
-                if original_size_mb > 5:  # Only compress videos larger than 5MB
-                    final_data = compress_video_to_720p(data)
-                    compressed_size_mb = len(final_data) / 1024 / 1024
-                    print(f"📊 Final video size: {compressed_size_mb:.1f}MB")
-                else:
-                    print(f"📊 Video too small to compress, keeping original")
-                    final_data = data
-                    
-            except Exception as e:
-                print(f"⚠️ Video compression failed, using original: {e}")
-                final_data = data
-        
-        # Store in GridFS
+        # Resize image / compress video (CPU work runs in the image process pool)
+        final_data, thumb_bytes, thumb_type, thumb_variants = await _process_upload_bytes(data, file.content_type, file.filename)
+
+        # Store in GridFS (sync GridFS API keeps contentType on fs.files; run off the event loop)
         from gridfs import GridFS
-        fs = GridFS(db)
-        grid_id = fs.put(final_data, filename=file.filename, content_type=file.content_type, uploadDate=datetime.utcnow())
+        fs = GridFS(get_database().db)
+        grid_id = await asyncio.to_thread(fs.put, final_data, filename=file.filename, content_type=file.content_type, uploadDate=datetime.utcnow())
 
         # Generate unique ID first for URLs
         doc_id = str(uuid.uuid4())
@@ -287,39 +216,31 @@ async def upload_content(
             "thumb_url": f"/api/content/{doc_id}/thumb",
             "attributed_month": attributed_month,
             "upload_type": upload_type,
-            "source": "upload"  # Mark as regular upload vs pixabay
+            "source": "upload",  # Mark as regular upload vs pixabay
+            "accessible": True  # Original just stored in GridFS
         }
-        res = db.media.insert_one(media_doc)
-        media_id = res.inserted_id
+        await adb.media.insert(media_doc)
 
-        # Schedule thumbnail generation
-        def _thumb_job():
-            try:
-                if file.content_type and file.content_type.startswith('image/'):
-                    thumb_bytes = generate_image_thumb_from_bytes(final_data)  # Use processed data
-                    save_db_thumbnail(user_id, doc_id, thumb_bytes)  # Use doc_id instead of media_id
-                    print(f"✅ Thumbnail generated for {doc_id}")
-                elif file.content_type and file.content_type.startswith('video/'):
-                    thumb_bytes = generate_video_thumb_from_bytes(final_data)
-                    save_db_thumbnail(user_id, doc_id, thumb_bytes)
-                    print(f"✅ Video thumbnail generated for {doc_id}")
-            except Exception as e:
-                print(f"⚠️ Thumbnail generation error for upload {doc_id}: {e}")
-        if bg is not None:
-            bg.add_task(_thumb_job)
-        else:
-            _thumb_job()
+        if thumb_bytes:
+            # Thumbnail produced by the same pipeline pass as the resize
+            await adb.thumbnails.save(user_id, doc_id, thumb_bytes, thumb_type, variants=thumb_variants)
+            print(f"✅ Thumbnail generated for {doc_id}")
+        elif file.content_type and file.content_type.startswith(('image/', 'video/')):
+            # Videos (ffmpeg) and failed image passes go through the durable job queue
+            await enqueue_thumbnail(user_id, doc_id)
 
         return {
             "ok": True,
-            "id": str(media_id),
+            "id": doc_id,
             "filename": file.filename,
             "file_type": file.content_type,
             "size": size,
-            "thumb_url": f"/api/content/{media_id}/thumb"
+            "thumb_url": f"/api/content/{doc_id}/thumb"
         }
     except HTTPException:
         raise
+    except PipelineBusy as e:
+        raise HTTPException(503, f"Upload processing busy, retry shortly: {str(e)}")
     except Exception as e:
         raise HTTPException(500, f"Upload failed: {str(e)}")
 
@@ -331,137 +252,31 @@ async def upload_content_batch(
     upload_type: Optional[str] = Form(None),
     common_title: Optional[str] = Form(None),
     common_context: Optional[str] = Form(None),
-    bg: BackgroundTasks = None,
     user_id: str = Depends(get_current_user_id_robust)
 ):
     """Batch upload multiple files to GridFS, return created items."""
     try:
-        dbm = get_database()
-        db = dbm.db
+        adb = get_async_database()
         from gridfs import GridFS
-        fs = GridFS(db)
+        fs = GridFS(get_database().db)
 
         created = []
         
         # Generate a single carousel_id for all files in this batch if it's a carousel upload
         batch_carousel_id = str(uuid.uuid4()) if upload_type == "carousel" and common_title else None
         
+        # Read every file, then fan the CPU work out across the image process pool
+        payloads = []
         for file in files:
             data = await file.read()
-            if not data:
-                continue
-            
-            # Resize image if it's an image file (same logic as single upload)
-            final_data = data
-            if file.content_type and file.content_type.startswith('image/'):
-                try:
-                    import tempfile
-                    import os
-                    from PIL import Image
-                    import PIL.ExifTags
-                    
-                    # Create temp files
-                    with tempfile.NamedTemporaryFile(delete=False, suffix='.tmp') as temp_input:
-                        temp_input.write(data)
-                        temp_input_path = temp_input.name
-                    
-                    with tempfile.NamedTemporaryFile(delete=False, suffix='.jpg') as temp_output:
-                        temp_output_path = temp_output.name
-                    
-                    try:
-                        with Image.open(temp_input_path) as im:
-                            # Fix EXIF orientation (Pillow 11.x compatible)
-                            try:
-                                exif = im._getexif()
-                                if exif is not None:
-                                    # Use the orientation value directly (Pillow 11.x compatibility)
-                                    orientation_key = None
-                                    for tag, value in PIL.ExifTags.TAGS.items():
-                                        if value == 'Orientation':
-                                            orientation_key = tag
-                                            break
-                                    
-                                    if orientation_key and orientation_key in exif:
-                                        orientation = exif[orientation_key]
-                                        if orientation == 3:
-                                            im = im.rotate(180, expand=True)
-                                        elif orientation == 6:
-                                            im = im.rotate(270, expand=True)
-                                        elif orientation == 8:
-                                            im = im.rotate(90, expand=True)
-                            except (AttributeError, KeyError, TypeError):
-                                pass
-                            
-                            # Convert to RGB and resize
-                            im = im.convert("RGB")
-                            original_width, original_height = im.size
-                            
-                            # Calculate new dimensions (1024px on smallest side)
-                            min_dimension = 1024
-                            
-                            if original_width <= original_height:
-                                if original_width > min_dimension:
-                                    new_width = min_dimension
-                                    new_height = int((original_height * new_width) / original_width)
-                                else:
-                                    new_width = original_width
-                                    new_height = original_height
-                            else:
-                                if original_height > min_dimension:
-                                    new_height = min_dimension
-                                    new_width = int((original_width * new_height) / original_height)
-                                else:
-                                    new_width = original_width
-                                    new_height = original_height
-                            
-                            # Resize if needed
-                            if new_width != original_width or new_height != original_height:
-                                im = im.resize((new_width, new_height), Image.LANCZOS)
-                            
-                            # Save with optimizations
-                            im.save(temp_output_path, format="JPEG", quality=85, optimize=True, progressive=True, dpi=(72, 72))
-                        
-                        # Read resized data if successful
-                        with open(temp_output_path, 'rb') as f:
-                            final_data = f.read()
-                        
-                        print(f"✅ Batch image resized: {new_width}x{new_height}")
-                        
-                    except Exception as resize_error:
-                        print(f"⚠️ Batch image resize failed: {resize_error}")
-                        # Use original data if resize fails
-                        final_data = data
-                    
-                    # Cleanup temp files
-                    os.unlink(temp_input_path)
-                    if os.path.exists(temp_output_path):
-                        os.unlink(temp_output_path)
-                        
-                except Exception as e:
-                    print(f"⚠️ Image processing error: {e}")
-                    final_data = data
-                    
-            elif file.content_type and file.content_type.startswith('video/'):
-                # Compress video to 720p max (batch version)
-                try:
-                    print(f"🎥 Processing batch video file: {file.filename}")
-                    original_size_mb = len(data) / 1024 / 1024
-                    print(f"📊 Original video size: {original_size_mb:.1f}MB")
-                    
-                    # Only compress if video is large enough to benefit
-                    if original_size_mb > 5:  # Only compress videos larger than 5MB
-                        final_data = compress_video_to_720p(data)
-                        compressed_size_mb = len(final_data) / 1024 / 1024
-                        print(f"📊 Final video size: {compressed_size_mb:.1f}MB")
-                    else:
-                        print(f"📊 Video too small to compress, keeping original")
-                        final_data = data
-                        
-                except Exception as e:
-                    print(f"⚠️ Video compression failed, using original: {e}")
-                    final_data = data
-            
-            grid_id = fs.put(final_data, filename=file.filename, content_type=file.content_type, uploadDate=datetime.utcnow())
+            if data:
+                payloads.append((file, data))
+        processed = await asyncio.gather(*(
+            _process_upload_bytes(data, file.content_type, file.filename) for file, data in payloads
+        ))
+
+        for (file, data), (final_data, thumb_bytes, thumb_type, thumb_variants) in zip(payloads, processed):
+            grid_id = await asyncio.to_thread(fs.put, final_data, filename=file.filename, content_type=file.content_type, uploadDate=datetime.utcnow())
             
             # Generate unique ID first for URLs
             doc_id = str(uuid.uuid4())
@@ -496,28 +311,16 @@ async def upload_content_batch(
                 "title": title,  # Add title field
                 "context": context,  # Add context field
                 "common_title": common_title if upload_type == "carousel" else None,  # For carousel grouping
-                "carousel_id": batch_carousel_id  # Group carousel items with same ID
+                "carousel_id": batch_carousel_id,  # Group carousel items with same ID
+                "accessible": True  # Original just stored in GridFS
             }
-            res = db.media.insert_one(media_doc)
-            media_id = res.inserted_id
+            await adb.media.insert(media_doc)
 
-            def _thumb_job_local(fid=doc_id, bytes_data=final_data, ctype=file.content_type):
-                try:
-                    if ctype and ctype.startswith('image/'):
-                        thumb_bytes = generate_image_thumb_from_bytes(bytes_data)
-                        save_db_thumbnail(user_id, fid, thumb_bytes)
-                        print(f"✅ Local thumbnail generated for {fid}")
-                    elif ctype and ctype.startswith('video/'):
-                        thumb_bytes = generate_video_thumb_from_bytes(bytes_data)
-                        save_db_thumbnail(user_id, fid, thumb_bytes)
-                        print(f"✅ Local video thumbnail generated for {fid}")
-                except Exception as e:
-                    print(f"⚠️ Thumbnail generation error for upload {fid}: {e}")
-
-            if bg is not None:
-                bg.add_task(_thumb_job_local)
-            else:
-                _thumb_job_local()
+            if thumb_bytes:
+                await adb.thumbnails.save(user_id, doc_id, thumb_bytes, thumb_type, variants=thumb_variants)
+                print(f"✅ Local thumbnail generated for {doc_id}")
+            elif file.content_type and file.content_type.startswith(('image/', 'video/')):
+                await enqueue_thumbnail(user_id, doc_id)
 
             created.append({
                 "id": doc_id,  # Use UUID for consistency with content/pending
@@ -530,15 +333,43 @@ async def upload_content_batch(
         return {"ok": True, "created": created, "count": len(created)}
     except HTTPException:
         raise
+    except PipelineBusy as e:
+        raise HTTPException(503, f"Upload processing busy, retry shortly: {str(e)}")
     except Exception as e:
         raise HTTPException(500, f"Batch upload failed: {str(e)}")
 
 
+async def _iter_gridfs_range(grid_out, start: int, end: int):
+    """Yield bytes start..end (inclusive) from a GridFS file, one chunk at a time"""
+    grid_out.seek(start)
+    remaining = end - start + 1
+    chunk_size = grid_out.chunk_size or 255 * 1024
+    while remaining > 0:
+        data = await grid_out.read(min(chunk_size, remaining))
+        if not data:
+            break
+        remaining -= len(data)
+        yield data
+
+
 @router.get("/content/{file_id}/file")
 @router.head("/content/{file_id}/file")
-async def get_original_file(file_id: str, token: Optional[str] = None, authorization: Optional[str] = Header(None), range: Optional[str] = Header(None)):
-    """Stream original file from GridFS with auth and Range support for videos."""
-    print(f"🔍 GET /content/{file_id}/file - token: {token is not None}, auth: {authorization is not None}, range: {range}")
+async def get_original_file(
+    file_id: str,
+    request: Request,
+    token: Optional[str] = None,
+    authorization: Optional[str] = Header(None),
+    range: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None),
+    if_modified_since: Optional[str] = Header(None),
+    if_range: Optional[str] = Header(None),
+):
+    """Stream original file from GridFS with auth, Range support and conditional requests.
+
+    Only the requested byte range is read from GridFS, chunk by chunk, so memory per
+    request is bounded by the GridFS chunk size whatever the file size.
+    """
+    print(f"🔍 {request.method} /content/{file_id}/file - token: {token is not None}, auth: {authorization is not None}, range: {range}")
     
     # Allow auth via Authorization header or ?token=
     user_id = None
@@ -554,91 +385,80 @@ async def get_original_file(file_id: str, token: Optional[str] = None, authoriza
         raise HTTPException(status_code=401, detail="Authentication required")
     
     try:
-        dbm = get_database()
-        db = dbm.db
-        from gridfs import GridFS
-        fs = GridFS(db)
+        adb = get_async_database()
 
         # Find media using the proper collection and field
-        media_collection = get_media_collection()
-        media = media_collection.find_one({"id": file_id, "owner_id": user_id, "deleted": {"$ne": True}})
+        media = await adb.media.find_for_owner(file_id, user_id)
         if not media:
             raise HTTPException(404, "Media not found")
         # Check storage type
         storage_type = media.get("storage", "")
         
-        if storage_type == "gridfs":
-            # Handle GridFS stored files
-            if not media.get("gridfs_id"):
-                raise HTTPException(404, "GridFS ID missing")
-                
-            gid = media.get("gridfs_id")
-            if isinstance(gid, str):
-                gid = ObjectId(gid)
-            f = fs.get(gid)
-            content_type = f.content_type or media.get("file_type") or "application/octet-stream"
-            
-            # Read all file data into memory for range support
-            file_data = f.read()
-            file_size = len(file_data)
-            
-        elif storage_type == "external" and media.get("is_external"):
+        if storage_type == "external" and media.get("is_external"):
             # Handle external/repaired files - return placeholder or redirect
-            file_path = media.get("file_path", "")
             url = media.get("url", "")
             
             if url and url.startswith("http"):
                 # Redirect to external URL
                 from fastapi.responses import RedirectResponse
                 return RedirectResponse(url=url)
-            else:
-                # Return a placeholder response
-                placeholder_content = b"External file - use thumbnail"
-                file_data = placeholder_content
-                file_size = len(file_data)
-                content_type = media.get("file_type") or "image/jpeg"
+            # Return a placeholder response
+            return Response(content=b"External file - use thumbnail", media_type=media.get("file_type") or "image/jpeg")
         
-        else:
+        if storage_type != "gridfs":
             raise HTTPException(404, "File not accessible - invalid storage type")
         
-        # Handle Range requests for video streaming
-        if range and content_type.startswith('video/'):
+        # Handle GridFS stored files
+        if not media.get("gridfs_id"):
+            raise HTTPException(404, "GridFS ID missing")
+            
+        gid = media.get("gridfs_id")
+        if isinstance(gid, str):
+            gid = ObjectId(gid)
+        f = await adb.fs.open_download_stream(gid)
+        content_type = f.content_type or media.get("file_type") or "application/octet-stream"
+        file_size = f.length
+        
+        # Validators from GridFS metadata (md5 is absent on files written by recent drivers)
+        etag = make_etag(gid, f.md5 or file_size, f.upload_date.isoformat() if f.upload_date else None)
+        headers = {
+            "Accept-Ranges": "bytes",
+            "ETag": etag,
+            "Cache-Control": "private, max-age=86400",
+        }
+        last_modified = http_date(f.upload_date)
+        if last_modified:
+            headers["Last-Modified"] = last_modified
+        
+        if is_not_modified(etag, f.upload_date, if_none_match, if_modified_since):
+            return Response(status_code=304, headers=headers)
+        
+        # Handle Range requests (video seeks, resumable downloads); If-Range falls back to the full body
+        byte_range = None
+        if range and (not if_range or if_range.strip() == etag):
             try:
-                ranges = range.replace('bytes=', '').split('-')
-                start = int(ranges[0]) if ranges[0] else 0
-                end = int(ranges[1]) if ranges[1] else file_size - 1
-                
-                if start >= file_size or end >= file_size:
-                    raise HTTPException(416, "Range not satisfiable")
-                
-                chunk_data = file_data[start:end+1]
-                content_length = len(chunk_data)
-                
-                from fastapi import Response
-                headers = {
-                    'Content-Range': f'bytes {start}-{end}/{file_size}',
-                    'Accept-Ranges': 'bytes',
-                    'Content-Length': str(content_length),
-                    'Content-Type': content_type
-                }
-                
-                return Response(
-                    content=chunk_data,
-                    status_code=206,  # Partial Content
-                    headers=headers
-                )
-            except (ValueError, IndexError):
-                # Invalid range, fall back to full file
-                pass
+                byte_range = parse_range(range, file_size)
+            except RangeNotSatisfiable:
+                return Response(status_code=416, headers={"Content-Range": f"bytes */{file_size}"})
         
-        # Return full file with proper headers for video
-        headers = {}
-        if content_type.startswith('video/'):
-            headers['Accept-Ranges'] = 'bytes'
-            headers['Content-Length'] = str(file_size)
+        if byte_range:
+            start, end = byte_range
+            status_code = 206  # Partial Content
+            headers["Content-Range"] = f"bytes {start}-{end}/{file_size}"
+        else:
+            start, end = 0, file_size - 1
+            status_code = 200
+        headers["Content-Length"] = str(end - start + 1)
         
-        from io import BytesIO
-        return StreamingResponse(BytesIO(file_data), media_type=content_type, headers=headers)
+        if request.method == "HEAD" or file_size == 0:
+            return Response(status_code=status_code, headers=headers, media_type=content_type)
+        
+        return StreamingResponse(
+            _iter_gridfs_range(f, start, end),
+            status_code=status_code,
+            media_type=content_type,
+            headers=headers
+        )
         
     except HTTPException:
         raise
@@ -650,19 +470,15 @@ async def get_original_file(file_id: str, token: Optional[str] = None, authoriza
 async def delete_content(file_id: str, user_id: str = Depends(get_current_user_id_robust)):
     """Delete media: thumbnail doc, GridFS original, and media document."""
     try:
-        dbm = get_database()
-        db = dbm.db
-        from gridfs import GridFS
-        fs = GridFS(db)
+        adb = get_async_database()
 
         # Find media using the proper collection and field
-        media_collection = get_media_collection()
-        media = media_collection.find_one({"id": file_id, "owner_id": user_id, "deleted": {"$ne": True}})
+        media = await adb.media.find_for_owner(file_id, user_id)
         if not media:
             raise HTTPException(404, "Media not found")
 
         # Delete thumbnail document (if present)
-        db.thumbnails.delete_one({"media_id": media.get("_id")})
+        await adb.thumbnails.delete(canonical_media_id(media))
 
         # Delete original in GridFS
         if media.get("storage") == "gridfs" and media.get("gridfs_id"):
@@ -674,12 +490,14 @@ async def delete_content(file_id: str, user_id: str = Depends(get_current_user_i
                     gid = None
             if gid is not None:
                 try:
-                    fs.delete(gid)
+                    await adb.fs.delete(gid)
                 except Exception as e:
                     print(f"⚠️ Failed to delete GridFS file: {e}")
 
-        # Delete media document
-        db.media.delete_one({"_id": media.get("_id")})
+        # Delete media document and its cached publish JPEG
+        await adb.media.collection.delete_one({"_id": media.get("_id")})
+        await invalidate_derivatives(media_key(media))
+        invalidate_media(media)
 
         return {"ok": True, "deleted": 1}
     except HTTPException:
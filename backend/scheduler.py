@@ -5,7 +5,8 @@ from typing import List, Dict, Any
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from motor.motor_asyncio import AsyncIOMotorClient
+from async_database import get_async_db
+from business_context import amark_stale as mark_context_stale
 from pydantic import BaseModel
 import os
 from pathlib import Path
@@ -28,9 +29,7 @@ ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
 # MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+db = get_async_db()  # Shared Motor pool (async_database.py)
 
 # Email configuration
 EMAIL_HOST = os.environ.get('EMAIL_HOST', 'smtp.gmail.com')
@@ -133,6 +132,9 @@ async def update_user_monthly_organization(user_id: str):
             }
         )
         
+        if notes_update_result.modified_count:
+            await mark_context_stale(db, user_id, "notes")
+        
         logger.info(f"✅ Updated {media_update_result.modified_count} media items and {notes_update_result.modified_count} notes for user {user_id}")
         
     except Exception as e:
@@ -165,11 +167,31 @@ async def check_and_update_website_analyses():
                 logger.info(f"🔄 Auto-refreshing analysis for user {user_id}, website {website_url}")
                 
                 # Import and call the website analysis function
-                from website_analyzer_gpt5 import analyze_multiple_pages, discover_website_pages, analyze_with_gpt4o
+                from website_analyzer_gpt5 import (
+                    analyze_multiple_pages, discover_website_pages, analyze_with_gpt4o,
+                    check_pages_changed, page_fingerprints
+                )
+                from llm_cache import set_cache_owner
+                set_cache_owner(user_id)  # unchanged pages are answered from the LLM cache
+                
+                # Re-crawl conditionnel : aucune page modifiée = pas de nouvelle analyse LLM
+                fetched = {}
+                changed, fingerprints = await check_pages_changed(analysis.get("page_fingerprints", []), fetched)
+                if not changed:
+                    await analyses_collection.update_one(
+                        {"_id": analysis["_id"]},
+                        {"$set": {
+                            "page_fingerprints": fingerprints,
+                            "last_checked": now,
+                            "next_analysis_due": now + timedelta(days=30)
+                        }}
+                    )
+                    logger.info(f"⏭️ {website_url} unchanged since last analysis, LLM analysis skipped")
+                    continue
                 
                 # Discover and analyze pages
-                important_pages = discover_website_pages(website_url, max_pages=5)
-                content_data = await analyze_multiple_pages(important_pages, website_url)
+                important_pages = await discover_website_pages(website_url, max_pages=5, fetched=fetched)
+                content_data = await analyze_multiple_pages(important_pages, website_url, fetched)
                 
                 if "error" not in content_data:
                     # Analyze with GPT
@@ -184,8 +206,10 @@ async def check_and_update_website_analyses():
                         "main_services": analysis_result.get("main_services", []),
                         "content_suggestions": analysis_result.get("content_suggestions", []),
                         "pages_analyzed": content_data.get("pages_analyzed", []),
+                        "page_fingerprints": page_fingerprints(content_data),
                         "pages_count": len(important_pages),
                         "last_analyzed": now,
+                        "last_checked": now,
                         "next_analysis_due": now + timedelta(days=30)
                     }
                     
@@ -193,6 +217,7 @@ async def check_and_update_website_analyses():
                         {"_id": analysis["_id"]},
                         {"$set": updated_analysis}
                     )
+                    await mark_context_stale(db, analysis.get("user_id"), "website")
                     
                     logger.info(f"✅ Auto-refresh completed for {website_url}")
                     
@@ -1,6 +1,6 @@
 from fastapi import FastAPI, APIRouter, HTTPException, Header, Depends, Form, File, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import RedirectResponse
+from fastapi.responses import RedirectResponse, Response, StreamingResponse
 import requests
 from pydantic import BaseModel, Field
 import jwt
@@ -12,6 +12,7 @@ import uuid
 import json
 import re
 import time
+import asyncio
 from PIL import Image
 import mimetypes
 import aiohttp
@@ -39,6 +40,28 @@ mimetypes.add_type('image/heic', '.heic')
 mimetypes.add_type('image/heif', '.heif')
 
 from database import get_database
+from async_database import get_async_database, close_async_database, canonical_media_id
+from derivatives import get_or_create_publish_jpeg, open_derivative, read_source_bytes, invalidate_derivatives, media_key
+from http_cache import http_date, is_not_modified
+from memory_cache import invalidate_media
+from business_context import amark_stale as mark_context_stale, stats as business_context_stats
+from image_pipeline import shutdown_pipeline, THUMB_VARIANT_WIDTHS
+from thumbnail_jobs import THUMB_WORKERS_IN_API, start_workers as start_thumbnail_workers, stop_workers as stop_thumbnail_workers
+from llm_backup_system import llm_backup
+import web_fetcher
+from media_resolver import resolve_publish_image, ImageUnavailable, convert_to_public_image_url
+from publisher import (
+    publish_post, PublishError, QUEUE_FIELDS as PUBLICATION_QUEUE_FIELDS, LOCKED_STATES as PUBLICATION_LOCKED_STATES
+)
+from publication_dispatcher import (
+    PUBLICATION_DISPATCHER_IN_API, queue_fields as publication_queue_fields, stats as publication_stats,
+    start_workers as start_publication_dispatcher, stop_workers as stop_publication_dispatcher
+)
+from http_clients import graph_client, close_all as close_http_clients, stats as http_clients_stats
+from generation_jobs import (
+    GENERATION_WORKERS_IN_API, enqueue_generation, get_job as get_generation_job_doc, public_job,
+    start_workers as start_generation_workers, stop_workers as stop_generation_workers
+)
 
 class UpdateDescriptionIn(BaseModel):
     description: str = Field("", max_length=2000)
@@ -53,65 +76,11 @@ class MediaResponse(BaseModel):
     thumb_url: Optional[str] = None
     uploaded_at: Optional[str] = None
 
-def get_media_collection():
-    db_manager = get_database()
-    return db_manager.db.media
-
-def parse_any_id(file_id: str) -> dict:
-    try:
-        from bson import ObjectId
-        return {"_id": ObjectId(file_id)}
-    except Exception:
-        print(f"⚠️ Using UUID fallback for file_id: {file_id}")
-        return {"id": file_id}
-
-def convert_to_public_image_url(image_url: str) -> str:
-    """Convertir URL protégée en URL publique accessible par Facebook (avec support carousel)"""
-    if not image_url:
-        return None
-    
-    # Si c'est déjà une URL publique externe, la garder
-    if image_url.startswith("http") and not "/api/" in image_url:
-        return image_url
-    
-    backend_url = os.environ.get('REACT_APP_BACKEND_URL', 'https://claire-marcus.com')
-    
-    # CORRECTION CHATGPT: Support des carousels
-    if "carousel_" in image_url:
-        # Exemple : /api/content/carousel/carousel_90e5d8c2... ➜ id = 90e5d8c2...
-        import re
-        match = re.search(r'carousel_([^/.]+)', image_url)
-        if match:
-            file_id = match.group(1)
-            print(f"🔄 Converting carousel URL: {image_url} → /api/public/image/{file_id}.jpg")
-            return f"{backend_url}/api/public/image/{file_id}.jpg"
-    
-    # Si c'est une URL protégée /api/content/{id}/file, convertir
-    if "/api/content/" in image_url and "/file" in image_url:
-        # Extraire l'ID du fichier
-        import re
-        match = re.search(r'/api/content/([^/]+)/file', image_url)
-        if match:
-            file_id = match.group(1)
-            print(f"🔄 Converting content URL: {image_url} → /api/public/image/{file_id}.jpg")
-            return f"{backend_url}/api/public/image/{file_id}.jpg"
-    
-    # Support uploads/ (selon ChatGPT)
-    if "uploads/" in image_url:
-        # Extraire l'ID du fichier uploads
-        import re
-        match = re.search(r'uploads/[^/]+/([^/.]+)', image_url)
-        if match:
-            file_id = match.group(1)
-            print(f"🔄 Converting uploads URL: {image_url} → /api/public/image/{file_id}.jpg")
-            return f"{backend_url}/api/public/image/{file_id}.jpg"
-    
-    # Si c'est une URL relative, la convertir en absolue
-    if image_url.startswith("/"):
-        return f"{backend_url}{image_url}"
-    
-    # Sinon, retourner telle quelle
-    return image_url
+async def parse_any_id(file_id: str, owner_id: str) -> dict:
+    """Media query for a client-supplied id: every media doc has a unique canonical `id`
+    (legacy ObjectId docs use str(_id), see migrate_media_ids.py), so this is one indexed equality.
+    Legacy identifiers are mapped to the canonical id through media_aliases."""
+    return {"id": await get_async_database().media.canonical_id(file_id, owner_id)}
 
 try:
     from website_analyzer_gpt5 import website_router
@@ -187,8 +156,8 @@ async def log_requests(request, call_next):
 @app.middleware("http")
 async def add_no_cache_headers(request, call_next):
     response = await call_next(request)
-    # Apply no-cache headers to API endpoints EXCEPT thumbnails
-    if request.url.path.startswith("/api") and "/thumb" not in request.url.path:
+    # Apply no-cache headers to API endpoints EXCEPT thumbnails and responses carrying their own validators (ETag)
+    if request.url.path.startswith("/api") and "/thumb" not in request.url.path and "etag" not in response.headers:
         response.headers["Cache-Control"] = "no-store, no-cache, must-revalidate, proxy-revalidate"
         response.headers["Pragma"] = "no-cache"
         response.headers["Expires"] = "0"
@@ -398,6 +367,11 @@ async def diagnostic():
         "database_name": "claire_marcus",
         "mongo_url_prefix": os.environ.get('MONGO_URL', '')[:25] + '...' if os.environ.get('MONGO_URL') else 'NOT_SET',
         "environment": os.environ.get('NODE_ENV', 'development'),
+        "llm_cache": llm_backup.cache_stats(),
+        "business_context": business_context_stats(),
+        "http_clients": http_clients_stats(),
+        "publication_queue": await publication_stats(),
+        "llm_providers": llm_backup.router_stats(),
         "timestamp": datetime.now().isoformat()
     }
 
@@ -422,8 +396,7 @@ async def root():
 async def who_am_i(user_id: str = Depends(get_current_user_id_robust)):
     """Return basic user payload for the current token"""
     try:
-        dbm = get_database()
-        user = dbm.db.users.find_one({"user_id": user_id})
+        user = await get_async_database().users.find_by_id(user_id)
         if user:
             return {
                 "user_id": user.get("user_id"),
@@ -441,18 +414,17 @@ async def who_am_i(user_id: str = Depends(get_current_user_id_robust)):
 @api_router.post("/auth/register")
 async def register(body: RegisterRequest):
     try:
-        dbm = get_database()
-        users = dbm.db.users
+        users = get_async_database().users
         email_clean = body.email.lower().strip()
         
         # Check if user already exists
-        if users.find_one({"email": email_clean}):
+        if await users.find_by_email(email_clean):
             raise HTTPException(status_code=400, detail="Email already registered")
         
         # Hash password with bcrypt
         import bcrypt
         salt = bcrypt.gensalt()
-        hashed_password = bcrypt.hashpw(body.password.encode("utf-8"), salt).decode("utf-8")
+        hashed_password = (await asyncio.to_thread(bcrypt.hashpw, body.password.encode("utf-8"), salt)).decode("utf-8")
         
         # Create user
         user_id = str(uuid.uuid4())
@@ -482,7 +454,7 @@ async def register(body: RegisterRequest):
             "hashtags_secondary": []
         }
         
-        users.insert_one(user_data)
+        await users.collection.insert_one(user_data)
         
         # Generate JWT token for immediate login
         now = datetime.now(timezone.utc)
@@ -511,17 +483,15 @@ async def register(body: RegisterRequest):
 @api_router.post("/auth/login-robust")
 async def login_robust(body: LoginIn):
     try:
-        dbm = get_database()
-        users = dbm.db.users
         email_clean = body.email.lower().strip()
-        user = users.find_one({"email": email_clean})
+        user = await get_async_database().users.find_by_email(email_clean)
         if not user:
             raise HTTPException(status_code=401, detail="Invalid credentials")
         stored_pw = user.get("password_hash") or user.get("hashed_password")
         if not stored_pw:
             raise HTTPException(status_code=401, detail="Invalid credentials")
         import bcrypt
-        if not bcrypt.checkpw(body.password.encode("utf-8"), stored_pw.encode("utf-8")):
+        if not await asyncio.to_thread(bcrypt.checkpw, body.password.encode("utf-8"), stored_pw.encode("utf-8")):
             raise HTTPException(status_code=401, detail="Invalid credentials")
         user_id = user.get("user_id") or str(user.get("_id"))
         now = datetime.now(timezone.utc)
@@ -543,65 +513,27 @@ async def login_robust(body: LoginIn):
 # CONTENT LISTING: /api/content/pending
 # ----------------------------
 @api_router.get("/content/pending")
-async def get_pending_content_mongo(offset: int = 0, limit: int = 24, user_id: str = Depends(get_current_user_id_robust)):
+async def get_pending_content_mongo(offset: int = 0, limit: int = 24, cursor: Optional[str] = None, user_id: str = Depends(get_current_user_id_robust)):
+    """List the user's accessible media, newest first.
+
+    Accessibility is stored on each media document (`accessible`) when it is uploaded,
+    deleted or repaired, so a page is a single indexed query whatever the library size.
+    Pass back `next_cursor` as `cursor` to fetch the following page.
+    """
     try:
-        media_collection = get_media_collection()
-        q = {"owner_id": user_id, "$or": [{"deleted": {"$ne": True}}, {"deleted": {"$exists": False}}]}
+        adb = get_async_database()
+        page = await adb.media.list_accessible(user_id, limit=limit, cursor=cursor, offset=offset)
         
-        # CORRECTION CRITIQUE: Filtrer pour ne retourner QUE les images accessibles
-        cursor = media_collection.find(q).sort([("created_at", -1), ("_id", -1)])
         accessible_items = []
-        total_checked = 0
-        
-        print(f"🔍 Filtering accessible images for Facebook publication...")
-        
-        for d in cursor:
-            total_checked += 1
+        for d in page["items"]:
             try:
                 file_id = d.get("id") or str(d.get("_id"))
                 url = d.get("url", "")
-                file_path = d.get("file_path", "")
-                grid_file_id = d.get("grid_file_id")
-                
-                # VALIDATION: Vérifier si l'image est vraiment accessible
-                is_accessible = False
-                access_method = ""
                 
-                # Méthode 1: Images avec file_path (uploads/)
-                if file_path and os.path.exists(file_path):
-                    is_accessible = True
-                    access_method = "file_path"
+                # Les images stockées chez nous passent par l'endpoint protégé, les URLs externes restent telles quelles
+                if not (url and url.startswith("http") and not "claire-marcus-api.onrender.com" in url):
                     url = f"/api/content/{file_id}/file"
                 
-                # Méthode 2: Images avec GridFS (si disponible)
-                elif grid_file_id:
-                    try:
-                        import gridfs
-                        from bson import ObjectId
-                        dbm = get_database()
-                        fs = gridfs.GridFS(dbm.db)
-                        if isinstance(grid_file_id, str):
-                            grid_file_id = ObjectId(grid_file_id)
-                        if fs.exists(grid_file_id):
-                            is_accessible = True
-                            access_method = "gridfs"
-                            url = f"/api/content/{file_id}/file"
-                    except Exception:
-                        pass
-                
-                # Méthode 3: URLs externes valides (commençant par http)
-                elif url and url.startswith("http") and not "claire-marcus-api.onrender.com" in url:
-                    is_accessible = True
-                    access_method = "external_url"
-                    # Garder l'URL externe telle quelle
-                
-                # IMPORTANT: Ne traiter que les images accessibles
-                if not is_accessible:
-                    print(f"   ❌ Skipping inaccessible image: {file_id} (no valid storage)")
-                    continue
-                
-                print(f"   ✅ Including accessible image: {file_id} via {access_method}")
-                
                 # Handle created_at safely
                 created_at = d.get("created_at")
                 if hasattr(created_at, 'isoformat'):
@@ -644,23 +576,18 @@ async def get_pending_content_mongo(offset: int = 0, limit: int = 24, user_id: s
                 print(f"⚠️ Error processing media item {d.get('id', 'unknown')}: {item_error}")
                 continue
         
-        # Pagination après filtrage
-        total_accessible = len(accessible_items)
-        start_idx = max(0, int(offset))
-        end_idx = start_idx + max(1, int(limit))
-        paginated_items = accessible_items[start_idx:end_idx]
-        
-        print(f"✅ Content filtering complete: {total_accessible} accessible images, returning {len(paginated_items)}")
+        total_accessible = page["total"]
         
         return {
-            "content": paginated_items,
+            "content": accessible_items,
             "total": total_accessible,
             "offset": offset,
             "limit": limit,
-            "has_more": end_idx < total_accessible,
-            "loaded": len(paginated_items),
-            "total_checked": total_checked,
-            "accessible_count": total_accessible
+            "has_more": page["has_more"],
+            "next_cursor": page["next_cursor"],
+            "loaded": len(accessible_items),
+            "accessible_count": total_accessible,
+            "thumb_widths": THUMB_VARIANT_WIDTHS  # srcset: thumb_url?w=<width>
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to fetch content: {str(e)}")
@@ -675,17 +602,11 @@ async def get_pending_content_with_auth(offset: int = 0, limit: int = 24, curren
         # Utiliser le user_id authentifié au lieu du hardcodé
         user_id = current_user_id
         
-        media_collection = get_media_collection()
-        q = {"owner_id": user_id, "$or": [{"deleted": {"$ne": True}}, {"deleted": {"$exists": False}}]}
-        total = media_collection.count_documents(q)
-        cursor = (
-            media_collection.find(q)
-            .sort([("created_at", -1), ("_id", -1)])
-            .skip(max(0, int(offset)))
-            .limit(max(1, int(limit)))
-        )
+        adb = get_async_database()
+        total = await adb.media.count_for_owner(user_id)
+        docs = await adb.media.list_for_owner(user_id, offset=offset, limit=limit)
         items = []
-        for d in cursor:
+        for d in docs:
             try:
                 created_at = d.get("created_at")
                 if hasattr(created_at, 'isoformat'):
@@ -744,6 +665,7 @@ async def get_pending_content_with_auth(offset: int = 0, limit: int = 24, curren
             "limit": limit, 
             "has_more": offset + limit < total, 
             "loaded": len(items),
+            "thumb_widths": THUMB_VARIANT_WIDTHS,  # srcset: thumb_url?w=<width>
             "debug_auth_fix": "SECURITY_FIX_APPLIED",
             "authenticated_user": user_id
         }
@@ -774,12 +696,10 @@ async def get_business_profile(user_id: str = Depends(get_current_user_id_robust
         env_path = Path(__file__).parent / '.env'
         load_dotenv(env_path)
         
-        # Utiliser la fonction get_database() au lieu d'une connexion directe
-        dbm = get_database()
-        business_profiles = dbm.db.business_profiles
+        adb = get_async_database()
         
         # Récupérer le profil business de l'utilisateur depuis business_profiles
-        business_profile = business_profiles.find_one({"user_id": user_id})
+        business_profile = await adb.db.business_profiles.find_one({"user_id": user_id})
         print(f"🔍 DEBUG: Profile found: {business_profile is not None}")
         
         if business_profile:
@@ -836,24 +756,23 @@ class BusinessProfileIn(BaseModel):
     objective: Optional[str] = None
 
 @api_router.put("/business-profile")
-def put_business_profile(body: BusinessProfileIn, user_id: str = Depends(get_current_user_id_robust)):
-    # Suppression async car utilise client MongoDB synchrone
+async def put_business_profile(body: BusinessProfileIn, user_id: str = Depends(get_current_user_id_robust)):
     try:
-        dbm = get_database()
-        business_profiles = dbm.db.business_profiles  # Use business_profiles collection like GET
+        business_profiles = get_async_database().db.business_profiles  # Use business_profiles collection like GET
         update = {k: v for k, v in body.dict().items() if v is not None}
         if not update:
             return {"success": True, "message": "No changes"}
         # Use user_id to match the GET endpoint field
-        business_profiles.update_one({"user_id": user_id}, {"$set": update}, upsert=True)
+        await business_profiles.update_one({"user_id": user_id}, {"$set": update}, upsert=True)
+        await mark_context_stale(get_async_database().db, user_id, "profile")
         return {"success": True}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to update business profile: {str(e)}")
 
 @api_router.post("/business-profile")
 async def post_business_profile(body: BusinessProfileIn, user_id: str = Depends(get_current_user_id_robust)):
-    # For compatibility with existing frontend that may POST - CORRECTION ASYNC/SYNC  
-    return put_business_profile(body, user_id)  # Maintenant cohérent
+    # For compatibility with existing frontend that may POST
+    return await put_business_profile(body, user_id)
 
 # ----------------------------
 # NOTES: /api/notes
@@ -864,8 +783,7 @@ async def post_business_profile(body: BusinessProfileIn, user_id: str = Depends(
 async def get_notes(user_id: str = Depends(get_current_user_id_robust)):
     """Get all notes for user"""
     try:
-        dbm = get_database()
-        notes = dbm.get_notes(user_id)
+        notes = await get_async_database().content_notes.list_for_owner(user_id)
         return {"notes": notes}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to fetch notes: {str(e)}")
@@ -874,10 +792,9 @@ async def get_notes(user_id: str = Depends(get_current_user_id_robust)):
 async def create_note(note: ContentNote, user_id: str = Depends(get_current_user_id_robust)):
     """Create a new note"""
     try:
-        dbm = get_database()
-        # Using the existing create_note function with all parameters
-        created_note = dbm.create_note(
-            user_id=user_id,
+        # Using the notes repository with all parameters
+        created_note = await get_async_database().content_notes.create(
+            owner_id=user_id,
             content=note.content,
             description=note.description,
             priority=note.priority,
@@ -900,31 +817,20 @@ async def create_note(note: ContentNote, user_id: str = Depends(get_current_user
 async def update_note(note_id: str, note: ContentNote, user_id: str = Depends(get_current_user_id_robust)):
     """Update an existing note"""
     try:
-        dbm = get_database()
-        
-        # Update note in content_notes collection
-        result = dbm.db.content_notes.update_one(
-            {"note_id": note_id, "owner_id": user_id},
-            {"$set": {
-                "content": note.content,
-                "description": note.description,
-                "priority": note.priority,
-                "is_monthly_note": note.is_monthly_note,
-                "note_month": note.note_month,
-                "note_year": note.note_year,
-                "updated_at": datetime.now().isoformat()
-            }}
-        )
+        # Update note in content_notes collection and get the updated note
+        updated_note = await get_async_database().content_notes.update(note_id, user_id, {
+            "content": note.content,
+            "description": note.description,
+            "priority": note.priority,
+            "is_monthly_note": note.is_monthly_note,
+            "note_month": note.note_month,
+            "note_year": note.note_year,
+            "updated_at": datetime.now().isoformat()
+        })
         
-        if result.matched_count == 0:
+        if updated_note is None:
             raise HTTPException(status_code=404, detail="Note not found")
         
-        # Get the updated note
-        updated_note = dbm.db.content_notes.find_one(
-            {"note_id": note_id, "owner_id": user_id},
-            {"_id": 0}
-        )
-        
         return {
             "message": "Note modifiée avec succès",
             "note": updated_note
@@ -938,14 +844,10 @@ async def update_note(note_id: str, note: ContentNote, user_id: str = Depends(ge
 async def delete_note(note_id: str, user_id: str = Depends(get_current_user_id_robust)):
     """Delete a note"""
     try:
-        dbm = get_database()
         # Delete note from content_notes collection
-        result = dbm.db.content_notes.delete_one({
-            "note_id": note_id,
-            "owner_id": user_id
-        })
+        deleted = await get_async_database().content_notes.delete(note_id, user_id)
         
-        if result.deleted_count == 0:
+        if not deleted:
             raise HTTPException(status_code=404, detail="Note not found")
         
         return {"message": "Note supprimée avec succès"}
@@ -954,9 +856,7 @@ async def delete_note(note_id: str, user_id: str = Depends(get_current_user_id_r
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to delete note: {str(e)}")
 
-@api_router.post("/notes/cleanup-expired")
-async def cleanup_expired_periodic_notes_manual(user_id: str = Depends(get_current_user_id_robust)):
-    """Manually trigger cleanup of expired periodic notes (admin/test function)"""
+def _cleanup_expired_periodic_notes_manual(user_id: str):
     try:
         dbm = get_database()
         result = dbm.cleanup_expired_periodic_notes()
@@ -968,6 +868,11 @@ async def cleanup_expired_periodic_notes_manual(user_id: str = Depends(get_curre
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to cleanup notes: {str(e)}")
 
+@api_router.post("/notes/cleanup-expired")
+async def cleanup_expired_periodic_notes_manual(user_id: str = Depends(get_current_user_id_robust)):
+    """Manually trigger cleanup of expired periodic notes (admin/test function)"""
+    return await asyncio.to_thread(_cleanup_expired_periodic_notes_manual, user_id)
+
 # ----------------------------
 # CONTENT CONTEXT: /api/content/{content_id}/context
 # ----------------------------
@@ -982,19 +887,11 @@ class ContentTitleRequest(BaseModel):
 async def update_content_context(content_id: str, body: ContentContextRequest, user_id: str = Depends(get_current_user_id_robust)):
     """Update context/description for a content item"""
     try:
-        dbm = get_database()
-        
-        # Update content context in the media collection
-        query = parse_any_id(content_id)
-        query["owner_id"] = user_id  # Use owner_id to match the content retrieval query
-        
-        result = dbm.db.media.update_one(
-            query,
-            {"$set": {
-                "context": body.context,
-                "updated_at": datetime.now().isoformat()
-            }}
-        )
+        # Update content context in the media collection (owner_id matches the content retrieval query)
+        result = await get_async_database().media.update_for_owner(await parse_any_id(content_id, user_id), user_id, {
+            "context": body.context,
+            "updated_at": datetime.now().isoformat()
+        })
         
         if result.matched_count == 0:
             raise HTTPException(status_code=404, detail="Content not found")
@@ -1009,16 +906,8 @@ async def update_content_context(content_id: str, body: ContentContextRequest, u
 async def update_content_title(content_id: str, body: ContentTitleRequest, user_id: str = Depends(get_current_user_id_robust)):
     """Update title for a content item"""
     try:
-        dbm = get_database()
-        
         # Update content title in the media collection
-        query = parse_any_id(content_id)
-        query["owner_id"] = user_id
-        
-        result = dbm.db.media.update_one(
-            query,
-            {"$set": {"title": body.title}}
-        )
+        result = await get_async_database().media.update_for_owner(await parse_any_id(content_id, user_id), user_id, {"title": body.title})
         
         if result.matched_count == 0:
             raise HTTPException(status_code=404, detail="Content not found")
@@ -1044,7 +933,7 @@ async def delete_content_batch(request: BatchDeleteRequest, user_id: str = Depen
         
         print(f"🗑️ Batch deleting {len(request.content_ids)} content items for user {user_id}")
         
-        dbm = get_database()
+        adb = get_async_database()
         
         # Convert content IDs to proper format for querying
         from bson import ObjectId
@@ -1074,16 +963,22 @@ async def delete_content_batch(request: BatchDeleteRequest, user_id: str = Depen
             raise HTTPException(status_code=400, detail="No valid content IDs provided")
         
         # Perform batch deletion
-        result = dbm.db.media.delete_many(delete_filter)
+        media_items = await adb.media.collection.find({**delete_filter, "owner_id": user_id}, {"id": 1, "external_id": 1}).to_list(length=None)
+        deleted_count = await adb.media.delete_many_for_owner(delete_filter, user_id)
         
-        print(f"✅ Successfully deleted {result.deleted_count} out of {len(request.content_ids)} requested items")
+        # Drop the cached publish JPEGs and in-process thumbnail entries
+        for media_item in media_items:
+            await invalidate_derivatives(media_key(media_item))
+            invalidate_media(media_item)
         
-        if result.deleted_count == 0:
+        print(f"✅ Successfully deleted {deleted_count} out of {len(request.content_ids)} requested items")
+        
+        if deleted_count == 0:
             raise HTTPException(status_code=404, detail="No content found or already deleted")
         
         return {
-            "message": f"Suppression en lot réussie: {result.deleted_count} éléments supprimés",
-            "deleted_count": result.deleted_count,
+            "message": f"Suppression en lot réussie: {deleted_count} éléments supprimés",
+            "deleted_count": deleted_count,
             "requested_count": len(request.content_ids)
         }
         
@@ -1097,17 +992,20 @@ async def delete_content_batch(request: BatchDeleteRequest, user_id: str = Depen
 async def delete_content(content_id: str, user_id: str = Depends(get_current_user_id_robust)):
     """Delete a content item"""
     try:
-        dbm = get_database()
+        media_repo = get_async_database().media
+        query = await parse_any_id(content_id, user_id)
+        media_item = await media_repo.collection.find_one({**query, "owner_id": user_id}, {"id": 1, "external_id": 1})
         
-        # Delete content from media collection
-        query = parse_any_id(content_id)
-        query["owner_id"] = user_id  # Use owner_id to match the content retrieval query
+        # Delete content from media collection (owner_id matches the content retrieval query)
+        deleted_count = await media_repo.delete_for_owner(query, user_id)
         
-        result = dbm.db.media.delete_one(query)
-        
-        if result.deleted_count == 0:
+        if deleted_count == 0:
             raise HTTPException(status_code=404, detail="Content not found")
         
+        # Drop the cached publish JPEG and in-process thumbnail entries
+        await invalidate_derivatives(media_key(media_item))
+        invalidate_media(media_item)
+        
         return {"message": "Contenu supprimé avec succès"}
     except HTTPException:
         raise
@@ -1134,29 +1032,24 @@ async def move_content_to_month(
         
         print(f"📅 Moving content {content_id} to month {request.target_month} for user {user_id}")
         
-        dbm = get_database()
+        media_repo = get_async_database().media
         
         # Build query to find the content
-        query = parse_any_id(content_id)
+        query = await parse_any_id(content_id, user_id)
         query["owner_id"] = user_id
         
         # Check if content exists
-        existing_content = dbm.db.media.find_one(query)
+        existing_content = await media_repo.collection.find_one(query)
         if not existing_content:
             raise HTTPException(status_code=404, detail="Content not found")
         
         current_month = existing_content.get("attributed_month", "Non attribué")
         
         # Update the attributed_month field
-        result = dbm.db.media.update_one(
-            query,
-            {
-                "$set": {
-                    "attributed_month": request.target_month,
-                    "modified_at": datetime.utcnow().isoformat()
-                }
-            }
-        )
+        result = await media_repo.update_for_owner(query, user_id, {
+            "attributed_month": request.target_month,
+            "modified_at": datetime.utcnow().isoformat()
+        })
         
         if result.matched_count == 0:
             raise HTTPException(status_code=404, detail="Content not found")
@@ -1193,11 +1086,7 @@ class AttachImageRequest(BaseModel):
     uploaded_files: List[str] = []  # For upload filenames (legacy)
     uploaded_file_ids: List[str] = []  # For upload UUIDs (new)
 
-@api_router.delete("/posts/generated/all")
-async def delete_all_generated_posts(
-    user_id: str = Depends(get_current_user_id_robust)
-):
-    """Delete all generated posts for the current user"""
+def _delete_all_generated_posts(user_id: str):
     try:
         print(f"🗑️ Deleting all generated posts for user {user_id}")
         
@@ -1233,12 +1122,14 @@ async def delete_all_generated_posts(
         print(f"❌ Error deleting posts: {e}")
         raise HTTPException(status_code=500, detail="Error deleting posts")
 
-@api_router.delete("/posts/generated/month/{target_month}")
-async def delete_posts_by_month(
-    target_month: str,
+@api_router.delete("/posts/generated/all")
+async def delete_all_generated_posts(
     user_id: str = Depends(get_current_user_id_robust)
 ):
-    """Delete generated posts for a specific month (temporary endpoint)"""
+    """Delete all generated posts for the current user"""
+    return await asyncio.to_thread(_delete_all_generated_posts, user_id)
+
+def _delete_posts_by_month(target_month: str, user_id: str):
     try:
         print(f"🗑️ Deleting posts for month '{target_month}' for user {user_id}")
         
@@ -1262,12 +1153,15 @@ async def delete_posts_by_month(
         print(f"❌ Error deleting posts for month {target_month}: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to delete posts: {str(e)}")
 
-@api_router.delete("/posts/generated/{post_id}")
-async def delete_single_generated_post(
-    post_id: str,
+@api_router.delete("/posts/generated/month/{target_month}")
+async def delete_posts_by_month(
+    target_month: str,
     user_id: str = Depends(get_current_user_id_robust)
 ):
-    """Delete a single generated post by ID"""
+    """Delete generated posts for a specific month (temporary endpoint)"""
+    return await asyncio.to_thread(_delete_posts_by_month, target_month, user_id)
+
+def _delete_single_generated_post(post_id: str, user_id: str):
     try:
         print(f"🗑️ Deleting single post '{post_id}' for user {user_id}")
         
@@ -1335,11 +1229,15 @@ async def delete_single_generated_post(
         print(f"❌ Error deleting post {post_id}: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to delete post: {str(e)}")
 
-@api_router.post("/posts/clear-cache")
-async def clear_posts_cache(
+@api_router.delete("/posts/generated/{post_id}")
+async def delete_single_generated_post(
+    post_id: str,
     user_id: str = Depends(get_current_user_id_robust)
 ):
-    """Clear posts cache and clean up inconsistent data"""
+    """Delete a single generated post by ID"""
+    return await asyncio.to_thread(_delete_single_generated_post, post_id, user_id)
+
+def _clear_posts_cache(user_id: str):
     try:
         print(f"🧹 Clearing posts cache for user {user_id}")
         
@@ -1369,12 +1267,14 @@ async def clear_posts_cache(
         print(f"❌ Error clearing cache: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to clear cache: {str(e)}")
 
-@api_router.get("/content/carousel/{carousel_id}")
-async def get_carousel_content(
-    carousel_id: str,
+@api_router.post("/posts/clear-cache")
+async def clear_posts_cache(
     user_id: str = Depends(get_current_user_id_robust)
 ):
-    """Get carousel content for display"""
+    """Clear posts cache and clean up inconsistent data"""
+    return await asyncio.to_thread(_clear_posts_cache, user_id)
+
+def _get_carousel_content(carousel_id: str, user_id: str):
     try:
         dbm = get_database()
         
@@ -1401,6 +1301,14 @@ async def get_carousel_content(
         print(f"❌ Error getting carousel: {e}")
         raise HTTPException(status_code=500, detail="Error getting carousel")
 
+@api_router.get("/content/carousel/{carousel_id}")
+async def get_carousel_content(
+    carousel_id: str,
+    user_id: str = Depends(get_current_user_id_robust)
+):
+    """Get carousel content for display"""
+    return await asyncio.to_thread(_get_carousel_content, carousel_id, user_id)
+
 @api_router.put("/posts/{post_id}/attach-image")
 async def attach_image_to_post(
     post_id: str,
@@ -1412,10 +1320,10 @@ async def attach_image_to_post(
         print(f"🖼️ Attaching image to post {post_id} for user {user_id}")
         print(f"   Source: {request.image_source}")
         
-        dbm = get_database()
+        adb = get_async_database().db
         
         # Get the post
-        current_post = dbm.db.generated_posts.find_one({
+        current_post = await adb.generated_posts.find_one({
             "id": post_id,
             "owner_id": user_id
         })
@@ -1436,14 +1344,14 @@ async def attach_image_to_post(
         if request.image_source == "library":
             # Use existing image from library
             if request.image_id:
-                # Find the image using parse_any_id to handle both ObjectId and UUID
-                query = parse_any_id(request.image_id)
+                # Find the image using parse_any_id to handle canonical and legacy ids
+                query = await parse_any_id(request.image_id, user_id)
                 query["owner_id"] = user_id
                 
-                image_doc = dbm.db.media.find_one(query)
+                image_doc = await adb.media.find_one(query)
                 
                 if image_doc:
-                    new_image_id = request.image_id
+                    new_image_id = canonical_media_id(image_doc)
                     new_image_url = f"/api/content/{new_image_id}/file"
                     
                     # Check if we need to create a carousel (adding to existing image)
@@ -1466,7 +1374,7 @@ async def attach_image_to_post(
                             "created_at": datetime.utcnow().isoformat()
                         }
                         
-                        dbm.db.carousels.insert_one(carousel_doc)
+                        await adb.carousels.insert_one(carousel_doc)
                         print(f"✅ Created carousel {carousel_id} with existing + new image")
                         
                     elif has_existing_image and current_visual_id.startswith("carousel_"):
@@ -1476,7 +1384,7 @@ async def attach_image_to_post(
                         visual_url = current_visual_url
                         
                         # Add new image to existing carousel
-                        dbm.db.carousels.update_one(
+                        await adb.carousels.update_one(
                             {"id": carousel_id, "owner_id": user_id},
                             {"$push": {"images": {"id": new_image_id, "url": new_image_url}}}
                         )
@@ -1489,10 +1397,10 @@ async def attach_image_to_post(
                         print(f"✅ Replaced image with library image {visual_id}")
                     
                     # Mark new image as used
-                    update_query = parse_any_id(request.image_id)
+                    update_query = await parse_any_id(request.image_id, user_id)
                     update_query["owner_id"] = user_id
                     
-                    dbm.db.media.update_one(
+                    await adb.media.update_one(
                         update_query,
                         {"$set": {"used_in_posts": True}}
                     )
@@ -1535,7 +1443,7 @@ async def attach_image_to_post(
                             "created_at": datetime.utcnow().isoformat()
                         }
                         
-                        dbm.db.carousels.insert_one(carousel_doc)
+                        await adb.carousels.insert_one(carousel_doc)
                         print(f"✅ Created carousel {carousel_id} with existing + uploaded image")
                         
                     elif has_existing_image and current_visual_id.startswith("carousel_"):
@@ -1545,7 +1453,7 @@ async def attach_image_to_post(
                         visual_url = current_visual_url
                         
                         # Add new image to existing carousel
-                        dbm.db.carousels.update_one(
+                        await adb.carousels.update_one(
                             {"id": carousel_id, "owner_id": user_id},
                             {"$push": {"images": {"id": new_image_id, "url": new_image_url}}}
                         )
@@ -1558,10 +1466,10 @@ async def attach_image_to_post(
                         print(f"✅ Set single uploaded image {visual_id}")
                     
                     # Mark uploaded image as used
-                    update_query = parse_any_id(new_image_id)
+                    update_query = await parse_any_id(new_image_id, user_id)
                     update_query["owner_id"] = user_id
                     
-                    dbm.db.media.update_one(
+                    await adb.media.update_one(
                         update_query,
                         {"$set": {"used_in_posts": True}}
                     )
@@ -1578,7 +1486,7 @@ async def attach_image_to_post(
                             
                             new_images = [{"id": fid, "url": f"/api/content/{fid}/file"} for fid in request.uploaded_file_ids]
                             
-                            dbm.db.carousels.update_one(
+                            await adb.carousels.update_one(
                                 {"id": carousel_id, "owner_id": user_id},
                                 {"$push": {"images": {"$each": new_images}}}
                             )
@@ -1602,7 +1510,7 @@ async def attach_image_to_post(
                                 "created_at": datetime.utcnow().isoformat()
                             }
                             
-                            dbm.db.carousels.insert_one(carousel_doc)
+                            await adb.carousels.insert_one(carousel_doc)
                             print(f"✅ Created carousel with existing + {len(request.uploaded_file_ids)} new images")
                             
                     else:
@@ -1622,15 +1530,15 @@ async def attach_image_to_post(
                             "created_at": datetime.utcnow().isoformat()
                         }
                         
-                        dbm.db.carousels.insert_one(carousel_doc)
+                        await adb.carousels.insert_one(carousel_doc)
                         print(f"✅ Created new carousel with {len(request.uploaded_file_ids)} images")
                     
                     # Mark all uploaded images as used
                     for file_id in request.uploaded_file_ids:
-                        update_query = parse_any_id(file_id)
+                        update_query = await parse_any_id(file_id, user_id)
                         update_query["owner_id"] = user_id
                         
-                        dbm.db.media.update_one(
+                        await adb.media.update_one(
                             update_query,
                             {"$set": {"used_in_posts": True}}
                         )
@@ -1646,7 +1554,7 @@ async def attach_image_to_post(
             "updated_at": datetime.utcnow().isoformat()
         }
         
-        result = dbm.db.generated_posts.update_one(
+        result = await adb.generated_posts.update_one(
             {"id": post_id, "owner_id": user_id},
             {"$set": update_data}
         )
@@ -1684,12 +1592,7 @@ class ValidateToCalendarRequest(BaseModel):
     post_id: str
     scheduled_date: Optional[str] = None
 
-@api_router.post("/posts/validate-to-calendar")
-async def validate_post_to_calendar(
-    request: ValidateToCalendarRequest,
-    user_id: str = Depends(get_current_user_id_robust)
-):
-    """Validate a post to the calendar by updating its validated status and ensuring it's scheduled"""
+def _validate_post_to_calendar(request: ValidateToCalendarRequest, user_id: str):
     try:
         print(f"📅 Validating post {request.post_id} to calendar for user {user_id}")
         
@@ -1746,23 +1649,22 @@ async def validate_post_to_calendar(
         print(f"❌ Error validating post to calendar: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to validate post to calendar: {str(e)}")
 
+@api_router.post("/posts/validate-to-calendar")
+async def validate_post_to_calendar(
+    request: ValidateToCalendarRequest,
+    user_id: str = Depends(get_current_user_id_robust)
+):
+    """Validate a post to the calendar by updating its validated status and ensuring it's scheduled"""
+    return await asyncio.to_thread(_validate_post_to_calendar, request, user_id)
+
 @api_router.get("/calendar/posts")
 async def get_calendar_posts(user_id: str = Depends(get_current_user_id_robust)):
     """Get all validated posts for calendar display"""
     try:
         print(f"📅 Loading calendar posts for user {user_id}")
         
-        dbm = get_database()
-        db = dbm.db
-        
         # Get all validated/scheduled posts for this user
-        posts = list(db.generated_posts.find({
-            "owner_id": user_id,
-            "$or": [
-                {"validated": True},
-                {"status": "scheduled"}
-            ]
-        }))
+        posts = await get_async_database().generated_posts.list_calendar_for_owner(user_id)
         
         print(f"📅 Found {len(posts)} calendar posts for user {user_id}")
         
@@ -1801,13 +1703,7 @@ async def get_calendar_posts(user_id: str = Depends(get_current_user_id_robust))
 class MovePostRequest(BaseModel):
     scheduled_date: str
 
-@api_router.put("/posts/move-calendar-post/{post_id}")
-async def move_calendar_post(
-    post_id: str,
-    request: MovePostRequest,
-    user_id: str = Depends(get_current_user_id_robust)
-):
-    """Déplacer un post du calendrier à une nouvelle date/heure"""
+def _move_calendar_post(post_id: str, request: MovePostRequest, user_id: str):
     try:
         print(f"📅 Moving calendar post {post_id} to {request.scheduled_date}")
         
@@ -1848,12 +1744,16 @@ async def move_calendar_post(
         print(f"❌ Error moving calendar post: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to move calendar post: {str(e)}")
 
-@api_router.delete("/posts/cancel-calendar-post/{post_id}")
-async def cancel_calendar_post(
+@api_router.put("/posts/move-calendar-post/{post_id}")
+async def move_calendar_post(
     post_id: str,
+    request: MovePostRequest,
     user_id: str = Depends(get_current_user_id_robust)
 ):
-    """Annuler la programmation d'un post (retirer du calendrier et remettre en état non-validé)"""
+    """Déplacer un post du calendrier à une nouvelle date/heure"""
+    return await asyncio.to_thread(_move_calendar_post, post_id, request, user_id)
+
+def _cancel_calendar_post(post_id: str, user_id: str):
     try:
         print(f"🗑️ Canceling calendar post {post_id}")
         
@@ -1901,9 +1801,15 @@ async def cancel_calendar_post(
         print(f"❌ Error canceling calendar post: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to cancel calendar post: {str(e)}")
 
-@api_router.get("/posts/calendar-temp")
-async def get_publication_calendar_temp():
-    """Endpoint temporaire pour tester le calendrier sans auth"""
+@api_router.delete("/posts/cancel-calendar-post/{post_id}")
+async def cancel_calendar_post(
+    post_id: str,
+    user_id: str = Depends(get_current_user_id_robust)
+):
+    """Annuler la programmation d'un post (retirer du calendrier et remettre en état non-validé)"""
+    return await asyncio.to_thread(_cancel_calendar_post, post_id, user_id)
+
+def _get_publication_calendar_temp():
     try:
         dbm = get_database()
         
@@ -1937,14 +1843,12 @@ async def get_publication_calendar_temp():
     except Exception as e:
         return {"error": str(e), "posts": [], "total": 0}
 
-@api_router.get("/posts/calendar")
-async def get_publication_calendar(
-    start_date: str = None,
-    end_date: str = None,
-    platform: str = None,
-    user_id: str = Depends(get_current_user_id_robust)
-):
-    """Get posts from the publication calendar with optional filters"""
+@api_router.get("/posts/calendar-temp")
+async def get_publication_calendar_temp():
+    """Endpoint temporaire pour tester le calendrier sans auth"""
+    return await asyncio.to_thread(_get_publication_calendar_temp)
+
+def _get_publication_calendar(start_date: str, end_date: str, platform: str, user_id: str):
     try:
         dbm = get_database()
         
@@ -2007,12 +1911,22 @@ async def get_publication_calendar(
         print(f"❌ Error fetching publication calendar: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to fetch calendar: {str(e)}")
 
-@api_router.post("/posts/generate")
+@api_router.get("/posts/calendar")
+async def get_publication_calendar(
+    start_date: str = None,
+    end_date: str = None,
+    platform: str = None,
+    user_id: str = Depends(get_current_user_id_robust)
+):
+    """Get posts from the publication calendar with optional filters"""
+    return await asyncio.to_thread(_get_publication_calendar, start_date, end_date, platform, user_id)
+
+@api_router.post("/posts/generate", status_code=202)
 async def generate_posts_manual(
     request: PostGenerationRequest = PostGenerationRequest(),
     user_id: str = Depends(get_current_user_id_robust)
 ):
-    """Generate posts manually for the current user with advanced AI system"""
+    """Queue post generation for the current user (progress: GET /posts/generate/{job_id})"""
     try:
         # Determine target month from request
         if request.month_key:
@@ -2050,8 +1964,8 @@ async def generate_posts_manual(
         print(f"   📅 Target month: {target_month} ({target_month_fr})")
         
         # Get business profile to determine posting frequency
-        dbm = get_database()
-        business_profile = dbm.db.business_profiles.find_one({"user_id": user_id})
+        adb = get_async_database().db
+        business_profile = await adb.business_profiles.find_one({"user_id": user_id})
         
         if not business_profile:
             raise HTTPException(status_code=404, detail="Business profile not found. Please complete your business profile first.")
@@ -2129,10 +2043,10 @@ async def generate_posts_manual(
         
         # Vérifier les réseaux sociaux connectés
         connected_platforms = []
-        social_connections = list(dbm.db.social_media_connections.find({
+        social_connections = await adb.social_media_connections.find({
             "user_id": user_id,
             "active": True
-        }))
+        }).to_list(length=None)
         
         for connection in social_connections:
             platform = connection.get("platform", "").lower()
@@ -2147,49 +2061,41 @@ async def generate_posts_manual(
                 detail="Aucun réseau social connecté. Veuillez connecter au moins un compte Facebook, Instagram ou LinkedIn pour générer des posts."
             )
         
-        # Use the new advanced posts generator
-        from posts_generator import PostsGenerator
-        generator = PostsGenerator()
-        
-        result = await generator.generate_posts_for_month(
-            user_id=user_id,
+        # La génération (plusieurs appels LLM) tourne dans un worker : réponse immédiate
+        job = await enqueue_generation(
+            owner_id=user_id,
             target_month=target_month,
             num_posts=num_posts,
             connected_platforms=connected_platforms  # Passer les plateformes connectées
         )
-        
-        if result["success"]:
-            print(f"✅ Successfully generated {result['posts_count']} posts")
-            return {
-                "message": f"Successfully generated {result['posts_count']} posts for {target_month}",
-                "success": True,
-                "posts_count": result["posts_count"],
-                "strategy": result["strategy"],
-                "sources_used": result["sources_used"]
-            }
-        else:
-            print(f"❌ Post generation failed: {result['error']}")
-            raise HTTPException(status_code=500, detail=result["error"])
+        print(f"📨 Post generation job queued: {job['id']}")
+        return {
+            "message": f"Post generation queued for {target_month}",
+            "success": True,
+            **public_job(job)
+        }
             
     except Exception as e:
         print(f"❌ Post generation error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to generate posts: {str(e)}")
 
+@api_router.get("/posts/generate/{job_id}")
+async def get_generation_job(job_id: str, user_id: str = Depends(get_current_user_id_robust)):
+    """Progress of a post generation job (status, current step, result)"""
+    job = await get_generation_job_doc(user_id, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Generation job not found")
+    return public_job(job)
+
 @api_router.get("/posts/generated")
 async def get_generated_posts(user_id: str = Depends(get_current_user_id_robust)):
     """Get generated posts for the current user with enhanced format"""
     try:
         print(f"🔍 DEBUG: get_generated_posts called for user {user_id}")
         
-        dbm = get_database()
-        db = dbm.db
-        
-        print(f"🔍 DEBUG: Database name: {db.name}")
         print(f"🔍 DEBUG: Looking for posts with owner_id: {user_id}")
         
-        posts = list(db.generated_posts.find(
-            {"owner_id": user_id}
-        ).sort([("scheduled_date", 1)]).limit(100))
+        posts = await get_async_database().generated_posts.list_for_owner(user_id, limit=100)
         
         print(f"🔍 DEBUG: Found {len(posts)} posts in database")
         
@@ -2223,9 +2129,7 @@ async def get_generated_posts(user_id: str = Depends(get_current_user_id_robust)
         print(f"❌ Failed to fetch posts: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to fetch generated posts: {str(e)}")
 
-@api_router.get("/website-analysis")
-async def get_website_analyses(user_id: str = Depends(get_current_user_id_robust)):
-    """Get website analyses for the current user"""
+def _get_website_analyses(user_id: str):
     try:
         print(f"🔍 DEBUG: get_website_analyses called for user {user_id}")
         
@@ -2266,9 +2170,12 @@ async def get_website_analyses(user_id: str = Depends(get_current_user_id_robust
         print(f"❌ Failed to fetch analyses: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to fetch website analyses: {str(e)}")
 
-@api_router.get("/debug/posts-count")
-async def debug_posts_count(user_id: str = Depends(get_current_user_id_robust)):
-    """Debug endpoint to check posts count in database"""
+@api_router.get("/website-analysis")
+async def get_website_analyses(user_id: str = Depends(get_current_user_id_robust)):
+    """Get website analyses for the current user"""
+    return await asyncio.to_thread(_get_website_analyses, user_id)
+
+def _debug_posts_count(user_id: str):
     try:
         print(f"🔍 DEBUG ENDPOINT: debug_posts_count called for user {user_id}")
         
@@ -2308,6 +2215,11 @@ async def debug_posts_count(user_id: str = Depends(get_current_user_id_robust)):
         print(f"❌ DEBUG endpoint error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Debug endpoint error: {str(e)}")
 
+@api_router.get("/debug/posts-count")
+async def debug_posts_count(user_id: str = Depends(get_current_user_id_robust)):
+    """Debug endpoint to check posts count in database"""
+    return await asyncio.to_thread(_debug_posts_count, user_id)
+
 class PostModificationRequest(BaseModel):
     modification_request: str
 
@@ -2332,80 +2244,67 @@ class InstagramAuthRequest(BaseModel):
     code: str
     redirect_uri: str
 
-@api_router.put("/posts/{post_id}/modify")
-async def modify_post_with_ai(
-    post_id: str, 
-    request: PostModificationRequest,
-    user_id: str = Depends(get_current_user_id_robust)
-):
-    """Modify a post using AI based on user request"""
-    try:
-        print(f"🔧 Modifying post {post_id} for user {user_id}")
-        print(f"   Modification request: {request.modification_request}")
-        
-        dbm = get_database()
-        db = dbm.db
-        
-        # Debug: Check different possible ID fields
-        print(f"🔍 DEBUG: Searching for post with id={post_id}, owner_id={user_id}")
-        
-        # Try different search patterns to debug the issue
-        search_patterns = [
-            {"id": post_id, "owner_id": user_id},
-            {"_id": post_id, "owner_id": user_id},
-            {"id": post_id, "user_id": user_id},
-            {"post_id": post_id, "owner_id": user_id}
-        ]
-        
-        current_post = None
-        found_pattern = None
-        
-        for i, pattern in enumerate(search_patterns):
-            print(f"🔍 DEBUG: Trying search pattern {i+1}: {pattern}")
-            current_post = db.generated_posts.find_one(pattern)
-            if current_post:
-                found_pattern = pattern
-                print(f"✅ DEBUG: Found post with pattern {i+1}: {pattern}")
-                break
-            else:
-                print(f"❌ DEBUG: No post found with pattern {i+1}")
-        
-        # If still not found, let's see what posts exist for this user
-        if not current_post:
-            print(f"🔍 DEBUG: Listing all posts for user {user_id}:")
-            all_user_posts = list(db.generated_posts.find({"owner_id": user_id}, {"id": 1, "_id": 1, "title": 1}).limit(5))
-            for post in all_user_posts:
-                print(f"   Post: {post}")
-            
-            # Also try with user_id field
-            all_user_posts_v2 = list(db.generated_posts.find({"user_id": user_id}, {"id": 1, "_id": 1, "title": 1}).limit(5))
-            for post in all_user_posts_v2:
-                print(f"   Post (user_id): {post}")
-        
-        if not current_post:
-            print(f"❌ DEBUG: Post {post_id} not found for user {user_id}")
-            raise HTTPException(status_code=404, detail="Post not found")
-        
-        print(f"✅ DEBUG: Post found successfully: {current_post.get('title', 'No title')}")
-        
-        # Use OpenAI to modify the post
-        from openai import OpenAI
-        
-        api_key = os.getenv('OPENAI_API_KEY')
-        if not api_key:
-            raise HTTPException(status_code=500, detail="OpenAI API key not configured")
-        
-        openai_client = OpenAI(api_key=api_key)
-        
-        # Create modification prompt
-        current_text = current_post.get("text", "")
-        current_hashtags = current_post.get("hashtags", [])
-        current_title = current_post.get("title", "")
-        
-        # Get current scheduled date for date modification handling
-        current_scheduled_date = current_post.get("scheduled_date", "")
-        
-        modification_prompt = f"""Modifie ce post Instagram selon la demande utilisateur.
+def _find_post_for_modification(post_id: str, user_id: str) -> Dict[str, Any]:
+    """Load the post to modify (several legacy id/owner field combinations)"""
+    dbm = get_database()
+    db = dbm.db
+    
+    # Debug: Check different possible ID fields
+    print(f"🔍 DEBUG: Searching for post with id={post_id}, owner_id={user_id}")
+    
+    # Try different search patterns to debug the issue
+    search_patterns = [
+        {"id": post_id, "owner_id": user_id},
+        {"_id": post_id, "owner_id": user_id},
+        {"id": post_id, "user_id": user_id},
+        {"post_id": post_id, "owner_id": user_id}
+    ]
+    
+    current_post = None
+    found_pattern = None
+    
+    for i, pattern in enumerate(search_patterns):
+        print(f"🔍 DEBUG: Trying search pattern {i+1}: {pattern}")
+        current_post = db.generated_posts.find_one(pattern)
+        if current_post:
+            found_pattern = pattern
+            print(f"✅ DEBUG: Found post with pattern {i+1}: {pattern}")
+            break
+        else:
+            print(f"❌ DEBUG: No post found with pattern {i+1}")
+    
+    # If still not found, let's see what posts exist for this user
+    if not current_post:
+        print(f"🔍 DEBUG: Listing all posts for user {user_id}:")
+        all_user_posts = list(db.generated_posts.find({"owner_id": user_id}, {"id": 1, "_id": 1, "title": 1}).limit(5))
+        for post in all_user_posts:
+            print(f"   Post: {post}")
+        
+        # Also try with user_id field
+        all_user_posts_v2 = list(db.generated_posts.find({"user_id": user_id}, {"id": 1, "_id": 1, "title": 1}).limit(5))
+        for post in all_user_posts_v2:
+            print(f"   Post (user_id): {post}")
+    
+    if not current_post:
+        print(f"❌ DEBUG: Post {post_id} not found for user {user_id}")
+        raise HTTPException(status_code=404, detail="Post not found")
+    
+    print(f"✅ DEBUG: Post found successfully: {current_post.get('title', 'No title')}")
+    
+    return current_post
+
+
+def _post_modification_messages(current_post: Dict[str, Any], modification_request: str) -> List[Dict[str, str]]:
+    """Chat messages asking the LLM for the modified post as JSON"""
+    # Create modification prompt
+    current_text = current_post.get("text", "")
+    current_hashtags = current_post.get("hashtags", [])
+    current_title = current_post.get("title", "")
+    
+    # Get current scheduled date for date modification handling
+    current_scheduled_date = current_post.get("scheduled_date", "")
+    
+    modification_prompt = f"""Modifie ce post Instagram selon la demande utilisateur.
 
 POST ACTUEL:
 Titre: {current_title}
@@ -2414,7 +2313,7 @@ Hashtags: {', '.join(['#' + tag for tag in current_hashtags])}
 Date programmée: {current_scheduled_date}
 
 DEMANDE DE MODIFICATION:
-{request.modification_request}
+{modification_request}
 
 RÈGLES STRICTES DE RÉDACTION:
 - BANNIR absolument le style IA artificiel et grandiose
@@ -2439,72 +2338,102 @@ RÉPONSE ATTENDUE (JSON exact):
     "scheduled_date": "2025-09-15T09:00:00"
 }}
 """
+    
+    return [
+        {"role": "system", "content": "Tu modifies des posts Instagram selon les demandes utilisateur. Tu écris comme un humain naturel, pas comme une IA. Tu réponds toujours en JSON exact."},
+        {"role": "user", "content": modification_prompt}
+    ]
+
+
+def _apply_post_modification(post_id: str, user_id: str, current_post: Dict[str, Any], response_text: str) -> Dict[str, Any]:
+    """Parse the LLM JSON answer, persist the modified post and build the API response"""
+    db = get_database().db
+    current_text = current_post.get("text", "")
+    current_hashtags = current_post.get("hashtags", [])
+    current_title = current_post.get("title", "")
+    current_scheduled_date = current_post.get("scheduled_date", "")
+    
+    # Clean and parse response
+    clean_response = response_text.strip()
+    if clean_response.startswith('```json'):
+        clean_response = clean_response[7:]
+    if clean_response.endswith('```'):
+        clean_response = clean_response[:-3]
+    clean_response = clean_response.strip()
+    
+    try:
+        modified_data = json.loads(clean_response)
+    except json.JSONDecodeError as e:
+        print(f"❌ Failed to parse AI response: {e}")
+        raise HTTPException(status_code=500, detail="Failed to parse AI modification response")
+    
+    # Update post in database
+    update_data = {
+        "title": modified_data.get("title", current_title),
+        "text": modified_data.get("text", current_text),
+        "hashtags": modified_data.get("hashtags", current_hashtags),
+        "modified_at": datetime.utcnow().isoformat()
+    }
+    
+    # Handle scheduled_date if provided by AI
+    if "scheduled_date" in modified_data and modified_data["scheduled_date"]:
+        update_data["scheduled_date"] = modified_data["scheduled_date"]
+    
+    result = db.generated_posts.update_one(
+        {"id": post_id, "owner_id": user_id},
+        {"$set": update_data}
+    )
+    
+    if result.matched_count == 0:
+        raise HTTPException(status_code=404, detail="Post not found")
+    
+    print(f"✅ Post {post_id} modified successfully")
+    
+    # Return response in format expected by frontend
+    return {
+        "success": True,  # AJOUT DU CHAMP SUCCESS REQUIS PAR LE FRONTEND
+        "message": "Post modifié avec succès",
+        "new_title": update_data["title"],
+        "new_text": update_data["text"],
+        "new_hashtags": update_data["hashtags"],
+        "modified_at": update_data["modified_at"],
+        "scheduled_date": update_data.get("scheduled_date", current_scheduled_date),
+        "modified_post": {
+            "id": post_id,
+            "title": update_data["title"],
+            "text": update_data["text"],
+            "hashtags": update_data["hashtags"]
+        }
+    }
+
+
+@api_router.put("/posts/{post_id}/modify")
+async def modify_post_with_ai(
+    post_id: str, 
+    request: PostModificationRequest,
+    user_id: str = Depends(get_current_user_id_robust)
+):
+    """Modify a post using AI based on user request"""
+    try:
+        print(f"🔧 Modifying post {post_id} for user {user_id}")
+        print(f"   Modification request: {request.modification_request}")
+        
+        # Use OpenAI to modify the post (shared async client pool)
+        if not llm_backup.openai_client:
+            raise HTTPException(status_code=500, detail="OpenAI API key not configured")
+        
+        current_post = await asyncio.to_thread(_find_post_for_modification, post_id, user_id)
         
         # Send to OpenAI
-        response = openai_client.chat.completions.create(
+        response_text = await llm_backup.openai_chat(
             model="gpt-4o",
-            messages=[
-                {"role": "system", "content": "Tu modifies des posts Instagram selon les demandes utilisateur. Tu écris comme un humain naturel, pas comme une IA. Tu réponds toujours en JSON exact."},
-                {"role": "user", "content": modification_prompt}
-            ],
+            messages=_post_modification_messages(current_post, request.modification_request),
             temperature=0.7,
-            max_tokens=1000
-        )
-        
-        response_text = response.choices[0].message.content
-        
-        # Clean and parse response
-        clean_response = response_text.strip()
-        if clean_response.startswith('```json'):
-            clean_response = clean_response[7:]
-        if clean_response.endswith('```'):
-            clean_response = clean_response[:-3]
-        clean_response = clean_response.strip()
-        
-        try:
-            modified_data = json.loads(clean_response)
-        except json.JSONDecodeError as e:
-            print(f"❌ Failed to parse AI response: {e}")
-            raise HTTPException(status_code=500, detail="Failed to parse AI modification response")
-        
-        # Update post in database
-        update_data = {
-            "title": modified_data.get("title", current_title),
-            "text": modified_data.get("text", current_text),
-            "hashtags": modified_data.get("hashtags", current_hashtags),
-            "modified_at": datetime.utcnow().isoformat()
-        }
-        
-        # Handle scheduled_date if provided by AI
-        if "scheduled_date" in modified_data and modified_data["scheduled_date"]:
-            update_data["scheduled_date"] = modified_data["scheduled_date"]
-        
-        result = db.generated_posts.update_one(
-            {"id": post_id, "owner_id": user_id},
-            {"$set": update_data}
+            max_tokens=1000,
+            cache=False
         )
         
-        if result.matched_count == 0:
-            raise HTTPException(status_code=404, detail="Post not found")
-        
-        print(f"✅ Post {post_id} modified successfully")
-        
-        # Return response in format expected by frontend
-        return {
-            "success": True,  # AJOUT DU CHAMP SUCCESS REQUIS PAR LE FRONTEND
-            "message": "Post modifié avec succès",
-            "new_title": update_data["title"],
-            "new_text": update_data["text"],
-            "new_hashtags": update_data["hashtags"],
-            "modified_at": update_data["modified_at"],
-            "scheduled_date": update_data.get("scheduled_date", current_scheduled_date),
-            "modified_post": {
-                "id": post_id,
-                "title": update_data["title"],
-                "text": update_data["text"],
-                "hashtags": update_data["hashtags"]
-            }
-        }
+        return await asyncio.to_thread(_apply_post_modification, post_id, user_id, current_post, response_text)
         
     except HTTPException:
         raise
@@ -2512,16 +2441,55 @@ RÉPONSE ATTENDUE (JSON exact):
         print(f"❌ Error modifying post: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to modify post: {str(e)}")
 
-class UpdateScheduleRequest(BaseModel):
-    scheduled_date: str
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
 
-@api_router.put("/posts/{post_id}/schedule")
-async def update_post_schedule(
+@api_router.post("/posts/{post_id}/modify/stream")
+async def modify_post_with_ai_stream(
     post_id: str,
-    request: UpdateScheduleRequest,
+    request: PostModificationRequest,
     user_id: str = Depends(get_current_user_id_robust)
 ):
-    """Update the scheduled date and time for a post"""
+    """Streaming variant of PUT /posts/{post_id}/modify (Server-Sent Events).
+
+    Events: `token` ({"delta"}) for each chunk of the LLM answer as it arrives,
+    then `done` with the same body as the PUT endpoint once the modified post is
+    saved, or `error` ({"detail"}).
+    """
+    print(f"🔧 Streaming modification of post {post_id} for user {user_id}")
+    if not llm_backup.openai_client:
+        raise HTTPException(status_code=500, detail="OpenAI API key not configured")
+    current_post = await asyncio.to_thread(_find_post_for_modification, post_id, user_id)
+    messages = _post_modification_messages(current_post, request.modification_request)
+    
+    async def events():
+        chunks = []
+        try:
+            async for delta in llm_backup.openai_chat_stream(
+                model="gpt-4o",
+                messages=messages,
+                temperature=0.7,
+                max_tokens=1000
+            ):
+                chunks.append(delta)
+                yield _sse("token", {"delta": delta})
+            result = await asyncio.to_thread(_apply_post_modification, post_id, user_id, current_post, "".join(chunks))
+            yield _sse("done", result)
+        except HTTPException as e:
+            yield _sse("error", {"detail": e.detail})
+        except Exception as e:
+            print(f"❌ Error streaming post modification: {str(e)}")
+            yield _sse("error", {"detail": f"Failed to modify post: {str(e)}"})
+    
+    return StreamingResponse(events(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
+
+class UpdateScheduleRequest(BaseModel):
+    scheduled_date: str
+
+def _update_post_schedule(post_id: str, request: UpdateScheduleRequest, user_id: str):
     try:
         print(f"📅 Updating schedule for post {post_id} to {request.scheduled_date}")
         
@@ -2579,6 +2547,15 @@ async def update_post_schedule(
         print(f"❌ Error updating post schedule: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to update post schedule: {str(e)}")
 
+@api_router.put("/posts/{post_id}/schedule")
+async def update_post_schedule(
+    post_id: str,
+    request: UpdateScheduleRequest,
+    user_id: str = Depends(get_current_user_id_robust)
+):
+    """Update the scheduled date and time for a post"""
+    return await asyncio.to_thread(_update_post_schedule, post_id, request, user_id)
+
 # ----------------------------
 # PIXABAY INTEGRATION: /api/pixabay
 # ----------------------------
@@ -2662,6 +2639,10 @@ async def search_pixabay_images(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Search failed: {str(e)}")
 
+def _image_size(file_path: str):
+    with Image.open(file_path) as img:
+        return img.size
+
 @api_router.post("/pixabay/save-image")
 async def save_pixabay_image(
     request: dict,
@@ -2698,13 +2679,11 @@ async def save_pixabay_image(
                 else:
                     raise HTTPException(status_code=500, detail="Failed to download image")
         
-        # Get image dimensions and file size
-        with Image.open(file_path) as img:
-            width, height = img.size
+        # Get image dimensions and file size (Pillow reads the header off the loop)
+        width, height = await asyncio.to_thread(_image_size, file_path)
         file_size = os.path.getsize(file_path)
         
         # Save to database using the same collection as content/pending
-        media_collection = get_media_collection()
         # Generate document ID first
         doc_id = str(uuid.uuid4())
         
@@ -2740,10 +2719,12 @@ async def save_pixabay_image(
             "thumb_url": f"/api/content/{doc_id}/thumb",  # Use optimized thumbnail endpoint
             "is_external": True,  # Flag to indicate external image
             "save_type": save_type,  # Track how this was saved
-            "attributed_month": attributed_month if save_type == "monthly" else None  # Month attribution
+            "attributed_month": attributed_month if save_type == "monthly" else None,  # Month attribution
+            "deleted": False,
+            "accessible": True  # Served from the Pixabay URL
         }
         
-        media_collection.insert_one(media_doc)
+        await get_async_database().media.insert(media_doc)
         media_doc.pop('_id', None)  # Remove MongoDB _id
         
         return {
@@ -2772,9 +2753,7 @@ async def get_pixabay_categories():
 # SOCIAL MEDIA CONNECTIONS: /api/social
 # ----------------------------
 
-@api_router.get("/social/connections/debug")
-async def debug_social_connections(user_id: str = Depends(get_current_user_id_robust)):
-    """Debug endpoint to check raw connections data"""
+def _debug_social_connections_raw(user_id: str):
     try:
         dbm = get_database()
         social_connections = list(dbm.db.social_connections.find({"user_id": user_id}))
@@ -2782,24 +2761,21 @@ async def debug_social_connections(user_id: str = Depends(get_current_user_id_ro
     except Exception as e:
         return {"error": str(e)}
 
+@api_router.get("/social/connections/debug")
+async def debug_social_connections(user_id: str = Depends(get_current_user_id_robust)):
+    """Debug endpoint to check raw connections data"""
+    return await asyncio.to_thread(_debug_social_connections_raw, user_id)
+
 @api_router.get("/social/connections")  
 async def get_social_connections(user_id: str = Depends(get_current_user_id_robust)):
     """Get all social media connections for the user"""
-    dbm = get_database()
+    social_connections = get_async_database().social_connections
     
     # Get Facebook connections
-    fb_connections = list(dbm.db.social_media_connections.find({
-        "user_id": user_id,
-        "platform": "facebook",
-        "active": True
-    }))
+    fb_connections = await social_connections.list_active(user_id, platform="facebook")
     
     # Get Instagram connections
-    ig_connections = list(dbm.db.social_media_connections.find({
-        "user_id": user_id,
-        "platform": "instagram",
-        "active": True
-    }))
+    ig_connections = await social_connections.list_active(user_id, platform="instagram")
     
     connections = {}
     
@@ -2926,9 +2902,9 @@ async def get_instagram_auth_url(user_id: str = Depends(get_current_user_id_robu
 async def get_media_for_specific_user(user_id: str):
     """Endpoint de test pour récupérer les médias d'un utilisateur sans authentification"""
     try:
-        media_collection = get_media_collection()
+        media_repo = get_async_database().media
         q = {"owner_id": user_id, "$or": [{"deleted": {"$ne": True}}, {"deleted": {"$exists": False}}]}
-        total = media_collection.count_documents(q)
+        total = await media_repo.count_for_owner(user_id)
         
         if total == 0:
             return {
@@ -2940,8 +2916,7 @@ async def get_media_for_specific_user(user_id: str):
         
         # Récupérer quelques médias pour test
         items = []
-        cursor = media_collection.find(q).limit(5)
-        for d in cursor:
+        for d in await media_repo.list_for_owner(user_id, limit=5):
             file_id = d.get("id") or str(d.get("_id"))
             items.append({
                 "id": file_id,
@@ -3219,7 +3194,7 @@ async def facebook_oauth_callback(
                         print(f"   Token: {page_access_token[:20]}... (format: {'EAA' if page_access_token.startswith('EAA') else 'Other'})")
                         
                         # SAUVEGARDE TOKEN PERMANENT (selon ChatGPT)
-                        dbm = get_database()
+                        adb = get_async_database().db
                         facebook_connection = {
                             "id": str(uuid.uuid4()),
                             "user_id": user_id,
@@ -3234,12 +3209,12 @@ async def facebook_oauth_callback(
                         }
                         
                         # Supprimer anciennes connexions et sauvegarder la nouvelle
-                        dbm.db.social_media_connections.delete_many({
+                        await adb.social_media_connections.delete_many({
                             "user_id": user_id,
                             "platform": "facebook"
                         })
                         
-                        dbm.db.social_media_connections.insert_one(facebook_connection)
+                        await adb.social_media_connections.insert_one(facebook_connection)
                         print(f"✅ TOKEN PERMANENT SAUVEGARDÉ: {page_name}")
                         
                         # Instagram si disponible
@@ -3263,12 +3238,12 @@ async def facebook_oauth_callback(
                                     "expires_at": (datetime.now(timezone.utc) + timedelta(seconds=expires_in)).isoformat()
                                 }
                                 
-                                dbm.db.social_media_connections.delete_many({
+                                await adb.social_media_connections.delete_many({
                                     "user_id": user_id,
                                     "platform": "instagram"
                                 })
                                 
-                                dbm.db.social_media_connections.insert_one(instagram_connection)
+                                await adb.social_media_connections.insert_one(instagram_connection)
                                 print(f"✅ INSTAGRAM TOKEN PERMANENT SAUVEGARDÉ: @{ig_username}")
                         
                         # Succès avec tokens permanents
@@ -3418,11 +3393,11 @@ async def instagram_oauth_callback(
                             raise Exception("Aucune page Facebook trouvée pour Instagram")
                         
                         # Chercher les comptes Instagram Business dans les pages
-                        dbm = get_database()
+                        adb = get_async_database().db
                         instagram_connections_created = 0
                         
                         # Supprimer anciennes connexions Instagram
-                        dbm.db.social_media_connections.delete_many({
+                        await adb.social_media_connections.delete_many({
                             "user_id": user_id,
                             "platform": "instagram"
                         })
@@ -3462,7 +3437,7 @@ async def instagram_oauth_callback(
                                         "expires_at": (datetime.now(timezone.utc) + timedelta(seconds=expires_in)).isoformat()
                                     }
                                     
-                                    dbm.db.social_media_connections.insert_one(instagram_connection)
+                                    await adb.social_media_connections.insert_one(instagram_connection)
                                     instagram_connections_created += 1
                                     
                                     print(f"✅ INSTAGRAM TOKEN PERMANENT SAUVEGARDÉ: @{ig_username}")
@@ -3500,8 +3475,12 @@ class PublishPostRequest(BaseModel):
 @api_router.head("/public/image/{file_id}.webp")
 @api_router.head("/public/image/{file_id}.jpg")
 @api_router.head("/public/image/{file_id}")
-async def get_public_image_webp(file_id: str):
-    """ENDPOINT PUBLIC VRAIMENT ACCESSIBLE - Pas d'auth pour Facebook"""
+async def get_public_image_webp(file_id: str, request: Request):
+    """ENDPOINT PUBLIC VRAIMENT ACCESSIBLE - Pas d'auth pour Facebook
+
+    Le JPEG publiable est rendu une seule fois par média (cache GridFS "derivatives",
+    invalidé quand l'original change ou est supprimé) puis streamé avec ETag/304.
+    """
     try:
         print(f"🌐 Serving public image: {file_id}")
         
@@ -3511,13 +3490,8 @@ async def get_public_image_webp(file_id: str):
             clean_file_id = file_id.rsplit('.', 1)[0]
             print(f"🔧 Stripped extension: {file_id} → {clean_file_id}")
         
-        # Récupérer l'image directement de GridFS
-        from database import get_database
-        dbm = get_database()
-        
         # Récupérer depuis la collection media
-        query = parse_any_id(clean_file_id)
-        media_item = dbm.db.media.find_one(query)
+        media_item = await get_async_database().media.find_public(clean_file_id)
         
         if not media_item:
             print(f"❌ Image not found: {clean_file_id}")
@@ -3529,140 +3503,54 @@ async def get_public_image_webp(file_id: str):
             print(f"✅ Redirecting to external URL: {url}")
             return RedirectResponse(url=url, status_code=302)
         
-        # Fichier GridFS - servir directement
-        grid_file_id = media_item.get("grid_file_id")
-        if grid_file_id:
-            print(f"✅ Serving from GridFS: {grid_file_id}")
-            
-            try:
-                import gridfs
-                from bson import ObjectId
-                
-                # Connexion GridFS
-                fs = gridfs.GridFS(dbm.db)
-                
-                # Récupérer le fichier
-                if isinstance(grid_file_id, str):
-                    grid_file_id = ObjectId(grid_file_id)
-                
-                grid_file = fs.get(grid_file_id)
-                
-                # Déterminer le content-type
-                content_type = media_item.get("content_type", "image/jpeg")
-                filename = media_item.get("filename", f"image_{clean_file_id}")
-                
-                # Retourner le fichier en JPG pour Facebook (selon analyse ChatGPT)
-                from fastapi.responses import Response
-                from PIL import Image
-                import io
-                
-                # Convertir en JPG pour Facebook
-                image_bytes = grid_file.read()
-                
-                try:
-                    # Ouvrir et convertir l'image en JPG
-                    image = Image.open(io.BytesIO(image_bytes))
-                    
-                    # Convertir en RGB si nécessaire
-                    if image.mode in ('RGBA', 'LA', 'P'):
-                        background = Image.new('RGB', image.size, (255, 255, 255))
-                        if image.mode == 'P':
-                            image = image.convert('RGBA')
-                        background.paste(image, mask=image.split()[-1] if image.mode == 'RGBA' else None)
-                        image = background
-                    elif image.mode != 'RGB':
-                        image = image.convert('RGB')
-                    
-                    # Sauvegarder en JPG
-                    jpg_buffer = io.BytesIO()
-                    image.save(jpg_buffer, format='JPEG', quality=85, optimize=True)
-                    jpg_bytes = jpg_buffer.getvalue()
-                    
-                    print(f"✅ Converted to JPG: {len(image_bytes)} → {len(jpg_bytes)} bytes")
-                    
-                    return Response(
-                        content=jpg_bytes,
-                        media_type="image/jpeg",  # JPG pour Facebook selon ChatGPT
-                        headers={
-                            "Content-Disposition": f"inline; filename={clean_file_id}.jpg",
-                            "Cache-Control": "public, max-age=31536000",
-                            "Access-Control-Allow-Origin": "*"
-                        }
-                    )
-                    
-                except Exception as convert_error:
-                    print(f"❌ JPG conversion failed, serving original: {convert_error}")
-                    # Fallback vers l'image originale
-                    return Response(
-                        content=image_bytes,
-                        media_type=content_type,
-                        headers={
-                            "Content-Disposition": f"inline; filename={clean_file_id}.jpg",
-                            "Cache-Control": "public, max-age=31536000",
-                            "Access-Control-Allow-Origin": "*"
-                        }
-                    )
-                
-            except Exception as grid_error:
-                print(f"❌ GridFS error: {str(grid_error)}")
-        
-        # Fallback : essayer avec le fichier local si disponible
-        file_path = media_item.get("file_path", "")
-        if file_path and os.path.exists(file_path):
-            print(f"✅ Serving local file: {file_path}")
-            from fastapi.responses import FileResponse
-            # Convertir le fichier local en JPG pour Facebook
-            try:
-                from PIL import Image
-                import io
-                
-                # Ouvrir et convertir en JPG
-                image = Image.open(file_path)
-                
-                # Convertir en RGB si nécessaire
-                if image.mode in ('RGBA', 'LA', 'P'):
-                    background = Image.new('RGB', image.size, (255, 255, 255))
-                    if image.mode == 'P':
-                        image = image.convert('RGBA')
-                    background.paste(image, mask=image.split()[-1] if image.mode == 'RGBA' else None)
-                    image = background
-                elif image.mode != 'RGB':
-                    image = image.convert('RGB')
-                
-                # Sauvegarder en JPG
-                jpg_buffer = io.BytesIO()
-                image.save(jpg_buffer, format='JPEG', quality=85, optimize=True)
-                jpg_bytes = jpg_buffer.getvalue()
-                
-                print(f"✅ File converted to JPG: {file_path}")
-                
-                from fastapi.responses import Response
-                return Response(
-                    content=jpg_bytes,
-                    media_type="image/jpeg",  # JPG pour Facebook
-                    headers={
-                        "Content-Disposition": f"inline; filename={file_id}.jpg",
-                        "Cache-Control": "public, max-age=31536000",
-                        "Access-Control-Allow-Origin": "*"
-                    }
-                )
-                
-            except Exception as convert_error:
-                print(f"❌ File JPG conversion failed, serving as-is: {convert_error}")
-                # Fallback vers FileResponse original
-                return FileResponse(
-                    file_path,
-                    media_type="image/jpeg",  # Force JPG même en fallback
-                    filename=f"{clean_file_id}.jpg",
-                    headers={
-                        "Cache-Control": "public, max-age=31536000",
-                        "Access-Control-Allow-Origin": "*"
-                    }
-                )
+        headers = {
+            "Content-Disposition": f"inline; filename={clean_file_id}.jpg",
+            "Cache-Control": "public, max-age=31536000",
+            "Access-Control-Allow-Origin": "*"
+        }
+        
+        try:
+            derivative = await get_or_create_publish_jpeg(media_item)
+        except Exception as convert_error:
+            print(f"❌ JPG conversion failed, serving original: {convert_error}")
+            # Fallback vers l'image originale
+            original_bytes = await read_source_bytes(media_item)
+            if not original_bytes:
+                raise HTTPException(status_code=404, detail="Image file not found")
+            return Response(
+                content=original_bytes,
+                media_type=media_item.get("file_type") or "image/jpeg",
+                headers=headers
+            )
         
-        # Pas de fichier disponible
-        print(f"❌ No file data available for: {clean_file_id}")
-        raise HTTPException(status_code=404, detail="Image file not found")
+        if not derivative:
+            # Pas de fichier disponible
+            print(f"❌ No file data available for: {clean_file_id}")
+            raise HTTPException(status_code=404, detail="Image file not found")
+        
+        metadata = derivative.get("metadata", {})
+        etag = metadata.get("etag")
+        headers["ETag"] = etag
+        headers["Last-Modified"] = http_date(derivative.get("uploadDate"))
+        headers["Content-Length"] = str(derivative.get("length", 0))
+        
+        if is_not_modified(etag, derivative.get("uploadDate"), request.headers.get("if-none-match"), request.headers.get("if-modified-since")):
+            headers.pop("Content-Length")
+            return Response(status_code=304, headers=headers)
+        
+        if request.method == "HEAD":
+            return Response(headers=headers, media_type="image/jpeg")
+        
+        grid_out = await open_derivative(derivative)
+        
+        async def _iter_chunks():
+            while True:
+                chunk = await grid_out.readchunk()
+                if not chunk:
+                    break
+                yield chunk
+        
+        return StreamingResponse(_iter_chunks(), media_type="image/jpeg", headers=headers)
         
     except HTTPException:
         raise
@@ -3670,12 +3558,7 @@ async def get_public_image_webp(file_id: str):
         print(f"❌ Error serving public image: {str(e)}")
         raise HTTPException(status_code=500, detail="Image service error")
 
-@api_router.post("/social/facebook/connect-manual")
-async def connect_facebook_manual(
-    request: dict,
-    user_id: str = Depends(get_current_user_id_robust)
-):
-    """SOLUTION TEMPORAIRE : Connexion Facebook manuelle avec token fourni"""
+def _connect_facebook_manual(request: dict, user_id: str):
     try:
         page_access_token = request.get("page_access_token")
         page_name = request.get("page_name", "Page Facebook")
@@ -3733,6 +3616,14 @@ async def connect_facebook_manual(
             "message": "Erreur connexion manuelle Facebook"
         }
 
+@api_router.post("/social/facebook/connect-manual")
+async def connect_facebook_manual(
+    request: dict,
+    user_id: str = Depends(get_current_user_id_robust)
+):
+    """SOLUTION TEMPORAIRE : Connexion Facebook manuelle avec token fourni"""
+    return await asyncio.to_thread(_connect_facebook_manual, request, user_id)
+
 @api_router.get("/test/image-headers/{file_id}")
 async def test_image_headers(file_id: str):
     """Test endpoint pour vérifier les headers d'image (selon ChatGPT)"""
@@ -3765,9 +3656,7 @@ async def test_image_headers(file_id: str):
             "response_time_ms": 0
         }
 
-@api_router.get("/social/connections/status")
-async def get_social_connections_status(user_id: str = Depends(get_current_user_id_robust)):
-    """STATUS SIMPLE - Voir les connexions comme ChatGPT"""
+def _get_social_connections_status(user_id: str):
     try:
         dbm = get_database()
         
@@ -3803,6 +3692,11 @@ async def get_social_connections_status(user_id: str = Depends(get_current_user_
             "error": str(e)
         }
 
+@api_router.get("/social/connections/status")
+async def get_social_connections_status(user_id: str = Depends(get_current_user_id_robust)):
+    """STATUS SIMPLE - Voir les connexions comme ChatGPT"""
+    return await asyncio.to_thread(_get_social_connections_status, user_id)
+
 @api_router.post("/publish/facebook/photo")
 async def publish_facebook_photo_binary(
     caption: str = Form(...),
@@ -3822,31 +3716,27 @@ async def publish_facebook_photo_binary(
         file_bytes = await file.read()
         
         # Construire payload multipart/form-data (selon ChatGPT)
-        import aiohttp
-        async with aiohttp.ClientSession() as session:
-            form_data = aiohttp.FormData()
-            form_data.add_field('source', file_bytes, filename=file.filename, content_type=file.content_type)
-            form_data.add_field('caption', caption)
-            form_data.add_field('access_token', access_token)
-            form_data.add_field('published', 'true')
-            
-            async with session.post(fb_url, data=form_data, timeout=30) as response:
-                fb_resp = await response.json()
-                
-                if response.status == 200 and 'id' in fb_resp:
-                    print(f"✅ Facebook binary upload successful: {fb_resp.get('id')}")
-                    return {
-                        "success": True,
-                        "facebook_post_id": fb_resp.get('id'),
-                        "message": "Photo publiée avec succès via upload binaire"
-                    }
-                else:
-                    print(f"❌ Facebook binary upload failed: {fb_resp}")
-                    return {
-                        "success": False,
-                        "error": fb_resp.get('error', {}).get('message', 'Upload failed'),
-                        "details": fb_resp
-                    }
+        response = await graph_client().post(
+            fb_url,
+            data={'caption': caption, 'access_token': access_token, 'published': 'true'},
+            files={'source': (file.filename, file_bytes, file.content_type)}
+        )
+        fb_resp = response.json()
+        
+        if response.status_code == 200 and 'id' in fb_resp:
+            print(f"✅ Facebook binary upload successful: {fb_resp.get('id')}")
+            return {
+                "success": True,
+                "facebook_post_id": fb_resp.get('id'),
+                "message": "Photo publiée avec succès via upload binaire"
+            }
+        else:
+            print(f"❌ Facebook binary upload failed: {fb_resp}")
+            return {
+                "success": False,
+                "error": fb_resp.get('error', {}).get('message', 'Upload failed'),
+                "details": fb_resp
+            }
         
     except Exception as e:
         print(f"❌ Facebook binary upload error: {str(e)}")
@@ -3876,10 +3766,10 @@ async def publish_facebook_with_image(
         # Convertir URL protégée en URL publique
         public_image_url = convert_to_public_image_url(image_url)
         
-        dbm = get_database()
+        adb = get_async_database().db
         
         # Récupérer la connexion Facebook
-        connection = dbm.db.social_media_connections.find_one({
+        connection = await adb.social_media_connections.find_one({
             "user_id": user_id,
             "platform": "facebook",
             "active": True
@@ -3899,52 +3789,49 @@ async def publish_facebook_with_image(
         print(f"📘 Facebook upload with image download: {page_name}")
         print(f"   Image URL: {public_image_url}")
         
-        # ÉTAPE 1: Télécharger l'image (selon ChatGPT)
-        import aiohttp
-        async with aiohttp.ClientSession() as session:
-            async with session.get(public_image_url) as img_response:
-                if img_response.status != 200:
-                    return {
-                        "success": False,
-                        "error": f"Impossible de télécharger l'image: {img_response.status}",
-                        "image_url": public_image_url
-                    }
-                
-                image_bytes = await img_response.read()
-                content_type = img_response.headers.get('Content-Type', 'image/webp')
-                
-                print(f"✅ Image downloaded: {len(image_bytes)} bytes, {content_type}")
-                
-                # ÉTAPE 2: Upload binaire à Facebook (solution ChatGPT)
-                fb_url = f"https://graph.facebook.com/v20.0/{page_id}/photos"
-                
-                form_data = aiohttp.FormData()
-                form_data.add_field('source', image_bytes, filename='image.webp', content_type=content_type)
-                form_data.add_field('caption', text)
-                form_data.add_field('access_token', access_token)
-                form_data.add_field('published', 'true')
-                
-                async with session.post(fb_url, data=form_data, timeout=30) as fb_response:
-                    fb_resp = await fb_response.json()
-                    
-                    if fb_response.status == 200 and 'id' in fb_resp:
-                        print(f"✅ Facebook binary publication successful: {fb_resp.get('id')}")
-                        return {
-                            "success": True,
-                            "facebook_post_id": fb_resp.get('id'),
-                            "page_name": page_name,
-                            "content": text,
-                            "image_size": len(image_bytes),
-                            "method": "binary_upload",
-                            "published_at": datetime.now().isoformat()
-                        }
-                    else:
-                        print(f"❌ Facebook API Error: {fb_resp}")
-                        return {
-                            "success": False,
-                            "error": fb_resp.get('error', {}).get('message', 'Publication failed'),
-                            "details": fb_resp
-                        }
+        # ÉTAPE 1: Récupérer l'image (cache de dérivés pour nos images, téléchargement sinon)
+        try:
+            resolved_image = await resolve_publish_image(public_image_url)
+        except ImageUnavailable as e:
+            return {
+                "success": False,
+                "error": str(e),
+                "image_url": public_image_url
+            }
+        
+        image_bytes = resolved_image["data"]
+        content_type = resolved_image["content_type"]
+        
+        print(f"✅ Image ready ({resolved_image['source']}): {len(image_bytes)} bytes, {content_type}")
+        
+        # ÉTAPE 2: Upload binaire à Facebook (solution ChatGPT)
+        fb_url = f"https://graph.facebook.com/v20.0/{page_id}/photos"
+        
+        fb_response = await graph_client().post(
+            fb_url,
+            data={'caption': text, 'access_token': access_token, 'published': 'true'},
+            files={'source': ('image.jpg', image_bytes, content_type)}
+        )
+        fb_resp = fb_response.json()
+        
+        if fb_response.status_code == 200 and 'id' in fb_resp:
+            print(f"✅ Facebook binary publication successful: {fb_resp.get('id')}")
+            return {
+                "success": True,
+                "facebook_post_id": fb_resp.get('id'),
+                "page_name": page_name,
+                "content": text,
+                "image_size": len(image_bytes),
+                "method": "binary_upload",
+                "published_at": datetime.now().isoformat()
+            }
+        else:
+            print(f"❌ Facebook API Error: {fb_resp}")
+            return {
+                "success": False,
+                "error": fb_resp.get('error', {}).get('message', 'Publication failed'),
+                "details": fb_resp
+            }
         
     except Exception as e:
         print(f"❌ Facebook publication with image error: {str(e)}")
@@ -3959,10 +3846,15 @@ async def publish_instagram_simple(
     request: dict,
     user_id: str = Depends(get_current_user_id_robust)
 ):
-    """PUBLICATION INSTAGRAM SIMPLE - Approche ChatGPT (2 étapes)"""
+    """PUBLICATION INSTAGRAM SIMPLE - Approche ChatGPT (2 étapes)
+
+    `image_urls` (2 à 10 images) publie un carrousel : conteneurs enfants créés en
+    parallèle, parent publié dès que tous sont FINISHED.
+    """
     try:
         text = request.get("text", "Test de publication Instagram")
-        image_url = request.get("image_url")
+        image_urls = [convert_to_public_image_url(url) for url in request.get("image_urls") or [] if url]
+        image_url = request.get("image_url") or (image_urls[0] if image_urls else None)
         
         if not image_url:
             return {
@@ -3974,10 +3866,10 @@ async def publish_instagram_simple(
         # Convertir URL protégée en URL publique pour Instagram
         image_url = convert_to_public_image_url(image_url)
         
-        dbm = get_database()
+        adb = get_async_database().db
         
         # Récupérer la connexion Instagram (approche simple)
-        connection = dbm.db.social_media_connections.find_one({
+        connection = await adb.social_media_connections.find_one({
             "user_id": user_id,
             "platform": "instagram",
             "active": True
@@ -4005,65 +3897,36 @@ async def publish_instagram_simple(
         print(f"   Content: {text[:50]}...")
         print(f"   Image: {image_url}")
         
-        # Publication Instagram en 2 étapes (approche ChatGPT)
-        import aiohttp
-        async with aiohttp.ClientSession() as session:
-            # ÉTAPE 1: Créer le media container (API v20.0 selon GPT-4o)
-            create_url = f"https://graph.facebook.com/v20.0/{instagram_user_id}/media"
-            create_data = {
-                "caption": text,
-                "image_url": image_url,
-                "access_token": access_token
+        # Publication Instagram en 2 étapes (approche ChatGPT), publiée dès que le conteneur est FINISHED
+        from social_media import InstagramAPIClient
+        instagram = InstagramAPIClient(access_token, http_client=graph_client(),
+                                       base_url="https://graph.facebook.com/v20.0")
+        try:
+            if len(image_urls) > 1:
+                print(f"🎠 Carousel: {len(image_urls)} images")
+                published = await instagram.post_carousel_to_instagram(instagram_user_id, image_urls, text)
+            else:
+                published = await instagram.post_to_instagram(instagram_user_id, image_url, text)
+        except HTTPException as e:
+            print(f"❌ Instagram Error: {e.detail}")
+            return {
+                "success": False,
+                "error": "Erreur publication Instagram",
+                "details": e.detail
             }
-            
-            async with session.post(create_url, data=create_data) as create_response:
-                if create_response.status == 200:
-                    create_result = await create_response.json()
-                    media_id = create_result.get("id")
-                    
-                    if not media_id:
-                        raise Exception("Media ID non reçu d'Instagram")
-                    
-                    print(f"✅ Media container créé: {media_id}")
-                    
-                    # ÉTAPE 2: Publier le media (API v20.0 selon GPT-4o)
-                    publish_url = f"https://graph.facebook.com/v20.0/{instagram_user_id}/media_publish"
-                    publish_data = {
-                        "creation_id": media_id,
-                        "access_token": access_token
-                    }
-                    
-                    async with session.post(publish_url, data=publish_data) as publish_response:
-                        if publish_response.status == 200:
-                            publish_result = await publish_response.json()
-                            instagram_post_id = publish_result.get("id")
-                            
-                            return {
-                                "success": True,
-                                "message": f"✅ Publication réussie sur @{username}",
-                                "instagram_post_id": instagram_post_id,
-                                "media_id": media_id,
-                                "username": username,
-                                "content": text,
-                                "image_url": image_url,
-                                "published_at": datetime.now().isoformat()
-                            }
-                        else:
-                            error_text = await publish_response.text()
-                            print(f"❌ Instagram Publish Error: {publish_response.status} - {error_text}")
-                            return {
-                                "success": False,
-                                "error": f"Erreur publication Instagram: {publish_response.status}",
-                                "details": error_text
-                            }
-                else:
-                    error_text = await create_response.text()
-                    print(f"❌ Instagram Create Error: {create_response.status} - {error_text}")
-                    return {
-                        "success": False,
-                        "error": f"Erreur création media Instagram: {create_response.status}",
-                        "details": error_text
-                    }
+        
+        print(f"✅ Media container publié: {published['container_id']}")
+        return {
+            "success": True,
+            "message": f"✅ Publication réussie sur @{username}",
+            "instagram_post_id": published["media_id"],
+            "media_id": published["container_id"],
+            "children": published.get("children", []),
+            "username": username,
+            "content": text,
+            "image_url": image_url,
+            "published_at": datetime.now().isoformat()
+        }
         
     except Exception as e:
         print(f"❌ Instagram publication error: {str(e)}")
@@ -4073,9 +3936,7 @@ async def publish_instagram_simple(
             "message": "Erreur lors de la publication Instagram"
         }
 
-@api_router.get("/posts/real-data")
-async def get_real_posts(user_id: str = Depends(get_current_user_id_robust)):
-    """Endpoint BYPASS - retourne les VRAIS posts de la base locale"""
+def _get_real_posts(user_id: str):
     try:
         # Connexion directe sans cache
         from database import get_database
@@ -4119,9 +3980,12 @@ async def get_real_posts(user_id: str = Depends(get_current_user_id_robust)):
     except Exception as e:
         return {"error": f"Real data error: {str(e)}"}
 
-@api_router.get("/posts/force-clear-cache")
-async def force_clear_all_caches(user_id: str = Depends(get_current_user_id_robust)):
-    """Force le vidage de tous les caches possibles"""
+@api_router.get("/posts/real-data")
+async def get_real_posts(user_id: str = Depends(get_current_user_id_robust)):
+    """Endpoint BYPASS - retourne les VRAIS posts de la base locale"""
+    return await asyncio.to_thread(_get_real_posts, user_id)
+
+def _force_clear_all_caches(user_id: str):
     try:
         import gc
         import os
@@ -4164,9 +4028,12 @@ async def force_clear_all_caches(user_id: str = Depends(get_current_user_id_robu
     except Exception as e:
         return {"error": f"Cache clear error: {str(e)}"}
 
-@api_router.get("/posts/debug-db")
-async def debug_db_posts(user_id: str = Depends(get_current_user_id_robust)):
-    """Endpoint de debug DIRECT sur la base de données"""
+@api_router.get("/posts/force-clear-cache")
+async def force_clear_all_caches(user_id: str = Depends(get_current_user_id_robust)):
+    """Force le vidage de tous les caches possibles"""
+    return await asyncio.to_thread(_force_clear_all_caches, user_id)
+
+def _debug_db_posts(user_id: str):
     try:
         from database import get_database
         
@@ -4203,9 +4070,12 @@ async def debug_db_posts(user_id: str = Depends(get_current_user_id_robust)):
     except Exception as e:
         return {"error": f"Debug error: {str(e)}"}
 
-@api_router.delete("/posts/nuclear-clean")
-async def nuclear_clean_posts(user_id: str = Depends(get_current_user_id_robust)):
-    """NETTOYAGE NUCLÉAIRE - Supprime TOUT et force la regénération"""
+@api_router.get("/posts/debug-db")
+async def debug_db_posts(user_id: str = Depends(get_current_user_id_robust)):
+    """Endpoint de debug DIRECT sur la base de données"""
+    return await asyncio.to_thread(_debug_db_posts, user_id)
+
+def _nuclear_clean_posts(user_id: str):
     try:
         dbm = get_database()
         
@@ -4227,6 +4097,11 @@ async def nuclear_clean_posts(user_id: str = Depends(get_current_user_id_robust)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erreur nettoyage: {str(e)}")
 
+@api_router.delete("/posts/nuclear-clean")
+async def nuclear_clean_posts(user_id: str = Depends(get_current_user_id_robust)):
+    """NETTOYAGE NUCLÉAIRE - Supprime TOUT et force la regénération"""
+    return await asyncio.to_thread(_nuclear_clean_posts, user_id)
+
 @api_router.post("/posts/force-generate-facebook")
 async def force_generate_facebook_posts(user_id: str = Depends(get_current_user_id_robust)):
     """Force la génération de posts Facebook avec nouveau système"""
@@ -4234,8 +4109,8 @@ async def force_generate_facebook_posts(user_id: str = Depends(get_current_user_
         from posts_generator import PostsGenerator
         
         # Vérifier la connexion Facebook
-        dbm = get_database()
-        fb_connection = dbm.db.social_media_connections.find_one({
+        adb = get_async_database().db
+        fb_connection = await adb.social_media_connections.find_one({
             "user_id": user_id,
             "platform": "facebook",
             "active": True
@@ -4245,7 +4120,7 @@ async def force_generate_facebook_posts(user_id: str = Depends(get_current_user_
             raise HTTPException(status_code=400, detail="Aucune connexion Facebook active")
         
         # Générer des posts Facebook manuellement
-        generator = PostsGenerator()
+        generator = await asyncio.to_thread(PostsGenerator)
         result = await generator.generate_posts_for_month(
             user_id=user_id,
             target_month="octobre_2024",
@@ -4257,12 +4132,7 @@ async def force_generate_facebook_posts(user_id: str = Depends(get_current_user_
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erreur génération forcée: {str(e)}")
 
-@api_router.post("/posts/validate")
-async def validate_post(
-    post_id: str,
-    user_id: str = Depends(get_current_user_id_robust)
-):
-    """Valider un post (le marquer comme publié)"""
+def _validate_post(post_id: str, user_id: str):
     try:
         dbm = get_database()
         
@@ -4290,12 +4160,15 @@ async def validate_post(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erreur validation: {str(e)}")
 
-@api_router.post("/social/facebook/publish-simple")
-async def publish_facebook_post_simple(
-    request: PublishPostRequest,
+@api_router.post("/posts/validate")
+async def validate_post(
+    post_id: str,
     user_id: str = Depends(get_current_user_id_robust)
 ):
-    """Version simplifiée de l'endpoint de publication Facebook"""
+    """Valider un post (le marquer comme publié)"""
+    return await asyncio.to_thread(_validate_post, post_id, user_id)
+
+def _publish_facebook_post_simple(request: PublishPostRequest, user_id: str):
     try:
         post_id = request.post_id
         if not post_id:
@@ -4328,6 +4201,14 @@ async def publish_facebook_post_simple(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erreur: {str(e)}")
 
+@api_router.post("/social/facebook/publish-simple")
+async def publish_facebook_post_simple(
+    request: PublishPostRequest,
+    user_id: str = Depends(get_current_user_id_robust)
+):
+    """Version simplifiée de l'endpoint de publication Facebook"""
+    return await asyncio.to_thread(_publish_facebook_post_simple, request, user_id)
+
 @api_router.post("/social/facebook/publish")
 async def publish_facebook_post(
     request: PublishPostRequest,
@@ -4335,16 +4216,16 @@ async def publish_facebook_post(
 ):
     """Publier un post sur Facebook automatiquement"""
     try:
-        dbm = get_database()
+        adb = get_async_database().db
         
         # 1. Récupérer le post à publier
         post_id = request.post_id
-        post = dbm.db.generated_posts.find_one({"post_id": post_id, "user_id": user_id})
+        post = await adb.generated_posts.find_one({"post_id": post_id, "user_id": user_id})
         if not post:
             raise HTTPException(status_code=404, detail="Post non trouvé")
         
         # 2. Récupérer la connexion Facebook de l'utilisateur
-        facebook_connection = dbm.db.social_media_connections.find_one({
+        facebook_connection = await adb.social_media_connections.find_one({
             "user_id": user_id,
             "platform": "facebook",
             "active": True
@@ -4357,8 +4238,6 @@ async def publish_facebook_post(
         page_name = facebook_connection.get("page_name", "Page Facebook")
         
         # 3. Publier sur Facebook via Graph API
-        import aiohttp
-        
         # Préparer le contenu du post
         message = f"{post.get('text', '')}\n\n{' '.join(post.get('hashtags', []))}"
         
@@ -4374,36 +4253,35 @@ async def publish_facebook_post(
         if post.get("visual_url"):
             post_data["link"] = post.get("visual_url")
         
-        async with aiohttp.ClientSession() as session:
-            async with session.post(facebook_url, data=post_data) as response:
-                if response.status == 200:
-                    facebook_response = await response.json()
-                    facebook_post_id = facebook_response.get("id")
-                    
-                    # 4. Mettre à jour le post avec les informations de publication
-                    dbm.db.generated_posts.update_one(
-                        {"post_id": post_id, "user_id": user_id},
-                        {
-                            "$set": {
-                                "published": True,
-                                "published_at": datetime.now(timezone.utc),
-                                "facebook_post_id": facebook_post_id,
-                                "publication_platform": "facebook"
-                            }
-                        }
-                    )
-                    
-                    print(f"✅ Post {post_id} publié sur Facebook: {facebook_post_id}")
-                    
-                    return {
-                        "message": f"Post publié avec succès sur {page_name}",
+        response = await graph_client().post(facebook_url, data=post_data)
+        if response.status_code == 200:
+            facebook_response = response.json()
+            facebook_post_id = facebook_response.get("id")
+            
+            # 4. Mettre à jour le post avec les informations de publication
+            await adb.generated_posts.update_one(
+                {"post_id": post_id, "user_id": user_id},
+                {
+                    "$set": {
+                        "published": True,
+                        "published_at": datetime.now(timezone.utc),
                         "facebook_post_id": facebook_post_id,
-                        "published_at": datetime.now(timezone.utc).isoformat()
+                        "publication_platform": "facebook"
                     }
-                else:
-                    error_text = await response.text()
-                    print(f"❌ Erreur publication Facebook: {response.status} - {error_text}")
-                    raise HTTPException(status_code=400, detail=f"Erreur Facebook: {error_text}")
+                }
+            )
+            
+            print(f"✅ Post {post_id} publié sur Facebook: {facebook_post_id}")
+            
+            return {
+                "message": f"Post publié avec succès sur {page_name}",
+                "facebook_post_id": facebook_post_id,
+                "published_at": datetime.now(timezone.utc).isoformat()
+            }
+        else:
+            error_text = response.text
+            print(f"❌ Erreur publication Facebook: {response.status_code} - {error_text}")
+            raise HTTPException(status_code=400, detail=f"Erreur Facebook: {error_text}")
     
     except Exception as e:
         print(f"❌ Error publishing Facebook post: {str(e)}")
@@ -4483,10 +4361,10 @@ async def connect_instagram_account(
                     raise HTTPException(status_code=400, detail="Failed to get Instagram account info")
         
         # Step 3: Save connection to database
-        dbm = get_database()
+        adb = get_async_database().db
         
         # Remove any existing Instagram connection for this user
-        dbm.db.social_media_connections.delete_many({
+        await adb.social_media_connections.delete_many({
             "user_id": user_id,
             "platform": "instagram"  
         })
@@ -4502,7 +4380,7 @@ async def connect_instagram_account(
             "active": True  # Utiliser "active" pour cohérence
         }
         
-        dbm.db.social_media_connections.insert_one(connection_data)
+        await adb.social_media_connections.insert_one(connection_data)
         
         print(f"✅ Instagram account @{username} connected successfully")
         
@@ -4519,9 +4397,7 @@ async def connect_instagram_account(
         print(f"❌ Error connecting Instagram: {e}")
         raise HTTPException(status_code=500, detail="Failed to connect Instagram account")
 
-@api_router.get("/social/debug-connections")
-async def debug_social_connections(user_id: str = Depends(get_current_user_id_robust)):
-    """Debug endpoint to check social connections state"""
+def _debug_social_connections_state(user_id: str):
     try:
         dbm = get_database()
         
@@ -4579,12 +4455,12 @@ async def debug_social_connections(user_id: str = Depends(get_current_user_id_ro
         print(f"❌ Error in debug connections: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Debug failed: {str(e)}")
 
-@api_router.delete("/social/connections/{platform}")
-async def disconnect_social_platform(
-    platform: str,
-    user_id: str = Depends(get_current_user_id_robust)
-):
-    """Disconnect a specific social media platform (enforces one account per platform)"""
+@api_router.get("/social/debug-connections")
+async def debug_social_connections(user_id: str = Depends(get_current_user_id_robust)):
+    """Debug endpoint to check social connections state"""
+    return await asyncio.to_thread(_debug_social_connections_state, user_id)
+
+def _disconnect_social_platform(platform: str, user_id: str):
     try:
         if platform not in ["facebook", "instagram"]:
             raise HTTPException(status_code=400, detail="Platform must be 'facebook' or 'instagram'")
@@ -4616,355 +4492,34 @@ async def disconnect_social_platform(
         print(f"❌ Error disconnecting {platform}: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to disconnect {platform}: {str(e)}")
 
+@api_router.delete("/social/connections/{platform}")
+async def disconnect_social_platform(
+    platform: str,
+    user_id: str = Depends(get_current_user_id_robust)
+):
+    """Disconnect a specific social media platform (enforces one account per platform)"""
+    return await asyncio.to_thread(_disconnect_social_platform, platform, user_id)
+
 @api_router.post("/posts/publish")
 async def publish_post_to_social_media(
     request: dict,
     user_id: str = Depends(get_current_user_id_robust)
 ):
     """Publier un post directement sur les réseaux sociaux connectés"""
+    post_id = request.get("post_id")
+    if not post_id:
+        raise HTTPException(status_code=400, detail="post_id requis")
+    
+    print(f"🚀 Publishing post {post_id} to social media for user {user_id}")
     try:
-        post_id = request.get("post_id")
-        if not post_id:
-            raise HTTPException(status_code=400, detail="post_id requis")
-        
-        print(f"🚀 Publishing post {post_id} to social media for user {user_id}")
-        
-        dbm = get_database()
-        db = dbm.db
-        
-        # Récupérer le post
-        post = db.generated_posts.find_one({
-            "id": post_id,
-            "owner_id": user_id
-        })
-        
-        if not post:
-            raise HTTPException(status_code=404, detail="Post non trouvé")
-        
-        # Récupérer les connexions sociales actives
-        social_connections = list(db.social_media_connections.find({
-            "user_id": user_id,
-            "active": True
-        }))
-        
-        if not social_connections:
-            raise HTTPException(status_code=400, detail="Aucune connexion sociale active trouvée")
-        
-        # Déterminer sur quelle plateforme publier
-        target_platform = post.get("platform", "facebook").lower()
-        print(f"📱 Target platform: {target_platform}")
-        
-        # Trouver la connexion pour cette plateforme
-        target_connection = None
-        for conn in social_connections:
-            if conn["platform"] == target_platform:
-                target_connection = conn
-                break
-        
-        if not target_connection:
-            # Utiliser Facebook par défaut si disponible
-            for conn in social_connections:
-                if conn["platform"] == "facebook":
-                    target_connection = conn
-                    target_platform = "facebook"
-                    break
-        
-        if not target_connection:
-            raise HTTPException(status_code=400, detail=f"Aucune connexion {target_platform} trouvée")
-        
-        print(f"📱 Using connection: {target_connection['platform']} - {target_connection.get('page_name', 'Unknown')}")
-        
-        # Préparer le contenu du post
-        content = post.get("text", "")
-        if post.get("hashtags"):
-            hashtags = " ".join([f"#{tag.strip('#')}" for tag in post["hashtags"][:10]])  # Limiter à 10 hashtags
-            content = f"{content}\n\n{hashtags}"
-        
-        # Récupérer l'URL de l'image et la convertir en URL publique
-        image_url = None
-        if post.get("image_url"):
-            image_url = post["image_url"]
-        elif post.get("images") and len(post["images"]) > 0:
-            # Prendre la première image du carrousel
-            image_url = post["images"][0].get("url")
-        
-        # CONVERTIR URL PROTÉGÉE EN URL PUBLIQUE pour Facebook
-        if image_url:
-            image_url = convert_to_public_image_url(image_url)
-        
-        print(f"📝 Content: {content[:100]}...")
-        print(f"🖼️ Image URL: {image_url}")
-        
-        # Publier sur Facebook (vraie publication restaurée)
-        if target_platform == "facebook" and SOCIAL_MEDIA_AVAILABLE:
-            try:
-                access_token = target_connection.get("access_token", "")
-                page_id = target_connection.get("page_id")
-                
-                print(f"📘 Publishing to Facebook: {content[:100]}...")
-                print(f"   Page ID: {page_id}")
-                print(f"   Token: {access_token[:20]}..." if access_token else "No token")
-                
-                # Validation du token avant publication (selon ChatGPT)
-                if not access_token:
-                    raise Exception("Aucun token Facebook trouvé - Reconnectez votre compte")
-                if access_token.startswith("temp_"):
-                    raise Exception("Token Facebook temporaire détecté - Reconnectez votre compte pour obtenir un vrai token OAuth")
-                if not access_token.startswith("EAAG") and not access_token.startswith("EAA"):
-                    raise Exception(f"Format de token Facebook invalide - Token reçu: {access_token[:20]}...")
-                
-                # MÉTHODE BINAIRE + CONVERSION JPG selon analyse ChatGPT
-                if image_url:
-                    print(f"🔄 Facebook JPG Upload: Downloading and converting image from {image_url}")
-                    
-                    import aiohttp
-                    from PIL import Image
-                    import io
-                    
-                    async with aiohttp.ClientSession() as session:
-                        # Télécharger l'image
-                        async with session.get(image_url) as img_response:
-                            if img_response.status != 200:
-                                raise Exception(f"Impossible de télécharger l'image: {img_response.status} - {image_url}")
-                            
-                            original_image_bytes = await img_response.read()
-                            original_content_type = img_response.headers.get('Content-Type', 'image/webp')
-                            
-                            print(f"✅ Image téléchargée: {len(original_image_bytes)} bytes, {original_content_type}")
-                            
-                            # CONVERSION EN JPG AUTOMATIQUE pour Facebook
-                            try:
-                                # Ouvrir l'image avec Pillow
-                                image = Image.open(io.BytesIO(original_image_bytes))
-                                
-                                # Convertir en RGB si nécessaire (pour JPG)
-                                if image.mode in ('RGBA', 'LA', 'P'):
-                                    # Créer un fond blanc pour les images avec transparence
-                                    background = Image.new('RGB', image.size, (255, 255, 255))
-                                    if image.mode == 'P':
-                                        image = image.convert('RGBA')
-                                    background.paste(image, mask=image.split()[-1] if image.mode == 'RGBA' else None)
-                                    image = background
-                                elif image.mode != 'RGB':
-                                    image = image.convert('RGB')
-                                
-                                # Convertir en JPG (format supporté par Facebook)
-                                jpg_buffer = io.BytesIO()
-                                image.save(jpg_buffer, format='JPEG', quality=85, optimize=True)
-                                jpg_bytes = jpg_buffer.getvalue()
-                                
-                                print(f"✅ Conversion JPG réussie: {len(original_image_bytes)} bytes → {len(jpg_bytes)} bytes JPG")
-                                
-                            except Exception as conversion_error:
-                                print(f"❌ Erreur conversion JPG: {conversion_error}")
-                                # Fallback : utiliser l'image originale
-                                jpg_bytes = original_image_bytes
-                                print(f"⚠️ Utilisation image originale sans conversion")
-                            
-                            # Upload binaire JPG à Facebook (solution ChatGPT)
-                            fb_url = f"https://graph.facebook.com/v20.0/{page_id}/photos"
-                            
-                            form_data = aiohttp.FormData()
-                            form_data.add_field('source', jpg_bytes, filename='post_image.jpg', content_type='image/jpeg')
-                            form_data.add_field('caption', content)
-                            form_data.add_field('access_token', access_token)
-                            form_data.add_field('published', 'true')  # Critique selon analyse
-                            
-                            print(f"🔄 Envoi à Facebook: {len(jpg_bytes)} bytes JPG, caption: {content[:50]}...")
-                            
-                            async with session.post(fb_url, data=form_data, timeout=30) as fb_response:
-                                fb_response_text = await fb_response.text()
-                                
-                                if fb_response.status == 200:
-                                    try:
-                                        result = await fb_response.json()
-                                        facebook_post_id = result.get('id')
-                                        
-                                        if facebook_post_id:
-                                            print(f"🎉 Facebook JPG publication successful: {facebook_post_id}")
-                                            result = {
-                                                "id": facebook_post_id, 
-                                                "platform": "facebook",
-                                                "method": "binary_jpg_upload",
-                                                "image_size": len(jpg_bytes)
-                                            }
-                                        else:
-                                            print(f"❌ Pas d'ID post dans la réponse Facebook: {result}")
-                                            raise Exception(f"Pas d'ID post dans la réponse Facebook: {result}")
-                                    except Exception as parse_error:
-                                        print(f"❌ Erreur parsing réponse Facebook: {parse_error}")
-                                        print(f"   Réponse brute: {fb_response_text}")
-                                        raise Exception(f"Erreur parsing réponse Facebook: {fb_response_text}")
-                                else:
-                                    print(f"❌ Facebook API error: {fb_response.status}")
-                                    print(f"   Réponse: {fb_response_text}")
-                                    try:
-                                        error_response = await fb_response.json()
-                                        error_msg = error_response.get('error', {}).get('message', 'Upload failed')
-                                        raise Exception(f"Facebook JPG upload failed: {fb_response.status} - {error_msg}")
-                                    except:
-                                        raise Exception(f"Facebook JPG upload failed: {fb_response.status} - {fb_response_text}")
-                else:
-                    # Publication texte seul (sans image)
-                    import aiohttp
-                    async with aiohttp.ClientSession() as session:
-                        fb_url = f"https://graph.facebook.com/v20.0/{page_id}/feed"
-                        form_data = aiohttp.FormData()
-                        form_data.add_field('message', content)
-                        form_data.add_field('access_token', access_token)
-                        
-                        async with session.post(fb_url, data=form_data) as fb_response:
-                            if fb_response.status == 200:
-                                result = await fb_response.json()
-                                result = {"id": result.get('id'), "platform": "facebook", "method": "text_only"}
-                                print(f"✅ Facebook text post successful: {result['id']}")
-                            else:
-                                error_response = await fb_response.json()
-                                raise Exception(f"Facebook text post failed: {fb_response.status} - {error_response}")
-                
-                print(f"✅ Successfully published to Facebook: {result}")
-                
-                # Marquer le post comme publié
-                update_result = db.generated_posts.update_one(
-                    {"id": post_id, "owner_id": user_id},
-                    {
-                        "$set": {
-                            "status": "published",
-                            "published": True,
-                            "published_at": datetime.utcnow().isoformat(),
-                            "platform_post_id": result.get("id"),
-                            "publication_platform": "facebook",
-                            "publication_page": target_connection.get("page_name", "")
-                        }
-                    }
-                )
-                
-                if update_result.matched_count == 0:
-                    print("⚠️ Warning: Could not update post status in database")
-                
-                return {
-                    "success": True,
-                    "message": f"Post publié avec succès sur {target_connection.get('page_name', 'Facebook')} !",
-                    "platform": "facebook",
-                    "page_name": str(target_connection.get("page_name", "")),
-                    "post_id": str(result.get("id", "")),
-                    "published_at": datetime.utcnow().isoformat()
-                }
-                
-            except Exception as fb_error:
-                print(f"❌ Facebook publishing error: {str(fb_error)}")
-                raise HTTPException(status_code=500, detail=f"Erreur de publication Facebook: {str(fb_error)}")
-        
-        # Publier sur Instagram (VRAIE publication)
-        elif target_platform == "instagram" and SOCIAL_MEDIA_AVAILABLE:
-            try:
-                access_token = target_connection.get("access_token", "")
-                page_id = target_connection.get("page_id")
-                
-                print(f"📷 Publishing to Instagram: {content[:100]}...")
-                print(f"   Page ID: {page_id}")
-                print(f"   Token: {access_token[:20]}..." if access_token else "No token")
-                
-                # Validation du token avant publication  
-                if not access_token or access_token.startswith("temp_"):
-                    raise Exception("Token Instagram invalide ou temporaire détecté")
-                
-                # Publication Instagram via Facebook Graph API
-                import aiohttp
-                async with aiohttp.ClientSession() as session:
-                    # Étape 1: Créer le media container
-                    create_url = f"https://graph.facebook.com/v21.0/{page_id}/media"
-                    create_data = {
-                        "caption": content,
-                        "access_token": access_token
-                    }
-                    
-                    # Ajouter image si disponible
-                    if image_url:
-                        create_data["image_url"] = image_url
-                    
-                    async with session.post(create_url, data=create_data) as create_response:
-                        if create_response.status == 200:
-                            create_result = await create_response.json()
-                            media_id = create_result.get("id")
-                            
-                            if not media_id:
-                                raise Exception("Media ID non reçu d'Instagram")
-                            
-                            print(f"✅ Media container créé: {media_id}")
-                            
-                            # Étape 2: Publier le media
-                            publish_url = f"https://graph.facebook.com/v21.0/{page_id}/media_publish"
-                            publish_data = {
-                                "creation_id": media_id,
-                                "access_token": access_token
-                            }
-                            
-                            async with session.post(publish_url, data=publish_data) as publish_response:
-                                if publish_response.status == 200:
-                                    publish_result = await publish_response.json()
-                                    instagram_post_id = publish_result.get("id")
-                                    
-                                    print(f"✅ Successfully published to Instagram: {instagram_post_id}")
-                                    
-                                    result = {
-                                        "id": instagram_post_id,
-                                        "media_id": media_id,
-                                        "status": "published"
-                                    }
-                                else:
-                                    error_text = await publish_response.text()
-                                    raise Exception(f"Erreur publication Instagram: {publish_response.status} - {error_text}")
-                        else:
-                            error_text = await create_response.text()
-                            raise Exception(f"Erreur création media Instagram: {create_response.status} - {error_text}")
-                
-                # Marquer le post comme publié
-                update_result = db.generated_posts.update_one(
-                    {"id": post_id, "owner_id": user_id},
-                    {
-                        "$set": {
-                            "status": "published", 
-                            "published": True,
-                            "published_at": datetime.utcnow().isoformat(),
-                            "platform_post_id": result.get("id"),
-                            "publication_platform": "instagram",
-                            "publication_page": target_connection.get("username", "")
-                        }
-                    }
-                )
-                
-                if update_result.matched_count == 0:
-                    print("⚠️ Warning: Could not update post status in database")
-                
-                return {
-                    "success": True,
-                    "message": f"Post publié avec succès sur Instagram (@{target_connection.get('username', 'instagram')}) !",
-                    "platform": "instagram",
-                    "page_name": target_connection.get("username", ""),
-                    "post_id": result.get("id"),
-                    "published_at": datetime.utcnow().isoformat()
-                }
-                
-            except Exception as ig_error:
-                print(f"❌ Instagram publishing error: {str(ig_error)}")
-                raise HTTPException(status_code=500, detail=f"Erreur de publication Instagram: {str(ig_error)}")
-        
-        else:
-            raise HTTPException(status_code=400, detail=f"Publication sur {target_platform} non supportée pour le moment")
-            
-    except HTTPException:
-        raise
+        return await publish_post(post_id, user_id)
+    except PublishError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
     except Exception as e:
         print(f"❌ Error publishing post: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Erreur lors de la publication: {str(e)}")
 
-@api_router.post("/posts/schedule")
-async def schedule_post_for_later(
-    request: dict,
-    user_id: str = Depends(get_current_user_id_robust)
-):
-    """Programmer un post pour publication automatique à la date/heure prévue"""
+def _schedule_post_for_later(request: dict, user_id: str):
     try:
         post_id = request.get("post_id")
         scheduled_date = request.get("scheduled_date")  # Format: "2024-09-30"
@@ -5011,9 +4566,19 @@ async def schedule_post_for_later(
             "status": "scheduled",
             "scheduled_at": scheduled_datetime.isoformat(),
             "scheduled_for_publication": True,
-            "programming_date": datetime.utcnow().isoformat()
+            "programming_date": datetime.utcnow().isoformat(),
+            # File de publication (publication_dispatcher.py)
+            **publication_queue_fields(scheduled_datetime)
         }
         
+        # Mettre à jour le post original (jamais un post en cours de publication ou déjà publié)
+        result = db.generated_posts.update_one(
+            {"id": post_id, "owner_id": user_id, "publication_state": {"$nin": PUBLICATION_LOCKED_STATES}},
+            {"$set": update_data}
+        )
+        if result.matched_count == 0:
+            raise HTTPException(status_code=409, detail="Post déjà publié ou en cours de publication")
+        
         # Ajouter au calendrier (collection calendar_posts)
         calendar_post = {
             **post,  # Copier toutes les données du post original
@@ -5036,12 +4601,6 @@ async def schedule_post_for_later(
         except Exception as calendar_error:
             print(f"⚠️ Erreur ajout calendrier: {calendar_error}")
         
-        # Mettre à jour le post original
-        db.generated_posts.update_one(
-            {"id": post_id, "owner_id": user_id},
-            {"$set": update_data}
-        )
-        
         print(f"✅ Post {post_id} programmé avec succès pour {scheduled_datetime}")
         
         return {
@@ -5058,12 +4617,15 @@ async def schedule_post_for_later(
         print(f"❌ Error scheduling post: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Erreur lors de la programmation: {str(e)}")
 
-@api_router.put("/posts/{post_id}/unschedule")
-async def unschedule_post(
-    post_id: str,
+@api_router.post("/posts/schedule")
+async def schedule_post_for_later(
+    request: dict,
     user_id: str = Depends(get_current_user_id_robust)
 ):
-    """Déprogrammer un post - le retirer du calendrier et le remettre en brouillon"""
+    """Programmer un post pour publication automatique à la date/heure prévue"""
+    return await asyncio.to_thread(_schedule_post_for_later, request, user_id)
+
+def _unschedule_post(post_id: str, user_id: str):
     try:
         print(f"🗑️ Unscheduling post {post_id} for user {user_id}")
         
@@ -5085,13 +4647,14 @@ async def unschedule_post(
             "status": "draft", 
             "scheduled_at": None,
             "scheduled_for_publication": False,
-            "unscheduled_at": datetime.utcnow().isoformat()
+            "unscheduled_at": datetime.utcnow().isoformat(),
+            "publication_state": None
         }
         
-        # Mettre à jour dans generated_posts
+        # Mettre à jour dans generated_posts (et retirer de la file de publication)
         db.generated_posts.update_one(
             {"id": post_id, "owner_id": user_id},
-            {"$set": update_data}
+            {"$set": update_data, "$unset": PUBLICATION_QUEUE_FIELDS}
         )
         
         # Supprimer du calendrier
@@ -5111,12 +4674,15 @@ async def unschedule_post(
         print(f"❌ Error unscheduling post: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Erreur lors de la déprogrammation: {str(e)}")
 
-@api_router.post("/posts/{post_id}/publish-now")
-async def publish_post_immediately(
+@api_router.put("/posts/{post_id}/unschedule")
+async def unschedule_post(
     post_id: str,
     user_id: str = Depends(get_current_user_id_robust)
 ):
-    """Publier un post immédiatement (bypasser la programmation)"""
+    """Déprogrammer un post - le retirer du calendrier et le remettre en brouillon"""
+    return await asyncio.to_thread(_unschedule_post, post_id, user_id)
+
+def _publish_post_immediately(post_id: str, user_id: str):
     try:
         print(f"⚡ Publishing post {post_id} immediately for user {user_id}")
         
@@ -5151,14 +4717,17 @@ async def publish_post_immediately(
             "status": "published",
             "published_at": published_at,
             "publication_method": "immediate",  # Marquer comme publication immédiate
-            "validated": True
+            "validated": True,
+            "publication_state": "published"
         }
         
-        # Mettre à jour dans generated_posts  
-        db.generated_posts.update_one(
-            {"id": post_id, "owner_id": user_id},
-            {"$set": update_data}
+        # Mettre à jour dans generated_posts (le dispatcher ne le republiera pas)
+        result = db.generated_posts.update_one(
+            {"id": post_id, "owner_id": user_id, "publication_state": {"$ne": "publishing"}},
+            {"$set": update_data, "$unset": PUBLICATION_QUEUE_FIELDS}
         )
+        if result.matched_count == 0:
+            raise HTTPException(status_code=409, detail="Publication déjà en cours pour ce post")
         
         # Ajouter au calendrier avec statut publié
         calendar_post = {
@@ -5192,12 +4761,15 @@ async def publish_post_immediately(
         print(f"❌ Error publishing post immediately: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Erreur lors de la publication immédiate: {str(e)}")
 
-@api_router.post("/debug/convert-post-platform")
-async def convert_post_platform(
-    request: dict,
+@api_router.post("/posts/{post_id}/publish-now")
+async def publish_post_immediately(
+    post_id: str,
     user_id: str = Depends(get_current_user_id_robust)
 ):
-    """Convertir la plateforme d'un post (Instagram → Facebook) pour les tests"""
+    """Publier un post immédiatement (bypasser la programmation)"""
+    return await asyncio.to_thread(_publish_post_immediately, post_id, user_id)
+
+def _convert_post_platform(request: dict, user_id: str):
     try:
         post_id = request.get("post_id")
         new_platform = request.get("platform", "facebook")
@@ -5239,15 +4811,22 @@ async def convert_post_platform(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erreur: {str(e)}")
 
+@api_router.post("/debug/convert-post-platform")
+async def convert_post_platform(
+    request: dict,
+    user_id: str = Depends(get_current_user_id_robust)
+):
+    """Convertir la plateforme d'un post (Instagram → Facebook) pour les tests"""
+    return await asyncio.to_thread(_convert_post_platform, request, user_id)
+
 @api_router.post("/test/instagram-post")
 async def test_instagram_post(user_id: str = Depends(get_current_user_id_robust)):
     """Test de publication Instagram directe pour debugging"""
     try:
-        dbm = get_database()
-        db = dbm.db
+        db = get_async_database().db
         
         # Récupérer connexion Instagram
-        conn = db.social_media_connections.find_one({
+        conn = await db.social_media_connections.find_one({
             "user_id": user_id,
             "platform": "instagram",
             "active": True
@@ -5318,11 +4897,10 @@ async def test_instagram_post(user_id: str = Depends(get_current_user_id_robust)
 async def test_facebook_post(user_id: str = Depends(get_current_user_id_robust)):
     """Test de publication Facebook directe pour debugging"""
     try:
-        dbm = get_database()
-        db = dbm.db
+        db = get_async_database().db
         
         # Récupérer connexion Facebook
-        conn = db.social_media_connections.find_one({
+        conn = await db.social_media_connections.find_one({
             "user_id": user_id,
             "platform": "facebook",
             "active": True
@@ -5369,9 +4947,7 @@ async def test_facebook_post(user_id: str = Depends(get_current_user_id_robust))
         print(f"❌ Erreur test publication Facebook: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Erreur test: {str(e)}")
 
-@api_router.post("/debug/clean-library-badges")
-async def clean_library_badges(user_id: str = Depends(get_current_user_id_robust)):
-    """Nettoyer les badges orphelins dans la bibliothèque"""
+def _clean_library_badges(user_id: str):
     try:
         dbm = get_database()
         db = dbm.db
@@ -5444,9 +5020,12 @@ async def clean_library_badges(user_id: str = Depends(get_current_user_id_robust
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erreur nettoyage badges: {str(e)}")
 
-@api_router.post("/debug/clean-fake-tokens")
-async def clean_fake_facebook_tokens(user_id: str = Depends(get_current_user_id_robust)):
-    """Supprimer TOUS les faux tokens Facebook temporaires"""
+@api_router.post("/debug/clean-library-badges")
+async def clean_library_badges(user_id: str = Depends(get_current_user_id_robust)):
+    """Nettoyer les badges orphelins dans la bibliothèque"""
+    return await asyncio.to_thread(_clean_library_badges, user_id)
+
+def _clean_fake_facebook_tokens(user_id: str):
     try:
         dbm = get_database()
         db = dbm.db
@@ -5476,9 +5055,12 @@ async def clean_fake_facebook_tokens(user_id: str = Depends(get_current_user_id_
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erreur nettoyage: {str(e)}")
 
-@api_router.post("/debug/force-real-facebook-oauth")
-async def force_real_facebook_oauth(user_id: str = Depends(get_current_user_id_robust)):
-    """Forcer une vraie reconnexion Facebook OAuth"""
+@api_router.post("/debug/clean-fake-tokens")
+async def clean_fake_facebook_tokens(user_id: str = Depends(get_current_user_id_robust)):
+    """Supprimer TOUS les faux tokens Facebook temporaires"""
+    return await asyncio.to_thread(_clean_fake_facebook_tokens, user_id)
+
+def _force_real_facebook_oauth(user_id: str):
     try:
         dbm = get_database()
         db = dbm.db
@@ -5501,9 +5083,12 @@ async def force_real_facebook_oauth(user_id: str = Depends(get_current_user_id_r
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erreur: {str(e)}")
 
-@api_router.post("/debug/clean-invalid-tokens")
-async def clean_invalid_social_tokens(user_id: str = Depends(get_current_user_id_robust)):
-    """Supprimer les connexions avec tokens invalides"""
+@api_router.post("/debug/force-real-facebook-oauth")
+async def force_real_facebook_oauth(user_id: str = Depends(get_current_user_id_robust)):
+    """Forcer une vraie reconnexion Facebook OAuth"""
+    return await asyncio.to_thread(_force_real_facebook_oauth, user_id)
+
+def _clean_invalid_social_tokens(user_id: str):
     try:
         dbm = get_database()
         db = dbm.db
@@ -5539,9 +5124,12 @@ async def clean_invalid_social_tokens(user_id: str = Depends(get_current_user_id
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erreur nettoyage: {str(e)}")
 
-@api_router.get("/debug/social-connections")
-async def debug_social_connections(user_id: str = Depends(get_current_user_id_robust)):
-    """Debug endpoint pour vérifier les connexions sociales"""
+@api_router.post("/debug/clean-invalid-tokens")
+async def clean_invalid_social_tokens(user_id: str = Depends(get_current_user_id_robust)):
+    """Supprimer les connexions avec tokens invalides"""
+    return await asyncio.to_thread(_clean_invalid_social_tokens, user_id)
+
+def _debug_social_connections_check(user_id: str):
     try:
         dbm = get_database()
         db = dbm.db
@@ -5580,6 +5168,35 @@ async def debug_social_connections(user_id: str = Depends(get_current_user_id_ro
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erreur debug: {str(e)}")
 
+@api_router.get("/debug/social-connections")
+async def debug_social_connections(user_id: str = Depends(get_current_user_id_robust)):
+    """Debug endpoint pour vérifier les connexions sociales"""
+    return await asyncio.to_thread(_debug_social_connections_check, user_id)
+
+@app.on_event("startup")
+async def start_background_workers():
+    """Thumbnail / post generation job workers and the scheduled publication dispatcher
+    (disable with THUMB_WORKERS_IN_API / GENERATION_WORKERS_IN_API /
+    PUBLICATION_DISPATCHER_IN_API=false to run them standalone)"""
+    if THUMB_WORKERS_IN_API:
+        start_thumbnail_workers()
+    if GENERATION_WORKERS_IN_API:
+        start_generation_workers()
+    if PUBLICATION_DISPATCHER_IN_API:
+        start_publication_dispatcher()
+
+@app.on_event("shutdown")
+async def close_database_pools():
+    """Stop job workers, release the shared Motor/LLM connection pools and image worker processes"""
+    await stop_thumbnail_workers()
+    await stop_generation_workers()
+    await stop_publication_dispatcher()
+    close_async_database()
+    shutdown_pipeline()
+    await llm_backup.close()
+    await web_fetcher.close()
+    await close_http_clients()
+
 # Include the API router (auth endpoints need to stay without prefix)
 app.include_router(api_router)
 
@@ -5606,7 +5223,7 @@ async def analyze_website_bypass(
         print(f"🔥 CONTOURNEMENT GPT-4o pour: {website_url}")
         
         # Extraction du contenu
-        content_data = extract_website_content_with_limits(website_url)
+        content_data = await extract_website_content_with_limits(website_url)
         
         if "error" in content_data:
             print(f"⚠️ Erreur extraction, utilisation de données minimales")
@@ -5673,7 +5290,7 @@ async def website_analysis_gpt4o_direct(
         print(f"🔥 ANALYSE GPT-4o DIRECTE dans server.py pour: {url}")
         
         # Extraction du contenu
-        content_data = extract_website_content_with_limits(url)
+        content_data = await extract_website_content_with_limits(url)
         
         if "error" in content_data:
             # Données minimales si extraction échoue
@@ -5939,4 +5556,4 @@ if PAYMENTS_V2_AVAILABLE:
 # Include social media router
 if SOCIAL_MEDIA_AVAILABLE:
     app.include_router(social_router, prefix="/api")
-    print("✅ Social media router included")
\ No newline at end of file
+    print("✅ Social media router included")
@@ -9,18 +9,19 @@ import secrets
 import urllib.parse
 from datetime import datetime, timedelta
 import json
-from motor.motor_asyncio import AsyncIOMotorClient
+import asyncio
+from pymongo import UpdateOne
+from async_database import get_async_db
 import uuid
 
 from auth import get_current_active_user, User
+from http_clients import SharedClientMixin, GRAPH
 
 # Initialize router
 social_router = APIRouter(prefix="/social", tags=["social-media"])
 
 # MongoDB connection (reuse from main app)
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+db = get_async_db()  # Shared Motor pool (async_database.py)
 
 # Facebook App credentials from environment
 FACEBOOK_CLIENT_ID = os.environ.get('FACEBOOK_APP_ID', '')
@@ -32,6 +33,12 @@ FACEBOOK_AUTH_URL = "https://www.facebook.com/v19.0/dialog/oauth"
 FACEBOOK_TOKEN_URL = "https://graph.facebook.com/v19.0/oauth/access_token"
 FACEBOOK_API_BASE = "https://graph.facebook.com/v19.0"
 
+# Instagram media containers
+INSTAGRAM_CAROUSEL_MAX_ITEMS = 10
+INSTAGRAM_CONTAINER_TIMEOUT = float(os.environ.get("INSTAGRAM_CONTAINER_TIMEOUT", "60"))
+INSTAGRAM_STATUS_POLL_INITIAL = float(os.environ.get("INSTAGRAM_STATUS_POLL_INITIAL", "0.5"))
+INSTAGRAM_STATUS_POLL_MAX = float(os.environ.get("INSTAGRAM_STATUS_POLL_MAX", "8"))
+
 # Pydantic Models
 class FacebookAuthRequest(BaseModel):
     business_id: str
@@ -60,10 +67,12 @@ class InstagramAccountInfo(BaseModel):
 # OAuth State Management
 oauth_states = {}  # In production, use Redis or database
 
-class FacebookOAuthManager:
+class FacebookOAuthManager(SharedClientMixin):
     """Manages Facebook OAuth flow"""
+    upstream = GRAPH
     
-    def __init__(self):
+    def __init__(self, http_client: Optional[httpx.AsyncClient] = None):
+        self._http_client = http_client
         self.client_id = FACEBOOK_CLIENT_ID
         self.client_secret = FACEBOOK_CLIENT_SECRET
         self.redirect_uri = FACEBOOK_REDIRECT_URI
@@ -115,31 +124,31 @@ class FacebookOAuthManager:
             "code": code
         }
         
-        async with httpx.AsyncClient() as client:
-            response = await client.get(FACEBOOK_TOKEN_URL, params=token_params)
-            
-            if response.status_code != 200:
-                raise HTTPException(
-                    status_code=400, 
-                    detail=f"Token exchange failed: {response.text}"
-                )
-            
-            token_data = response.json()
-            
-            # Get long-lived token
-            long_lived_token = await self.get_long_lived_token(token_data["access_token"])
-            
-            # Clean up state
-            user_id = state_data["user_id"]
-            business_id = state_data["business_id"]
-            del oauth_states[state]
-            
-            return {
-                "access_token": long_lived_token["access_token"],
-                "expires_in": long_lived_token.get("expires_in", 5184000),  # 60 days default
-                "user_id": user_id,
-                "business_id": business_id
-            }
+        client = self.http
+        response = await client.get(FACEBOOK_TOKEN_URL, params=token_params)
+        
+        if response.status_code != 200:
+            raise HTTPException(
+                status_code=400, 
+                detail=f"Token exchange failed: {response.text}"
+            )
+        
+        token_data = response.json()
+        
+        # Get long-lived token
+        long_lived_token = await self.get_long_lived_token(token_data["access_token"])
+        
+        # Clean up state
+        user_id = state_data["user_id"]
+        business_id = state_data["business_id"]
+        del oauth_states[state]
+        
+        return {
+            "access_token": long_lived_token["access_token"],
+            "expires_in": long_lived_token.get("expires_in", 5184000),  # 60 days default
+            "user_id": user_id,
+            "business_id": business_id
+        }
     
     async def get_long_lived_token(self, short_token: str) -> Dict[str, Any]:
         """Convert short-lived token to long-lived token"""
@@ -150,19 +159,21 @@ class FacebookOAuthManager:
             "fb_exchange_token": short_token
         }
         
-        async with httpx.AsyncClient() as client:
-            response = await client.get(FACEBOOK_TOKEN_URL, params=params)
-            
-            if response.status_code == 200:
-                return response.json()
-            else:
-                # If long-lived token fails, return short token
-                return {"access_token": short_token, "expires_in": 3600}
+        client = self.http
+        response = await client.get(FACEBOOK_TOKEN_URL, params=params)
+        
+        if response.status_code == 200:
+            return response.json()
+        else:
+            # If long-lived token fails, return short token
+            return {"access_token": short_token, "expires_in": 3600}
 
-class FacebookAPIClient:
+class FacebookAPIClient(SharedClientMixin):
     """Handles Facebook API interactions"""
+    upstream = GRAPH
     
-    def __init__(self, access_token: str):
+    def __init__(self, access_token: str, http_client: Optional[httpx.AsyncClient] = None):
+        self._http_client = http_client
         self.access_token = access_token
         self.base_url = FACEBOOK_API_BASE
     
@@ -174,16 +185,16 @@ class FacebookAPIClient:
             "access_token": self.access_token
         }
         
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url, params=params)
-            
-            if response.status_code == 200:
-                return response.json()
-            else:
-                raise HTTPException(
-                    status_code=400, 
-                    detail=f"Failed to get user info: {response.text}"
-                )
+        client = self.http
+        response = await client.get(url, params=params)
+        
+        if response.status_code == 200:
+            return response.json()
+        else:
+            raise HTTPException(
+                status_code=400, 
+                detail=f"Failed to get user info: {response.text}"
+            )
     
     async def get_user_pages(self) -> List[FacebookPageInfo]:
         """Get user's Facebook pages"""
@@ -193,29 +204,29 @@ class FacebookAPIClient:
             "access_token": self.access_token
         }
         
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url, params=params)
+        client = self.http
+        response = await client.get(url, params=params)
+        
+        if response.status_code == 200:
+            data = response.json()
+            pages = []
             
-            if response.status_code == 200:
-                data = response.json()
-                pages = []
-                
-                for page_data in data.get("data", []):
-                    page_info = FacebookPageInfo(
-                        id=page_data["id"],
-                        name=page_data["name"],
-                        access_token=page_data["access_token"],
-                        category=page_data.get("category", ""),
-                        instagram_business_account=page_data.get("instagram_business_account")
-                    )
-                    pages.append(page_info)
-                
-                return pages
-            else:
-                raise HTTPException(
-                    status_code=400, 
-                    detail=f"Failed to get pages: {response.text}"
+            for page_data in data.get("data", []):
+                page_info = FacebookPageInfo(
+                    id=page_data["id"],
+                    name=page_data["name"],
+                    access_token=page_data["access_token"],
+                    category=page_data.get("category", ""),
+                    instagram_business_account=page_data.get("instagram_business_account")
                 )
+                pages.append(page_info)
+            
+            return pages
+        else:
+            raise HTTPException(
+                status_code=400, 
+                detail=f"Failed to get pages: {response.text}"
+            )
     
     async def post_to_page(self, page_id: str, page_token: str, content: str, image_url: Optional[str] = None) -> Dict[str, Any]:
         """Post content to a Facebook page"""
@@ -229,23 +240,35 @@ class FacebookAPIClient:
         if image_url:
             post_data["link"] = image_url
         
-        async with httpx.AsyncClient() as client:
-            response = await client.post(url, data=post_data)
-            
-            if response.status_code == 200:
-                return response.json()
-            else:
-                raise HTTPException(
-                    status_code=400, 
-                    detail=f"Failed to post to Facebook: {response.text}"
-                )
+        client = self.http
+        response = await client.post(url, data=post_data)
+        
+        if response.status_code == 200:
+            return response.json()
+        else:
+            raise HTTPException(
+                status_code=400, 
+                detail=f"Failed to post to Facebook: {response.text}"
+            )
 
-class InstagramAPIClient:
-    """Handles Instagram Business API interactions"""
+class InstagramContainerError(Exception):
+    """A media container ended in ERROR / EXPIRED or was not ready in time"""
+
+
+class InstagramAPIClient(SharedClientMixin):
+    """Handles Instagram Business API interactions
+
+    Media containers are published once their status_code is FINISHED, polled
+    with exponential backoff. Carousel children are created concurrently and
+    polled together (one multi-id Graph request per round).
+    """
+    upstream = GRAPH
     
-    def __init__(self, access_token: str):
+    def __init__(self, access_token: str, http_client: Optional[httpx.AsyncClient] = None,
+                 base_url: str = FACEBOOK_API_BASE):
+        self._http_client = http_client
         self.access_token = access_token
-        self.base_url = FACEBOOK_API_BASE
+        self.base_url = base_url
     
     async def get_instagram_account_info(self, instagram_user_id: str) -> InstagramAccountInfo:
         """Get Instagram account information"""
@@ -255,43 +278,49 @@ class InstagramAPIClient:
             "access_token": self.access_token
         }
         
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url, params=params)
-            
-            if response.status_code == 200:
-                data = response.json()
-                return InstagramAccountInfo(
-                    id=data["id"],
-                    username=data["username"],
-                    account_type=data.get("account_type", "BUSINESS")
-                )
-            else:
-                raise HTTPException(
-                    status_code=400, 
-                    detail=f"Failed to get Instagram info: {response.text}"
-                )
+        client = self.http
+        response = await client.get(url, params=params)
+        
+        if response.status_code == 200:
+            data = response.json()
+            return InstagramAccountInfo(
+                id=data["id"],
+                username=data["username"],
+                account_type=data.get("account_type", "BUSINESS")
+            )
+        else:
+            raise HTTPException(
+                status_code=400, 
+                detail=f"Failed to get Instagram info: {response.text}"
+            )
     
-    async def create_media_container(self, instagram_user_id: str, image_url: str, caption: str) -> str:
-        """Create Instagram media container"""
+    async def create_media_container(self, instagram_user_id: str, image_url: Optional[str], caption: Optional[str],
+                                     is_carousel_item: bool = False, children: Optional[List[str]] = None) -> str:
+        """Create Instagram media container (single image, carousel item or carousel parent)"""
         url = f"{self.base_url}/{instagram_user_id}/media"
         
-        data = {
-            "image_url": image_url,
-            "caption": caption,
-            "access_token": self.access_token
-        }
+        data = {"access_token": self.access_token}
+        if children:
+            data["media_type"] = "CAROUSEL"
+            data["children"] = ",".join(children)
+        else:
+            data["image_url"] = image_url
+        if is_carousel_item:
+            data["is_carousel_item"] = "true"
+        elif caption is not None:
+            data["caption"] = caption
         
-        async with httpx.AsyncClient() as client:
-            response = await client.post(url, data=data)
-            
-            if response.status_code == 200:
-                result = response.json()
-                return result["id"]
-            else:
-                raise HTTPException(
-                    status_code=400, 
-                    detail=f"Failed to create Instagram media container: {response.text}"
-                )
+        client = self.http
+        response = await client.post(url, data=data)
+        
+        if response.status_code == 200:
+            result = response.json()
+            return result["id"]
+        else:
+            raise HTTPException(
+                status_code=400, 
+                detail=f"Failed to create Instagram media container: {response.text}"
+            )
     
     async def publish_media(self, instagram_user_id: str, creation_id: str) -> Dict[str, Any]:
         """Publish Instagram media"""
@@ -302,27 +331,89 @@ class InstagramAPIClient:
             "access_token": self.access_token
         }
         
-        async with httpx.AsyncClient() as client:
-            response = await client.post(url, data=data)
-            
-            if response.status_code == 200:
-                return response.json()
-            else:
-                raise HTTPException(
-                    status_code=400, 
-                    detail=f"Failed to publish Instagram media: {response.text}"
+        client = self.http
+        response = await client.post(url, data=data)
+        
+        if response.status_code == 200:
+            return response.json()
+        else:
+            raise HTTPException(
+                status_code=400, 
+                detail=f"Failed to publish Instagram media: {response.text}"
+            )
+    
+    async def get_container_statuses(self, container_ids: List[str]) -> Dict[str, str]:
+        """status_code of several containers in one request ({id: status_code})"""
+        response = await self.http.get(f"{self.base_url}/", params={
+            "ids": ",".join(container_ids),
+            "fields": "status_code",
+            "access_token": self.access_token
+        })
+        if response.status_code != 200:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Failed to get Instagram container status: {response.text}"
+            )
+        return {container_id: data.get("status_code", "") for container_id, data in response.json().items()}
+    
+    async def wait_until_finished(self, container_ids: List[str]):
+        """Poll containers with exponential backoff until every one is FINISHED"""
+        pending = list(container_ids)
+        delay = INSTAGRAM_STATUS_POLL_INITIAL
+        deadline = asyncio.get_running_loop().time() + INSTAGRAM_CONTAINER_TIMEOUT
+        while True:
+            statuses = await self.get_container_statuses(pending)
+            failed = {cid: status for cid, status in statuses.items() if status in ("ERROR", "EXPIRED")}
+            if failed:
+                raise InstagramContainerError(f"Instagram containers failed: {failed}")
+            pending = [cid for cid in pending if statuses.get(cid) != "FINISHED"]
+            if not pending:
+                return
+            if asyncio.get_running_loop().time() + delay > deadline:
+                raise InstagramContainerError(
+                    f"Instagram containers not ready after {INSTAGRAM_CONTAINER_TIMEOUT:.0f}s: {pending}"
                 )
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, INSTAGRAM_STATUS_POLL_MAX)
     
     async def post_to_instagram(self, instagram_user_id: str, image_url: str, caption: str) -> Dict[str, Any]:
         """Complete Instagram posting workflow"""
         # Step 1: Create media container
         container_id = await self.create_media_container(instagram_user_id, image_url, caption)
         
-        # Step 2: Publish media
+        # Step 2: Wait for Instagram to process the image, then publish
+        await self.wait_until_finished([container_id])
+        result = await self.publish_media(instagram_user_id, container_id)
+        
+        return {
+            "container_id": container_id,
+            "media_id": result["id"],
+            "success": True
+        }
+    
+    async def post_carousel_to_instagram(self, instagram_user_id: str, image_urls: List[str], caption: str) -> Dict[str, Any]:
+        """Carousel workflow: children created concurrently, parent published once they are FINISHED"""
+        if not 2 <= len(image_urls) <= INSTAGRAM_CAROUSEL_MAX_ITEMS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"An Instagram carousel needs 2 to {INSTAGRAM_CAROUSEL_MAX_ITEMS} images ({len(image_urls)} given)"
+            )
+        
+        # Step 1: One child container per image, all at once
+        children = list(await asyncio.gather(*(
+            self.create_media_container(instagram_user_id, image_url, None, is_carousel_item=True)
+            for image_url in image_urls
+        )))
+        await self.wait_until_finished(children)
+        
+        # Step 2: Parent container, then publish
+        container_id = await self.create_media_container(instagram_user_id, None, caption, children=children)
+        await self.wait_until_finished([container_id])
         result = await self.publish_media(instagram_user_id, container_id)
         
         return {
             "container_id": container_id,
+            "children": children,
             "media_id": result["id"],
             "success": True
         }
@@ -615,81 +706,155 @@ async def disconnect_social_account(
     return {"message": "Social media account disconnected successfully"}
 
 # Social Media Analytics Functions
-class SocialMediaAnalytics:
-    """Functions to retrieve post metrics from social media platforms"""
+# Post metrics collection
+METRICS_FRESHNESS_MINUTES = int(os.environ.get("METRICS_FRESHNESS_MINUTES", "60"))
+METRICS_MAX_POSTS = int(os.environ.get("METRICS_MAX_POSTS", "500"))
+GRAPH_BATCH_SIZE = 50  # Maximum sub-requests of a Graph batch call
+GRAPH_BATCH_CONCURRENCY = int(os.environ.get("GRAPH_BATCH_CONCURRENCY", "4"))
+INSTAGRAM_METRICS_CONCURRENCY = int(os.environ.get("INSTAGRAM_METRICS_CONCURRENCY", "8"))
+
+FACEBOOK_POST_INSIGHTS = 'post_engaged_users,post_clicks,post_impressions,post_reach,post_reactions_by_type_total'
+FACEBOOK_POST_FIELDS = 'comments.summary(true),shares'
+INSTAGRAM_MEDIA_INSIGHTS = 'impressions,reach,likes,comments,shares,saved,profile_visits,follows'
+
+
+def parse_facebook_metrics(insights: List[Dict[str, Any]], post_data: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Standardized metrics of a Facebook post (insights + comments/shares fields)"""
+    metrics = {}
+    for insight in insights:
+        metric_name = insight.get('name')
+        values = insight.get('values', [])
+        
+        if values:
+            if metric_name == 'post_engaged_users':
+                metrics['engaged_users'] = values[0].get('value', 0)
+            elif metric_name == 'post_clicks':
+                metrics['clicks'] = values[0].get('value', 0)
+            elif metric_name == 'post_impressions':
+                metrics['impressions'] = values[0].get('value', 0)
+            elif metric_name == 'post_reach':
+                metrics['reach'] = values[0].get('value', 0)
+            elif metric_name == 'post_reactions_by_type_total':
+                reactions = values[0].get('value', {})
+                metrics['likes'] = reactions.get('like', 0)
+                metrics['love'] = reactions.get('love', 0)
+                metrics['wow'] = reactions.get('wow', 0)
+                metrics['haha'] = reactions.get('haha', 0)
+                metrics['sad'] = reactions.get('sad', 0)
+                metrics['angry'] = reactions.get('angry', 0)
+                metrics['total_reactions'] = sum(reactions.values())
+    
+    # Additional metrics (comments, shares) from the post fields
+    if post_data:
+        metrics['comments'] = post_data.get('comments', {}).get('summary', {}).get('total_count', 0)
+        metrics['shares'] = post_data.get('shares', {}).get('count', 0)
     
-    def __init__(self):
-        # Don't initialize API clients here - they need access tokens
-        pass
+    # Calculate engagement rate
+    total_engagement = (metrics.get('total_reactions', 0) + 
+                      metrics.get('comments', 0) + 
+                      metrics.get('shares', 0))
+    reach = metrics.get('reach', 1)
+    metrics['engagement_rate'] = round((total_engagement / max(reach, 1)) * 100, 2)
+    return metrics
+
+
+def parse_instagram_metrics(insights: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Standardized metrics of an Instagram media"""
+    metrics = {}
+    for insight in insights:
+        values = insight.get('values', [])
+        if values:
+            metrics[insight.get('name')] = values[0].get('value', 0)
+    
+    # Calculate engagement rate
+    total_engagement = (metrics.get('likes', 0) + 
+                      metrics.get('comments', 0) + 
+                      metrics.get('shares', 0) + 
+                      metrics.get('saved', 0))
+    reach = metrics.get('reach', 1)
+    metrics['engagement_rate'] = round((total_engagement / max(reach, 1)) * 100, 2)
+    return metrics
+
+
+class SocialMediaAnalytics(SharedClientMixin):
+    """Functions to retrieve post metrics from social media platforms
+
+    Facebook metrics go through Graph batch requests (insights + fields of up
+    to 25 posts per call, GRAPH_BATCH_CONCURRENCY calls in flight); Instagram
+    insights are fetched in parallel under INSTAGRAM_METRICS_CONCURRENCY.
+    Collected metrics are stored on the generated post and reused for
+    METRICS_FRESHNESS_MINUTES.
+    """
+    upstream = GRAPH
+    
+    def __init__(self, http_client: Optional[httpx.AsyncClient] = None):
+        # Shared Graph client; access tokens are passed per call
+        self._http_client = http_client
+        self._batch_slots = asyncio.Semaphore(GRAPH_BATCH_CONCURRENCY)
+        self._instagram_slots = asyncio.Semaphore(INSTAGRAM_METRICS_CONCURRENCY)
+    
+    async def graph_batch(self, requests: List[Dict[str, str]], access_token: str) -> List[Optional[Dict[str, Any]]]:
+        """Run up to GRAPH_BATCH_SIZE GET sub-requests in one Graph call.
+
+        Returns the decoded body of each sub-request, None for failed ones.
+        """
+        async with self._batch_slots:
+            try:
+                response = await self.http.post(f"{FACEBOOK_API_BASE}/", data={
+                    'access_token': access_token,
+                    'batch': json.dumps(requests),
+                    'include_headers': 'false'
+                })
+            except httpx.HTTPError as e:
+                logging.error(f"Facebook batch request failed: {e}")
+                return [None] * len(requests)
+        
+        if response.status_code != 200:
+            logging.error(f"Facebook batch API error: {response.status_code} - {response.text}")
+            return [None] * len(requests)
+        
+        results = []
+        for item in response.json():
+            if not item or item.get('code') != 200:
+                if item:
+                    logging.error(f"Facebook batch sub-request error: {item.get('code')} - {item.get('body')}")
+                results.append(None)
+                continue
+            try:
+                results.append(json.loads(item.get('body') or '{}'))
+            except ValueError:
+                results.append(None)
+        return results
+    
+    async def get_facebook_metrics_batch(self, post_ids: List[str], access_token: str) -> Dict[str, Dict[str, Any]]:
+        """Metrics of many Facebook posts: {post_id: metrics} (posts without insights are left out)"""
+        posts_per_call = GRAPH_BATCH_SIZE // 2  # insights + fields per post
+        chunks = [post_ids[i:i + posts_per_call] for i in range(0, len(post_ids), posts_per_call)]
+        
+        async def collect(chunk: List[str]) -> Dict[str, Dict[str, Any]]:
+            requests = []
+            for post_id in chunk:
+                requests.append({'method': 'GET', 'relative_url': f"{post_id}/insights?metric={FACEBOOK_POST_INSIGHTS}"})
+                requests.append({'method': 'GET', 'relative_url': f"{post_id}?fields={FACEBOOK_POST_FIELDS}"})
+            results = await self.graph_batch(requests, access_token)
+            chunk_metrics = {}
+            for index, post_id in enumerate(chunk):
+                insights, post_data = results[2 * index], results[2 * index + 1]
+                if insights is None:
+                    continue
+                chunk_metrics[post_id] = parse_facebook_metrics(insights.get('data', []), post_data)
+            return chunk_metrics
+        
+        metrics = {}
+        for chunk_metrics in await asyncio.gather(*(collect(chunk) for chunk in chunks)):
+            metrics.update(chunk_metrics)
+        return metrics
     
     async def get_facebook_post_metrics(self, post_id: str, access_token: str) -> Dict[str, Any]:
-        """Retrieve metrics for a Facebook post"""
+        """Retrieve metrics for a Facebook post (one batch call for insights and fields)"""
         try:
-            # Facebook Graph API endpoint for post insights
-            url = f"https://graph.facebook.com/v19.0/{post_id}/insights"
-            params = {
-                'access_token': access_token,
-                'metric': 'post_engaged_users,post_clicks,post_impressions,post_reach,post_reactions_by_type_total'
-            }
-            
-            async with httpx.AsyncClient() as client:
-                response = await client.get(url, params=params)
-                
-            if response.status_code == 200:
-                data = response.json()
-                insights = data.get('data', [])
-                
-                # Parse metrics into standardized format
-                metrics = {}
-                for insight in insights:
-                    metric_name = insight.get('name')
-                    values = insight.get('values', [])
-                    
-                    if values:
-                        if metric_name == 'post_engaged_users':
-                            metrics['engaged_users'] = values[0].get('value', 0)
-                        elif metric_name == 'post_clicks':
-                            metrics['clicks'] = values[0].get('value', 0)
-                        elif metric_name == 'post_impressions':
-                            metrics['impressions'] = values[0].get('value', 0)
-                        elif metric_name == 'post_reach':
-                            metrics['reach'] = values[0].get('value', 0)
-                        elif metric_name == 'post_reactions_by_type_total':
-                            reactions = values[0].get('value', {})
-                            metrics['likes'] = reactions.get('like', 0)
-                            metrics['love'] = reactions.get('love', 0)
-                            metrics['wow'] = reactions.get('wow', 0)
-                            metrics['haha'] = reactions.get('haha', 0)
-                            metrics['sad'] = reactions.get('sad', 0)
-                            metrics['angry'] = reactions.get('angry', 0)
-                            metrics['total_reactions'] = sum(reactions.values())
-                
-                # Get additional metrics (comments, shares) from post endpoint
-                post_url = f"https://graph.facebook.com/v19.0/{post_id}"
-                post_params = {
-                    'access_token': access_token,
-                    'fields': 'comments.summary(true),shares'
-                }
-                
-                post_response = await client.get(post_url, params=post_params)
-                if post_response.status_code == 200:
-                    post_data = post_response.json()
-                    metrics['comments'] = post_data.get('comments', {}).get('summary', {}).get('total_count', 0)
-                    metrics['shares'] = post_data.get('shares', {}).get('count', 0)
-                
-                # Calculate engagement rate
-                total_engagement = (metrics.get('total_reactions', 0) + 
-                                  metrics.get('comments', 0) + 
-                                  metrics.get('shares', 0))
-                reach = metrics.get('reach', 1)
-                metrics['engagement_rate'] = round((total_engagement / max(reach, 1)) * 100, 2)
-                
-                return metrics
-                
-            else:
-                logging.error(f"Facebook API error: {response.status_code} - {response.text}")
-                return {}
-                
+            metrics = await self.get_facebook_metrics_batch([post_id], access_token)
+            return metrics.get(post_id, {})
         except Exception as e:
             logging.error(f"Error retrieving Facebook post metrics: {e}")
             return {}
@@ -701,36 +866,14 @@ class SocialMediaAnalytics:
             url = f"https://graph.facebook.com/v19.0/{post_id}/insights"
             params = {
                 'access_token': access_token,
-                'metric': 'impressions,reach,likes,comments,shares,saved,profile_visits,follows'
+                'metric': INSTAGRAM_MEDIA_INSIGHTS
             }
             
-            async with httpx.AsyncClient() as client:
-                response = await client.get(url, params=params)
-                
+            async with self._instagram_slots:
+                response = await self.http.get(url, params=params)
+            
             if response.status_code == 200:
-                data = response.json()
-                insights = data.get('data', [])
-                
-                # Parse metrics into standardized format
-                metrics = {}
-                for insight in insights:
-                    metric_name = insight.get('name')
-                    values = insight.get('values', [])
-                    
-                    if values:
-                        value = values[0].get('value', 0)
-                        metrics[metric_name] = value
-                
-                # Calculate engagement rate
-                total_engagement = (metrics.get('likes', 0) + 
-                                  metrics.get('comments', 0) + 
-                                  metrics.get('shares', 0) + 
-                                  metrics.get('saved', 0))
-                reach = metrics.get('reach', 1)
-                metrics['engagement_rate'] = round((total_engagement / max(reach, 1)) * 100, 2)
-                
-                return metrics
-                
+                return parse_instagram_metrics(response.json().get('data', []))
             else:
                 logging.error(f"Instagram API error: {response.status_code} - {response.text}")
                 return {}
@@ -739,19 +882,29 @@ class SocialMediaAnalytics:
             logging.error(f"Error retrieving Instagram post metrics: {e}")
             return {}
     
+    async def get_instagram_metrics_many(self, post_ids: List[str], access_token: str) -> Dict[str, Dict[str, Any]]:
+        """Metrics of many Instagram media, fetched in parallel (INSTAGRAM_METRICS_CONCURRENCY)"""
+        results = await asyncio.gather(*(self.get_instagram_post_metrics(post_id, access_token) for post_id in post_ids))
+        return {post_id: metrics for post_id, metrics in zip(post_ids, results) if metrics}
+    
     async def get_post_metrics_for_business(self, business_id: str, days_back: int = 7) -> List[Dict[str, Any]]:
-        """Retrieve metrics for all posts from a business in the specified period"""
+        """Retrieve metrics for all posts from a business in the specified period
+
+        Only posts whose metrics are older than METRICS_FRESHNESS_MINUTES are
+        fetched again; the others are served from the stored metrics.
+        """
         try:
             # Calculate date range
             end_date = datetime.utcnow()
             start_date = end_date - timedelta(days=days_back)
+            fresh_after = end_date - timedelta(minutes=METRICS_FRESHNESS_MINUTES)
             
             # Get published posts from the period
             published_posts = await db.generated_posts.find({
                 "business_id": business_id,
                 "status": "posted",
                 "published_at": {"$gte": start_date, "$lte": end_date}
-            }).to_list(100)
+            }, {"id": 1, "platform": 1, "platform_post_id": 1, "metrics": 1, "metrics_collected_at": 1}).to_list(METRICS_MAX_POSTS)
             
             # Get social media connections for this business
             connections = await db.social_media_connections.find({
@@ -762,30 +915,50 @@ class SocialMediaAnalytics:
             # Create connection lookup
             connection_map = {conn["platform"]: conn for conn in connections}
             
-            metrics_list = []
-            
+            # Posts to refresh, grouped by platform
+            to_refresh: Dict[str, List[str]] = {"facebook": [], "instagram": []}
             for post in published_posts:
                 platform = post.get("platform", "facebook")
-                platform_post_id = post.get("platform_post_id")
-                
-                if not platform_post_id:
+                if not post.get("platform_post_id") or platform not in to_refresh:
                     continue
-                    
-                connection = connection_map.get(platform)
-                if not connection:
+                if not connection_map.get(platform, {}).get("access_token"):
                     continue
-                
-                access_token = connection.get("access_token")
-                if not access_token:
+                collected_at = post.get("metrics_collected_at")
+                if post.get("metrics") and collected_at and collected_at >= fresh_after:
                     continue
+                to_refresh[platform].append(post["platform_post_id"])
+            
+            # Facebook batches and Instagram fan-out run in parallel
+            collected: Dict[str, Dict[str, Dict[str, Any]]] = {"facebook": {}, "instagram": {}}
+            fetches = []
+            if to_refresh["facebook"]:
+                fetches.append(("facebook", self.get_facebook_metrics_batch(
+                    to_refresh["facebook"], connection_map["facebook"]["access_token"])))
+            if to_refresh["instagram"]:
+                fetches.append(("instagram", self.get_instagram_metrics_many(
+                    to_refresh["instagram"], connection_map["instagram"]["access_token"])))
+            for (platform, _), result in zip(fetches, await asyncio.gather(*(fetch for _, fetch in fetches))):
+                collected[platform] = result
+            
+            now = datetime.utcnow()
+            metrics_list = []
+            updates = []
+            
+            for post in published_posts:
+                platform = post.get("platform", "facebook")
+                platform_post_id = post.get("platform_post_id")
                 
-                # Retrieve metrics based on platform
-                if platform == "facebook":
-                    metrics = await self.get_facebook_post_metrics(platform_post_id, access_token)
-                elif platform == "instagram":
-                    metrics = await self.get_instagram_post_metrics(platform_post_id, access_token)
+                if platform_post_id in collected.get(platform, {}):
+                    metrics = collected[platform][platform_post_id]
+                    collected_at = now
+                    updates.append(UpdateOne(
+                        {"_id": post["_id"]},
+                        {"$set": {"metrics": metrics, "metrics_collected_at": now}}
+                    ))
                 else:
-                    continue
+                    # Métriques encore fraîches (ou plateforme indisponible) : valeur stockée
+                    metrics = post.get("metrics")
+                    collected_at = post.get("metrics_collected_at")
                 
                 if metrics:
                     post_metrics = {
@@ -793,11 +966,15 @@ class SocialMediaAnalytics:
                         "platform": platform,
                         "platform_post_id": platform_post_id,
                         "metrics": metrics,
-                        "collected_at": datetime.utcnow(),
+                        "collected_at": collected_at,
                         "analysis_period": f"{days_back}_days"
                     }
                     metrics_list.append(post_metrics)
             
+            if updates:
+                await db.generated_posts.bulk_write(updates, ordered=False)
+            
+            logging.info(f"Post metrics: {len(updates)} refreshed, {len(metrics_list) - len(updates)} fresh")
             return metrics_list
             
         except Exception as e:
@@ -0,0 +1,204 @@
+# thumbnail_jobs.py
+"""Durable thumbnail job queue stored in MongoDB (`thumbnail_jobs` collection).
+
+Jobs only hold identifiers (owner + media id); workers load the original from
+GridFS/disk when they run, so nothing large is kept in memory while queued and
+nothing is lost on a restart or deploy.
+
+Lifecycle: pending -> running (atomic claim with a lease) -> done | failed,
+driven by job_queue.LeaseJobQueue. A crashed worker's job is re-claimed once
+its lease expires and errors are retried with exponential backoff, both up to
+THUMB_JOB_MAX_ATTEMPTS (a job that keeps killing its worker is then failed
+instead of being re-claimed forever).
+
+Workers run inside the API process (THUMB_WORKERS_IN_API=true, default) and can
+also run standalone: `python thumbnail_jobs.py`.
+"""
+import asyncio
+import os
+from datetime import datetime
+from typing import Optional, Dict, Any, List
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from async_database import get_async_database
+from job_queue import LeaseJobQueue
+
+JOBS_COLLECTION = "thumbnail_jobs"
+THUMB_JOB_CONCURRENCY = int(os.environ.get("THUMB_JOB_CONCURRENCY", "2"))
+THUMB_JOB_LEASE_SECONDS = int(os.environ.get("THUMB_JOB_LEASE_SECONDS", "300"))
+THUMB_JOB_MAX_ATTEMPTS = int(os.environ.get("THUMB_JOB_MAX_ATTEMPTS", "5"))
+THUMB_JOB_POLL_SECONDS = float(os.environ.get("THUMB_JOB_POLL_SECONDS", "2"))
+THUMB_JOB_RETENTION_DAYS = int(os.environ.get("THUMB_JOB_RETENTION_DAYS", "7"))
+THUMB_WORKERS_IN_API = os.environ.get("THUMB_WORKERS_IN_API", "true").lower() == "true"
+
+_indexes_ready = False
+
+
+def _jobs():
+    return get_async_database().db[JOBS_COLLECTION]
+
+
+async def ensure_indexes():
+    global _indexes_ready
+    if _indexes_ready:
+        return
+    col = _jobs()
+    try:
+        # Claim query: oldest runnable job first
+        await col.create_index([("status", 1), ("run_after", 1)])
+        await col.create_index([("owner_id", 1), ("status", 1)])
+        # At most one queued/running job per media (`active` is unset when the job ends)
+        await col.create_index(
+            [("media_id", 1)], unique=True, name="media_id_active_unique",
+            partialFilterExpression={"active": True}
+        )
+        # Finished jobs are pruned automatically
+        await col.create_index("finished_at", expireAfterSeconds=THUMB_JOB_RETENTION_DAYS * 86400)
+    except Exception as e:
+        print(f"⚠️ Thumbnail jobs index creation warning: {e}")
+    _indexes_ready = True
+
+
+def _new_job(owner_id: str, media_id, reason: str, now: datetime) -> Dict[str, Any]:
+    return {
+        "media_id": media_id,
+        "owner_id": owner_id,
+        "reason": reason,
+        "status": "pending",
+        "active": True,
+        "attempts": 0,
+        "run_after": now,
+        "created_at": now,
+        "updated_at": now
+    }
+
+
+async def enqueue_thumbnail(owner_id: str, media_id, reason: str = "upload") -> bool:
+    """Queue thumbnail generation for a media item (no-op if one is already queued/running).
+
+    `media_id` is the thumbnail key: UUID string `id` or legacy ObjectId `_id`.
+    Returns True when a new job was created.
+    """
+    return await enqueue_many(owner_id, [media_id], reason=reason) > 0
+
+
+async def enqueue_many(owner_id: str, media_ids: List[Any], reason: str = "rebuild") -> int:
+    """Queue jobs for many media items in one bulk write; returns the number of new jobs"""
+    if not media_ids:
+        return 0
+    await ensure_indexes()
+    now = datetime.utcnow()
+    ops = [
+        UpdateOne({"media_id": media_id, "active": True},
+                  {"$setOnInsert": _new_job(owner_id, media_id, reason, now)},
+                  upsert=True)
+        for media_id in media_ids
+    ]
+    try:
+        result = await _jobs().bulk_write(ops, ordered=False)
+        return result.upserted_count
+    except BulkWriteError as e:
+        # Duplicate keys come from concurrent enqueues: the job already exists
+        return e.details.get("nUpserted", 0)
+
+
+queue = LeaseJobQueue(
+    JOBS_COLLECTION, "Thumbnail job", lease_seconds=THUMB_JOB_LEASE_SECONDS,
+    max_attempts=THUMB_JOB_MAX_ATTEMPTS, poll_seconds=THUMB_JOB_POLL_SECONDS,
+    error_field="last_error", setup=ensure_indexes
+)
+
+
+async def complete_job(job: Dict[str, Any]):
+    await queue.finish(job, "done")
+
+
+async def fail_job(job: Dict[str, Any], error: str, retry: bool = True):
+    """Reschedule with exponential backoff, or mark failed after the last attempt"""
+    attempts = job.get("attempts", 1)
+    if retry and attempts < THUMB_JOB_MAX_ATTEMPTS:
+        await queue.reschedule(job, 30 * (2 ** (attempts - 1)), {"last_error": error})
+    else:
+        await queue.finish(job, "failed", {"last_error": error})
+
+
+async def job_stats(owner_id: str) -> Dict[str, int]:
+    """Job counts per status for one user (progress reporting)"""
+    stats = {"pending": 0, "running": 0, "done": 0, "failed": 0}
+    pipeline = [
+        {"$match": {"owner_id": owner_id}},
+        {"$group": {"_id": "$status", "count": {"$sum": 1}}}
+    ]
+    async for row in _jobs().aggregate(pipeline):
+        stats[row["_id"]] = row["count"]
+    return stats
+
+
+# ----------------------------
+# Worker
+# ----------------------------
+
+async def _load_media(media_id) -> Optional[Dict[str, Any]]:
+    media_filter = {"id": media_id} if isinstance(media_id, str) else {"_id": media_id}
+    return await get_async_database().media.collection.find_one(media_filter)
+
+
+async def process_job(job: Dict[str, Any]):
+    """Generate and store the thumbnail for one job (source fetched by id)"""
+    # Local imports to avoid circular import (routes_thumbs imports this module)
+    from routes_thumbs import _fetch_original_bytes, is_image, is_video
+    from image_pipeline import run_image_job, make_thumb_set, PipelineBusy
+    from thumbs import generate_video_thumb_from_bytes
+
+    media_id = job["media_id"]
+    media_doc = await _load_media(media_id)
+    if not media_doc or media_doc.get("deleted"):
+        await fail_job(job, "media not found or deleted", retry=False)
+        return
+
+    file_type = media_doc.get("file_type")
+    if not (is_image(file_type) or is_video(file_type)):
+        await fail_job(job, f"unsupported media type {file_type}", retry=False)
+        return
+
+    try:
+        original_bytes = await asyncio.to_thread(_fetch_original_bytes, media_doc)
+        if not original_bytes:
+            await fail_job(job, "original media missing")
+            return
+        if is_image(file_type):
+            result = await run_image_job(make_thumb_set, original_bytes)
+            content, content_type, variants = result["thumb"], result["thumb_content_type"], result["variants"]
+        else:
+            content = await asyncio.to_thread(generate_video_thumb_from_bytes, original_bytes)
+            content_type, variants = "image/webp", None
+        del original_bytes
+        await get_async_database().thumbnails.save(media_doc.get("owner_id"), media_id, content, content_type, variants=variants)
+        await complete_job(job)
+        print(f"✅ Thumbnail job done for {media_id} ({job.get('reason')})")
+    except PipelineBusy as e:
+        await fail_job(job, str(e))
+    except Exception as e:
+        print(f"⚠️ Thumbnail job failed for {media_id}: {e}")
+        await fail_job(job, str(e))
+
+
+def start_workers(concurrency: int = THUMB_JOB_CONCURRENCY):
+    """Start `concurrency` worker coroutines on the running loop (API startup)"""
+    queue.start_workers(process_job, concurrency)
+
+
+async def stop_workers():
+    await queue.stop_workers()
+
+
+async def main():
+    await queue.run(process_job, THUMB_JOB_CONCURRENCY)
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    load_dotenv()
+    asyncio.run(main())
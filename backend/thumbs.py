@@ -1,194 +1,35 @@
 # thumbs.py
-import io, os, subprocess, tempfile
-from PIL import Image
+import os, subprocess, tempfile
+from image_pipeline import THUMB_FORMAT, make_thumb_bytes, resize_image_bytes
 
 THUMB_DIR = os.environ.get("THUMB_DIR", "uploads/thumbs")
-THUMB_SIZE = int(os.environ.get("THUMB_SIZE", "200"))  # 200x200 for better performance
-THUMB_FORMAT = os.environ.get("THUMB_FORMAT", "WEBP")  # WEBP|JPEG|PNG
-QUALITY = int(os.environ.get("THUMB_QUALITY", "85"))
 
 os.makedirs(THUMB_DIR, exist_ok=True)
 
-def _square_crop(im: Image.Image) -> Image.Image:
-    """Crop image to square format (center crop)"""
-    w, h = im.size
-    side = min(w, h)
-    left = (w - side) // 2
-    top = (h - side) // 2
-    return im.crop((left, top, left + side, top + side))
+# Image work lives in image_pipeline.py (one EXIF/resize/encode implementation);
+# these wrappers keep the file-path API used by scripts and legacy routes.
 
 def generate_image_thumb(src_path: str, thumb_path: str) -> None:
     """Generate thumbnail from image file (filesystem output)"""
-    with Image.open(src_path) as im:
-        # Fix EXIF orientation before processing (Pillow 11.x compatible)
-        try:
-            import PIL.ExifTags
-            exif = im._getexif()
-            if exif is not None:
-                # Use the orientation value directly (Pillow 11.x compatibility)
-                orientation_key = None
-                for tag, value in PIL.ExifTags.TAGS.items():
-                    if value == 'Orientation':
-                        orientation_key = tag
-                        break
-                
-                if orientation_key and orientation_key in exif:
-                    orientation = exif[orientation_key]
-                    if orientation == 3:
-                        im = im.rotate(180, expand=True)
-                    elif orientation == 6:
-                        im = im.rotate(270, expand=True)
-                    elif orientation == 8:
-                        im = im.rotate(90, expand=True)
-        except (AttributeError, KeyError, TypeError, ImportError):
-            pass  # No EXIF data or orientation
-        
-        im = im.convert("RGB")
-        im = _square_crop(im)
-        im.thumbnail((THUMB_SIZE, THUMB_SIZE), Image.LANCZOS)
-        ext = THUMB_FORMAT.lower()
-        if ext == "webp":
-            im.save(thumb_path, format="WEBP", quality=QUALITY, method=6)
-        elif ext == "jpeg" or ext == "jpg":
-            im.save(thumb_path, format="JPEG", quality=QUALITY, optimize=True, progressive=True)
-        else:
-            im.save(thumb_path, format="PNG", optimize=True)
+    with open(thumb_path, "wb") as fh:
+        fh.write(generate_image_thumb_bytes(src_path))
 
 def resize_image_to_1024(src_path: str, dst_path: str) -> tuple:
     """Resize image to 1024px on smallest side, respecting EXIF orientation"""
-    with Image.open(src_path) as im:
-        # Fix EXIF orientation first (Pillow 11.x compatible)
-        try:
-            import PIL.ExifTags
-            exif = im._getexif()
-            if exif is not None:
-                # Use the orientation value directly (Pillow 11.x compatibility)
-                orientation_key = None
-                for tag, value in PIL.ExifTags.TAGS.items():
-                    if value == 'Orientation':
-                        orientation_key = tag
-                        break
-                
-                if orientation_key and orientation_key in exif:
-                    orientation = exif[orientation_key]
-                    if orientation == 3:
-                        im = im.rotate(180, expand=True)
-                    elif orientation == 6:
-                        im = im.rotate(270, expand=True)
-                    elif orientation == 8:
-                        im = im.rotate(90, expand=True)
-        except (AttributeError, KeyError, TypeError, ImportError):
-            pass
-        
-        # Convert to RGB for consistency
-        im = im.convert("RGB")
-        
-        # Get original dimensions
-        original_width, original_height = im.size
-        
-        # Calculate new dimensions (1024px on SMALLEST side as requested)
-        min_dimension = 1024
-        
-        if original_width <= original_height:
-            # Width is smaller - resize to 1024 width
-            if original_width > min_dimension:
-                new_width = min_dimension
-                new_height = int((original_height * new_width) / original_width)
-            else:
-                new_width = original_width
-                new_height = original_height
-        else:
-            # Height is smaller - resize to 1024 height
-            if original_height > min_dimension:
-                new_height = min_dimension
-                new_width = int((original_width * new_height) / original_height)
-            else:
-                new_width = original_width
-                new_height = original_height
-        
-        # Resize only if needed
-        if new_width != original_width or new_height != original_height:
-            im = im.resize((new_width, new_height), Image.LANCZOS)
-        
-        # Save as JPEG with good quality, 72 DPI, and optimal compression
-        im.save(dst_path, format="JPEG", quality=85, optimize=True, progressive=True, dpi=(72, 72))
-        
-        return new_width, new_height
+    with open(src_path, "rb") as fh:
+        result = resize_image_bytes(fh.read())
+    with open(dst_path, "wb") as fh:
+        fh.write(result["data"])
+    return result["width"], result["height"]
 
 def generate_image_thumb_bytes(src_path: str) -> bytes:
     """Generate thumbnail from image file and return bytes (for DB storage)"""
-    with Image.open(src_path) as im:
-        # Fix EXIF orientation before processing
-        try:
-            from PIL.ExifTags import ORIENTATION
-            exif = im._getexif()
-            if exif is not None:
-                for tag, value in exif.items():
-                    if tag == ORIENTATION:
-                        if value == 3:
-                            im = im.rotate(180, expand=True)
-                        elif value == 6:
-                            im = im.rotate(270, expand=True)
-                        elif value == 8:
-                            im = im.rotate(90, expand=True)
-                        break
-        except (AttributeError, KeyError, TypeError):
-            pass  # No EXIF data or orientation
-        
-        im = im.convert("RGB")
-        im = _square_crop(im)
-        im.thumbnail((THUMB_SIZE, THUMB_SIZE), Image.LANCZOS)
-        buf = io.BytesIO()
-        ext = THUMB_FORMAT.lower()
-        if ext == "webp":
-            im.save(buf, format="WEBP", quality=QUALITY, method=6)
-            content_type = "image/webp"
-        elif ext in ("jpeg", "jpg"):
-            im.save(buf, format="JPEG", quality=QUALITY, optimize=True, progressive=True)
-            content_type = "image/jpeg"
-        else:
-            im.save(buf, format="PNG", optimize=True)
-            content_type = "image/png"
-        return buf.getvalue()
+    with open(src_path, "rb") as fh:
+        return make_thumb_bytes(fh.read())
 
 def generate_image_thumb_from_bytes(data: bytes) -> bytes:
     """Generate thumbnail from in-memory image bytes and return bytes"""
-    with Image.open(io.BytesIO(data)) as im:
-        # Fix EXIF orientation before processing (Pillow 11.x compatible)
-        try:
-            import PIL.ExifTags
-            exif = im._getexif()
-            if exif is not None:
-                # Use the orientation value directly (Pillow 11.x compatibility)
-                orientation_key = None
-                for tag, value in PIL.ExifTags.TAGS.items():
-                    if value == 'Orientation':
-                        orientation_key = tag
-                        break
-                
-                if orientation_key and orientation_key in exif:
-                    orientation = exif[orientation_key]
-                    if orientation == 3:
-                        im = im.rotate(180, expand=True)
-                    elif orientation == 6:
-                        im = im.rotate(270, expand=True)
-                    elif orientation == 8:
-                        im = im.rotate(90, expand=True)
-        except (AttributeError, KeyError, TypeError, ImportError):
-            pass  # No EXIF data or orientation
-        
-        im = im.convert("RGB")
-        im = _square_crop(im)
-        im.thumbnail((THUMB_SIZE, THUMB_SIZE), Image.LANCZOS)
-        buf = io.BytesIO()
-        ext = THUMB_FORMAT.lower()
-        if ext == "webp":
-            im.save(buf, format="WEBP", quality=QUALITY, method=6)
-        elif ext in ("jpeg", "jpg"):
-            im.save(buf, format="JPEG", quality=QUALITY, optimize=True, progressive=True)
-        else:
-            im.save(buf, format="PNG", optimize=True)
-        return buf.getvalue()
+    return make_thumb_bytes(data)
 
 def generate_video_thumb(src_path: str, thumb_path: str, time_pos="00:00:01") -> None:
     """Generate thumbnail from video file using ffmpeg (filesystem output)"""
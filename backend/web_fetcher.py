@@ -0,0 +1,130 @@
+# web_fetcher.py
+"""Async page fetcher of the website analyzer.
+
+One pooled httpx.AsyncClient per process (keep-alive, WEB_FETCH_MAX_CONNECTIONS),
+at most WEB_FETCH_PER_HOST concurrent requests per host, and bodies streamed
+with a WEB_FETCH_MAX_BYTES cap so a huge page cannot exhaust memory. Parsing is
+left to the caller (BeautifulSoup runs in a worker thread, see
+website_analyzer_gpt5.parse_page_html).
+
+Errors are returned the way the analyzer reports them:
+{"error": (http_status, message)}.
+
+stream() yields a body chunk by chunk (sitemaps are parsed while they download).
+
+conditional_headers() builds the validators of a conditional re-crawl from a
+stored page fingerprint (see website_analyzer_gpt5.check_pages_changed).
+"""
+import asyncio
+import os
+from typing import Optional, Dict, Any, Tuple, AsyncIterator
+from urllib.parse import urlparse
+
+import httpx
+
+WEB_FETCH_TIMEOUT = float(os.environ.get("WEB_FETCH_TIMEOUT", "12"))
+WEB_FETCH_MAX_BYTES = int(os.environ.get("WEB_FETCH_MAX_BYTES", str(2_000_000)))
+WEB_FETCH_PER_HOST = int(os.environ.get("WEB_FETCH_PER_HOST", "4"))
+WEB_FETCH_MAX_CONNECTIONS = int(os.environ.get("WEB_FETCH_MAX_CONNECTIONS", "20"))
+
+USER_AGENT = "Mozilla/5.0 (compatible; ClaireMarcusBot/1.0; +https://claire-marcus.com)"
+
+_client: Optional[httpx.AsyncClient] = None
+_host_semaphores: Dict[str, asyncio.Semaphore] = {}
+
+
+def get_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            headers={"User-Agent": USER_AGENT},
+            follow_redirects=True,
+            timeout=httpx.Timeout(WEB_FETCH_TIMEOUT, connect=5.0),
+            limits=httpx.Limits(
+                max_connections=WEB_FETCH_MAX_CONNECTIONS,
+                max_keepalive_connections=WEB_FETCH_MAX_CONNECTIONS // 2
+            )
+        )
+    return _client
+
+
+async def close():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def _host_semaphore(url: str) -> asyncio.Semaphore:
+    host = urlparse(url).netloc.lower()
+    if host not in _host_semaphores:
+        _host_semaphores[host] = asyncio.Semaphore(WEB_FETCH_PER_HOST)
+    return _host_semaphores[host]
+
+
+def conditional_headers(fingerprint: Dict[str, Any]) -> Dict[str, str]:
+    headers = {}
+    if fingerprint.get("etag"):
+        headers["If-None-Match"] = fingerprint["etag"]
+    if fingerprint.get("last_modified"):
+        headers["If-Modified-Since"] = fingerprint["last_modified"]
+    return headers
+
+
+async def _read_capped(response: httpx.Response, max_bytes: int) -> Tuple[bytes, bool]:
+    chunks, size = [], 0
+    async for chunk in response.aiter_bytes(8192):
+        size += len(chunk)
+        if size > max_bytes:
+            return b"".join(chunks), True
+        chunks.append(chunk)
+    return b"".join(chunks), False
+
+
+async def fetch(url: str, max_bytes: int = WEB_FETCH_MAX_BYTES, html_only: bool = True,
+                headers: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    """GET a page: {"url", "status", "content_type", "headers", "body", "truncated"} or {"error": ...}
+
+    `headers` may carry If-None-Match / If-Modified-Since: a 304 is returned with an empty body.
+    """
+    try:
+        async with _host_semaphore(url):
+            async with get_client().stream("GET", url, headers=headers) as response:
+                content_type = response.headers.get("Content-Type", "").lower()
+                result = {
+                    "url": str(response.url),
+                    "status": response.status_code,
+                    "content_type": content_type,
+                    "headers": dict(response.headers),
+                    "body": b"",
+                    "truncated": False,
+                }
+                if response.status_code >= 400 or response.status_code == 304:
+                    return result
+                if html_only and "text/html" not in content_type:
+                    return {"error": (415, f"Contenu non supporté ({content_type or 'inconnu'}). Veuillez fournir une URL HTML.")}
+                result["body"], result["truncated"] = await _read_capped(response, max_bytes)
+                return result
+    except httpx.TimeoutException:
+        return {"error": (504, "Le site met trop de temps à répondre (timeout).")}
+    except httpx.ConnectError:
+        return {"error": (502, "Impossible de se connecter au site. Vérifiez l'URL.")}
+    except httpx.HTTPError as e:
+        return {"error": (502, f"Erreur d'accès au site: {str(e)}")}
+
+
+async def stream(url: str, max_bytes: int = WEB_FETCH_MAX_BYTES) -> AsyncIterator[bytes]:
+    """Yield the body of a 2xx response chunk by chunk, stopping after max_bytes.
+
+    Nothing is yielded for an error status; network errors propagate (httpx.HTTPError).
+    """
+    async with _host_semaphore(url):
+        async with get_client().stream("GET", url) as response:
+            if response.status_code >= 300:
+                return
+            size = 0
+            async for chunk in response.aiter_bytes(16384):
+                size += len(chunk)
+                if size > max_bytes:
+                    return
+                yield chunk
@@ -9,25 +9,26 @@ from typing import Optional, Dict, Any
 from datetime import datetime, timedelta
 from pydantic import BaseModel, Field, HttpUrl
 import uuid
-import requests
 from bs4 import BeautifulSoup
 import os
 import logging
 import json
+import hashlib
 import time
 import asyncio
-from motor.motor_asyncio import AsyncIOMotorClient
+from async_database import get_async_db
 from pathlib import Path
 from dotenv import load_dotenv
 from fastapi import Header
 from typing import Optional
 import re
 
-# Import du système LLM backup pour l'orchestration
-from llm_backup_system import LLMBackupSystem
-
-# Import database function for consistency
-from database import get_database
+# Import du système LLM backup pour l'orchestration (client async partagé)
+from llm_backup_system import llm_backup, OPENAI_AVAILABLE, CLAUDE_AVAILABLE
+from llm_cache import set_cache_owner, evict_owner as evict_llm_cache
+import web_fetcher
+import page_discovery
+from business_context import amark_stale as mark_context_stale
 
 # EXPLICIT .env loading to ensure JWT variables are available
 env_path = Path(__file__).parent / '.env'
@@ -42,16 +43,6 @@ if jwt_secret:
 else:
     print("❌ JWT_SECRET_KEY not found after loading .env")
 
-# Import OpenAI directly (no emergentintegrations)
-try:
-    from openai import OpenAI
-    OPENAI_AVAILABLE = True
-    print("✅ OpenAI module imported successfully")
-except ImportError as e:
-    print(f"❌ OpenAI not available: {e}")
-    OPENAI_AVAILABLE = False
-    OpenAI = None
-
 # Simple User model for compatibility
 class User:
     def __init__(self, user_id: str, email: str = ""):
@@ -85,32 +76,8 @@ else:
 if not API_KEY:
     logging.warning("No API key found for GPT analysis. Website analysis will use fallback mode.")
 
-# MongoDB connection with URL encoding fix
-mongo_url = os.environ.get('MONGO_URL')
-
-# Fix MongoDB URL encoding for special characters (same as in database.py)
-if mongo_url and ("mongodb+srv://" in mongo_url or "@" in mongo_url):
-    try:
-        from urllib.parse import urlparse, urlunparse, quote_plus
-        parsed = urlparse(mongo_url)
-        if parsed.username and parsed.password:
-            # Re-encode username and password
-            encoded_username = quote_plus(parsed.username)
-            encoded_password = quote_plus(parsed.password)
-            # Reconstruct URL with encoded credentials
-            netloc = f"{encoded_username}:{encoded_password}@{parsed.hostname}"
-            if parsed.port:
-                netloc += f":{parsed.port}"
-            mongo_url = urlunparse((
-                parsed.scheme, netloc, parsed.path, 
-                parsed.params, parsed.query, parsed.fragment
-            ))
-            print(f"✅ Website Analyzer MongoDB URL credentials encoded for RFC 3986 compliance")
-    except Exception as e:
-        print(f"⚠️ Website Analyzer MongoDB URL encoding warning: {e}")
-
-mongo_client = AsyncIOMotorClient(mongo_url)
-db = mongo_client[os.environ.get('DB_NAME', 'claire_marcus')]
+# MongoDB connection (shared Motor pool, URL encoding handled in database.py)
+db = get_async_db()
 
 # Router setup
 website_router = APIRouter(prefix="/website")
@@ -142,34 +109,8 @@ class WebsiteData(BaseModel):
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
 
-def extract_website_content_with_limits(url):
-    """Extract content with strict limits (timeout, size, content-type) for robustness"""
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (compatible; ClaireMarcusBot/1.0; +https://claire-marcus.com)'
-    }
-    try:
-        r = requests.get(url, headers=headers, timeout=12, allow_redirects=True, stream=True)
-    except requests.exceptions.Timeout:
-        return {"error": (504, "Le site met trop de temps à répondre (timeout).")}
-    except requests.exceptions.ConnectionError:
-        return {"error": (502, "Impossible de se connecter au site. Vérifiez l'URL.")}
-    except requests.exceptions.RequestException as e:
-        return {"error": (502, f"Erreur d'accès au site: {str(e)}")}
-
-    ct = r.headers.get("Content-Type", "").lower()
-    if "text/html" not in ct:
-        return {"error": (415, f"Contenu non supporté ({ct or 'inconnu'}). Veuillez fournir une URL HTML.")}
-
-    chunks, size = [], 0
-    for ch in r.iter_content(8192):
-        if not ch:
-            break
-        size += len(ch)
-        if size > 2_000_000:  # 2MB
-            break
-        chunks.append(ch)
-    html = b"".join(chunks)
-
+def parse_page_html(html: bytes) -> dict:
+    """Extract text, title, description and headings of a page (CPU-bound, run in a thread)"""
     try:
         soup = BeautifulSoup(html, "html.parser")
         for tag in soup(["script", "style", "noscript"]):
@@ -191,6 +132,83 @@ def extract_website_content_with_limits(url):
     except Exception as e:
         return {"error": (422, f"Impossible d'analyser le HTML de la page: {str(e)}")}
 
+def content_hash(extracted: dict) -> str:
+    """Hash of the normalised page text: markup, whitespace or case changes do not count"""
+    normalised = " ".join([
+        extracted.get("meta_title", ""),
+        extracted.get("meta_description", ""),
+        extracted.get("content_text", ""),
+    ]).lower()
+    normalised = re.sub(r"\s+", " ", normalised).strip()
+    return hashlib.sha256(normalised.encode("utf-8")).hexdigest()
+
+async def fetch_page(url: str, fetched: Optional[dict] = None) -> dict:
+    """Fetch a page once per analysis: `fetched` memoises responses by URL"""
+    if fetched is not None and url in fetched:
+        return fetched[url]
+    page = await web_fetcher.fetch(url)
+    if "error" not in page and page["status"] >= 400:
+        page = {"error": (502, f"Le site a répondu avec le statut {page['status']}.")}
+    if fetched is not None:
+        fetched[url] = page
+    return page
+
+async def extract_website_content_with_limits(url, fetched: Optional[dict] = None):
+    """Extract content with strict limits (timeout, size, content-type) for robustness"""
+    page = await fetch_page(url, fetched)
+    if "error" in page:
+        return page
+    extracted = await asyncio.to_thread(parse_page_html, page["body"])
+    if "error" not in extracted:
+        # Empreinte de la page pour le re-crawl conditionnel
+        extracted["etag"] = page["headers"].get("etag")
+        extracted["last_modified"] = page["headers"].get("last-modified")
+        extracted["content_hash"] = content_hash(extracted)
+    return extracted
+
+def page_fingerprints(content_data: dict) -> list:
+    """Validators and content hash of every analyzed page (stored on the analysis)"""
+    return [
+        {key: page.get(key) for key in ("url", "etag", "last_modified", "content_hash")}
+        for page in content_data.get("pages_analyzed", [])
+        if page.get("status") == "analyzed" and page.get("content_hash")
+    ]
+
+async def check_pages_changed(fingerprints: list, fetched: Optional[dict] = None) -> tuple:
+    """Conditional re-crawl of the stored pages.
+
+    Returns (changed, refreshed_fingerprints). A 304 or an identical content hash
+    means unchanged; any fetch/parse error counts as changed so that the full
+    analysis runs. Fresh 200 responses are kept in `fetched` for that analysis.
+    """
+    if not fingerprints:
+        return True, []
+
+    async def check(fingerprint: dict):
+        url = fingerprint["url"]
+        page = await web_fetcher.fetch(url, headers=web_fetcher.conditional_headers(fingerprint))
+        if "error" in page:
+            return True, fingerprint
+        if page["status"] == 304:
+            return False, fingerprint
+        if page["status"] >= 400:
+            return True, fingerprint
+        if fetched is not None:
+            fetched[url] = page
+        extracted = await asyncio.to_thread(parse_page_html, page["body"])
+        if "error" in extracted:
+            return True, fingerprint
+        refreshed = {
+            "url": url,
+            "etag": page["headers"].get("etag"),
+            "last_modified": page["headers"].get("last-modified"),
+            "content_hash": content_hash(extracted),
+        }
+        return refreshed["content_hash"] != fingerprint.get("content_hash"), refreshed
+
+    results = await asyncio.gather(*(check(fp) for fp in fingerprints if fp.get("url")))
+    return any(changed for changed, _ in results), [fp for _, fp in results]
+
 async def analyze_with_gpt4o_and_claude_backup(content_data: dict, website_url: str) -> dict:
     """Analyze website content using GPT-4o with Claude Sonnet 4 backup"""
     logging.info(f"🔥 analyze_with_gpt4o_and_claude_backup CALLED for {website_url}")
@@ -222,8 +240,7 @@ async def analyze_with_claude_storytelling(content_data: dict, website_url: str)
     """Analyse storytelling avec Claude Sonnet 4 - dimension narrative et inspiration"""
     
     # Initialiser le système LLM
-    from llm_backup_system import LLMBackupSystem
-    llm_system = LLMBackupSystem()
+    llm_system = llm_backup
     
     # Préparer le contenu pour l'analyse storytelling
     title = content_data.get('title', content_data.get('meta_title', ''))
@@ -538,8 +555,7 @@ INSTRUCTIONS ULTRA-SPÉCIFIQUES :
 - PENSE MARKETING : chaque information doit être exploitable pour créer du contenu"""
 
     try:
-        client = OpenAI(api_key=API_KEY)
-        response = client.chat.completions.create(
+        raw_response = await llm_backup.openai_chat(
             model="gpt-4o",
             messages=[
                 {
@@ -555,8 +571,6 @@ INSTRUCTIONS ULTRA-SPÉCIFIQUES :
             max_tokens=3000   # Plus de tokens pour plus de détails
         )
         
-        raw_response = response.choices[0].message.content
-        
         # Parse JSON avec gestion des erreurs
         clean_response = raw_response.strip()
         if clean_response.startswith('```json'):
@@ -581,8 +595,7 @@ INSTRUCTIONS ULTRA-SPÉCIFIQUES :
 async def analyze_with_claude_business_backup(content_data: dict, website_url: str) -> dict:
     """Claude backup pour analyse business quand GPT-4o échoue"""
     try:
-        from llm_backup_system import LLMBackupSystem
-        llm_system = LLMBackupSystem()
+        llm_system = llm_backup
         
         # Préparer le contenu pour l'analyse business
         title = content_data.get('title', content_data.get('meta_title', ''))
@@ -709,8 +722,7 @@ Fournis une analyse NARRATIVE selon ce format :
 
 IMPORTANT : Sois INSPIRANT, NARRATIF et ENGAGEANT. Focus sur le storytelling et l'émotion."""
 
-        client = OpenAI(api_key=API_KEY)
-        response = client.chat.completions.create(
+        storytelling_content = await llm_backup.openai_chat(
             model="gpt-4o",
             messages=[
                 {
@@ -726,8 +738,6 @@ IMPORTANT : Sois INSPIRANT, NARRATIF et ENGAGEANT. Focus sur le storytelling et
             max_tokens=1200
         )
         
-        storytelling_content = response.choices[0].message.content
-        
         return {
             "storytelling_analysis": storytelling_content,
             "ai_used": "GPT-4o (Storytelling Backup)",
@@ -748,8 +758,7 @@ IMPORTANT : Sois INSPIRANT, NARRATIF et ENGAGEANT. Focus sur le storytelling et
 async def analyze_with_claude_business_backup(content_data: dict, website_url: str) -> dict:
     """Claude backup pour analyse business quand GPT-4o échoue"""
     try:
-        from llm_backup_system import LLMBackupSystem
-        llm_system = LLMBackupSystem()
+        llm_system = llm_backup
         
         # Préparer le contenu pour l'analyse business
         title = content_data.get('title', content_data.get('meta_title', ''))
@@ -876,8 +885,7 @@ Fournis une analyse NARRATIVE selon ce format :
 
 IMPORTANT : Sois INSPIRANT, NARRATIF et ENGAGEANT. Focus sur le storytelling et l'émotion."""
 
-        client = OpenAI(api_key=API_KEY)
-        response = client.chat.completions.create(
+        storytelling_content = await llm_backup.openai_chat(
             model="gpt-4o",
             messages=[
                 {
@@ -893,8 +901,6 @@ IMPORTANT : Sois INSPIRANT, NARRATIF et ENGAGEANT. Focus sur le storytelling et
             max_tokens=1200
         )
         
-        storytelling_content = response.choices[0].message.content
-        
         return {
             "storytelling_analysis": storytelling_content,
             "ai_used": "GPT-4o (Storytelling Backup)",
@@ -934,109 +940,64 @@ def create_fallback_analysis(content_data: dict, website_url: str, reason: str =
     }
 
 @website_router.get("/analysis")
-def get_website_analysis(user_id: str = Depends(get_current_user_id_robust)):
+async def get_website_analysis(user_id: str = Depends(get_current_user_id_robust)):
     """Get latest website analysis for user"""
     try:
         print(f"🔍 Getting website analysis for user: {user_id}")
-        import pymongo
-        mongo_url = os.environ.get("MONGO_URL")
-        client = pymongo.MongoClient(mongo_url)
-        # Utiliser get_database() pour la cohérence
-        dbp = get_database()
-        collection = dbp.db.website_analyses
-        latest = collection.find_one({"user_id": user_id}, sort=[("created_at", -1)])
+        latest = await db.website_analyses.find_one({"user_id": user_id}, sort=[("created_at", -1)])
         if latest:
             # Return all fields from the saved analysis, not just a subset
             analysis_data = dict(latest)
             # Remove MongoDB internal fields
             analysis_data.pop('_id', None)
             
-            client.close()
             return analysis_data  # Return directly, not wrapped in {"analysis": ...}
-        client.close()
         return {"analysis": None}
     except Exception as e:
         print(f"❌ Error getting website analysis: {e}")
         return {"analysis": None}
 
-def discover_website_pages(base_url: str, max_pages: int = 5) -> list:
-    """Discover important pages of a website"""
+async def discover_website_pages(base_url: str, max_pages: int = 5, fetched: Optional[dict] = None) -> list:
+    """Discover the most informative pages of a website (robots.txt, sitemaps, homepage links).
+
+    Sitemaps are read within WEBSITE_DISCOVERY_BUDGET seconds; whatever was
+    collected by then is ranked. The homepage response is kept in `fetched`.
+    """
+    print(f"🔍 Discovering pages for: {base_url}")
+    candidates = {}
+    disallowed = []
+    
+    async def from_sitemaps():
+        sitemaps, rules = await page_discovery.read_robots(base_url)
+        disallowed.extend(rules)
+        await page_discovery.collect_sitemap_urls(base_url, sitemaps, candidates)
+    
+    sitemap_task = asyncio.create_task(
+        asyncio.wait_for(from_sitemaps(), timeout=page_discovery.WEBSITE_DISCOVERY_BUDGET)
+    )
     try:
-        from urllib.parse import urljoin, urlparse
-        import requests
-        from bs4 import BeautifulSoup
-        
-        print(f"🔍 Discovering pages for: {base_url}")
-        discovered_pages = [base_url]  # Always include homepage
-        
-        # Get homepage to find links
-        try:
-            response = requests.get(base_url, timeout=10, headers={
-                'User-Agent': 'Mozilla/5.0 (compatible; Website Analyzer Bot)'
-            })
-            if response.status_code != 200:
-                return discovered_pages
-                
-            soup = BeautifulSoup(response.content, 'html.parser')
-            base_domain = urlparse(base_url).netloc
-            
-            # Keywords to look for in URLs and link text
-            important_keywords = [
-                'about', 'qui-sommes-nous', 'notre-histoire', 'entreprise',
-                'services', 'produits', 'solutions', 'offres',
-                'contact', 'contacts', 'nous-contacter',
-                'concept', 'notre-concept', 'philosophie',
-                'portfolio', 'realisations', 'projets',
-                'equipe', 'team', 'notre-equipe'
-            ]
-            
-            # Skip technical pages
-            skip_keywords = [
-                'mentions-legales', 'legal', 'privacy', 'cookies', 'cgv', 'cgu',
-                'terms', 'politique', 'sitemap', 'admin', 'login', 'wp-',
-                'feed', 'rss', 'xml'
-            ]
-            
-            # Find all links
-            links = soup.find_all('a', href=True)
-            
-            for link in links:
-                href = link.get('href', '').lower()
-                text = link.get_text(strip=True).lower()
-                
-                # Skip empty links, anchors, external links
-                if not href or href.startswith('#') or href.startswith('mailto:'):
-                    continue
-                
-                # Build full URL
-                full_url = urljoin(base_url, href)
-                parsed_url = urlparse(full_url)
-                
-                # Skip external domains
-                if parsed_url.netloc != base_domain:
-                    continue
-                
-                # Skip technical pages
-                if any(skip in href or skip in text for skip in skip_keywords):
-                    continue
-                
-                # Check if it's an important page
-                if any(keyword in href or keyword in text for keyword in important_keywords):
-                    if full_url not in discovered_pages and len(discovered_pages) < max_pages:
-                        discovered_pages.append(full_url)
-                        print(f"📄 Found important page: {full_url}")
-            
-        except Exception as e:
-            print(f"⚠️ Error discovering pages: {e}")
-            
-        return discovered_pages[:max_pages]
-        
+        homepage = await fetch_page(base_url, fetched)
+        if "error" not in homepage:
+            links = await asyncio.to_thread(page_discovery.homepage_links, homepage["body"], base_url)
+            for url, text in links:
+                page_discovery.add_candidate(candidates, url, text=text)
+    except Exception as e:
+        print(f"⚠️ Error reading homepage links: {e}")
+    
+    try:
+        await sitemap_task
+    except asyncio.TimeoutError:
+        print(f"⏱️ Discovery budget reached, ranking {len(candidates)} candidates collected so far")
     except Exception as e:
-        print(f"❌ Page discovery failed: {e}")
-        return [base_url]
+        print(f"⚠️ Error reading robots.txt / sitemaps: {e}")
+    
+    pages = page_discovery.rank_pages(base_url, candidates, disallowed, max_pages)
+    for page_url in pages[1:]:
+        print(f"📄 Found important page: {page_url}")
+    return pages
 
-async def analyze_multiple_pages(pages: list, base_url: str) -> dict:
-    """Analyze multiple pages and combine insights"""
+async def analyze_multiple_pages(pages: list, base_url: str, fetched: Optional[dict] = None) -> dict:
+    """Analyze multiple pages concurrently and combine insights (in discovery order)"""
     try:
         all_content = {
             "title": "",
@@ -1047,43 +1008,49 @@ async def analyze_multiple_pages(pages: list, base_url: str) -> dict:
             "pages_analyzed": []
         }
         
-        for page_url in pages:
-            try:
-                print(f"📄 Analyzing page: {page_url}")
-                extracted = extract_website_content_with_limits(page_url)
+        print(f"📄 Analyzing {len(pages)} pages concurrently")
+        results = await asyncio.gather(
+            *(extract_website_content_with_limits(page_url, fetched) for page_url in pages),
+            return_exceptions=True
+        )
+        
+        for page_url, extracted in zip(pages, results):
+            if isinstance(extracted, Exception):
+                print(f"⚠️ Error analyzing {page_url}: {extracted}")
+                all_content["pages_analyzed"].append({
+                    "url": page_url,
+                    "status": "error"
+                })
+                continue
+            
+            if "error" not in extracted:
+                # Combine content from all pages
+                if not all_content["title"] and extracted.get("meta_title"):
+                    all_content["title"] = extracted["meta_title"]
+                
+                if not all_content["description"] and extracted.get("meta_description"):
+                    all_content["description"] = extracted["meta_description"]
+                
+                # Combine text content (with limits)
+                page_text = extracted.get("content_text", "")[:2000]  # Limit per page
+                all_content["text_content"] += f"\n\n=== Page: {page_url} ===\n{page_text}"
                 
-                if "error" not in extracted:
-                    # Combine content from all pages
-                    if not all_content["title"] and extracted.get("title"):
-                        all_content["title"] = extracted["title"]
-                    
-                    if not all_content["description"] and extracted.get("description"):
-                        all_content["description"] = extracted["description"]
-                    
-                    # Combine text content (with limits)
-                    page_text = extracted.get("text_content", "")[:2000]  # Limit per page
-                    all_content["text_content"] += f"\n\n=== Page: {page_url} ===\n{page_text}"
-                    
-                    # Combine headers
-                    all_content["h1_tags"].extend(extracted.get("h1_tags", []))
-                    all_content["h2_tags"].extend(extracted.get("h2_tags", []))
-                    
-                    all_content["pages_analyzed"].append({
-                        "url": page_url,
-                        "title": extracted.get("title", ""),
-                        "status": "analyzed"
-                    })
-                else:
-                    all_content["pages_analyzed"].append({
-                        "url": page_url,
-                        "title": "",
-                        "status": "error"
-                    })
-                    
-            except Exception as e:
-                print(f"⚠️ Error analyzing {page_url}: {e}")
+                # Combine headers
+                all_content["h1_tags"].extend(extracted.get("h1_tags", []))
+                all_content["h2_tags"].extend(extracted.get("h2_tags", []))
+                
+                all_content["pages_analyzed"].append({
+                    "url": page_url,
+                    "title": extracted.get("meta_title", ""),
+                    "status": "analyzed",
+                    "etag": extracted.get("etag"),
+                    "last_modified": extracted.get("last_modified"),
+                    "content_hash": extracted.get("content_hash")
+                })
+            else:
                 all_content["pages_analyzed"].append({
                     "url": page_url,
+                    "title": "",
                     "status": "error"
                 })
         
@@ -1097,7 +1064,7 @@ async def analyze_multiple_pages(pages: list, base_url: str) -> dict:
     except Exception as e:
         print(f"❌ Multi-page analysis failed: {e}")
         # Fallback to single page
-        return extract_website_content_with_limits(base_url)
+        return await extract_website_content_with_limits(base_url, fetched)
 
 @website_router.post("/force-real-analysis")
 async def force_real_gpt4o_analysis(
@@ -1125,7 +1092,7 @@ async def force_real_gpt4o_analysis(
         print(f"🔥 FORCE REAL ANALYSIS - GPT-4o pour: {url}")
         
         # Extraction rapide du contenu
-        content_data = extract_website_content_with_limits(url)
+        content_data = await extract_website_content_with_limits(url)
         
         if "error" in content_data:
             print(f"❌ Erreur extraction: {content_data['error']}")
@@ -1267,6 +1234,7 @@ async def compare_openai_vs_claude(
 ):
     """Compare OpenAI GPT-4o vs Claude Sonnet 4 analysis side by side"""
     from fastapi.responses import JSONResponse
+    set_cache_owner(user_id)
     
     url = (request.website_url or "").strip()
     if not re.match(r'^https?://', url, re.IGNORECASE):
@@ -1275,7 +1243,7 @@ async def compare_openai_vs_claude(
     print(f"🔍 COMPARISON: OpenAI vs Claude for {url}")
     
     # Extraction du contenu une seule fois
-    content_data = extract_website_content_with_limits(url)
+    content_data = await extract_website_content_with_limits(url)
     
     if "error" in content_data:
         content_data = {
@@ -1360,8 +1328,7 @@ async def test_openai_only(content_data: dict, website_url: str) -> dict:
     Contenu: {content_data.get('text_content', 'Non disponible')[:2000]}
     """
     
-    client = OpenAI(api_key=API_KEY)
-    response = client.chat.completions.create(
+    raw_response = await llm_backup.openai_chat(
         model="gpt-4o",
         messages=[
             {
@@ -1377,8 +1344,6 @@ async def test_openai_only(content_data: dict, website_url: str) -> dict:
         max_tokens=2000
     )
     
-    raw_response = response.choices[0].message.content
-    
     # Parse JSON
     clean_response = raw_response.strip()
     if clean_response.startswith('```json'):
@@ -1391,9 +1356,7 @@ async def test_openai_only(content_data: dict, website_url: str) -> dict:
 
 async def test_claude_only(content_data: dict, website_url: str) -> dict:
     """Test Claude Sonnet 4 uniquement"""
-    try:
-        from emergentintegrations.llm.chat import LlmChat, UserMessage
-    except ImportError:
+    if not CLAUDE_AVAILABLE:
         raise Exception("Claude/emergentintegrations not available")
     
     claude_key = os.environ.get('CLAUDE_API_KEY')
@@ -1422,14 +1385,11 @@ async def test_claude_only(content_data: dict, website_url: str) -> dict:
     IMPORTANT: Réponds UNIQUEMENT avec le JSON, sans texte supplémentaire.
     """
     
-    claude_chat = LlmChat(
-        api_key=claude_key,
-        session_id="comparison-test",
-        system_message="Tu es un expert en analyse web. Tu réponds toujours en JSON valide et structuré."
-    ).with_model("anthropic", "claude-4-sonnet-20250514")
-    
-    user_message = UserMessage(text=prompt)
-    response = await claude_chat.send_message(user_message)
+    response = await llm_backup.claude_completion(
+        prompt,
+        system_message="Tu es un expert en analyse web. Tu réponds toujours en JSON valide et structuré.",
+        session_id="comparison-test"
+    )
     
     # Parse JSON from Claude response
     clean_response = response.strip()
@@ -1447,6 +1407,7 @@ async def compare_posts_generation(
     user_id: str = Depends(get_current_user_id_robust)
 ):
     """Compare OpenAI vs Claude pour la génération de posts"""
+    set_cache_owner(user_id)
     
     business_context = request.get('business_context', '')
     if not business_context:
@@ -1514,8 +1475,7 @@ async def test_openai_post_generation(business_context: str) -> dict:
     - Hashtags pertinents
     """
     
-    client = OpenAI(api_key=API_KEY)
-    response = client.chat.completions.create(
+    raw_response = await llm_backup.openai_chat(
         model="gpt-4o",
         messages=[
             {"role": "system", "content": "Tu es un expert en réseaux sociaux. Réponds UNIQUEMENT en JSON."},
@@ -1524,8 +1484,6 @@ async def test_openai_post_generation(business_context: str) -> dict:
         temperature=0.7,
         max_tokens=500
     )
-    
-    raw_response = response.choices[0].message.content
     clean_response = raw_response.strip()
     if clean_response.startswith('```json'):
         clean_response = clean_response[7:]
@@ -1537,9 +1495,7 @@ async def test_openai_post_generation(business_context: str) -> dict:
 
 async def test_claude_post_generation(business_context: str) -> dict:
     """Test génération de post avec Claude uniquement"""
-    try:
-        from emergentintegrations.llm.chat import LlmChat, UserMessage
-    except ImportError:
+    if not CLAUDE_AVAILABLE:
         raise Exception("Claude not available")
     
     claude_key = os.environ.get('CLAUDE_API_KEY')
@@ -1565,14 +1521,11 @@ async def test_claude_post_generation(business_context: str) -> dict:
     Réponds UNIQUEMENT avec le JSON, rien d'autre.
     """
     
-    claude_chat = LlmChat(
-        api_key=claude_key,
-        session_id="posts-comparison",
-        system_message="Tu es un expert en réseaux sociaux. Tu réponds toujours en JSON valide."
-    ).with_model("anthropic", "claude-4-sonnet-20250514")
-    
-    user_message = UserMessage(text=prompt)
-    response = await claude_chat.send_message(user_message)
+    response = await llm_backup.claude_completion(
+        prompt,
+        system_message="Tu es un expert en réseaux sociaux. Tu réponds toujours en JSON valide.",
+        session_id="posts-comparison"
+    )
     
     clean_response = response.strip()
     if clean_response.startswith('```json'):
@@ -1690,7 +1643,7 @@ async def analyze_with_gpt4o_business(content_data: Dict[str, Any]) -> Dict[str,
     """Analyse business/exécution avec GPT-4o : concis, structuré, actionnable"""
     
     # Initialiser le système LLM
-    llm_system = LLMBackupSystem()
+    llm_system = llm_backup
     
     # Préparer le contenu pour l'analyse depuis la vraie structure de content_data
     title = content_data.get('title', '')
@@ -1790,7 +1743,7 @@ async def analyze_with_claude_narrative(content_data: Dict[str, Any]) -> Dict[st
     """Analyse narrative/inspiration avec Claude Sonnet 4 : storytelling, profondeur"""
     
     # Initialiser le système LLM
-    llm_system = LLMBackupSystem()
+    llm_system = llm_backup
     
     # Préparer le contenu pour l'analyse depuis la vraie structure de content_data
     title = content_data.get('title', '')
@@ -1989,16 +1942,19 @@ async def analyze_website_robust(
 
 async def _perform_website_analysis(url: str, user_id: str) -> dict:
     """Fonction interne optimisée pour l'analyse avec timeout"""
+    # Réponses LLM mises en cache par utilisateur (pages inchangées = 0 token)
+    set_cache_owner(user_id)
     
     # Step 1: Découverte rapide (max 3 pages pour éviter timeout)
     print(f"📋 Step 1: Discovering pages...")
-    important_pages = discover_website_pages(url, max_pages=3)  # Réduit de 5 à 3
+    fetched = {}  # page d'accueil téléchargée une seule fois (découverte + analyse)
+    important_pages = await discover_website_pages(url, max_pages=3, fetched=fetched)  # Réduit de 5 à 3
     print(f"📋 Found {len(important_pages)} pages to analyze: {important_pages}")
     
     # Step 2: Analyse multi-pages avec timeout augmenté
     print(f"📄 Step 2: Analyzing content...")
     content_data = await asyncio.wait_for(
-        analyze_multiple_pages(important_pages, url),
+        analyze_multiple_pages(important_pages, url, fetched),
         timeout=35.0  # 35 secondes max pour l'extraction de contenu
     )
     
@@ -2113,17 +2069,17 @@ async def _perform_website_analysis(url: str, user_id: str) -> dict:
 
     # Sauvegarde en base avec gestion d'erreur
     try:
-        dbp = get_database()
         analysis_doc = {
             "user_id": user_id,
             "website_url": url,
             **combined_result,
+            "page_fingerprints": page_fingerprints(content_data),
             "created_at": datetime.utcnow(),
             "updated_at": datetime.utcnow()
         }
         
-        # Consistent collection access using dot notation - CORRECTION ASYNC/SYNC
-        dbp.db.website_analyses.insert_one(analysis_doc)  # Suppression await pour client synchrone
+        await db.website_analyses.insert_one(analysis_doc)
+        await mark_context_stale(db, user_id, "website")
         logging.info(f"✅ Analysis saved to database for user {user_id}")
         
     except Exception as save_error:
@@ -2142,6 +2098,8 @@ async def delete_website_analysis(
     """Delete website analysis for the current user"""
     try:
         result = await db.website_analyses.delete_many({"user_id": user_id})
+        await evict_llm_cache(user_id)
+        await mark_context_stale(db, user_id, "website")
         return {
             "message": f"Deleted {result.deleted_count} website analysis records",
             "deleted_count": result.deleted_count
@@ -102,6 +102,61 @@ const FREE_TRIAL_PLAN = {
   color: 'green'
 };
 
+// Largeurs des variantes de vignettes (THUMB_VARIANT_WIDTHS côté API) et taille d'affichage dans la grille
+const THUMB_WIDTHS = [200, 400, 800];
+// Suivi des jobs de génération de posts (/posts/generate/{job_id})
+const GENERATION_POLL_INTERVAL_MS = 2000;
+const GENERATION_POLL_MAX_MS = 20 * 60 * 1000;
+const GENERATION_POLL_MAX_ERRORS = 3;
+const THUMB_SIZES = '(min-width: 1024px) 20vw, (min-width: 768px) 25vw, 33vw';
+
+// Modification IA en streaming (Server-Sent Events) : onText reçoit le texte du post au fil des tokens,
+// la promesse se résout avec la même réponse que PUT /posts/{id}/modify une fois le post enregistré
+const streamPostModification = async (postId, modificationRequest, token, onText) => {
+  const response = await fetch(`${API}/posts/${postId}/modify/stream`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json', Authorization: `Bearer ${token}` },
+    body: JSON.stringify({ modification_request: modificationRequest })
+  });
+  if (!response.ok || !response.body) {
+    const body = await response.json().catch(() => ({}));
+    const error = new Error(body.detail || body.error || `HTTP ${response.status}`);
+    error.response = { status: response.status, data: { detail: body.detail || body.error } };
+    throw error;
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  let raw = '';
+  for (;;) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    const events = buffer.split('\n\n');
+    buffer = events.pop();
+    for (const block of events) {
+      const eventName = (block.match(/^event: (.*)$/m) || [])[1];
+      const dataLine = (block.match(/^data: (.*)$/m) || [])[1];
+      if (!dataLine) continue;
+      const data = JSON.parse(dataLine);
+      if (eventName === 'token') {
+        raw += data.delta;
+        // Aperçu : champ "text" du JSON encore incomplet
+        const partial = raw.match(/"text"\s*:\s*"((?:[^"\\]|\\.)*)/);
+        if (partial && onText) onText(partial[1].replace(/\\n/g, '\n').replace(/\\"/g, '"'));
+      } else if (eventName === 'done') {
+        return data;
+      } else if (eventName === 'error') {
+        const error = new Error(data.detail);
+        error.response = { data: { detail: data.detail } };
+        throw error;
+      }
+    }
+  }
+  throw new Error('Flux interrompu avant la fin de la modification');
+};
+
 // ContentThumbnail component avec support carrousel
 const ContentThumbnail = React.memo(({ content, isSelectionMode, isSelected, onContentClick, onToggleSelection, onMoveContent }) => {
   // Token stable - récupéré une seule fois
@@ -126,6 +181,16 @@ const ContentThumbnail = React.memo(({ content, isSelectionMode, isSelected, onC
     return url;
   }, [content.thumb_url, stableToken]);
 
+  // Variantes responsives (200/400/800) servies par /thumb?w= selon la taille d'affichage
+  const thumbnailSrcSet = useMemo(() => {
+    if (!content.thumb_url || !content.thumb_url.startsWith('/api/content/')) {
+      return undefined;
+    }
+    return THUMB_WIDTHS
+      .map((w) => `${content.thumb_url}?w=${w}&token=${stableToken} ${w}w`)
+      .join(', ');
+  }, [content.thumb_url, stableToken]);
+
   const handleClick = useCallback(() => {
     onContentClick(content);
   }, [content, onContentClick]);
@@ -156,6 +221,8 @@ const ContentThumbnail = React.memo(({ content, isSelectionMode, isSelected, onC
           }`}>
             <img 
               src={thumbnailUrl || '/api/placeholder.png'}
+              srcSet={thumbnailSrcSet}
+              sizes={THUMB_SIZES}
               alt={content.title || 'Carrousel'}
               className="thumbnail-image w-full h-full object-cover"
               loading="lazy"
@@ -163,6 +230,7 @@ const ContentThumbnail = React.memo(({ content, isSelectionMode, isSelected, onC
               onError={(e) => {
                 const fallbackUrl = '/api/placeholder.png';
                 if (e.currentTarget.src !== fallbackUrl) {
+                  e.currentTarget.removeAttribute('srcset');
                   e.currentTarget.src = fallbackUrl;
                 }
               }}
@@ -220,6 +288,8 @@ const ContentThumbnail = React.memo(({ content, isSelectionMode, isSelected, onC
         {content.file_type?.startsWith('image/') ? (
           <img 
             src={thumbnailUrl || '/api/placeholder.png'}
+            srcSet={thumbnailSrcSet}
+            sizes={THUMB_SIZES}
             alt={content.filename}
             className="thumbnail-image w-full h-full object-cover"
             loading="lazy"
@@ -227,6 +297,7 @@ const ContentThumbnail = React.memo(({ content, isSelectionMode, isSelected, onC
             onError={(e) => {
               const fallbackUrl = content.url || '/api/placeholder.png';
               if (e.currentTarget.src !== fallbackUrl) {
+                e.currentTarget.removeAttribute('srcset');
                 e.currentTarget.src = fallbackUrl;
               }
             }}
@@ -4187,6 +4258,44 @@ function MainApp() {
         headers: { Authorization: `Bearer ${token}` }
       });
 
+      // La génération tourne en tâche de fond : suivre la progression du job
+      const jobId = response.data.job_id;
+      const progressToastId = `generate-${jobId}`;
+      let job = response.data;
+      try {
+        const pollDeadline = Date.now() + GENERATION_POLL_MAX_MS;
+        let pollErrors = 0;
+        while (job.status === 'pending' || job.status === 'running') {
+          if (Date.now() > pollDeadline) {
+            throw new Error('La génération prend plus de temps que prévu. Elle continue en arrière-plan : rechargez la page dans quelques minutes pour voir vos posts.');
+          }
+          toast.loading(`Génération en cours${job.step ? ` (étape ${job.step})` : ''} : ${job.step_label || 'en attente'}`, {
+            id: progressToastId
+          });
+          await new Promise(resolve => setTimeout(resolve, GENERATION_POLL_INTERVAL_MS));
+          try {
+            const progressResponse = await axios.get(`${API}/posts/generate/${jobId}`, {
+              headers: { Authorization: `Bearer ${token}` }
+            });
+            job = progressResponse.data;
+            pollErrors = 0;
+          } catch (pollError) {
+            // Erreurs réseau / 5xx passagères : on réessaie au prochain tour
+            const status = pollError.response?.status;
+            pollErrors += 1;
+            if ((status && status < 500) || pollErrors >= GENERATION_POLL_MAX_ERRORS) {
+              throw pollError;
+            }
+            console.warn(`Generation poll failed (${pollErrors}/${GENERATION_POLL_MAX_ERRORS}), retrying`, pollError);
+          }
+        }
+      } finally {
+        toast.dismiss(progressToastId);
+      }
+      if (job.status === 'failed') {
+        throw new Error(job.error || 'Génération échouée');
+      }
+
       const monthName = monthKey ? 
         new Date(monthKey + '-01').toLocaleDateString('fr-FR', { month: 'long', year: 'numeric' }) :
         'ce mois';
@@ -4347,14 +4456,11 @@ function MainApp() {
     try {
       console.log(`🔄 Modification du post ${post.id}:`, modificationRequestValue.trim());
       
-      const response = await axios.put(
-        `${API}/posts/${post.id}/modify`,
-        { modification_request: modificationRequestValue.trim() },
-        { 
-          headers: { Authorization: `Bearer ${token}` },
-          timeout: 30000 // 30 secondes timeout
-        }
-      );
+      // Le texte s'affiche au fil de la génération (streaming SSE)
+      const data = await streamPostModification(post.id, modificationRequestValue.trim(), token, (text) => {
+        toast.loading(`✍️ ${text.length > 160 ? '…' + text.slice(-160) : text}`, { id: `modify-${post.id}` });
+      });
+      const response = { data };
 
       console.log('📡 Réponse du serveur:', response.data);
 
@@ -4397,6 +4503,7 @@ function MainApp() {
       toast.error(errorMessage);
       return false;
     } finally {
+      toast.dismiss(`modify-${post.id}`);
       setIsModifyingPost(false);
     }
   };
@@ -4478,14 +4585,11 @@ function MainApp() {
     try {
       console.log(`🔄 Modification du post calendrier ${post.id}:`, modificationRequestValue.trim());
       
-      const response = await axios.put(
-        `${API}/posts/${post.id}/modify`,
-        { modification_request: modificationRequestValue.trim() },
-        { 
-          headers: { Authorization: `Bearer ${token}` },
-          timeout: 30000
-        }
-      );
+      // Le texte s'affiche au fil de la génération (streaming SSE)
+      const data = await streamPostModification(post.id, modificationRequestValue.trim(), token, (text) => {
+        toast.loading(`✍️ ${text.length > 160 ? '…' + text.slice(-160) : text}`, { id: `modify-${post.id}` });
+      });
+      const response = { data };
 
       console.log('📡 Réponse du serveur:', response.data);
 
@@ -4524,6 +4628,7 @@ function MainApp() {
       toast.error(errorMessage);
       return false;
     } finally {
+      toast.dismiss(`modify-${post.id}`);
       setIsModifyingPost(false);
     }
   };
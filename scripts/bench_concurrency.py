@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Claire et Marcus - API concurrency benchmark
+
+Fires concurrent authenticated requests at the read endpoints most affected by
+blocking MongoDB calls and reports latency percentiles and throughput.
+Run it against the same deployment before and after a data-layer change.
+
+Usage:
+    BENCH_BASE_URL=https://... BENCH_EMAIL=... BENCH_PASSWORD=... \\
+        python scripts/bench_concurrency.py [--concurrency 50] [--requests 500]
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+import httpx
+
+ENDPOINTS = [
+    "/api/content/pending?limit=24",
+    "/api/notes",
+    "/api/business-profile",
+    "/api/posts/generated",
+    "/api/calendar/posts",
+    "/api/content/thumbnails/status",
+]
+
+
+async def login(client: httpx.AsyncClient) -> str:
+    token = os.environ.get("BENCH_TOKEN")
+    if token:
+        return token
+    response = await client.post("/api/auth/login-robust", json={
+        "email": os.environ["BENCH_EMAIL"],
+        "password": os.environ["BENCH_PASSWORD"],
+    })
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+
+async def run(base_url: str, concurrency: int, total_requests: int):
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=60, limits=limits) as client:
+        token = await login(client)
+        headers = {"Authorization": f"Bearer {token}"}
+
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies = {endpoint: [] for endpoint in ENDPOINTS}
+        errors = 0
+
+        async def hit(i: int):
+            nonlocal errors
+            endpoint = ENDPOINTS[i % len(ENDPOINTS)]
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    response = await client.get(endpoint, headers=headers)
+                    if response.status_code >= 400:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies[endpoint].append((time.perf_counter() - started) * 1000)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(hit(i) for i in range(total_requests)))
+        elapsed = time.perf_counter() - started
+
+    print(f"🏁 {total_requests} requests, concurrency {concurrency}, {elapsed:.1f}s "
+          f"→ {total_requests / elapsed:.1f} req/s, {errors} errors")
+    print(f"{'endpoint':45} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8}")
+    for endpoint, values in latencies.items():
+        if not values:
+            continue
+        values.sort()
+        p95 = values[min(len(values) - 1, int(len(values) * 0.95))]
+        print(f"{endpoint:45} {statistics.median(values):8.0f} {p95:8.0f} {values[-1]:8.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=500)
+    args = parser.parse_args()
+
+    base_url = os.environ.get("BENCH_BASE_URL", "http://localhost:8001")
+    if not os.environ.get("BENCH_TOKEN") and not os.environ.get("BENCH_EMAIL"):
+        print("❌ Set BENCH_TOKEN or BENCH_EMAIL/BENCH_PASSWORD")
+        sys.exit(1)
+
+    asyncio.run(run(base_url, args.concurrency, args.requests))
+
+
+if __name__ == "__main__":
+    main()